@@ -0,0 +1,127 @@
+"""
+Vẽ bounding box + nhãn mã biển báo trực tiếp lên frame BGR (numpy), không chuyển frame qua PIL
+
+Mỗi nhãn được render một lần bằng PIL (font DejaVu) thành sprite: màu đã nhân alpha + alpha của
+nền đen trong suốt và chữ. Sprite của mọi mã trong CLASS_ID_TO_SIGN_CODE được render sẵn ở lần vẽ đầu,
+nhãn khác (fallback class_id) được cache khi gặp. Mỗi frame chỉ blend vùng ROI nhỏ của nhãn,
+box vẽ bằng cv2.rectangle.
+"""
+import threading
+from functools import lru_cache
+from pathlib import Path
+
+import cv2
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+
+from .sign_code_mapping import CLASS_ID_TO_SIGN_CODE
+
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+FONT_SIZE = 12  # tăng cỡ chữ cho video/ảnh
+TEXT_COLOR = (255, 0, 0)          # đỏ
+TEXT_BG_COLOR = (0, 0, 0, 255)    # nền đen (giống ảnh PIL cũ: ImageDraw trên RGBA ghi đè, không blend)
+LABEL_PADDING = 4
+BOX_THICKNESS = 2
+
+_BOX_COLOR_BGR = TEXT_COLOR[::-1]
+
+
+class LabelSprite:
+    """Nhãn đã render: color (h, w, 3) float32 đã nhân alpha, alpha (h, w, 1), offset so với vị trí vẽ chữ"""
+    __slots__ = ('color', 'alpha', 'offset_x', 'offset_y')
+
+    def __init__(self, color: np.ndarray, alpha: np.ndarray, offset_x: int, offset_y: int):
+        self.color = color
+        self.alpha = alpha
+        self.offset_x = offset_x
+        self.offset_y = offset_y
+
+
+@lru_cache(maxsize=1)
+def _get_font(size: int = FONT_SIZE):
+    try:
+        local_font = BASE_DIR / "ai_engine" / "fonts" / "DejaVuSans.ttf"
+        if local_font.exists():
+            return ImageFont.truetype(str(local_font), size=size)
+        return ImageFont.truetype("DejaVuSans.ttf", size=size)
+    except Exception:
+        return ImageFont.load_default()
+
+
+def render_label(text: str, font=None) -> LabelSprite:
+    """
+    Render nhãn thành sprite: nền TEXT_BG_COLOR bao quanh chữ (padding LABEL_PADDING), chữ TEXT_COLOR
+    Vị trí giống ImageDraw.text tại (x, y): sprite bắt đầu từ (x + offset_x, y + offset_y)
+    """
+    font = font or _get_font()
+    left, top, right, bottom = font.getbbox(text)
+    width = right - left + 2 * LABEL_PADDING + 1
+    height = bottom - top + 2 * LABEL_PADDING + 1
+
+    mask = Image.new("L", (width, height), 0)
+    ImageDraw.Draw(mask).text((LABEL_PADDING - left, LABEL_PADDING - top), text, fill=255, font=font)
+    text_alpha = np.asarray(mask, dtype=np.float32)[..., None] / 255.0
+    bg_alpha = TEXT_BG_COLOR[3] / 255.0
+
+    # Chữ phủ lên nền: alpha tổng = 1 - (1 - a_nền)(1 - a_chữ), màu (BGR) đã nhân alpha
+    alpha = 1.0 - (1.0 - bg_alpha) * (1.0 - text_alpha)
+    text_bgr = np.array(TEXT_COLOR[::-1], dtype=np.float32)
+    bg_bgr = np.array(TEXT_BG_COLOR[2::-1], dtype=np.float32)
+    color = text_bgr * text_alpha + bg_bgr * bg_alpha * (1.0 - text_alpha)
+    return LabelSprite(color.astype(np.float32), alpha.astype(np.float32), left - LABEL_PADDING, top - LABEL_PADDING)
+
+
+_sprites = {}
+_sprites_lock = threading.Lock()
+
+
+def _prerender_sign_codes():
+    font = _get_font()
+    for code in set(CLASS_ID_TO_SIGN_CODE.values()):
+        _sprites[code] = render_label(code, font)
+
+
+def get_label_sprite(text: str) -> LabelSprite:
+    sprite = _sprites.get(text)
+    if sprite is None:
+        with _sprites_lock:
+            if not _sprites:
+                _prerender_sign_codes()
+            sprite = _sprites.get(text)
+            if sprite is None:
+                sprite = _sprites[text] = render_label(text)
+    return sprite
+
+
+def blend_sprite(frame: np.ndarray, sprite: LabelSprite, x: int, y: int):
+    """Blend sprite lên frame tại (x, y) (góc trên trái), phần nằm ngoài frame bị cắt"""
+    height, width = frame.shape[:2]
+    sprite_h, sprite_w = sprite.alpha.shape[:2]
+    x0, y0 = max(x, 0), max(y, 0)
+    x1, y1 = min(x + sprite_w, width), min(y + sprite_h, height)
+    if x0 >= x1 or y0 >= y1:
+        return
+    sx, sy = x0 - x, y0 - y
+    alpha = sprite.alpha[sy:sy + y1 - y0, sx:sx + x1 - x0]
+    color = sprite.color[sy:sy + y1 - y0, sx:sx + x1 - x0]
+    roi = frame[y0:y1, x0:x1]
+    roi[:] = (roi * (1.0 - alpha) + color + 0.5).astype(np.uint8)
+
+
+def draw_detections(frame: np.ndarray, detections: list, label_fn):
+    """
+    Vẽ box và nhãn label_fn(det) của từng detection lên frame BGR (in-place)
+    Nhãn đặt phía trên góc trái box (y1 - FONT_SIZE, không âm)
+    """
+    for det in detections:
+        bbox = det.get("bbox")
+        if not bbox or len(bbox) != 4:
+            continue
+        x1, y1, x2, y2 = map(int, bbox)
+        cv2.rectangle(frame, (x1, y1), (x2, y2), _BOX_COLOR_BGR, BOX_THICKNESS)
+        label = label_fn(det)
+        if label:
+            sprite = get_label_sprite(label)
+            blend_sprite(frame, sprite, x1 + sprite.offset_x, max(0, y1 - FONT_SIZE) + sprite.offset_y)
@@ -0,0 +1,242 @@
+"""
+Backend inference cho YOLO model
+
+- 'torch': chạy trực tiếp best.pt bằng PyTorch (mặc định)
+- 'onnx': export best.pt sang ONNX một lần, chạy bằng ONNX Runtime (CPU nhanh hơn 2-3 lần)
+- 'openvino': export sang OpenVINO IR, tối ưu cho CPU Intel
+
+File export được cache trong YOLO_EXPORT_DIR, key theo hash của file weights,
+nên đổi weights sẽ tự export lại. Model export vẫn được load qua ultralytics.YOLO
+nên predict() và post-processing (NMS, scale box) giống hệt backend torch.
+"""
+import hashlib
+import importlib.util
+import json
+import os
+import shutil
+from functools import lru_cache
+from pathlib import Path
+
+from decouple import config
+
+from .performance_config import INFERENCE_BACKEND, INFERENCE_PRECISION
+
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+SUPPORTED_BACKENDS = ('torch', 'onnx', 'openvino')
+
+# Package cần có để chạy từng backend (optional dependency)
+_BACKEND_REQUIREMENTS = {
+    'onnx': 'onnxruntime',
+    'openvino': 'openvino',
+}
+
+
+def resolve_weight_path() -> Path:
+    """Đường dẫn file weights .pt theo YOLO_WEIGHTS hoặc mặc định ai_engine/YOLO11/best.pt"""
+    weight_path = os.environ.get("YOLO_WEIGHTS") or config("YOLO_WEIGHTS", default=None)
+    if not weight_path:
+        weight_path = BASE_DIR / "ai_engine" / "YOLO11" / "best.pt"
+    weight_path = Path(weight_path)
+    if not weight_path.exists():
+        raise FileNotFoundError(f"YOLO weight file not found: {weight_path}")
+    return weight_path
+
+
+def _export_dir() -> Path:
+    export_dir = os.environ.get("YOLO_EXPORT_DIR") or config("YOLO_EXPORT_DIR", default=None)
+    if not export_dir:
+        export_dir = BASE_DIR / "ai_engine" / "YOLO11" / "exports"
+    return Path(export_dir)
+
+
+@lru_cache(maxsize=8)
+def _hash_file(path: str, size: int, mtime: float) -> str:
+    sha = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def weights_hash(weight_path: Path) -> str:
+    """SHA-256 của file weights (cache theo size + mtime để không đọc lại file mỗi lần)"""
+    stat = weight_path.stat()
+    return _hash_file(str(weight_path), stat.st_size, stat.st_mtime)
+
+
+def current_model_version(backend: str = None, precision: str = None, weight_path: Path = None) -> str:
+    """Định danh model: hash weights + backend + precision (dùng để dedup kết quả)"""
+    backend = (backend or INFERENCE_BACKEND).lower()
+    precision = (precision or INFERENCE_PRECISION).lower()
+    return f"{weights_hash(weight_path or resolve_weight_path())[:16]}-{backend}-{precision}"
+
+
+def resolved_model_version(weight_path: Path = None):
+    """
+    Version của model mà load_model sẽ thực sự load với cấu hình hiện tại (sau fallback), không load / export gì
+    None nếu chưa biết được (artifact onnx / openvino chưa export)
+    """
+    weight_path = Path(weight_path) if weight_path else resolve_weight_path()
+    resolved = resolve_backend(INFERENCE_BACKEND, INFERENCE_PRECISION, weight_path, export=False)
+    if resolved is None:
+        return None
+    backend, precision, _ = resolved
+    return current_model_version(backend, precision, weight_path)
+
+
+def backend_available(backend: str) -> bool:
+    requirement = _BACKEND_REQUIREMENTS.get(backend)
+    return requirement is None or importlib.util.find_spec(requirement) is not None
+
+
+def exported_artifact_path(weight_path: Path, backend: str, tag: str = '') -> Path:
+    digest = weights_hash(weight_path)[:16]
+    # Tên theo file thật: YOLO_WEIGHTS là symlink hay file đã resolve (model registry) cho cùng artifact
+    name = f"{Path(os.path.realpath(weight_path)).stem}-{digest}{tag}"
+    if backend == 'onnx':
+        return _export_dir() / f"{name}.onnx"
+    return _export_dir() / f"{name}_openvino_model"
+
+
+def metadata_path(artifact: Path) -> Path:
+    return artifact.with_name(artifact.name + '.json')
+
+
+def read_export_metadata(artifact: Path) -> dict:
+    """Metadata ghi lúc export: imgsz, hash weights gốc, backend"""
+    try:
+        return json.loads(metadata_path(artifact).read_text(encoding='utf-8'))
+    except (OSError, ValueError):
+        return {}
+
+
+def export_model(weight_path: Path, backend: str, **export_kwargs) -> Path:
+    """
+    Export weights sang backend (nếu chưa có trong cache) và trả về đường dẫn artifact
+    export_kwargs được truyền thêm cho YOLO.export (ví dụ int8/data cho bản quantized)
+    """
+    tag = export_kwargs.pop('tag', '')
+    target = exported_artifact_path(weight_path, backend, tag)
+    if target.exists() and metadata_path(target).exists():
+        return target
+
+    from ultralytics import YOLO
+
+    print(f"📦 Exporting {weight_path.name} to {backend} (one-time)...")
+    target.parent.mkdir(parents=True, exist_ok=True)
+    source_model = YOLO(str(weight_path))
+    # Giữ imgsz lúc train (giống backend torch) để letterbox và output giống hệt
+    imgsz = source_model.overrides.get('imgsz', 640)
+    exported = Path(source_model.export(
+        format=backend,
+        imgsz=imgsz,
+        dynamic=True,  # Batch động cho _run_yolo_batch
+        verbose=False,
+        **export_kwargs,
+    ))
+    # Ultralytics export cạnh file .pt, chuyển vào cache dir với tên có hash
+    tmp_target = target.with_name(target.name + '.tmp')
+    if tmp_target.exists():
+        shutil.rmtree(tmp_target) if tmp_target.is_dir() else tmp_target.unlink()
+    shutil.move(str(exported), str(tmp_target))
+    os.replace(tmp_target, target)
+    metadata_path(target).write_text(json.dumps({
+        'backend': backend,
+        'imgsz': imgsz,
+        'weights': weight_path.name,
+        'weights_sha256': weights_hash(weight_path),
+        **{key: value for key, value in export_kwargs.items() if isinstance(value, (str, int, float, bool))},
+    }, indent=2), encoding='utf-8')
+    print(f"✅ Exported model cached at {target}")
+    return target
+
+
+def _resolve_int8_artifact(backend: str, weight_path: Path, verbose: bool = True):
+    """Model INT8 đã tạo sẵn (python -m ai_engine.quantization) và qua accuracy gate, hoặc None"""
+    from .quantization import gate_passed, int8_artifact_path
+
+    if backend == 'torch':
+        if verbose:
+            print(f"⚠️  INT8 is not available for the torch backend, using FP32")
+        return None
+    artifact = int8_artifact_path(backend, weight_path)
+    if not artifact.exists():
+        if verbose:
+            print(f"⚠️  INT8 model not found ({artifact.name}), using FP32. Run: python -m ai_engine.quantization")
+        return None
+    if not gate_passed(artifact):
+        if verbose:
+            print(f"⚠️  INT8 model has no passing accuracy report for these weights, using FP32")
+        return None
+    return artifact
+
+
+def _load_exported(artifact: Path):
+    from ultralytics import YOLO
+
+    model = YOLO(str(artifact), task='detect')
+    # Model export dynamic không tự lấy imgsz -> đặt lại để letterbox giống backend torch
+    imgsz = read_export_metadata(artifact).get('imgsz')
+    if imgsz:
+        model.overrides['imgsz'] = imgsz
+    return model
+
+
+def resolve_backend(backend: str = None, precision: str = None, weight_path: Path = None, export: bool = True):
+    """
+    Backend và precision thực sự dùng được sau fallback: (backend, precision, artifact)
+    artifact None = chạy file .pt bằng torch
+    Backend không khả dụng (thiếu package / export lỗi) sẽ fallback về torch,
+    INT8 chưa có hoặc không qua accuracy gate sẽ fallback về FP32
+    export=False: không export (không in cảnh báo), trả về None nếu artifact chưa có nên chưa biết kết quả
+    """
+    backend = (backend or INFERENCE_BACKEND).lower()
+    precision = (precision or INFERENCE_PRECISION).lower()
+    if backend not in SUPPORTED_BACKENDS:
+        raise ValueError(f"Unknown inference backend '{backend}'. Options: {', '.join(SUPPORTED_BACKENDS)}")
+
+    weight_path = Path(weight_path) if weight_path else resolve_weight_path()
+    if precision == 'int8' and backend_available(backend):
+        artifact = _resolve_int8_artifact(backend, weight_path, verbose=export)
+        if artifact is not None:
+            return backend, 'int8', artifact
+
+    if backend == 'torch':
+        return 'torch', 'fp32', None
+
+    if not backend_available(backend):
+        if export:
+            print(f"⚠️  Backend '{backend}' requires '{_BACKEND_REQUIREMENTS[backend]}', falling back to torch")
+        return 'torch', 'fp32', None
+
+    if not export:
+        artifact = exported_artifact_path(weight_path, backend)
+        if artifact.exists() and metadata_path(artifact).exists():
+            return backend, 'fp32', artifact
+        return None
+
+    try:
+        artifact = export_model(weight_path, backend)
+    except Exception as e:
+        print(f"⚠️  Export to {backend} failed, falling back to torch: {e}")
+        return 'torch', 'fp32', None
+    return backend, 'fp32', artifact
+
+
+def load_model(backend: str = None, precision: str = None, weight_path: Path = None):
+    """
+    Load YOLO model theo backend và precision ('fp32' | 'int8') đã cấu hình (fallback như resolve_backend)
+    weight_path: file weights cần load (mặc định resolve_weight_path(), model registry truyền version cụ thể)
+    Returns: (model, backend, precision) với backend / precision đã thực sự load
+    """
+    from ultralytics import YOLO
+
+    weight_path = Path(weight_path) if weight_path else resolve_weight_path()
+    backend, precision, artifact = resolve_backend(backend, precision, weight_path)
+    if artifact is None:
+        return YOLO(str(weight_path)), backend, precision
+    if precision == 'int8':
+        print(f"⚡ Using INT8 model {artifact.name}")
+    return _load_exported(artifact), backend, precision
@@ -0,0 +1,80 @@
+"""
+Dynamic micro-batching cho các request inference đồng thời
+
+Các thread gọi submit() cùng lúc được gom lại: batcher chờ tối đa max_wait_ms kể từ request đầu tiên
+(hoặc tới khi đủ max_batch_size), chạy một lần forward cho cả batch rồi trả kết quả về từng caller.
+"""
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable
+
+
+class MicroBatcher:
+    """
+    batch_fn(items: list) -> list kết quả cùng thứ tự
+    submit(item) trả về Future; nếu batch_fn lỗi, mọi Future trong batch nhận exception đó
+    """
+
+    def __init__(self, batch_fn: Callable, max_batch_size: int = 8, max_wait_ms: float = 5.0, name: str = "micro-batcher"):
+        self.batch_fn = batch_fn
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self._queue = queue.Queue()
+        self._stop = threading.Event()
+        self.batches = 0
+        self.items = 0
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def submit(self, item) -> Future:
+        future = Future()
+        self._queue.put((item, future))
+        return future
+
+    def __call__(self, item):
+        return self.submit(item).result()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join(timeout=1)
+
+    @property
+    def average_batch_size(self) -> float:
+        return self.items / self.batches if self.batches else 0.0
+
+    def _collect(self) -> list:
+        try:
+            first = self._queue.get(timeout=0.1)
+        except queue.Empty:
+            return []
+        batch = [first]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while not self._stop.is_set():
+            batch = self._collect()
+            if not batch:
+                continue
+            items = [item for item, _ in batch]
+            futures = [future for _, future in batch]
+            self.batches += 1
+            self.items += len(batch)
+            try:
+                results = self.batch_fn(items)
+            except BaseException as e:
+                for future in futures:
+                    future.set_exception(e)
+                continue
+            for future, result in zip(futures, results):
+                future.set_result(result)
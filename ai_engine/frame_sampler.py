@@ -0,0 +1,125 @@
+"""
+Chọn frame nào của video cần chạy YOLO
+
+- FixedStrideSampler: cách cũ, detect mỗi `frame_stride` frame
+- AdaptiveFrameSampler: so sánh frame hiện tại (thu nhỏ, grayscale) với frame detect gần nhất.
+  Cảnh đứng yên (dừng đèn đỏ) -> bỏ qua inference, chỉ detect với VIDEO_MIN_DETECTION_FPS;
+  cảnh thay đổi nhanh -> detect dày hơn, tối đa VIDEO_MAX_DETECTION_FPS.
+
+Cả hai có cùng interface: should_sample(frame_idx, frame) -> bool và report() -> dict.
+"""
+import math
+
+import cv2
+import numpy as np
+
+
+class FixedStrideSampler:
+    def __init__(self, frame_stride: int):
+        self.frame_stride = max(1, frame_stride)
+        self.frames = 0
+        self.sampled = 0
+
+    def should_sample(self, frame_idx: int, frame) -> bool:
+        self.frames += 1
+        sampled = frame_idx % self.frame_stride == 0
+        self.sampled += sampled
+        return sampled
+
+    def report(self) -> dict:
+        return {
+            "mode": "fixed",
+            "frame_stride": self.frame_stride,
+            "frames": self.frames,
+            "sampled": self.sampled,
+            "skipped": self.frames - self.sampled,
+        }
+
+
+class AdaptiveFrameSampler:
+    """
+    Score = trung bình |diff| (0..1) giữa thumbnail grayscale của frame hiện tại và của frame detect gần nhất
+
+    - Luôn detect frame đầu tiên
+    - Không detect khi chưa cách frame detect trước đủ min_gap = fps / max_fps frames
+    - Bắt buộc detect khi đã cách max_gap = fps / min_fps frames (dù cảnh không đổi)
+    - Ở giữa: detect khi score >= diff_threshold
+    """
+
+    def __init__(self, fps: float, min_fps: float, max_fps: float, diff_threshold: float,
+                 thumb_size: tuple = (64, 36), base_fps: float = None):
+        fps = fps if fps and fps > 0 else 24.0
+        max_fps = min(max_fps, fps)
+        min_fps = min(min_fps, max_fps)
+        self.min_gap = max(1, int(math.floor(fps / max_fps)))
+        self.max_gap = max(self.min_gap, int(math.floor(fps / min_fps)))
+        self.diff_threshold = diff_threshold
+        self.thumb_size = thumb_size
+        # Stride cố định tương đương để báo cáo số frame tiết kiệm được so với cách cũ
+        self.base_stride = max(1, int(fps / base_fps)) if base_fps else None
+        self._last_thumb = None
+        self._last_sampled_idx = None
+        self.frames = 0
+        self.sampled = 0
+        self.sampled_on_change = 0
+        self.sampled_on_timeout = 0
+
+    def _thumbnail(self, frame) -> np.ndarray:
+        small = cv2.resize(frame, self.thumb_size, interpolation=cv2.INTER_AREA)
+        if small.ndim == 3:
+            small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        return small
+
+    def score(self, thumb: np.ndarray) -> float:
+        if self._last_thumb is None:
+            return 1.0
+        return float(cv2.absdiff(thumb, self._last_thumb).mean()) / 255.0
+
+    def should_sample(self, frame_idx: int, frame) -> bool:
+        self.frames += 1
+        if self._last_sampled_idx is None:
+            return self._mark(frame_idx, self._thumbnail(frame))
+
+        gap = frame_idx - self._last_sampled_idx
+        if gap < self.min_gap:
+            return False
+        thumb = self._thumbnail(frame)
+        if gap >= self.max_gap:
+            self.sampled_on_timeout += 1
+            return self._mark(frame_idx, thumb)
+        if self.score(thumb) >= self.diff_threshold:
+            self.sampled_on_change += 1
+            return self._mark(frame_idx, thumb)
+        return False
+
+    def _mark(self, frame_idx: int, thumb: np.ndarray) -> bool:
+        self._last_sampled_idx = frame_idx
+        self._last_thumb = thumb
+        self.sampled += 1
+        return True
+
+    def report(self) -> dict:
+        report = {
+            "mode": "adaptive",
+            "min_gap": self.min_gap,
+            "max_gap": self.max_gap,
+            "frames": self.frames,
+            "sampled": self.sampled,
+            "skipped": self.frames - self.sampled,
+            "sampled_on_change": self.sampled_on_change,
+            "sampled_on_timeout": self.sampled_on_timeout,
+        }
+        if self.base_stride:
+            # Số frame mà stride cố định sẽ detect nhưng sampler đã bỏ qua (âm nếu detect dày hơn)
+            report["saved_vs_fixed_stride"] = math.ceil(self.frames / self.base_stride) - self.sampled
+        return report
+
+
+def format_sampling_report(report: dict) -> str:
+    line = (
+        f"🎯 Sampling ({report['mode']}): detected {report['sampled']}/{report['frames']} frames, "
+        f"skipped {report['skipped']}"
+    )
+    if "saved_vs_fixed_stride" in report:
+        line += f" ({report['saved_vs_fixed_stride']:+d} inferences saved vs fixed stride)"
+    return line
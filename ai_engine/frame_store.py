@@ -0,0 +1,215 @@
+"""
+Lưu detections gốc của từng frame detect thành file .npz dạng cột (không nén), đọc bằng memory map
+
+Các mảng trong file (mỗi mảng là một file .npy trong zip, np.load đọc được bình thường):
+- frame_index (F,) int32: các frame được detect, tăng dần
+- row_offsets (F + 1,) int64: detections của frame thứ i là các dòng [row_offsets[i], row_offsets[i + 1])
+- class_id (N,) int16, confidence (N,) float32, bbox (N, 4) float32, track_id (N,) int32
+  (class_id / track_id là -1 nếu detection không có)
+- class_names (C,) str: class_names[class_id]
+- meta () str: JSON (fps, total_frames, ...)
+
+FrameDetectionWriter ghi dần từng chunk ra file tạm nên bộ nhớ không tăng theo độ dài video.
+FrameDetectionFile memory-map từng cột: đọc một khoảng frame chỉ chạm tới phần file của khoảng đó.
+"""
+import json
+import shutil
+import struct
+import tempfile
+import zipfile
+from pathlib import Path
+
+import numpy as np
+from numpy.lib import format as npy_format
+
+FORMAT_VERSION = 1
+
+FRAME_COLUMNS = {
+    "frame_index": np.dtype('<i4'),
+}
+ROW_COLUMNS = {
+    "class_id": (np.dtype('<i2'), ()),
+    "confidence": (np.dtype('<f4'), ()),
+    "bbox": (np.dtype('<f4'), (4,)),
+    "track_id": (np.dtype('<i4'), ()),
+}
+ROW_OFFSETS_DTYPE = np.dtype('<i8')
+
+_ZIP_LOCAL_HEADER = struct.Struct('<4sHHHHHIIIHH')
+
+
+class FrameDetectionWriter:
+    """
+    writer.add(frame_index, detections) cho từng frame detect theo thứ tự -> writer.save(path, meta)
+    Detection không có bbox 4 số bị bỏ qua
+    """
+
+    CHUNK_ROWS = 4096
+
+    def __init__(self):
+        self.frames = 0
+        self.rows = 0
+        self.class_names = {}
+        self._last_frame = None
+        self._spools = {name: tempfile.TemporaryFile() for name in (*FRAME_COLUMNS, "row_ends", *ROW_COLUMNS)}
+        self._buffers = {name: [] for name in self._spools}
+
+    def add(self, frame_index: int, detections: list):
+        if self._last_frame is not None and frame_index <= self._last_frame:
+            raise ValueError(f"Frames must be added in increasing order: {frame_index} after {self._last_frame}")
+        self._last_frame = frame_index
+        buffers = self._buffers
+        for det in detections:
+            bbox = det.get("bbox")
+            if not bbox or len(bbox) != 4:
+                continue
+            class_id = det.get("class_id")
+            class_id = -1 if class_id is None else int(class_id)
+            if class_id not in self.class_names:
+                self.class_names[class_id] = det.get("class_name", "")
+            buffers["class_id"].append(class_id)
+            buffers["confidence"].append(det.get("confidence", 0))
+            buffers["bbox"].append(bbox)
+            track_id = det.get("track_id")
+            buffers["track_id"].append(-1 if track_id is None else track_id)
+            self.rows += 1
+        buffers["frame_index"].append(frame_index)
+        buffers["row_ends"].append(self.rows)
+        self.frames += 1
+        if len(buffers["class_id"]) >= self.CHUNK_ROWS or len(buffers["frame_index"]) >= self.CHUNK_ROWS:
+            self._spill()
+
+    def save(self, path: Path, meta: dict = None) -> Path:
+        """Ghi file .npz (ZIP_STORED để memory-map được) rồi xóa file tạm"""
+        self._spill()
+        path = Path(path)
+        try:
+            with zipfile.ZipFile(path, 'w', zipfile.ZIP_STORED, allowZip64=True) as zf:
+                self._write_member(zf, "frame_index", FRAME_COLUMNS["frame_index"], (self.frames,),
+                                   self._spools["frame_index"])
+                self._write_member(zf, "row_offsets", ROW_OFFSETS_DTYPE, (self.frames + 1,),
+                                   self._spools["row_ends"], prefix=np.zeros(1, ROW_OFFSETS_DTYPE).tobytes())
+                for name, (dtype, shape) in ROW_COLUMNS.items():
+                    self._write_member(zf, name, dtype, (self.rows, *shape), self._spools[name])
+                size = max(self.class_names, default=-1) + 1
+                class_names = [self.class_names.get(i, "") for i in range(size)]
+                _write_array(zf, "class_names", np.array(class_names, dtype=str) if class_names else np.array([], '<U1'))
+                _write_array(zf, "meta", np.array(json.dumps({"format": FORMAT_VERSION, **(meta or {})})))
+        finally:
+            self.close()
+        return path
+
+    def close(self):
+        for spool in self._spools.values():
+            spool.close()
+
+    def _spill(self):
+        for name, values in self._buffers.items():
+            if not values:
+                continue
+            if name == "row_ends":
+                dtype = ROW_OFFSETS_DTYPE
+            elif name in FRAME_COLUMNS:
+                dtype = FRAME_COLUMNS[name]
+            else:
+                dtype = ROW_COLUMNS[name][0]
+            np.asarray(values, dtype=dtype).tofile(self._spools[name])
+            values.clear()
+
+    @staticmethod
+    def _write_member(zf, name: str, dtype: np.dtype, shape: tuple, spool, prefix: bytes = b""):
+        spool.seek(0)
+        with zf.open(f"{name}.npy", 'w', force_zip64=True) as f:
+            npy_format.write_array_header_1_0(
+                f, {"descr": npy_format.dtype_to_descr(dtype), "fortran_order": False, "shape": shape}
+            )
+            f.write(prefix)
+            shutil.copyfileobj(spool, f)
+
+
+def _write_array(zf, name: str, array: np.ndarray):
+    with zf.open(f"{name}.npy", 'w', force_zip64=True) as f:
+        npy_format.write_array(f, array, allow_pickle=False)
+
+
+class FrameDetectionFile:
+    """Đọc file của FrameDetectionWriter, các cột là np.memmap (chỉ đọc)"""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._arrays = {}
+        with zipfile.ZipFile(self.path) as zf, open(self.path, 'rb') as fh:
+            for info in zf.infolist():
+                if info.compress_type != zipfile.ZIP_STORED:
+                    raise ValueError(f"{info.filename} is compressed, cannot memory-map")
+                self._arrays[info.filename[:-len(".npy")]] = self._map_member(fh, info)
+        self.meta = json.loads(str(self._arrays.pop("meta")[()]))
+        self.class_names = [str(name) for name in self._arrays.pop("class_names")]
+
+    def _map_member(self, fh, info: zipfile.ZipInfo) -> np.ndarray:
+        fh.seek(info.header_offset)
+        fields = _ZIP_LOCAL_HEADER.unpack(fh.read(_ZIP_LOCAL_HEADER.size))
+        name_length, extra_length = fields[-2], fields[-1]
+        fh.seek(info.header_offset + _ZIP_LOCAL_HEADER.size + name_length + extra_length)
+        version = npy_format.read_magic(fh)
+        if version == (1, 0):
+            shape, fortran_order, dtype = npy_format.read_array_header_1_0(fh)
+        else:
+            shape, fortran_order, dtype = npy_format.read_array_header_2_0(fh)
+        if dtype.hasobject or fortran_order:
+            raise ValueError(f"Unsupported array {info.filename}")
+        offset = fh.tell()
+        count = int(np.prod(shape))
+        if count == 0 or shape == ():
+            return np.frombuffer(fh.read(dtype.itemsize * count), dtype=dtype).reshape(shape)
+        return np.memmap(self.path, dtype=dtype, mode='r', offset=offset, shape=shape)
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        return self._arrays[name]
+
+    @property
+    def frame_count(self) -> int:
+        return len(self._arrays["frame_index"])
+
+    def frame_range(self, start: int = None, end: int = None) -> tuple:
+        """Vị trí [lo, hi) trong frame_index của các frame detect có start <= frame_index < end"""
+        frames = self._arrays["frame_index"]
+        lo = int(np.searchsorted(frames, start, 'left')) if start is not None else 0
+        hi = int(np.searchsorted(frames, end, 'left')) if end is not None else len(frames)
+        return lo, max(lo, hi)
+
+    def slice(self, lo: int, hi: int) -> dict:
+        """Các cột của frame detect thứ lo..hi-1 (chỉ đọc phần file tương ứng), row_offsets tính lại từ 0"""
+        offsets = np.asarray(self._arrays["row_offsets"][lo:hi + 1])
+        first, last = (int(offsets[0]), int(offsets[-1])) if len(offsets) else (0, 0)
+        columns = {name: np.asarray(self._arrays[name][first:last]) for name in ROW_COLUMNS}
+        columns["frame_index"] = np.asarray(self._arrays["frame_index"][lo:hi])
+        columns["row_offsets"] = offsets - first
+        return columns
+
+    def iter_frames(self, lo: int = 0, hi: int = None, chunk_frames: int = 4096):
+        """Yield {"frame_index", "detections"} giống output của predict_video_with_save, đọc từng chunk"""
+        hi = self.frame_count if hi is None else hi
+        for chunk_lo in range(lo, hi, chunk_frames):
+            columns = self.slice(chunk_lo, min(hi, chunk_lo + chunk_frames))
+            offsets = columns["row_offsets"]
+            class_ids = columns["class_id"].tolist()
+            confidences = columns["confidence"].tolist()
+            bboxes = columns["bbox"].tolist()
+            track_ids = columns["track_id"].tolist()
+            for i, frame_index in enumerate(columns["frame_index"].tolist()):
+                detections = []
+                for row in range(offsets[i], offsets[i + 1]):
+                    det = {
+                        "class_id": class_ids[row],
+                        "class_name": self._class_name(class_ids[row]),
+                        "confidence": confidences[row],
+                        "bbox": bboxes[row],
+                    }
+                    if track_ids[row] >= 0:
+                        det["track_id"] = track_ids[row]
+                    detections.append(det)
+                yield {"frame_index": frame_index, "detections": detections}
+
+    def _class_name(self, class_id: int) -> str:
+        return self.class_names[class_id] if 0 <= class_id < len(self.class_names) else ""
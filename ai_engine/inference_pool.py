@@ -0,0 +1,124 @@
+"""
+Pool nhiều process inference, mỗi process giữ một model riêng
+
+Trong một process, các request đồng thời dùng chung 1 model PyTorch và tranh nhau intra-op threads.
+Pool chia CPU thành INFERENCE_POOL_WORKERS nhóm core: mỗi worker process load model riêng,
+pin số thread (và CPU affinity trên Linux), nên throughput tăng theo số core.
+
+Bật bằng INFERENCE_POOL_WORKERS > 0. Khi tắt (mặc định), inference chạy ngay trong process hiện tại.
+Mỗi version model có pool riêng (tạo bởi model registry trong yolo_infer.py): hot reload tạo pool mới
+với weights mới, pool cũ dừng sau khi các job đã gửi chạy xong.
+"""
+import multiprocessing
+import os
+from concurrent.futures import Future, ProcessPoolExecutor
+
+from .performance_config import INFERENCE_POOL_THREADS, INFERENCE_POOL_PIN_CPUS
+
+
+_IN_WORKER = False  # True trong worker process -> không dispatch lồng nhau
+_WORKER_BACKEND = None  # (backend, precision) process cha đã chọn cho pool
+
+
+def in_pool_worker() -> bool:
+    return _IN_WORKER
+
+
+def pool_worker_backend():
+    """(backend, precision) worker phải load (đúng version của pool), None nếu không phải worker"""
+    return _WORKER_BACKEND
+
+
+def _threads_per_worker(workers: int) -> int:
+    if INFERENCE_POOL_THREADS > 0:
+        return INFERENCE_POOL_THREADS
+    return max(1, (os.cpu_count() or 1) // workers)
+
+
+def _init_worker(threads: int, counter, pin_cpus: bool, weight_path: str, backend: str, precision: str):
+    """Chạy một lần khi worker process khởi động: pin threads/CPU, load + warm-up model của version weight_path"""
+    global _IN_WORKER, _WORKER_BACKEND
+    _IN_WORKER = True
+    _WORKER_BACKEND = (backend, precision)
+
+    # Phải đặt trước khi torch khởi tạo thread pool
+    os.environ['OMP_NUM_THREADS'] = str(threads)
+    os.environ['MKL_NUM_THREADS'] = str(threads)
+    # Worker chỉ chạy đúng version của pool, reload do process cha tạo pool mới
+    os.environ['YOLO_WEIGHTS'] = weight_path
+
+    with counter.get_lock():
+        index = counter.value
+        counter.value += 1
+
+    if pin_cpus and hasattr(os, 'sched_setaffinity'):
+        cpus = sorted(os.sched_getaffinity(0))
+        group = cpus[index * threads:(index + 1) * threads]
+        if len(group) == threads:
+            os.sched_setaffinity(0, group)
+
+    import cv2
+    import torch
+
+    torch.set_num_threads(threads)
+    cv2.setNumThreads(1)
+
+    from .yolo_infer import _load_local_model, model_registry
+    model_registry.check_interval = 0
+    _load_local_model()
+    print(f"🧵 Inference worker {index} ready (pid={os.getpid()}, threads={threads})")
+
+
+def _worker_predict_images(images: list, conf: float) -> list:
+    from .yolo_infer import _predict_images_local
+    return _predict_images_local(images, conf)
+
+
+def _worker_run_batch(frames_batch: list, conf: float, original_size: tuple) -> list:
+    from .yolo_infer import _load_local_model, _run_yolo_batch
+    return _run_yolo_batch(_load_local_model(), frames_batch, conf, original_size)
+
+
+def _worker_process_segment(video_path: str, start_frame: int, end_frame, conf: float, fps: float, out_path: str,
+                            candidate_conf: float = None) -> dict:
+    from .segment_parallel import process_segment
+    return process_segment(video_path, start_frame, end_frame, conf, fps, out_path, candidate_conf)
+
+
+class InferencePool:
+    """
+    Bọc ProcessPoolExecutor, mỗi worker có model (weights weight_path) + nhóm core riêng
+    backend / precision: đã resolve (và export) ở process cha, worker load đúng như vậy
+    """
+
+    def __init__(self, workers: int, weight_path, backend: str = None, precision: str = None):
+        self.workers = workers
+        self.threads = _threads_per_worker(workers)
+        # spawn: không fork process đang có thread pool của torch (dễ deadlock)
+        context = multiprocessing.get_context('spawn')
+        counter = context.Value('i', 0)
+        self._executor = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=context,
+            initializer=_init_worker,
+            initargs=(self.threads, counter, INFERENCE_POOL_PIN_CPUS, os.path.realpath(weight_path), backend, precision),
+        )
+        print(f"🚀 Inference pool: {workers} workers x {self.threads} threads")
+
+    def submit_images(self, images: list, conf: float) -> Future:
+        """Ảnh đã resize về IMAGE_INPUT_SIZE -> Future[list detections theo từng ảnh]"""
+        return self._executor.submit(_worker_predict_images, images, conf)
+
+    def submit_batch(self, frames_batch: list, conf: float, original_size: tuple) -> Future:
+        return self._executor.submit(_worker_run_batch, frames_batch, conf, original_size)
+
+    def submit_segment(self, video_path: str, start_frame: int, end_frame, conf: float, fps: float,
+                       out_path: str, candidate_conf: float = None) -> Future:
+        """Detect + vẽ + encode frames [start_frame, end_frame) của video vào out_path (segment_parallel.py)"""
+        return self._executor.submit(
+            _worker_process_segment, video_path, start_frame, end_frame, conf, fps, out_path, candidate_conf
+        )
+
+    def shutdown(self, wait: bool = True, cancel_futures: bool = True):
+        self._executor.shutdown(wait=wait, cancel_futures=cancel_futures)
+
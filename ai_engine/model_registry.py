@@ -0,0 +1,261 @@
+"""
+Registry các version model: hot reload weights không cần restart process
+
+Version = hash weights + backend + precision thực sự load được (sau fallback, xem backends.resolve_backend).
+Nguồn weights là YOLO_WEIGHTS (file hoặc symlink). Deploy version mới bằng cách thay file một cách atomic
+(os.replace / ln -sfn ...): mỗi process kiểm tra mtime/size của weights tối đa mỗi check_interval giây,
+khi thấy thay đổi thì load + warm-up version mới trong thread nền rồi mới chuyển sang.
+
+- Request / job mới dùng version active tại thời điểm bắt đầu.
+- Job đang chạy giữ version cũ (pin()) tới khi xong, version cũ được giải phóng khi không còn job nào dùng.
+- Load lỗi (file hỏng...) thì version cũ vẫn active, không thử lại cho tới khi weights đổi tiếp.
+"""
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+
+from .backends import current_model_version, resolved_model_version, resolve_weight_path
+
+
+def weights_signature(weight_path: Path) -> tuple:
+    """(đường dẫn thật sau symlink, size, mtime): đổi khi file weights bị thay hoặc symlink trỏ sang file khác"""
+    real_path = os.path.realpath(weight_path)
+    stat = os.stat(real_path)
+    return real_path, stat.st_size, stat.st_mtime_ns
+
+
+class ModelHandle:
+    """
+    Một version model đã load: model trong process hoặc inference pool đã load weights đó
+    backend / precision: loader gán theo cái đã thực sự load, version tính từ đó sau khi load xong
+    """
+
+    def __init__(self, weight_path: Path, signature: tuple):
+        self.version = None
+        self.weight_path = weight_path
+        self.signature = signature
+        self.backend = None
+        self.precision = None
+        self.model = None
+        self.pool = None
+        self.loaded_at = None
+        self.in_flight = 0
+        self.retired = False
+
+    def describe(self, in_flight: bool = True) -> dict:
+        info = {
+            "version": self.version,
+            "backend": self.backend,
+            "precision": self.precision,
+            "weights": os.path.basename(self.signature[0]),
+            "loaded_at": self.loaded_at.isoformat(timespec="seconds") if self.loaded_at else None,
+        }
+        if in_flight:
+            info["in_flight"] = self.in_flight
+        return info
+
+
+class ModelRegistry:
+    """
+    loader(handle): load + warm-up model cho handle (gán handle.model hoặc handle.pool,
+                    và handle.backend / handle.precision đã thực sự load; None = theo cấu hình)
+    closer(handle): giải phóng version đã bị thay và không còn job nào dùng
+    check_interval: số giây giữa 2 lần kiểm tra weights có đổi không (0 = chỉ reload khi gọi reload())
+    """
+
+    HISTORY_SIZE = 10
+
+    def __init__(self, loader, closer=None, check_interval: float = 0.0):
+        self._loader = loader
+        self._closer = closer
+        self.check_interval = check_interval
+        self._init_state()
+
+    def _init_state(self):
+        self._active = None
+        self._retiring = []
+        self._history = deque(maxlen=self.HISTORY_SIZE)
+        self._reload = {"state": "idle"}
+        self._failed_signature = None
+        self._last_check = time.monotonic()
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self._local = threading.local()
+
+    @property
+    def loaded(self) -> bool:
+        return self._active is not None
+
+    def active(self) -> ModelHandle:
+        """Version active (load lần đầu nếu chưa có), đồng thời kiểm tra weights có version mới không"""
+        handle = self._active
+        if handle is None:
+            with self._load_lock:
+                if self._active is None:
+                    self._swap(self._load(resolve_weight_path()))
+            return self._active
+        self._maybe_check(handle)
+        return handle
+
+    def current(self) -> ModelHandle:
+        """Version job trong thread này đang pin, nếu không có thì version active"""
+        return getattr(self._local, 'handle', None) or self.active()
+
+    @contextmanager
+    def pin(self):
+        """
+        with registry.pin() as handle: ... -> mọi inference trong thread dùng handle (kể cả khi có reload giữa chừng)
+        Version cũ chỉ được giải phóng sau khi job cuối cùng pin nó kết thúc
+        """
+        pinned = getattr(self._local, 'handle', None)
+        if pinned is not None:
+            yield pinned
+            return
+        self.active()  # Load lần đầu / kiểm tra weights mới (có thể chậm, không giữ lock)
+        with self._lock:
+            # Đọc version active và tăng in_flight trong cùng lock với _swap: version vừa bị thay
+            # hoặc còn job dùng (retiring), hoặc đã là version mới, không bao giờ bị đóng khi job đang chạy
+            handle = self._active
+            handle.in_flight += 1
+        self._local.handle = handle
+        try:
+            yield handle
+        finally:
+            self._local.handle = None
+            self._release(handle)
+
+    def reload(self, force: bool = False, background: bool = False):
+        """
+        Load weights hiện tại của YOLO_WEIGHTS và chuyển sang nếu là version khác (force: load lại kể cả khi cùng version)
+        background=True: chạy trong thread nền, trả về ngay. Trả về handle active sau reload
+        """
+        if background:
+            threading.Thread(target=self._reload_safely, args=(force,), name="model-reload", daemon=True).start()
+            return None
+        with self._load_lock:
+            started = time.perf_counter()
+            self._reload = {"state": "loading", "started_at": _now()}
+            try:
+                weight_path = resolve_weight_path()
+                signature = weights_signature(weight_path)
+                active = self._active
+                if active is not None and not force and resolved_model_version(weight_path) == active.version:
+                    # Cùng nội dung (ví dụ chỉ đổi mtime): không cần load lại
+                    active.signature = signature
+                    self._reload = {"state": "idle"}
+                    return active
+                handle = self._load(weight_path)
+            except Exception as e:
+                self._failed_signature = _safe_signature()
+                self._reload = {"state": "failed", "error": str(e), "finished_at": _now()}
+                raise
+            self._swap(handle)
+            self._reload = {
+                "state": "idle",
+                "last_version": handle.version,
+                "seconds": round(time.perf_counter() - started, 3),
+                "finished_at": _now(),
+            }
+            return handle
+
+    def _reload_safely(self, force: bool):
+        try:
+            self.reload(force=force)
+        except Exception as e:
+            print(f"❌ Model reload failed, keeping current version: {e}")
+
+    def status(self) -> dict:
+        with self._lock:
+            active = self._active
+            return {
+                "active": active.describe() if active else None,
+                "retiring": [handle.describe() for handle in self._retiring],
+                "reload": dict(self._reload),
+                "history": list(self._history),
+            }
+
+    def after_fork(self):
+        """
+        Trong process con sau fork: model đã load dùng tiếp (copy-on-write), inference pool thuộc process cha
+        nên bỏ; lock, thread-local và thread reload của process cha không dùng được
+        """
+        active = self._active
+        self._init_state()
+        if active is not None and active.pool is None:
+            active.in_flight = 0
+            self._active = active
+            self._history.append(active.describe(in_flight=False))
+
+    def _load(self, weight_path: Path) -> ModelHandle:
+        signature = weights_signature(weight_path)
+        # Handle giữ file thật sau symlink: load lại sau này (model local, pool mới) vẫn đúng version này
+        # kể cả khi YOLO_WEIGHTS đã trỏ sang weights mới
+        weight_path = Path(signature[0])
+        handle = ModelHandle(weight_path, signature)
+        print(f"📥 Loading model {os.path.basename(signature[0])}...")
+        self._loader(handle)
+        # Version theo backend / precision loader đã load (onnx export lỗi -> torch, thiếu INT8 -> fp32)
+        handle.version = current_model_version(handle.backend, handle.precision, weight_path)
+        handle.loaded_at = datetime.now(timezone.utc)
+        return handle
+
+    def _swap(self, handle: ModelHandle):
+        with self._lock:
+            previous = self._active
+            self._active = handle
+            self._failed_signature = None
+            self._history.append(handle.describe(in_flight=False))
+            close_previous = previous is not None and previous.in_flight == 0
+            if previous is not None:
+                previous.retired = True
+                if not close_previous:
+                    self._retiring.append(previous)
+        if previous is not None:
+            print(f"🔁 Model switched {previous.version} -> {handle.version} "
+                  f"({previous.in_flight} job(s) still on the previous version)")
+        if close_previous:
+            self._close(previous)
+
+    def _release(self, handle: ModelHandle):
+        with self._lock:
+            handle.in_flight -= 1
+            close = handle.retired and handle.in_flight == 0 and handle in self._retiring
+            if close:
+                self._retiring.remove(handle)
+        if close:
+            self._close(handle)
+
+    def _close(self, handle: ModelHandle):
+        if self._closer is not None:
+            self._closer(handle)
+        handle.model = None
+        handle.pool = None
+
+    def _maybe_check(self, handle: ModelHandle):
+        if self.check_interval <= 0:
+            return
+        now = time.monotonic()
+        if now - self._last_check < self.check_interval:
+            return
+        self._last_check = now
+        signature = _safe_signature()
+        if signature is None or signature == handle.signature or signature == self._failed_signature:
+            return
+        if not self._load_lock.locked():
+            self.reload(background=True)
+
+
+def _safe_signature():
+    """Signature của weights đang cấu hình, None nếu file đang được thay / không tồn tại"""
+    try:
+        return weights_signature(resolve_weight_path())
+    except OSError:
+        return None
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat(timespec="seconds")
@@ -0,0 +1,153 @@
+"""
+Non-Maximum Suppression vectorized bằng NumPy
+
+Dùng cho các detection đã chuyển về dict {"class_id", "confidence", "bbox", ...}
+(gộp kết quả của nhiều tile, lọc box trùng sau khi chạy model).
+nms_detections_batch xử lý detections của tất cả frame của một video trong một lần gọi.
+"""
+import numpy as np
+
+
+def nms_indices(boxes: np.ndarray, scores: np.ndarray, iou_threshold: float, class_ids: np.ndarray = None) -> np.ndarray:
+    """
+    Index các box được giữ lại, theo confidence giảm dần
+    class_ids=None: agnostic (box khác class vẫn loại nhau); có class_ids: chỉ loại box cùng class
+    """
+    boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+    scores = np.asarray(scores, dtype=np.float64).reshape(-1)
+    if len(boxes) == 0:
+        return np.zeros(0, dtype=np.int64)
+
+    if class_ids is not None:
+        # Dịch box của mỗi class ra một vùng riêng -> box khác class không bao giờ giao nhau
+        offset = boxes.max() - boxes.min() + 1.0
+        boxes = boxes + (np.asarray(class_ids, dtype=np.float64).reshape(-1, 1) * offset)
+
+    x1, y1, x2, y2 = boxes.T
+    areas = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    order = np.argsort(-scores, kind='stable')
+
+    keep = []
+    while order.size:
+        i = order[0]
+        keep.append(i)
+        rest = order[1:]
+        inter_w = np.clip(np.minimum(x2[i], x2[rest]) - np.maximum(x1[i], x1[rest]), 0, None)
+        inter_h = np.clip(np.minimum(y2[i], y2[rest]) - np.maximum(y1[i], y1[rest]), 0, None)
+        inter = inter_w * inter_h
+        union = areas[i] + areas[rest] - inter
+        iou = np.where(union > 0, inter / np.maximum(union, 1e-9), 0.0)
+        order = rest[iou <= iou_threshold]
+    return np.asarray(keep, dtype=np.int64)
+
+
+def nms_detections(detections: list, iou_threshold: float = 0.5, class_aware: bool = True) -> list:
+    """NMS trên list detection dict, trả về các detection được giữ (confidence giảm dần)"""
+    valid = [det for det in detections if len(det.get("bbox", [])) == 4]
+    if not valid:
+        return valid
+    boxes = np.array([det["bbox"] for det in valid], dtype=np.float64)
+    scores = np.array([det.get("confidence", 0) for det in valid], dtype=np.float64)
+    class_ids = None
+    if class_aware:
+        class_ids = np.array([det.get("class_id") or 0 for det in valid], dtype=np.float64)
+    return [valid[i] for i in nms_indices(boxes, scores, iou_threshold, class_ids)]
+
+
+# Số phần tử tối đa của ma trận IoU (frames x boxes x boxes) tính cùng lúc trong nms_detections_batch
+BATCH_MAX_ELEMENTS = 4_000_000
+
+
+def _batched_keep_mask(boxes: np.ndarray, class_ids: np.ndarray, present: np.ndarray, has_box: np.ndarray,
+                       iou_threshold: float, class_aware: bool) -> np.ndarray:
+    """
+    Greedy NMS cho nhiều frame cùng lúc trên mảng đã pad: boxes (F, M, 4), các mảng còn lại (F, M)
+    Trả về mask (F, M) các box được giữ, theo thứ tự đã sort confidence giảm dần của từng frame
+    """
+    x1, y1, x2, y2 = (boxes[..., k] for k in range(4))
+    areas = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    inter_w = np.clip(np.minimum(x2[:, :, None], x2[:, None, :]) - np.maximum(x1[:, :, None], x1[:, None, :]), 0, None)
+    inter_h = np.clip(np.minimum(y2[:, :, None], y2[:, None, :]) - np.maximum(y1[:, :, None], y1[:, None, :]), 0, None)
+    inter = inter_w * inter_h
+    union = areas[:, :, None] + areas[:, None, :] - inter
+    suppress = (union > 0) & (inter > iou_threshold * union)
+
+    # Chỉ box đứng trước (confidence cao hơn) loại box đứng sau, cùng frame, cả 2 đều có bbox hợp lệ
+    suppress &= np.triu(np.ones(suppress.shape[1:], dtype=bool), k=1)
+    suppress &= has_box[:, :, None] & has_box[:, None, :]
+    if class_aware:
+        suppress &= class_ids[:, :, None] == class_ids[:, None, :]
+
+    alive = present.copy()
+    for i in range(alive.shape[1]):
+        # Box i còn sống sau khi xét mọi box đứng trước -> được giữ, loại các box sau nó
+        alive &= ~(suppress[:, i, :] & alive[:, i:i + 1])
+    return alive
+
+
+def _nms_chunk(frames: list, iou_threshold: float, class_aware: bool) -> list:
+    # Sort ổn định theo confidence giảm dần (giống sorted(..., reverse=True)), rồi pad về (F, M)
+    ordered_frames = [
+        sorted(detections, key=lambda det: det.get("confidence", 0), reverse=True) for detections in frames
+    ]
+    flat = [det for ordered in ordered_frames for det in ordered]
+    lengths = np.fromiter((len(ordered) for ordered in ordered_frames), dtype=np.int64, count=len(frames))
+    frame_index = np.repeat(np.arange(len(frames)), lengths)
+    position = np.arange(len(flat)) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+
+    bboxes = [det.get("bbox", ()) for det in flat]
+    valid = np.fromiter((len(bbox) == 4 for bbox in bboxes), dtype=bool, count=len(flat))
+    shape = (len(frames), int(lengths.max()))
+    boxes = np.zeros(shape + (4,), dtype=np.float64)
+    if valid.all():
+        boxes[frame_index, position] = bboxes
+    else:
+        boxes[frame_index[valid], position[valid]] = [bbox for bbox, ok in zip(bboxes, valid) if ok]
+    present = np.zeros(shape, dtype=bool)
+    present[frame_index, position] = True
+    has_box = np.zeros(shape, dtype=bool)
+    has_box[frame_index, position] = valid
+    class_ids = None
+    if class_aware:
+        class_ids = np.full(shape, -1, dtype=np.int64)
+        class_ids[frame_index, position] = [det.get("class_id") or 0 for det in flat]
+
+    keep = _batched_keep_mask(boxes, class_ids, present, has_box, iou_threshold, class_aware)
+    kept = keep[frame_index, position].tolist()
+    results, offset = [], 0
+    for ordered in ordered_frames:
+        results.append([det for det, ok in zip(ordered, kept[offset:offset + len(ordered)]) if ok])
+        offset += len(ordered)
+    return results
+
+
+def nms_detections_batch(frames: list, iou_threshold: float = 0.5, class_aware: bool = True) -> list:
+    """
+    NMS cho detections của nhiều frame trong một lần gọi: frames là [list detection dict của mỗi frame],
+    trả về list cùng độ dài, mỗi frame giữ các detection không bị loại (confidence giảm dần)
+
+    Các frame được pad về cùng số box và xử lý theo chunk: IoU của mọi cặp box trong frame tính bằng
+    một phép broadcast, vòng greedy chạy theo thứ hạng box (tối đa số box / frame) cho cả chunk,
+    thay vì vòng lặp Python qua từng cặp box của từng frame.
+    Detection không có bbox hợp lệ được giữ nguyên (không loại và không bị loại).
+    class_aware=False: box khác class vẫn loại nhau
+    """
+    results = [None] * len(frames)
+    pending = []
+    for f, detections in enumerate(frames):
+        if len(detections) < 2:
+            results[f] = list(detections)
+        else:
+            pending.append(f)
+
+    # Frame nhiều box trước để chunk gồm các frame có số box gần nhau (ít pad)
+    pending.sort(key=lambda f: len(frames[f]), reverse=True)
+    start = 0
+    while start < len(pending):
+        size = len(frames[pending[start]])
+        chunk_size = max(1, BATCH_MAX_ELEMENTS // (size * size))
+        chunk = pending[start:start + chunk_size]
+        for f, kept in zip(chunk, _nms_chunk([frames[f] for f in chunk], iou_threshold, class_aware)):
+            results[f] = kept
+        start += len(chunk)
+    return results
@@ -1,4 +1,41 @@
 # Performance configuration cho YOLO inference
+from decouple import config
+
+# ============================================
+# INFERENCE BACKEND
+# ============================================
+# 'torch': chạy best.pt bằng PyTorch
+# 'onnx': export sang ONNX (cần onnxruntime), nhanh hơn 2-3 lần trên CPU
+# 'openvino': export sang OpenVINO IR (cần openvino), tối ưu cho CPU Intel
+# Chọn qua biến môi trường / .env: YOLO_BACKEND=onnx
+INFERENCE_BACKEND = config('YOLO_BACKEND', default='torch')
+
+# 'fp32' hoặc 'int8' (chỉ cho backend onnx/openvino), chọn qua YOLO_PRECISION
+# Model INT8 phải được tạo trước: python -m ai_engine.quantization --dataset-root <dataset>
+# và chỉ được dùng khi report so sánh qua accuracy gate, nếu không sẽ fallback FP32
+INFERENCE_PRECISION = config('YOLO_PRECISION', default='fp32')
+
+# Accuracy gate: mAP50 của INT8 được phép giảm tối đa bao nhiêu (tuyệt đối) so với FP32
+INT8_MAX_MAP_DROP = config('INT8_MAX_MAP_DROP', default=0.01, cast=float)
+
+# Số ảnh (lấy đều từ tập train) dùng để calibrate INT8
+INT8_CALIBRATION_IMAGES = 300
+
+# Hot reload: mỗi process kiểm tra file YOLO_WEIGHTS mỗi N giây, đổi nội dung thì load version mới ở nền
+# rồi chuyển request mới sang (job đang chạy xong trên version cũ). 0 = tắt (xem ai_engine/model_registry.py)
+MODEL_RELOAD_CHECK_INTERVAL = config('MODEL_RELOAD_CHECK_INTERVAL', default=5.0, cast=float)
+
+# ============================================
+# INFERENCE POOL (nhiều process, mỗi process 1 model)
+# ============================================
+# Số worker process inference, 0 = tắt (inference chạy trong process hiện tại)
+INFERENCE_POOL_WORKERS = config('INFERENCE_POOL_WORKERS', default=0, cast=int)
+
+# Số intra-op thread của mỗi worker, 0 = tự chia đều số core cho các worker
+INFERENCE_POOL_THREADS = config('INFERENCE_POOL_THREADS', default=0, cast=int)
+
+# Gán mỗi worker vào một nhóm core riêng (Linux), tránh các worker tranh core
+INFERENCE_POOL_PIN_CPUS = True
 
 # ============================================
 # IMAGE PROCESSING (Độ chính xác tối đa)
@@ -6,6 +43,22 @@
 IMAGE_INPUT_SIZE = 320  # Giữ nguyên kích thước cao nhất cho độ chính xác
 IMAGE_CONF_THRESHOLD = 0.5  # Confidence thấp hơn để detect nhiều hơn
 
+# Micro-batching: gom các request ảnh đồng thời thành 1 lần forward
+# Request đầu tiên chờ tối đa IMAGE_MICRO_BATCH_MAX_WAIT_MS để gom thêm, hoặc tới khi đủ MAX_SIZE ảnh
+IMAGE_MICRO_BATCH_ENABLED = True
+IMAGE_MICRO_BATCH_MAX_SIZE = 8
+IMAGE_MICRO_BATCH_MAX_WAIT_MS = 5.0
+
+# Tiled inference cho ảnh độ phân giải cao (ảnh điện thoại 12MP): tile chồng lấn ở độ phân giải gốc
+# IMAGE_TILE_SIZE nên bằng imgsz lúc train model
+IMAGE_TILING_ENABLED = config('IMAGE_TILING', default=False, cast=bool)
+IMAGE_TILING_MIN_SIDE = 1280  # Chỉ tile ảnh có cạnh dài >= giá trị này
+IMAGE_TILE_SIZE = 640
+IMAGE_TILE_OVERLAP = 0.2  # Tỉ lệ chồng lấn giữa 2 tile kề nhau
+IMAGE_TILE_SALIENCY_THRESHOLD = 0.002  # Bỏ tile có tỉ lệ pixel salient thấp hơn
+IMAGE_TILE_MAX_TILES = 16  # Giới hạn số tile mỗi ảnh (giữ các tile salient nhất)
+IMAGE_TILE_NMS_IOU = 0.5  # NMS gộp detection trùng giữa các tile
+
 # ============================================
 # VIDEO PROCESSING (Cân bằng tốc độ & độ chính xác)
 # ============================================
@@ -22,9 +75,54 @@ VIDEO_CONF_THRESHOLD = 0.5
 # Target FPS cho detection (giảm để xử lý nhanh hơn)
 VIDEO_TARGET_DETECTION_FPS = 7.0
 
+# Adaptive sampling: bỏ qua inference khi cảnh không đổi, detect dày hơn khi cảnh đổi nhanh
+# False = detect cố định theo VIDEO_TARGET_DETECTION_FPS
+VIDEO_ADAPTIVE_SAMPLING = True
+VIDEO_MIN_DETECTION_FPS = 2.0  # Cảnh đứng yên vẫn detect ít nhất 2 lần/giây (gap <= 0.5s, khớp GAP_TOLERANCE khi gộp timeline)
+VIDEO_MAX_DETECTION_FPS = 15.0  # Cảnh đổi nhanh detect tối đa 15 lần/giây
+VIDEO_SCENE_DIFF_THRESHOLD = 0.03  # Độ khác biệt trung bình (0..1) so với frame detect gần nhất để detect lại
+VIDEO_SCENE_THUMB_SIZE = (64, 36)  # Kích thước thumbnail grayscale dùng để so sánh frame
+
+# Tracker (ai_engine/tracker.py): gán track_id, nội suy box giữa các frame detect
+# Mỗi track thành 1 DetectedSign. False = giữ box của frame detect gần nhất như cũ
+VIDEO_TRACKING_ENABLED = True
+# Khi bật tracker, YOLO chạy với confidence thấp hơn (như ByteTrack): detection >= conf yêu cầu tạo track mới,
+# detection trong khoảng [TRACKER_LOW_CONF_THRESHOLD, conf) chỉ được dùng để nối tiếp track đã có
+TRACKER_LOW_CONF_THRESHOLD = 0.1
+TRACKER_MATCH_IOU = 0.3  # IoU tối thiểu giữa box dự đoán của track và detection
+TRACKER_MAX_AGE_SECONDS = 1.0  # Track không khớp detection quá lâu sẽ bị xóa
+
+# Decode video 1 lần duy nhất (detect + ghi cùng lúc với look-behind buffer)
+# False = chế độ cũ 2 pass (decode lại toàn bộ video để ghi)
+VIDEO_SINGLE_PASS = True
+
+# Chạy decode / infer / draw / encode trên các thread riêng (chỉ áp dụng cho single pass)
+VIDEO_PIPELINE_THREADED = True
+
+# Số phần tử tối đa trong queue giữa 2 stage (backpressure, giới hạn RAM)
+VIDEO_PIPELINE_QUEUE_SIZE = 8
+
+# RAM tối đa (MB) cho các frame gốc giữ trong look-behind buffer của stage infer (chờ kết quả detect).
+# Buffer đầy thì batch đang gom được gửi ngay và decode dừng lại tới khi frame đầu buffer có kết quả
+# (1080p BGR ~6MB / frame: 256MB ~ 40 frames)
+VIDEO_PIPELINE_BUFFER_MB = 256
+
+# Segment-parallel (ai_engine/segment_parallel.py): chia video dài thành các segment bắt đầu tại keyframe,
+# mỗi segment được detect + vẽ + encode trong một worker của inference pool, sau đó ghép H.264 bằng ffmpeg
+# (không encode lại). Cần INFERENCE_POOL_WORKERS >= 2 và ffmpeg, nếu không video vẫn xử lý tuần tự
+VIDEO_SEGMENT_PARALLEL = config('VIDEO_SEGMENT_PARALLEL', default=False, cast=bool)
+VIDEO_SEGMENT_MIN_SECONDS = 10.0  # Segment ngắn nhất, video ngắn hơn 2 segment vẫn xử lý tuần tự
+VIDEO_SEGMENTS_PER_WORKER = 2  # Nhiều segment hơn số worker để cân tải khi các segment dài ngắn khác nhau
+
 # ============================================
 # VIDEO ENCODING
 # ============================================
+# Backend encode video output
+# 'ffmpeg_pipe': đẩy frame thẳng vào 1 process ffmpeg libx264 (không file tạm, không encode 2 lần)
+# 'opencv': ghi mp4v bằng cv2.VideoWriter rồi transcode sang H.264
+# ffmpeg_pipe tự fallback về opencv nếu không tìm thấy ffmpeg
+VIDEO_ENCODER = 'ffmpeg_pipe'
+
 # FFmpeg preset cho video encoding
 # Options: 'ultrafast', 'superfast', 'veryfast', 'faster', 'fast', 'medium'
 FFMPEG_PRESET = 'ultrafast'
@@ -32,3 +130,6 @@ FFMPEG_PRESET = 'ultrafast'
 # CRF (Constant Rate Factor) cho video quality
 # 18-28 recommended, cao hơn = file nhỏ hơn nhưng chất lượng thấp hơn
 FFMPEG_CRF = 28
+
+# Timeout (giây) cho bước transcode của backend 'opencv'
+FFMPEG_TRANSCODE_TIMEOUT = 300
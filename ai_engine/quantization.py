@@ -0,0 +1,276 @@
+"""
+INT8 post-training quantization cho YOLO model
+
+Tạo bản INT8 (calibrate trên ảnh của dataset trong ai_engine/dataset.yaml) và báo cáo so sánh
+với bản FP32: mAP50 / mAP50-95, recall từng class (52 class trong CLASS_ID_TO_SIGN_CODE) và latency.
+Báo cáo được lưu cạnh model INT8; backends.load_model chỉ dùng INT8 khi báo cáo qua accuracy gate.
+
+Chạy (cần dataset trên máy):
+    python -m ai_engine.quantization --dataset-root /data/dataset_yolov11 --backend onnx
+"""
+import argparse
+import json
+import tempfile
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+import yaml
+
+from .backends import (
+    BASE_DIR, backend_available, export_model, exported_artifact_path,
+    metadata_path, read_export_metadata, resolve_weight_path, weights_hash,
+)
+from .performance_config import INT8_CALIBRATION_IMAGES, INT8_MAX_MAP_DROP
+from .sign_code_mapping import CLASS_ID_TO_SIGN_CODE
+
+
+DATASET_YAML = BASE_DIR / "ai_engine" / "dataset.yaml"
+INT8_TAG = '-int8'
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp')
+
+
+def int8_artifact_path(backend: str, weight_path: Path = None) -> Path:
+    weight_path = weight_path or resolve_weight_path()
+    return exported_artifact_path(weight_path, backend, INT8_TAG)
+
+
+def report_path(artifact: Path) -> Path:
+    return artifact.with_name(artifact.name + '.report.json')
+
+
+def load_report(artifact: Path) -> dict:
+    try:
+        return json.loads(report_path(artifact).read_text(encoding='utf-8'))
+    except (OSError, ValueError):
+        return {}
+
+
+def dataset_config(dataset_root: str = None) -> Path:
+    """
+    dataset.yaml trỏ tới đường dẫn lúc train (Kaggle)
+    Nếu truyền dataset_root thì ghi một bản yaml tạm với `path` đã đổi
+    """
+    if not dataset_root:
+        return DATASET_YAML
+    data = yaml.safe_load(DATASET_YAML.read_text(encoding='utf-8'))
+    data['path'] = str(dataset_root)
+    tmp = tempfile.NamedTemporaryFile('w', suffix='.yaml', delete=False, encoding='utf-8')
+    with tmp:
+        yaml.safe_dump(data, tmp, allow_unicode=True)
+    return Path(tmp.name)
+
+
+def _calibration_images(data_yaml: Path, limit: int) -> list:
+    data = yaml.safe_load(Path(data_yaml).read_text(encoding='utf-8'))
+    image_dir = Path(data.get('path', '')) / data['train']
+    images = sorted(p for p in image_dir.rglob('*') if p.suffix.lower() in IMAGE_EXTENSIONS)
+    if not images:
+        raise FileNotFoundError(f"No calibration images found in {image_dir}")
+    # Lấy mẫu đều trên toàn bộ tập train
+    step = max(1, len(images) // limit)
+    return images[::step][:limit]
+
+
+def _letterbox(img: np.ndarray, size: int) -> np.ndarray:
+    """Resize giữ tỉ lệ + pad 114 giống tiền xử lý của ultralytics, trả về tensor NCHW float32"""
+    h, w = img.shape[:2]
+    scale = min(size / h, size / w)
+    new_w, new_h = int(round(w * scale)), int(round(h * scale))
+    resized = cv2.resize(img, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
+    canvas = np.full((size, size, 3), 114, dtype=np.uint8)
+    top, left = (size - new_h) // 2, (size - new_w) // 2
+    canvas[top:top + new_h, left:left + new_w] = resized
+    tensor = canvas[:, :, ::-1].transpose(2, 0, 1)[None].astype(np.float32) / 255.0  # BGR -> RGB, HWC -> NCHW
+    return np.ascontiguousarray(tensor)
+
+
+def _quantize_onnx(weight_path: Path, data_yaml: Path, calibration_images: int) -> Path:
+    """Static quantization bằng ONNX Runtime (QDQ, weight int8 per-channel)"""
+    from onnxruntime import InferenceSession
+    from onnxruntime.quantization import (
+        CalibrationDataReader, CalibrationMethod, QuantFormat, QuantType, quantize_static,
+    )
+
+    fp32_artifact = export_model(weight_path, 'onnx')
+    imgsz = read_export_metadata(fp32_artifact).get('imgsz', 640)
+    target = exported_artifact_path(weight_path, 'onnx', INT8_TAG)
+    input_name = InferenceSession(str(fp32_artifact), providers=['CPUExecutionProvider']).get_inputs()[0].name
+    images = _calibration_images(data_yaml, calibration_images)
+
+    class _Reader(CalibrationDataReader):
+        def __init__(self):
+            self._iter = iter(images)
+
+        def get_next(self):
+            for path in self._iter:
+                img = cv2.imread(str(path))
+                if img is not None:
+                    return {input_name: _letterbox(img, imgsz)}
+            return None
+
+    print(f"⚙️  Calibrating INT8 ONNX model on {len(images)} images...")
+    quantize_static(
+        str(fp32_artifact), str(target), _Reader(),
+        quant_format=QuantFormat.QDQ,
+        per_channel=True,
+        activation_type=QuantType.QUInt8,
+        weight_type=QuantType.QInt8,
+        calibrate_method=CalibrationMethod.MinMax,
+    )
+    metadata_path(target).write_text(json.dumps({
+        'backend': 'onnx',
+        'imgsz': imgsz,
+        'precision': 'int8',
+        'weights': weight_path.name,
+        'weights_sha256': weights_hash(weight_path),
+        'calibration_images': len(images),
+    }, indent=2), encoding='utf-8')
+    return target
+
+
+def export_int8(backend: str, data_yaml: Path, calibration_images: int = INT8_CALIBRATION_IMAGES) -> Path:
+    """Tạo model INT8 cho backend (cache theo hash weights giống bản FP32)"""
+    if backend not in ('onnx', 'openvino'):
+        raise ValueError("INT8 chỉ hỗ trợ backend 'onnx' hoặc 'openvino'")
+    if not backend_available(backend):
+        raise RuntimeError(f"Backend '{backend}' is not installed")
+
+    weight_path = resolve_weight_path()
+    target = int8_artifact_path(backend, weight_path)
+    if target.exists() and metadata_path(target).exists():
+        return target
+
+    if backend == 'onnx':
+        return _quantize_onnx(weight_path, data_yaml, calibration_images)
+
+    # OpenVINO: ultralytics calibrate bằng NNCF trên tập dữ liệu trong data yaml
+    n_train = len(_calibration_images(data_yaml, 10 ** 9))
+    return export_model(
+        weight_path, 'openvino',
+        tag=INT8_TAG,
+        int8=True,
+        data=str(data_yaml),
+        fraction=min(1.0, calibration_images / max(1, n_train)),
+    )
+
+
+def _evaluate(model_path: Path, data_yaml: Path, imgsz: int) -> dict:
+    from ultralytics import YOLO
+
+    model = YOLO(str(model_path), task='detect')
+    metrics = model.val(data=str(data_yaml), imgsz=imgsz, batch=1, split='val', plots=False, verbose=False)
+    box = metrics.box
+    recall = {int(class_id): float(box.r[i]) for i, class_id in enumerate(box.ap_class_index)}
+
+    # Latency riêng: predict 1 ảnh imgsz x imgsz, bỏ qua warm-up
+    dummy = np.zeros((imgsz, imgsz, 3), dtype=np.uint8)
+    for _ in range(3):
+        model.predict(source=dummy, imgsz=imgsz, verbose=False)
+    runs = 20
+    start = time.perf_counter()
+    for _ in range(runs):
+        model.predict(source=dummy, imgsz=imgsz, verbose=False)
+    latency_ms = (time.perf_counter() - start) / runs * 1000
+
+    return {
+        'map50': float(box.map50),
+        'map50_95': float(box.map),
+        'recall': recall,
+        'val_speed_ms': {k: round(float(v), 3) for k, v in metrics.speed.items()},
+        'latency_ms': round(latency_ms, 3),
+    }
+
+
+def compare(backend: str, data_yaml: Path, max_map_drop: float = INT8_MAX_MAP_DROP) -> dict:
+    """
+    So sánh FP32 (cùng backend) và INT8 trên tập val, ghi report JSON cạnh model INT8
+    Gate: mAP50 giảm không quá max_map_drop (tuyệt đối, ví dụ 0.01 = 1 điểm)
+    """
+    weight_path = resolve_weight_path()
+    fp32_artifact = export_model(weight_path, backend)
+    int8_artifact = int8_artifact_path(backend, weight_path)
+    if not int8_artifact.exists():
+        raise FileNotFoundError(f"INT8 model not found, run export first: {int8_artifact}")
+    imgsz = read_export_metadata(fp32_artifact).get('imgsz', 640)
+
+    print(f"📏 Evaluating FP32 ({backend})...")
+    fp32 = _evaluate(fp32_artifact, data_yaml, imgsz)
+    print(f"📏 Evaluating INT8 ({backend})...")
+    int8 = _evaluate(int8_artifact, data_yaml, imgsz)
+
+    per_class = {}
+    for class_id, sign_code in CLASS_ID_TO_SIGN_CODE.items():
+        r_fp32 = fp32['recall'].get(class_id)
+        r_int8 = int8['recall'].get(class_id)
+        per_class[sign_code] = {
+            'class_id': class_id,
+            'recall_fp32': r_fp32,
+            'recall_int8': r_int8,
+            'recall_delta': (r_int8 - r_fp32) if r_fp32 is not None and r_int8 is not None else None,
+        }
+
+    map50_delta = int8['map50'] - fp32['map50']
+    report = {
+        'backend': backend,
+        'weights_sha256': weights_hash(weight_path),
+        'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'fp32': {k: v for k, v in fp32.items() if k != 'recall'},
+        'int8': {k: v for k, v in int8.items() if k != 'recall'},
+        'map50_delta': map50_delta,
+        'map50_95_delta': int8['map50_95'] - fp32['map50_95'],
+        'latency_speedup': round(fp32['latency_ms'] / int8['latency_ms'], 3) if int8['latency_ms'] else None,
+        'per_class_recall': per_class,
+        'max_map_drop': max_map_drop,
+        'passed': map50_delta >= -max_map_drop,
+    }
+    report_path(int8_artifact).write_text(json.dumps(report, indent=2, ensure_ascii=False), encoding='utf-8')
+    return report
+
+
+def gate_passed(artifact: Path, max_map_drop: float = INT8_MAX_MAP_DROP) -> bool:
+    """INT8 chỉ được dùng khi có report cho đúng weights hiện tại và mAP50 không giảm quá gate"""
+    report = load_report(artifact)
+    if not report or report.get('weights_sha256') != read_export_metadata(artifact).get('weights_sha256'):
+        return False
+    return report.get('map50_delta', -1.0) >= -max_map_drop
+
+
+def format_report(report: dict) -> str:
+    lines = [
+        f"📊 INT8 vs FP32 ({report['backend']})",
+        f"   mAP50:    {report['fp32']['map50']:.4f} -> {report['int8']['map50']:.4f} ({report['map50_delta']:+.4f})",
+        f"   mAP50-95: {report['fp32']['map50_95']:.4f} -> {report['int8']['map50_95']:.4f} ({report['map50_95_delta']:+.4f})",
+        f"   Latency:  {report['fp32']['latency_ms']:.1f}ms -> {report['int8']['latency_ms']:.1f}ms (x{report['latency_speedup']})",
+        "   Recall theo class (giảm nhiều nhất):",
+    ]
+    deltas = [(code, data) for code, data in report['per_class_recall'].items() if data['recall_delta'] is not None]
+    for code, data in sorted(deltas, key=lambda item: item[1]['recall_delta'])[:10]:
+        lines.append(f"     {code:<10} {data['recall_fp32']:.3f} -> {data['recall_int8']:.3f} ({data['recall_delta']:+.3f})")
+    status = "✅ PASSED" if report['passed'] else "❌ FAILED"
+    lines.append(f"   Gate (mAP50 drop <= {report['max_map_drop']}): {status}")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tạo model INT8 và báo cáo so sánh với FP32")
+    parser.add_argument('--backend', choices=['onnx', 'openvino'], default='onnx')
+    parser.add_argument('--dataset-root', default=None, help="Thư mục dataset (ghi đè `path` trong dataset.yaml)")
+    parser.add_argument('--calibration-images', type=int, default=INT8_CALIBRATION_IMAGES)
+    parser.add_argument('--max-map-drop', type=float, default=INT8_MAX_MAP_DROP)
+    parser.add_argument('--skip-compare', action='store_true', help="Chỉ export, không chạy báo cáo")
+    args = parser.parse_args()
+
+    data_yaml = dataset_config(args.dataset_root)
+    artifact = export_int8(args.backend, data_yaml, args.calibration_images)
+    print(f"✅ INT8 model: {artifact}")
+    if args.skip_compare:
+        return
+    report = compare(args.backend, data_yaml, args.max_map_drop)
+    print(format_report(report))
+    print(f"📝 Report: {report_path(artifact)}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,307 @@
+"""
+Xử lý song song một video dài theo segment thời gian
+
+Một lần predict_video_with_save chạy tuần tự trên cả video dù máy có nhiều core. Chế độ segment:
+1. Đọc vị trí keyframe (chỉ demux packet bằng ffmpeg, không decode) và chia video thành các segment
+   bắt đầu tại keyframe -> worker seek thẳng tới đầu segment, không decode lại GOP của segment trước.
+   Seek được kiểm tra bằng timestamp của frame decode được; lệch thì video được xử lý single-pass
+2. Mỗi segment chạy decode -> detect -> vẽ -> encode H.264 trong một worker của inference pool
+   (mỗi worker có model + nhóm core riêng, xem inference_pool.py)
+3. Detections của từng segment được nối (frame_index toàn cục) ngay khi segment đó xong, theo thứ tự segment;
+   track_id được đánh lại, track cắt ngang ranh giới segment được nối lại. Sau segment cuối, các file H.264
+   được ghép bằng ffmpeg concat (-c copy, không encode lại)
+
+Sampler và tracker bắt đầu lại ở đầu mỗi segment (frame đầu segment luôn được detect).
+"""
+import shutil
+import subprocess
+import tempfile
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+from .metrics import time_stage
+from .tracker import iou_matrix
+from .video_encoder import FFmpegPipeWriter
+
+# Số cột tối thiểu của một dòng framecrc: stream, dts, pts, duration, size, checksum
+_FRAMECRC_FIELDS = 6
+
+
+def probe_keyframes(video_path: Path) -> list:
+    """
+    Index (theo thứ tự hiển thị) của các keyframe trong stream video đầu tiên, [] nếu không đọc được
+
+    Dùng muxer framecrc của ffmpeg với -c copy: chỉ đọc packet, nhanh kể cả với video dài.
+    Packet không phải keyframe có thêm cột "F=0x..." (flags khác AV_PKT_FLAG_KEY).
+    """
+    cmd = [
+        'ffmpeg', '-hide_banner', '-loglevel', 'error', '-nostats',
+        '-i', str(video_path), '-map', '0:v:0', '-c', 'copy', '-f', 'framecrc', '-',
+    ]
+    try:
+        result = subprocess.run(cmd, capture_output=True, encoding='utf-8', errors='ignore', timeout=120)
+    except (FileNotFoundError, subprocess.SubprocessError):
+        return []
+    if result.returncode != 0:
+        return []
+
+    packets = []  # (pts, is_keyframe)
+    for line in result.stdout.splitlines():
+        if not line or line.startswith('#'):
+            continue
+        fields = [field.strip() for field in line.split(',')]
+        if len(fields) < _FRAMECRC_FIELDS:
+            continue
+        flags = next((f for f in fields[_FRAMECRC_FIELDS:] if f.startswith('F=')), None)
+        is_key = flags is None or bool(int(flags[2:], 16) & 1)
+        try:
+            packets.append((int(fields[2]), is_key))
+        except ValueError:
+            continue
+
+    # Packet theo thứ tự decode (B-frame), sắp theo pts để ra index hiển thị như OpenCV đọc
+    packets.sort(key=lambda packet: packet[0])
+    return [idx for idx, (_, is_key) in enumerate(packets) if is_key]
+
+
+def plan_segments(keyframes: list, total_frames: int, num_segments: int, min_frames: int) -> list:
+    """
+    Chia [0, total_frames) thành tối đa num_segments đoạn (start, end) dài gần bằng nhau,
+    mỗi đoạn bắt đầu tại một keyframe và dài ít nhất min_frames. Đoạn cuối có end = None (đọc tới hết video)
+    """
+    if total_frames <= 0 or num_segments < 2:
+        return [(0, None)]
+    num_segments = min(num_segments, total_frames // max(1, min_frames))
+    candidates = sorted(k for k in set(keyframes) if 0 < k < total_frames)
+    if num_segments < 2 or not candidates:
+        return [(0, None)]
+
+    starts = [0]
+    for i in range(1, num_segments):
+        target = total_frames * i / num_segments
+        nearest = min(candidates, key=lambda k: abs(k - target))
+        if nearest - starts[-1] >= min_frames and total_frames - nearest >= min_frames:
+            starts.append(nearest)
+    ends = starts[1:] + [None]
+    return list(zip(starts, ends))
+
+
+def seek_to_frame(cap, frame_index: int, fps: float):
+    """
+    Seek cap tới frame_index, trả về frame đầu tiên decode được nếu đúng vị trí, None nếu lệch / không đọc được
+
+    Không tin CAP_PROP_POS_FRAMES sau cap.set (OpenCV chỉ tính lại từ vị trí yêu cầu): với một số container,
+    video VFR hoặc stream có B-frame, frame decode được có thể lệch khỏi frame_index.
+    So timestamp của frame đầu (CAP_PROP_POS_MSEC x fps) với frame_index
+    """
+    cap.set(cv2.CAP_PROP_POS_FRAMES, frame_index)
+    ret, frame = cap.read()
+    if not ret:
+        return None
+    if round(cap.get(cv2.CAP_PROP_POS_MSEC) * fps / 1000.0) != frame_index:
+        return None
+    return frame
+
+
+def check_segment_seeks(video_path: Path, segments: list, fps: float) -> bool:
+    """Seek tới đầu mọi segment có đúng frame không (chỉ decode 1 frame mỗi segment, segment bắt đầu tại keyframe)"""
+    cap = cv2.VideoCapture(str(video_path))
+    if not cap.isOpened():
+        return False
+    try:
+        return all(seek_to_frame(cap, start, fps) is not None for start, _ in segments if start)
+    finally:
+        cap.release()
+
+
+class _PrefetchedCapture:
+    """cap.read() trả về frame đã decode khi kiểm tra seek trước, sau đó đọc tiếp từ cap"""
+
+    def __init__(self, cap, frame):
+        self.cap = cap
+        self._frame = frame
+
+    def read(self):
+        if self._frame is not None:
+            frame, self._frame = self._frame, None
+            return True, frame
+        return self.cap.read()
+
+
+def process_segment(video_path: str, start_frame: int, end_frame, conf: float, fps: float, out_path: str,
+                    candidate_conf: float = None) -> dict:
+    """
+    Chạy trong worker của inference pool: detect + vẽ + encode các frame [start_frame, end_frame)
+    frame_index trong kết quả là index cục bộ của segment (bắt đầu từ 0)
+    candidate_conf: kết quả có thêm candidate confidence thấp (xem predict_video_with_save)
+    """
+    from .yolo_infer import _create_frame_sampler, _frame_stride, _process_video_pipeline
+
+    cap = cv2.VideoCapture(str(video_path))
+    if not cap.isOpened():
+        raise RuntimeError(f"Cannot open video: {video_path}")
+    size = (int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+    source = cap
+    if start_frame:
+        # Đã kiểm tra lúc chia segment (check_segment_seeks), kiểm tra lại vì segment sai vị trí là sai kết quả
+        first_frame = seek_to_frame(cap, start_frame, fps)
+        if first_frame is None:
+            cap.release()
+            raise RuntimeError(f"Cannot seek to frame {start_frame}: {video_path}")
+        source = _PrefetchedCapture(cap, first_frame)
+
+    writer = FFmpegPipeWriter(Path(out_path), fps, size)
+    if not writer.isOpened():
+        cap.release()
+        raise RuntimeError("Cannot start ffmpeg encoder for video segment")
+
+    sampler = _create_frame_sampler(fps, _frame_stride(fps))
+    max_frames = end_frame - start_frame if end_frame is not None else None
+    try:
+        results, report = _process_video_pipeline(
+            source, writer, conf, size, sampler, fps, max_frames=max_frames, candidate_conf=candidate_conf
+        )
+    finally:
+        cap.release()
+        writer.release()
+    writer.finalize()
+    return {
+        "start_frame": start_frame,
+        "results": results,
+        "pipeline": report,
+        "sampling": sampler.report(),
+    }
+
+
+def concat_segments(segment_paths: list, out_path: Path):
+    """Ghép các file H.264 cùng thông số encode bằng concat demuxer, không encode lại"""
+    list_path = Path(out_path).parent / f"{Path(out_path).stem}_concat.txt"
+    with open(list_path, 'w', encoding='utf-8') as f:
+        for path in segment_paths:
+            escaped = str(Path(path).resolve()).replace("'", r"'\''")
+            f.write(f"file '{escaped}'\n")
+    cmd = [
+        'ffmpeg', '-hide_banner', '-loglevel', 'error', '-nostats',
+        '-f', 'concat', '-safe', '0', '-i', str(list_path),
+        '-c', 'copy', '-movflags', '+faststart', '-y', str(out_path),
+    ]
+    try:
+        with time_stage("concat"):
+            result = subprocess.run(cmd, capture_output=True, encoding='utf-8', errors='ignore')
+    finally:
+        list_path.unlink(missing_ok=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"FFmpeg concat failed ({result.returncode}): {result.stderr[-2000:]}")
+
+
+def _match_boundary_tracks(prev_dets: list, next_dets: list, match_iou: float) -> dict:
+    """track_id (cục bộ) ở frame detect đầu segment sau -> track_id toàn cục ở frame detect cuối segment trước"""
+    prev_dets = [d for d in prev_dets if d.get("track_id") is not None and len(d.get("bbox", [])) == 4]
+    next_dets = [d for d in next_dets if d.get("track_id") is not None and len(d.get("bbox", [])) == 4]
+    if not prev_dets or not next_dets:
+        return {}
+    ious = iou_matrix(
+        np.array([d["bbox"] for d in prev_dets], dtype=np.float64),
+        np.array([d["bbox"] for d in next_dets], dtype=np.float64),
+    )
+    same_class = np.array([[p.get("class_id") == n.get("class_id") for n in next_dets] for p in prev_dets])
+    ious[~same_class] = 0.0
+
+    remap = {}
+    used_prev = set()
+    for flat in np.argsort(-ious, axis=None):
+        pi, ni = divmod(int(flat), ious.shape[1])
+        if ious[pi, ni] < match_iou:
+            break
+        next_id = next_dets[ni]["track_id"]
+        if pi in used_prev or next_id in remap:
+            continue
+        used_prev.add(pi)
+        remap[next_id] = prev_dets[pi]["track_id"]
+    return remap
+
+
+def stitch_segment_results(outputs: list, match_iou: float, max_gap: int) -> list:
+    """
+    Nối kết quả các segment (theo thứ tự) thành [{"frame_index", "detections"}] với frame_index toàn cục
+
+    track_id của mỗi segment được dịch để không trùng nhau; track ở frame detect đầu segment khớp
+    (cùng class, IoU >= match_iou) với track ở frame detect cuối segment trước thì dùng lại id cũ,
+    nếu 2 frame cách nhau không quá max_gap frames
+    """
+    return list(iter_stitched_results(outputs, match_iou, max_gap))
+
+
+def iter_stitched_results(outputs, match_iou: float, max_gap: int):
+    """
+    Như stitch_segment_results nhưng yield từng frame, không tạo list kết quả của cả video
+    outputs có thể là iterator (iter_segments): mỗi segment được nối ngay khi tới lượt
+    """
+    last = None
+    id_offset = 0
+    for output in outputs:
+        start = output["start_frame"]
+        segment_results = output["results"]
+        remap = {}
+        if last is not None and segment_results:
+            gap = segment_results[0]["frame_index"] + start - last["frame_index"]
+            if gap <= max_gap:
+                remap = _match_boundary_tracks(last["detections"], segment_results[0]["detections"], match_iou)
+
+        max_id = 0
+        for entry in segment_results:
+            detections = []
+            for det in entry["detections"]:
+                track_id = det.get("track_id")
+                if track_id is not None:
+                    max_id = max(max_id, track_id)
+                    det = {**det, "track_id": remap.get(track_id, track_id + id_offset)}
+                detections.append(det)
+            last = {"frame_index": entry["frame_index"] + start, "detections": detections}
+            yield last
+        id_offset += max_id
+
+
+def merge_sampling_reports(reports: list) -> dict:
+    """Cộng các bộ đếm của sampler từ từng segment"""
+    if not reports:
+        return {}
+    merged = dict(reports[0])
+    for key in ("frames", "sampled", "skipped", "sampled_on_change", "sampled_on_timeout", "saved_vs_fixed_stride"):
+        if key in merged:
+            merged[key] = sum(report.get(key, 0) for report in reports)
+    return merged
+
+
+def iter_segments(pool, video_path: Path, segments: list, conf: float, fps: float, out_path: Path,
+                  candidate_conf: float = None):
+    """
+    Gửi tất cả segment sang inference pool, yield output của process_segment theo thứ tự segment
+    ngay khi segment đó xong (không đợi cả video); sau segment cuối ghép video output vào out_path
+
+    Future đã yield được bỏ đi để kết quả của segment được giải phóng khi caller dùng xong,
+    chỉ các segment đã xong nhưng chưa tới lượt còn được giữ lại
+    """
+    segment_dir = Path(tempfile.mkdtemp(prefix=f"{Path(out_path).stem}_segments_", dir=Path(out_path).parent))
+    try:
+        segment_paths = [segment_dir / f"segment_{i:04d}.mp4" for i in range(len(segments))]
+        futures = [
+            pool.submit_segment(str(video_path), start, end, conf, fps, str(path), candidate_conf)
+            for (start, end), path in zip(segments, segment_paths)
+        ]
+        try:
+            for i in range(len(futures)):
+                output = futures[i].result()
+                futures[i] = None
+                yield output
+                del output
+        except BaseException:
+            for future in futures:
+                if future is not None:
+                    future.cancel()
+            raise
+        concat_segments(segment_paths, out_path)
+    finally:
+        shutil.rmtree(segment_dir, ignore_errors=True)
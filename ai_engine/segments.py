@@ -0,0 +1,157 @@
+"""
+Gộp detections của video thành segment (một lần xuất hiện của biển báo) ngay trong lúc xử lý
+
+SegmentAggregator nhận detections từng frame detect theo thứ tự frame (add), chỉ giữ các segment đang mở:
+- Detection có track_id (tracker bật): mỗi track là một segment, đóng khi track không xuất hiện (trước khi
+  lọc bằng frame_filter) quá track_max_age giây: tracker đã xóa track, id không bao giờ được dùng lại
+- Không có track_id: gộp theo (class_id, class_name), mất dấu quá gap_tolerance giây thì mở segment mới
+Segment đóng chỉ được giữ nếu kéo dài ít nhất min_duration giây. Mỗi segment chỉ lưu vài số
+(frame đầu/cuối, tổng confidence, số lần thấy, bbox cuối) nên bộ nhớ không tăng theo độ dài video.
+
+frame_filter(frames) -> frames: lọc detections của nhiều frame một lần (ví dụ NMS batch),
+các frame được gom thành chunk FILTER_CHUNK_FRAMES frame trước khi lọc.
+recorder.add(frame_index, detections): nhận detections gốc (trước min_confidence và frame_filter) của từng frame,
+ví dụ FrameDetectionWriter (ai_engine/frame_store.py).
+min_confidence: bỏ candidate có confidence thấp hơn (YOLO chạy với ngưỡng thấp hơn để lưu candidate),
+detection đã được tracker gán track_id luôn được giữ (xem select_detections).
+"""
+from .performance_config import TRACKER_MAX_AGE_SECONDS
+
+FILTER_CHUNK_FRAMES = 64
+
+
+def select_detections(detections: list, min_confidence: float) -> list:
+    """
+    Detection dùng để vẽ / gộp segment: có track_id (tracker đã giữ, kể cả box confidence thấp nối tiếp track)
+    hoặc confidence >= min_confidence. Các detection còn lại chỉ là candidate được lưu lại
+    """
+    return [
+        det for det in detections
+        if det.get('track_id') is not None or det.get('confidence', 0) >= min_confidence
+    ]
+
+
+class Segment:
+    """Một lần xuất hiện: frame_index đầu / cuối (frame detect), confidence trung bình, bbox cuối cùng"""
+    __slots__ = ('class_id', 'class_name', 'track_id', 'start_frame', 'end_frame',
+                 'confidence_sum', 'count', 'bbox', 'last_seen')
+
+    def __init__(self, det: dict, frame_index: int):
+        self.class_id = det.get('class_id')
+        self.class_name = det.get('class_name', '')
+        self.track_id = det.get('track_id')
+        self.start_frame = frame_index
+        self.end_frame = frame_index
+        self.confidence_sum = 0.0
+        self.count = 0
+        self.bbox = []
+        self.last_seen = frame_index  # Frame cuối track còn được tracker trả ra (kể cả box bị frame_filter loại)
+        self.add(det, frame_index)
+
+    def add(self, det: dict, frame_index: int):
+        self.end_frame = frame_index
+        self.last_seen = frame_index
+        self.confidence_sum += det.get('confidence', 0)
+        self.count += 1
+        self.bbox = det.get('bbox', [])
+
+    @property
+    def confidence(self) -> float:
+        return self.confidence_sum / self.count if self.count else 0
+
+    def duration(self, fps: float) -> float:
+        return (self.end_frame - self.start_frame) / fps if fps > 0 else 0
+
+
+class SegmentAggregator:
+    """
+    aggregator.start(fps) -> add(frame_index, detections) cho từng frame detect -> finish() -> segments
+    Dùng lại được: start() xóa trạng thái của video trước
+    """
+
+    def __init__(self, gap_tolerance: float, min_duration: float, track_max_age: float = TRACKER_MAX_AGE_SECONDS,
+                 frame_filter=None, recorder=None, min_confidence: float = 0.0):
+        self.gap_tolerance = gap_tolerance
+        self.min_duration = min_duration
+        self.track_max_age = track_max_age
+        self.frame_filter = frame_filter
+        self.recorder = recorder
+        self.min_confidence = min_confidence
+        self.start(0.0)
+
+    def start(self, fps: float):
+        self.fps = fps
+        self.gap_frames = int(fps * self.gap_tolerance)
+        self.track_gap_frames = int(fps * self.track_max_age)
+        self.segments = []  # Segment đã đóng và đủ min_duration
+        self.frames = 0  # Số frame detect đã nhận
+        self.max_open = 0  # Số segment mở cùng lúc nhiều nhất
+        self._open = {}
+        self._pending = []
+        self._last_frame = None
+
+    def add(self, frame_index: int, detections: list):
+        if self._last_frame is not None and frame_index < self._last_frame:
+            raise ValueError(f"Frames must be added in order: {frame_index} after {self._last_frame}")
+        self._last_frame = frame_index
+        self.frames += 1
+        if self.recorder is not None:
+            self.recorder.add(frame_index, detections)
+        if self.min_confidence:
+            detections = select_detections(detections, self.min_confidence)
+        if self.frame_filter is None:
+            self._consume(frame_index, detections, detections)
+            return
+        self._pending.append((frame_index, detections))
+        if len(self._pending) >= FILTER_CHUNK_FRAMES:
+            self._flush_pending()
+
+    def finish(self) -> list:
+        """Đóng mọi segment còn mở, trả về segments theo thứ tự frame bắt đầu"""
+        self._flush_pending()
+        for segment in self._open.values():
+            self._close(segment)
+        self._open = {}
+        self.segments.sort(key=lambda segment: segment.start_frame)
+        return self.segments
+
+    def _flush_pending(self):
+        if not self._pending:
+            return
+        filtered = self.frame_filter([detections for _, detections in self._pending])
+        for (frame_index, raw), detections in zip(self._pending, filtered):
+            self._consume(frame_index, detections, raw)
+        self._pending = []
+
+    def _consume(self, frame_index: int, detections: list, raw: list):
+        for det in raw:
+            segment = self._open.get(('track', det.get('track_id')))
+            if segment is not None:
+                segment.last_seen = frame_index
+        for det in detections:
+            track_id = det.get('track_id')
+            key = ('track', track_id) if track_id is not None else (det.get('class_id'), det.get('class_name', ''))
+            segment = self._open.get(key)
+            if segment is not None and self._expired(segment, frame_index):
+                self._close(segment)
+                segment = None
+            if segment is None:
+                self._open[key] = Segment(det, frame_index)
+            else:
+                segment.add(det, frame_index)
+        self.max_open = max(self.max_open, len(self._open))
+
+        # Detection sau này có frame_index >= frame hiện tại: segment mất dấu quá gap không thể nối tiếp
+        for key, segment in list(self._open.items()):
+            if self._expired(segment, frame_index):
+                del self._open[key]
+                self._close(segment)
+
+    def _expired(self, segment: Segment, frame_index: int) -> bool:
+        if segment.track_id is not None:
+            return frame_index - segment.last_seen > self.track_gap_frames
+        return frame_index - segment.end_frame > self.gap_frames
+
+    def _close(self, segment: Segment):
+        if segment.duration(self.fps) >= self.min_duration:
+            self.segments.append(segment)
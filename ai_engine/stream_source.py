@@ -0,0 +1,92 @@
+"""
+Đọc frame từ nguồn live (RTSP, HTTP MJPEG, hoặc bất kỳ URL nào OpenCV/FFmpeg mở được)
+
+Thread đọc luôn lấy frame mới nhất và bỏ frame cũ: khi inference chậm hơn tốc độ stream,
+độ trễ không bị cộng dồn như khi đọc tuần tự từ buffer của VideoCapture.
+"""
+import threading
+import time
+
+import cv2
+
+
+class LatestFrameReader:
+    """
+    read_latest(timeout) -> (frame_idx, frame, timestamp) của frame mới nhất chưa đọc, hoặc None
+    timestamp tính bằng giây kể từ lúc bắt đầu đọc stream
+    """
+
+    def __init__(self, url: str, reconnect_attempts: int = 3, reconnect_delay: float = 2.0):
+        self.url = url
+        self.reconnect_attempts = reconnect_attempts
+        self.reconnect_delay = reconnect_delay
+        self.frames_read = 0
+        self.frames_dropped = 0
+        self.error = None
+        self._latest = None
+        self._condition = threading.Condition()
+        self._stop = threading.Event()
+        self._ended = False
+        self._started_at = time.monotonic()
+        self._thread = threading.Thread(target=self._run, name="stream-reader", daemon=True)
+        self._thread.start()
+
+    @property
+    def ended(self) -> bool:
+        return self._ended
+
+    def read_latest(self, timeout: float = 1.0):
+        with self._condition:
+            if self._latest is None and not self._ended:
+                self._condition.wait(timeout)
+            latest, self._latest = self._latest, None
+            return latest
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join(timeout=5)
+
+    def _open(self):
+        cap = cv2.VideoCapture(self.url)
+        if cap.isOpened():
+            return cap
+        cap.release()
+        return None
+
+    def _run(self):
+        attempts = 0
+        cap = None
+        try:
+            while not self._stop.is_set():
+                if cap is None:
+                    cap = self._open()
+                    if cap is None:
+                        attempts += 1
+                        if attempts > self.reconnect_attempts:
+                            self.error = f"Cannot open stream: {self.url}"
+                            break
+                        self._stop.wait(self.reconnect_delay)
+                        continue
+                ret, frame = cap.read()
+                if not ret:
+                    # Mất kết nối hoặc hết stream -> thử mở lại
+                    cap.release()
+                    cap = None
+                    attempts += 1
+                    if attempts > self.reconnect_attempts:
+                        break
+                    self._stop.wait(self.reconnect_delay)
+                    continue
+                attempts = 0
+                with self._condition:
+                    if self._latest is not None:
+                        self.frames_dropped += 1
+                    self._latest = (self.frames_read, frame, time.monotonic() - self._started_at)
+                    self.frames_read += 1
+                    self._condition.notify_all()
+        finally:
+            if cap is not None:
+                cap.release()
+            with self._condition:
+                self._ended = True
+                self._condition.notify_all()
@@ -0,0 +1,77 @@
+"""
+Tiled (sliced) inference cho ảnh độ phân giải cao
+
+Resize cả ảnh 12MP về IMAGE_INPUT_SIZE làm biển báo nhỏ ở xa biến mất. Chế độ tiled cắt ảnh thành
+các tile chồng lấn ở độ phân giải gốc, chạy model trên tất cả tile (cộng ảnh thu nhỏ toàn cảnh
+để giữ biển báo lớn) trong một lần predict, rồi gộp kết quả bằng NMS.
+
+Tile gần như không có chi tiết (bầu trời, mặt đường) được bỏ qua nhờ saliency check rẻ
+trên ảnh thu nhỏ, và số tile tối đa bị giới hạn để chi phí không tăng vô hạn theo kích thước ảnh.
+"""
+import cv2
+import numpy as np
+
+
+def _positions(length: int, tile: int, stride: int) -> list:
+    """Vị trí bắt đầu các tile trên một trục, tile cuối được đẩy vào trong để luôn đủ kích thước"""
+    if length <= tile:
+        return [0]
+    positions = list(range(0, length - tile, stride))
+    positions.append(length - tile)
+    return positions
+
+
+def tile_grid(width: int, height: int, tile_size: int, overlap: float) -> list:
+    """Danh sách tile (x1, y1, x2, y2) phủ kín ảnh, các tile kề nhau chồng lấn `overlap` (0..1)"""
+    stride = max(1, int(tile_size * (1 - overlap)))
+    return [
+        (x, y, min(x + tile_size, width), min(y + tile_size, height))
+        for y in _positions(height, tile_size, stride)
+        for x in _positions(width, tile_size, stride)
+    ]
+
+
+def saliency_map(img: np.ndarray, scale: float = 0.125) -> np.ndarray:
+    """
+    Map 0/1 trên ảnh thu nhỏ: pixel có màu bão hòa (đỏ / xanh / vàng của biển báo) nằm gần cạnh
+    Tính một lần cho cả ảnh, mỗi tile chỉ lấy trung bình vùng tương ứng
+    """
+    small = cv2.resize(img, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    saturation = cv2.cvtColor(small, cv2.COLOR_BGR2HSV)[..., 1]
+    edges = cv2.Canny(cv2.cvtColor(small, cv2.COLOR_BGR2GRAY), 80, 160)
+    near_edges = cv2.dilate(edges, np.ones((3, 3), np.uint8)) > 0
+    return ((saturation >= 90) & near_edges).astype(np.float32)
+
+
+def tile_saliency(saliency: np.ndarray, tile: tuple, image_size: tuple) -> float:
+    """Tỉ lệ pixel salient trong tile (tọa độ ảnh gốc)"""
+    width, height = image_size
+    sy = saliency.shape[0] / height
+    sx = saliency.shape[1] / width
+    x1, y1, x2, y2 = tile
+    region = saliency[int(y1 * sy):max(int(y1 * sy) + 1, int(y2 * sy)), int(x1 * sx):max(int(x1 * sx) + 1, int(x2 * sx))]
+    return float(region.mean()) if region.size else 0.0
+
+
+def select_tiles(img: np.ndarray, tile_size: int, overlap: float, saliency_threshold: float, max_tiles: int) -> tuple:
+    """
+    Chọn tile cần chạy model: bỏ tile có saliency < ngưỡng, giữ tối đa max_tiles tile salient nhất
+    Returns: (tiles, total_tiles)
+    """
+    height, width = img.shape[:2]
+    tiles = tile_grid(width, height, tile_size, overlap)
+    saliency = saliency_map(img)
+    scored = [(tile_saliency(saliency, tile, (width, height)), tile) for tile in tiles]
+    kept = [(score, tile) for score, tile in scored if score >= saliency_threshold]
+    kept.sort(key=lambda item: item[0], reverse=True)
+    return [tile for _, tile in kept[:max_tiles]], len(tiles)
+
+
+def offset_detections(detections: list, tile: tuple) -> list:
+    """Chuyển bbox từ tọa độ tile về tọa độ ảnh gốc"""
+    x0, y0 = tile[0], tile[1]
+    for det in detections:
+        bbox = det.get("bbox", [])
+        if len(bbox) == 4:
+            det["bbox"] = [bbox[0] + x0, bbox[1] + y0, bbox[2] + x0, bbox[3] + y0]
+    return detections
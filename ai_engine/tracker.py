@@ -0,0 +1,260 @@
+"""
+Multi-object tracker cho video (kiểu ByteTrack: IoU + Kalman filter)
+
+Chỉ các frame được sample mới chạy YOLO. Tracker gán track_id cho detection của các frame đó,
+TrackStage nội suy box của từng track cho các frame ở giữa 2 frame detect
+để box di chuyển mượt thay vì đứng yên rồi nhảy.
+
+Mỗi track tương ứng với một biển báo vật lý -> một DetectedSign (xem recognition/processing.py).
+"""
+from typing import Callable, Iterable
+
+import numpy as np
+
+from .video_pipeline import PipelineStage
+
+
+def _box_to_state(bbox) -> np.ndarray:
+    x1, y1, x2, y2 = bbox
+    return np.array([(x1 + x2) / 2, (y1 + y2) / 2, x2 - x1, y2 - y1], dtype=np.float64)
+
+
+def _state_to_box(state: np.ndarray) -> list:
+    cx, cy, w, h = state[:4]
+    return [cx - w / 2, cy - h / 2, cx + w / 2, cy + h / 2]
+
+
+def iou_matrix(boxes_a: np.ndarray, boxes_b: np.ndarray) -> np.ndarray:
+    """IoU giữa mọi cặp box (N, 4) x (M, 4) -> (N, M)"""
+    if len(boxes_a) == 0 or len(boxes_b) == 0:
+        return np.zeros((len(boxes_a), len(boxes_b)))
+    a = boxes_a[:, None, :]
+    b = boxes_b[None, :, :]
+    inter_w = np.maximum(np.minimum(a[..., 2], b[..., 2]) - np.maximum(a[..., 0], b[..., 0]), 0)
+    inter_h = np.maximum(np.minimum(a[..., 3], b[..., 3]) - np.maximum(a[..., 1], b[..., 1]), 0)
+    inter = inter_w * inter_h
+    area_a = (a[..., 2] - a[..., 0]) * (a[..., 3] - a[..., 1])
+    area_b = (b[..., 2] - b[..., 0]) * (b[..., 3] - b[..., 1])
+    union = area_a + area_b - inter
+    return np.where(union > 0, inter / np.maximum(union, 1e-9), 0.0)
+
+
+class KalmanBoxTrack:
+    """
+    Kalman filter vận tốc không đổi trên (cx, cy, w, h)
+    Đơn vị vận tốc là pixel / frame, predict(dt) với dt = số frame từ lần update trước
+
+    4 toạ độ độc lập với nhau, có cùng covariance ban đầu và cùng nhiễu Q / R nên covariance 8x8
+    gồm 4 khối 2x2 (vị trí, vận tốc) giống hệt nhau: chỉ lưu một khối, cập nhật bằng số thực
+    (cùng kết quả với phép tính ma trận 8x8, nhanh hơn nhiều khi replay cả video)
+    """
+
+    def __init__(self, track_id: int, detection: dict, frame_idx: int):
+        self.track_id = track_id
+        self.class_id = detection.get("class_id")
+        self.detection = detection
+        self.last_frame = frame_idx
+        self.hits = 1
+        self.x = np.zeros(8)
+        self.x[:4] = _box_to_state(detection["bbox"])
+        w, h = self.x[2], self.x[3]
+        scale = max(w, h, 1.0)
+        # Khối covariance [[p_pos, p_cross], [p_cross, p_vel]], ban đầu diag(scale, 10 * scale) ** 2 * 0.01
+        self.p_pos = scale ** 2 * 0.01
+        self.p_cross = 0.0
+        self.p_vel = (10 * scale) ** 2 * 0.01
+        self._q = 0.05
+        self._r = 0.1
+
+    def predict(self, frame_idx: int) -> list:
+        """Box dự đoán tại frame_idx (không thay đổi state)"""
+        dt = frame_idx - self.last_frame
+        state = self.x[:4] + self.x[4:] * dt
+        state[2:4] = np.maximum(state[2:4], 1.0)
+        return _state_to_box(state)
+
+    def update(self, detection: dict, frame_idx: int):
+        dt = max(1, frame_idx - self.last_frame)
+        scale = max(self.x[2], self.x[3], 1.0)
+        q = (self._q * scale) ** 2 * dt
+        r = (self._r * scale) ** 2
+
+        # Predict: P = F P F^T + Q với F = [[1, dt], [0, 1]]
+        p_pos = self.p_pos + 2 * dt * self.p_cross + dt * dt * self.p_vel + q
+        p_cross = self.p_cross + dt * self.p_vel
+        p_vel = self.p_vel + q
+
+        # Update: đo vị trí, gain K = [p_pos, p_cross] / (p_pos + r)
+        k_pos = p_pos / (p_pos + r)
+        k_vel = p_cross / (p_pos + r)
+        position = self.x[:4] + self.x[4:] * dt
+        innovation = _box_to_state(detection["bbox"]) - position
+        self.x[:4] = position + k_pos * innovation
+        self.x[4:] += k_vel * innovation
+        self.p_pos = (1 - k_pos) * p_pos
+        self.p_cross = (1 - k_pos) * p_cross
+        self.p_vel = p_vel - k_vel * p_cross
+
+        self.detection = detection
+        self.last_frame = frame_idx
+        self.hits += 1
+
+
+class ByteTracker:
+    """
+    Tracker 2 bước như ByteTrack, so khớp theo IoU với box dự đoán của Kalman, chỉ giữa cùng class_id:
+    1. Detection confidence >= high_threshold khớp với các track đang có
+    2. Detection confidence thấp khớp với các track còn lại (giữ track qua frame bị che/mờ)
+    Detection cao không khớp tạo track mới, detection thấp không khớp bị bỏ.
+    Detection confidence < low_threshold bị bỏ ngay (YOLO chạy với ngưỡng candidate thấp hơn).
+    Track không được update quá max_age frames thì bị xóa.
+    """
+
+    def __init__(self, high_threshold: float = 0.6, match_iou: float = 0.3, max_age: int = 30,
+                 low_threshold: float = 0.0):
+        self.high_threshold = high_threshold
+        self.low_threshold = low_threshold
+        self.match_iou = match_iou
+        self.max_age = max(1, max_age)
+        self.tracks = []
+        self._next_id = 1
+
+    def update(self, frame_idx: int, detections: list) -> list:
+        """Trả về các detection được gán vào track (copy, có thêm 'track_id')"""
+        return self.track(frame_idx, detections)[0]
+
+    def track(self, frame_idx: int, detections: list) -> tuple:
+        """Như update, trả về (tracked, dropped): dropped là các detection có bbox không được gán track (không copy)"""
+        self.tracks = [t for t in self.tracks if frame_idx - t.last_frame <= self.max_age]
+        detections = [d for d in detections if len(d.get("bbox", [])) == 4]
+        dropped = [d for d in detections if d.get("confidence", 0) < self.low_threshold]
+        detections = [d for d in detections if d.get("confidence", 0) >= self.low_threshold]
+        high = [d for d in detections if d.get("confidence", 0) >= self.high_threshold]
+        low = [d for d in detections if d.get("confidence", 0) < self.high_threshold]
+
+        tracked = []
+        unmatched_tracks = list(self.tracks)
+        for group, create_new in ((high, True), (low, False)):
+            matches, unmatched_tracks, unmatched_dets = self._associate(unmatched_tracks, group, frame_idx)
+            for track, det in matches:
+                track.update(det, frame_idx)
+                tracked.append({**det, "track_id": track.track_id})
+            if create_new:
+                for det in unmatched_dets:
+                    track = KalmanBoxTrack(self._next_id, det, frame_idx)
+                    self._next_id += 1
+                    self.tracks.append(track)
+                    tracked.append({**det, "track_id": track.track_id})
+            else:
+                dropped.extend(unmatched_dets)
+        return tracked, dropped
+
+    def _associate(self, tracks: list, detections: list, frame_idx: int):
+        if not tracks or not detections:
+            return [], tracks, detections
+        predicted = np.array([t.predict(frame_idx) for t in tracks], dtype=np.float64)
+        boxes = np.array([d["bbox"] for d in detections], dtype=np.float64)
+        ious = iou_matrix(predicted, boxes)
+        same_class = (
+            np.array([t.class_id for t in tracks], dtype=object)[:, None]
+            == np.array([d.get("class_id") for d in detections], dtype=object)[None, :]
+        )
+        ious[~same_class] = 0.0
+
+        # Greedy theo IoU giảm dần (đủ tốt với số lượng biển báo nhỏ mỗi frame)
+        matches = []
+        used_tracks, used_dets = set(), set()
+        for flat in np.argsort(-ious, axis=None):
+            ti, di = divmod(int(flat), ious.shape[1])
+            if ious[ti, di] < self.match_iou:
+                break
+            if ti in used_tracks or di in used_dets:
+                continue
+            used_tracks.add(ti)
+            used_dets.add(di)
+            matches.append((tracks[ti], detections[di]))
+        unmatched_tracks = [t for i, t in enumerate(tracks) if i not in used_tracks]
+        unmatched_dets = [d for i, d in enumerate(detections) if i not in used_dets]
+        return matches, unmatched_tracks, unmatched_dets
+
+
+def interpolate_detections(prev: list, prev_idx: int, next_: list, next_idx: int, frame_idx: int) -> list:
+    """
+    Box của các track tại frame_idx nằm giữa 2 frame detect prev_idx < frame_idx < next_idx
+    Track có ở cả 2 frame: nội suy tuyến tính; chỉ có ở frame trước: giữ box cũ;
+    track mới xuất hiện ở frame sau chưa được vẽ
+    """
+    if next_ is None or next_idx is None or next_idx <= prev_idx:
+        return prev
+    t = (frame_idx - prev_idx) / (next_idx - prev_idx)
+    next_by_track = {d.get("track_id"): d for d in next_ if d.get("track_id") is not None}
+    frame_dets = []
+    for det in prev:
+        other = next_by_track.get(det.get("track_id"))
+        if other is None:
+            frame_dets.append(det)
+            continue
+        bbox = [a + (b - a) * t for a, b in zip(det["bbox"], other["bbox"])]
+        frame_dets.append({**det, "bbox": bbox})
+    return frame_dets
+
+
+class TrackStage(PipelineStage):
+    """
+    Input: (frame_idx, frame, detections | None) theo thứ tự từ stage infer
+    Output: (frame_idx, frame, detections) với detections đã gán track_id, nội suy cho mọi frame
+
+    Frame không detect được giữ lại tới khi frame detect kế tiếp có kết quả
+    (tối đa khoảng cách giữa 2 frame detect), sau đó mới nội suy và trả ra.
+    on_result(frame_idx, detections): nhận kết quả đã gán track_id của từng frame detect thay vì self.results
+    keep_dropped: kết quả (on_result / self.results) có thêm các detection không được gán track
+    (không có track_id, dùng làm candidate), frame output chỉ có detection đã gán track
+    """
+    name = "track"
+
+    def __init__(self, tracker: ByteTracker, on_result: Callable = None, keep_dropped: bool = False):
+        self.tracker = tracker
+        self.keep_dropped = keep_dropped
+        self.results = []  # [{"frame_index", "detections"}] cho các frame detect, có track_id
+        self.on_result = on_result or self._append_result
+        self._held = []  # [(frame_idx, frame)] chờ frame detect kế tiếp
+        self._prev = []
+        self._prev_idx = None
+
+    def process(self, item) -> Iterable:
+        frame_idx, frame, detections = item
+        if detections is None:
+            if self._prev_idx is None:
+                return [(frame_idx, frame, [])]
+            self._held.append((frame_idx, frame))
+            return ()
+
+        tracked, dropped = self.tracker.track(frame_idx, detections)
+        self.on_result(frame_idx, tracked + dropped if self.keep_dropped else tracked)
+        outputs = self._flush(tracked, frame_idx)
+        outputs.append((frame_idx, frame, tracked))
+        self._prev, self._prev_idx = tracked, frame_idx
+        return outputs
+
+    def finish(self) -> Iterable:
+        return self._flush(None, None)
+
+    def _append_result(self, frame_idx, detections):
+        self.results.append({"frame_index": frame_idx, "detections": detections})
+
+    def _flush(self, next_: list, next_idx: int) -> list:
+        outputs = [
+            (idx, frame, interpolate_detections(self._prev, self._prev_idx, next_, next_idx, idx))
+            for idx, frame in self._held
+        ]
+        self._held = []
+        return outputs
+
+
+def run_track_stage(stage: TrackStage, items: Iterable, sink: Callable):
+    """Chạy TrackStage ngoài pipeline (chế độ 2 pass): sink(frame_idx, frame, detections) theo thứ tự"""
+    for item in items:
+        for output in stage.process(item):
+            sink(*output)
+    for output in stage.finish():
+        sink(*output)
@@ -0,0 +1,169 @@
+"""
+Encoder cho video output
+
+- FFmpegPipeWriter: đẩy frame BGR thô qua stdin vào một process ffmpeg libx264 duy nhất,
+  ghi thẳng file H.264 cuối cùng (không có file tạm, không encode 2 lần, không timeout)
+- OpenCVTranscodeWriter: cách cũ, ghi mp4v ra file tạm rồi transcode sang H.264 bằng ffmpeg
+
+Cả hai có interface giống cv2.VideoWriter (write / release / isOpened) cộng thêm finalize()
+trả về đường dẫn file output cuối cùng.
+"""
+import shutil
+import subprocess
+import tempfile
+import uuid
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+from .metrics import time_stage
+from .performance_config import FFMPEG_PRESET, FFMPEG_CRF, FFMPEG_TRANSCODE_TIMEOUT, VIDEO_ENCODER
+
+
+def _h264_output_args(fps: float) -> list:
+    """Flags encode H.264 tối ưu cho web streaming (dùng chung cho pipe và transcode)"""
+    return [
+        '-c:v', 'libx264',  # H.264 codec
+        '-preset', FFMPEG_PRESET,
+        '-crf', str(FFMPEG_CRF),
+        '-pix_fmt', 'yuv420p',  # Pixel format cho web compatibility
+        '-movflags', '+faststart',  # Enable progressive streaming
+        '-r', str(fps),  # Force output FPS = input FPS
+        '-vsync', 'cfr',  # Constant frame rate
+        '-g', str(int(fps * 2)),  # Keyframe interval (2 giây)
+        '-sc_threshold', '0',  # Disable scene change detection
+        '-force_key_frames', 'expr:gte(t,n_forced*2)',  # Force keyframe mỗi 2s
+    ]
+
+
+class FFmpegPipeWriter:
+    """Stream raw BGR frames qua pipe vào ffmpeg libx264"""
+
+    def __init__(self, out_path: Path, fps: float, size: tuple):
+        self.out_path = Path(out_path)
+        self.fps = fps
+        self.width, self.height = size
+        self.returncode = None
+        # stderr ghi ra file tạm để không bị nghẽn pipe khi ffmpeg log nhiều
+        self._stderr = tempfile.TemporaryFile()
+
+        cmd = [
+            'ffmpeg', '-hide_banner', '-loglevel', 'error', '-nostats',
+            '-f', 'rawvideo', '-pix_fmt', 'bgr24',
+            '-s', f'{self.width}x{self.height}',
+            '-r', str(fps),
+            '-i', '-',
+            '-an',
+        ]
+        if self.width % 2 or self.height % 2:
+            # yuv420p yêu cầu kích thước chẵn
+            cmd += ['-vf', 'crop=trunc(iw/2)*2:trunc(ih/2)*2']
+        cmd += _h264_output_args(fps) + ['-y', str(self.out_path)]
+
+        try:
+            self.proc = subprocess.Popen(
+                cmd, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=self._stderr
+            )
+        except (FileNotFoundError, OSError):
+            self.proc = None
+
+    def isOpened(self) -> bool:
+        return self.proc is not None and self.proc.poll() is None
+
+    def write(self, frame):
+        if frame.shape[1] != self.width or frame.shape[0] != self.height:
+            frame = cv2.resize(frame, (self.width, self.height))
+        try:
+            self.proc.stdin.write(np.ascontiguousarray(frame).data)
+        except (BrokenPipeError, ValueError):
+            self.release()
+            raise RuntimeError(f"FFmpeg encoder stopped unexpectedly: {self._read_stderr()}")
+
+    def release(self):
+        if self.proc is None or self.returncode is not None:
+            return
+        try:
+            self.proc.stdin.close()
+        except (BrokenPipeError, OSError):
+            pass
+        self.returncode = self.proc.wait()
+
+    def finalize(self) -> Path:
+        # Đợi ffmpeg encode nốt các frame còn trong pipe
+        with time_stage("encode"):
+            self.release()
+        if self.returncode != 0:
+            raise RuntimeError(f"FFmpeg encoding failed ({self.returncode}): {self._read_stderr()}")
+        print(f"✅ Video encoded to H.264 via ffmpeg pipe")
+        return self.out_path
+
+    def _read_stderr(self) -> str:
+        try:
+            self._stderr.seek(0)
+            return self._stderr.read().decode('utf-8', errors='ignore')[-2000:]
+        except (OSError, ValueError):
+            return ''
+
+
+class OpenCVTranscodeWriter:
+    """Ghi mp4v bằng cv2.VideoWriter ra file tạm, finalize() transcode sang H.264"""
+
+    def __init__(self, out_path: Path, fps: float, size: tuple, duration: float = None):
+        self.out_path = Path(out_path)
+        self.temp_path = self.out_path.parent / f"temp_{uuid.uuid4().hex}.mp4"
+        self.fps = fps
+        self.duration = duration
+        fourcc = cv2.VideoWriter_fourcc(*"mp4v")
+        self.writer = cv2.VideoWriter(str(self.temp_path), fourcc, fps, size)
+
+    def isOpened(self) -> bool:
+        return self.writer.isOpened()
+
+    def write(self, frame):
+        self.writer.write(frame)
+
+    def release(self):
+        self.writer.release()
+
+    def finalize(self) -> Path:
+        self.release()
+        transcode_to_h264(self.temp_path, self.out_path, self.fps, self.duration)
+        return self.out_path
+
+
+def transcode_to_h264(temp_path: Path, out_path: Path, fps: float, duration: float = None):
+    """Convert video sang H.264 để tương thích với web browsers, lỗi thì giữ nguyên file gốc"""
+    try:
+        print(f"🔄 Converting video to H.264 for web compatibility...")
+        cmd = ['ffmpeg', '-i', str(temp_path)] + _h264_output_args(fps)
+        if duration:
+            cmd += ['-t', str(duration)]  # CRITICAL: Set exact duration
+        cmd += ['-y', str(out_path)]
+        with time_stage("transcode"):
+            result = subprocess.run(
+                cmd, capture_output=True, timeout=FFMPEG_TRANSCODE_TIMEOUT, encoding='utf-8', errors='ignore'
+            )
+
+        if result.returncode == 0:
+            print(f"✅ Video converted to H.264 successfully")
+            temp_path.unlink(missing_ok=True)
+        else:
+            print(f"⚠️  FFmpeg conversion failed: {result.stderr}")
+            temp_path.rename(out_path)
+    except (FileNotFoundError, subprocess.SubprocessError) as e:
+        print(f"⚠️  FFmpeg not found or conversion failed: {e}")
+        temp_path.rename(out_path)
+
+
+def open_video_writer(out_path: Path, fps: float, size: tuple, duration: float = None):
+    """
+    Tạo writer theo VIDEO_ENCODER
+    'ffmpeg_pipe' tự fallback về 'opencv' nếu máy không có ffmpeg
+    """
+    if VIDEO_ENCODER == 'ffmpeg_pipe' and shutil.which('ffmpeg'):
+        writer = FFmpegPipeWriter(out_path, fps, size)
+        if writer.isOpened():
+            return writer
+        print(f"⚠️  Cannot start ffmpeg pipe encoder, falling back to OpenCV writer")
+    return OpenCVTranscodeWriter(out_path, fps, size, duration)
@@ -0,0 +1,408 @@
+"""
+Pipeline nhiều stage cho xử lý video: decode -> infer -> draw -> encode
+
+Mỗi stage chạy trong một thread riêng, nối với nhau bằng queue có giới hạn (backpressure):
+stage nhanh sẽ bị chặn khi queue phía sau đầy thay vì giữ frames vô hạn trong RAM.
+Pipeline cũng chạy được tuần tự trong 1 thread (threaded=False) với cùng các stage.
+"""
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from typing import Callable, Iterable, Optional
+
+import cv2
+
+from .frame_sampler import FixedStrideSampler
+from .metrics import observe_stage, time_stage
+
+_END = object()  # Đánh dấu hết dữ liệu trong queue
+
+
+class _PipelineAborted(Exception):
+    """Một stage khác đã lỗi, thread hiện tại dừng lại"""
+
+
+class PipelineStage:
+    """
+    Stage cơ bản: process() nhận 1 item, trả về các item cho stage sau
+    finish() được gọi khi hết input để xả các item còn giữ lại
+    """
+    name = "stage"
+
+    def process(self, item) -> Iterable:
+        return ()
+
+    def finish(self) -> Iterable:
+        return ()
+
+
+class StageStats:
+    """Thời gian của một stage: bận xử lý, chờ input (đói), chờ output (bị backpressure)"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.items = 0
+        self.busy = 0.0
+        self.wait_input = 0.0
+        self.wait_output = 0.0
+
+    def as_dict(self, wall_time: float) -> dict:
+        return {
+            "items": self.items,
+            "busy_seconds": round(self.busy, 4),
+            "wait_input_seconds": round(self.wait_input, 4),
+            "wait_output_seconds": round(self.wait_output, 4),
+            "utilisation": round(self.busy / wall_time, 4) if wall_time > 0 else 0.0,
+        }
+
+
+class StagedPipeline:
+    """
+    Chạy source (iterable, ví dụ frames decode từ video) qua danh sách stage
+
+    run() trả về report: {"wall_seconds", "bottleneck", "stages": {name: stats}}
+    Stage có utilisation cao nhất là bottleneck.
+    """
+
+    def __init__(self, source: Iterable, stages: list, queue_size: int = 8,
+                 threaded: bool = True, source_name: str = "decode"):
+        self.source = source
+        self.stages = stages
+        self.queue_size = max(1, queue_size)
+        self.threaded = threaded
+        self.source_stats = StageStats(source_name)
+        self.stage_stats = [StageStats(stage.name) for stage in stages]
+        self._abort = threading.Event()
+        self._error: Optional[BaseException] = None
+        self._error_lock = threading.Lock()
+
+    def run(self) -> dict:
+        start = time.perf_counter()
+        if self.threaded:
+            self._run_threaded()
+        else:
+            self._run_sequential()
+        return self.report(time.perf_counter() - start)
+
+    def report(self, wall_time: float) -> dict:
+        all_stats = [self.source_stats] + self.stage_stats
+        stages = {stats.name: stats.as_dict(wall_time) for stats in all_stats}
+        bottleneck = max(all_stats, key=lambda stats: stats.busy).name if all_stats else None
+        return {
+            "wall_seconds": round(wall_time, 4),
+            "threaded": self.threaded,
+            "bottleneck": bottleneck,
+            "stages": stages,
+        }
+
+    # ------------------------------------------------------------------
+    # Chạy tuần tự
+    # ------------------------------------------------------------------
+    def _run_sequential(self):
+        iterator = iter(self.source)
+        while True:
+            t0 = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                self.source_stats.busy += time.perf_counter() - t0
+                break
+            self.source_stats.busy += time.perf_counter() - t0
+            self.source_stats.items += 1
+            self._push(0, item)
+
+        for index, stage in enumerate(self.stages):
+            stats = self.stage_stats[index]
+            t0 = time.perf_counter()
+            outputs = list(stage.finish())
+            stats.busy += time.perf_counter() - t0
+            for output in outputs:
+                self._push(index + 1, output)
+
+    def _push(self, index: int, item):
+        if index >= len(self.stages):
+            return
+        stats = self.stage_stats[index]
+        t0 = time.perf_counter()
+        outputs = list(self.stages[index].process(item))
+        stats.busy += time.perf_counter() - t0
+        stats.items += 1
+        for output in outputs:
+            self._push(index + 1, output)
+
+    # ------------------------------------------------------------------
+    # Chạy đa luồng
+    # ------------------------------------------------------------------
+    def _run_threaded(self):
+        queues = [queue.Queue(maxsize=self.queue_size) for _ in self.stages]
+        threads = [threading.Thread(
+            target=self._guard, args=(self._source_loop, queues[0] if queues else None),
+            name=f"pipeline-{self.source_stats.name}", daemon=True,
+        )]
+        for index, stage in enumerate(self.stages):
+            out_queue = queues[index + 1] if index + 1 < len(queues) else None
+            threads.append(threading.Thread(
+                target=self._guard, args=(self._stage_loop, index, queues[index], out_queue),
+                name=f"pipeline-{stage.name}", daemon=True,
+            ))
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        if self._error is not None:
+            raise self._error
+
+    def _guard(self, target: Callable, *args):
+        try:
+            target(*args)
+        except _PipelineAborted:
+            pass
+        except BaseException as e:
+            with self._error_lock:
+                if self._error is None:
+                    self._error = e
+            self._abort.set()
+
+    def _source_loop(self, out_queue):
+        stats = self.source_stats
+        iterator = iter(self.source)
+        while True:
+            if self._abort.is_set():
+                raise _PipelineAborted()
+            t0 = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                stats.busy += time.perf_counter() - t0
+                break
+            stats.busy += time.perf_counter() - t0
+            stats.items += 1
+            if out_queue is not None:
+                self._put(out_queue, item, stats)
+        if out_queue is not None:
+            self._put(out_queue, _END, stats)
+
+    def _stage_loop(self, index: int, in_queue, out_queue):
+        stage = self.stages[index]
+        stats = self.stage_stats[index]
+        while True:
+            item = self._get(in_queue, stats)
+            t0 = time.perf_counter()
+            if item is _END:
+                outputs = list(stage.finish())
+            else:
+                outputs = list(stage.process(item))
+                stats.items += 1
+            stats.busy += time.perf_counter() - t0
+            if out_queue is not None:
+                for output in outputs:
+                    self._put(out_queue, output, stats)
+            if item is _END:
+                if out_queue is not None:
+                    self._put(out_queue, _END, stats)
+                return
+
+    def _put(self, q, item, stats: StageStats):
+        t0 = time.perf_counter()
+        while True:
+            try:
+                q.put(item, timeout=0.1)
+                break
+            except queue.Full:
+                if self._abort.is_set():
+                    raise _PipelineAborted()
+        stats.wait_output += time.perf_counter() - t0
+
+    def _get(self, q, stats: StageStats):
+        t0 = time.perf_counter()
+        while True:
+            try:
+                item = q.get(timeout=0.1)
+                break
+            except queue.Empty:
+                if self._abort.is_set():
+                    raise _PipelineAborted()
+        stats.wait_input += time.perf_counter() - t0
+        return item
+
+
+def format_pipeline_report(report: dict) -> str:
+    """Format report thành bảng text để log"""
+    mode = "threaded" if report.get("threaded") else "sequential"
+    lines = [f"📊 Pipeline ({mode}) wall={report['wall_seconds']:.2f}s, bottleneck: {report['bottleneck']}"]
+    for name, stats in report["stages"].items():
+        lines.append(
+            f"   {name:<8} items={stats['items']:<6} busy={stats['busy_seconds']:.2f}s "
+            f"({stats['utilisation'] * 100:.0f}%) wait_in={stats['wait_input_seconds']:.2f}s "
+            f"wait_out={stats['wait_output_seconds']:.2f}s"
+        )
+    return "\n".join(lines)
+
+
+# ----------------------------------------------------------------------
+# Các stage cho video
+# ----------------------------------------------------------------------
+def read_frames(cap, max_frames: int = None):
+    """Source: decode tuần tự từ cv2.VideoCapture, yield (frame_idx, frame), tối đa max_frames frames"""
+    frame_idx = 0
+    while max_frames is None or frame_idx < max_frames:
+        start = time.perf_counter()
+        ret, frame = cap.read()
+        observe_stage("decode", time.perf_counter() - start)
+        if not ret:
+            break
+        yield frame_idx, frame
+        frame_idx += 1
+
+
+class StrideDetectStage(PipelineStage):
+    """
+    Detect theo stride, gom batch, giữ frame trong look-behind buffer cho tới khi có detection
+
+    Input: (frame_idx, frame). Output theo đúng thứ tự: (frame_idx, frame, detections | None),
+    detections là None với frame không được detect.
+
+    - sampler: quyết định frame nào được detect (ai_engine/frame_sampler.py),
+      mặc định FixedStrideSampler(frame_stride)
+    - run_batch(frames_resized) -> detections: chạy đồng bộ, buffer tối đa
+      (batch_size - 1) * khoảng cách lớn nhất giữa 2 frame detect + 1 frames
+    - submit_batch(frames_resized) -> Future: chạy bất đồng bộ (ví dụ inference pool),
+      giữ tối đa max_in_flight batch đang chạy cùng lúc
+    - max_buffer_bytes: giới hạn tổng kích thước frame trong buffer (None = không giới hạn). Vượt giới hạn thì
+      gửi batch đang gom (kể cả chưa đủ batch_size) và chờ kết quả của frame đầu buffer trước khi nhận frame mới
+    - on_result(frame_idx, detections): nhận kết quả từng frame detect theo thứ tự frame,
+      thay vì giữ tất cả trong self.results
+    """
+    name = "infer"
+
+    def __init__(self, run_batch: Callable = None, frame_stride: int = 1, batch_size: int = 1,
+                 input_size: int = 320, submit_batch: Callable = None, max_in_flight: int = 1,
+                 sampler=None, on_result: Callable = None, max_buffer_bytes: int = None):
+        if submit_batch is None:
+            submit_batch = self._run_now
+        self.run_batch = run_batch
+        self.submit_batch = submit_batch
+        self.max_in_flight = max(1, max_in_flight)
+        self.sampler = sampler or FixedStrideSampler(frame_stride)
+        self.batch_size = max(1, batch_size)
+        self.input_size = input_size
+        self.max_buffer_bytes = max_buffer_bytes
+        self.results = []  # [{"frame_index", "detections"}] giống output cũ (khi không có on_result)
+        self.on_result = on_result or self._append_result
+        self._frames_batch = []
+        self._batch_indices = []
+        self._in_flight = deque()  # [(future, batch_indices)] theo thứ tự submit
+        self._pending = deque()  # [(frame_idx, frame, sampled)] chưa trả ra
+        self._pending_bytes = 0
+        self._detections_map = {}
+
+    def _append_result(self, frame_idx, detections):
+        self.results.append({"frame_index": frame_idx, "detections": detections})
+
+    def _run_now(self, frames_batch):
+        future = Future()
+        future.set_result(self.run_batch(frames_batch))
+        return future
+
+    def process(self, item):
+        frame_idx, frame = item
+        sampled = self.sampler.should_sample(frame_idx, frame)
+        if sampled:
+            with time_stage("resize"):
+                self._frames_batch.append(cv2.resize(frame, (self.input_size, self.input_size)))
+            self._batch_indices.append(frame_idx)
+        self._pending.append((frame_idx, frame, sampled))
+        self._pending_bytes += frame.nbytes
+
+        if len(self._frames_batch) >= self.batch_size:
+            self._submit()
+        self._collect(block=False)
+        outputs = self._release()
+
+        # Buffer đầy: frame đầu buffer đang chờ detect -> gửi batch của nó nếu chưa gửi, đợi kết quả
+        while self._buffer_full() and self._pending:
+            if self._in_flight:
+                self._collect_one()
+            elif self._frames_batch:
+                self._submit()
+            else:
+                break
+            outputs.extend(self._release())
+        return outputs
+
+    def finish(self):
+        if self._frames_batch:
+            self._submit()
+        self._collect(block=True)
+        return self._release()
+
+    def _buffer_full(self) -> bool:
+        return self.max_buffer_bytes is not None and self._pending_bytes > self.max_buffer_bytes
+
+    def _submit(self):
+        # Backpressure: đợi batch cũ nhất xong nếu đã đủ max_in_flight
+        while len(self._in_flight) >= self.max_in_flight:
+            self._collect_one()
+        self._in_flight.append((self.submit_batch(self._frames_batch), self._batch_indices))
+        self._frames_batch = []
+        self._batch_indices = []
+
+    def _collect_one(self):
+        future, indices = self._in_flight.popleft()
+        for idx, detections in zip(indices, future.result()):
+            self._detections_map[idx] = detections
+            self.on_result(idx, detections)
+
+    def _collect(self, block: bool):
+        while self._in_flight and (block or self._in_flight[0][0].done()):
+            self._collect_one()
+
+    def _release(self):
+        """
+        Trả ra các frame đầu buffer đã đủ thông tin để vẽ:
+        frame không detect luôn sẵn sàng (các frame detect trước nó đã được trả ra),
+        frame detect phải chờ có kết quả
+        """
+        outputs = []
+        while self._pending:
+            frame_idx, frame, sampled = self._pending[0]
+            if sampled and frame_idx not in self._detections_map:
+                break
+            self._pending.popleft()
+            self._pending_bytes -= frame.nbytes
+            detections = self._detections_map.pop(frame_idx) if sampled else None
+            outputs.append((frame_idx, frame, detections))
+        return outputs
+
+
+class AnnotateStage(PipelineStage):
+    """Vẽ detections của frame detect gần nhất lên mọi frame, output frame đã vẽ"""
+    name = "draw"
+
+    def __init__(self, draw_fn: Callable):
+        self.draw_fn = draw_fn
+        self._last_detections = []
+
+    def process(self, item):
+        _, frame, detections = item
+        if detections is not None:
+            self._last_detections = detections
+        if self._last_detections:
+            with time_stage("draw"):
+                self.draw_fn(frame, self._last_detections)
+        return [frame]
+
+
+class EncodeStage(PipelineStage):
+    """Ghi frame vào writer (cv2.VideoWriter hoặc tương đương)"""
+    name = "encode"
+
+    def __init__(self, writer):
+        self.writer = writer
+
+    def process(self, frame):
+        with time_stage("encode"):
+            self.writer.write(frame)
+        return ()
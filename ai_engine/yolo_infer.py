@@ -1,46 +1,64 @@
-import os
+import gc
+import shutil
+import threading
+import time
 import uuid
-from functools import lru_cache
+from concurrent.futures.process import BrokenProcessPool
 from pathlib import Path
 from typing import Tuple
 
 import cv2
-from decouple import config
 import numpy as np
-from PIL import Image, ImageDraw, ImageFont
-from ultralytics import YOLO
 
 # Import mapping từ class_id sang sign_code
 from .sign_code_mapping import CLASS_ID_TO_SIGN_CODE
+from .backends import load_model, resolve_backend
+from .batching import MicroBatcher
+from .inference_pool import InferencePool, in_pool_worker, pool_worker_backend
 from .performance_config import (
+    INFERENCE_BACKEND, INFERENCE_PRECISION, INFERENCE_POOL_WORKERS, MODEL_RELOAD_CHECK_INTERVAL,
     IMAGE_INPUT_SIZE, IMAGE_CONF_THRESHOLD,
+    IMAGE_MICRO_BATCH_ENABLED, IMAGE_MICRO_BATCH_MAX_SIZE, IMAGE_MICRO_BATCH_MAX_WAIT_MS,
+    IMAGE_TILING_ENABLED, IMAGE_TILING_MIN_SIDE, IMAGE_TILE_SIZE, IMAGE_TILE_OVERLAP,
+    IMAGE_TILE_SALIENCY_THRESHOLD, IMAGE_TILE_MAX_TILES, IMAGE_TILE_NMS_IOU,
     VIDEO_BATCH_SIZE, VIDEO_INPUT_SIZE, VIDEO_CONF_THRESHOLD,
-    VIDEO_TARGET_DETECTION_FPS,
-    FFMPEG_PRESET, FFMPEG_CRF
+    VIDEO_TARGET_DETECTION_FPS, VIDEO_SINGLE_PASS,
+    VIDEO_ADAPTIVE_SAMPLING, VIDEO_MIN_DETECTION_FPS, VIDEO_MAX_DETECTION_FPS,
+    VIDEO_SCENE_DIFF_THRESHOLD, VIDEO_SCENE_THUMB_SIZE,
+    VIDEO_TRACKING_ENABLED, TRACKER_LOW_CONF_THRESHOLD, TRACKER_MATCH_IOU, TRACKER_MAX_AGE_SECONDS,
+    VIDEO_PIPELINE_THREADED, VIDEO_PIPELINE_QUEUE_SIZE, VIDEO_PIPELINE_BUFFER_MB,
+    VIDEO_SEGMENT_PARALLEL, VIDEO_SEGMENT_MIN_SECONDS, VIDEO_SEGMENTS_PER_WORKER,
+)
+from .annotation import draw_detections
+from .metrics import FRAMES_TOTAL, VIDEO_PROCESSING_FPS, time_stage
+from .model_registry import ModelRegistry
+from .nms import nms_detections
+from .tiling import offset_detections, select_tiles
+from .frame_sampler import AdaptiveFrameSampler, FixedStrideSampler, format_sampling_report
+from .segment_parallel import (
+    check_segment_seeks, iter_segments, iter_stitched_results, merge_sampling_reports, plan_segments,
+    probe_keyframes,
+)
+from .segments import select_detections
+from .tracker import ByteTracker, TrackStage, run_track_stage
+from .video_encoder import open_video_writer
+from .video_pipeline import (
+    StagedPipeline, StrideDetectStage, AnnotateStage, EncodeStage,
+    read_frames, format_pipeline_report
 )
 
 
 BASE_DIR = Path(__file__).resolve().parent.parent
 OUTPUT_DIR = BASE_DIR / "media" / "results"
 OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
+OUTPUT_JPEG_QUALITY = 75  # Giống mặc định của PIL trước đây
 
 
-FONT_SIZE = 12  # tăng cỡ chữ cho video/ảnh
-TEXT_COLOR = (255, 0, 0)          # đỏ
-TEXT_BG_COLOR = (0, 0, 0, 160)    # nền đen trong suốt
-
-
-@lru_cache(maxsize=1)
-def _load_local_model():
-    weight_path = os.environ.get("YOLO_WEIGHTS") or config("YOLO_WEIGHTS", default=None)
-    if not weight_path:
-        weight_path = BASE_DIR / "ai_engine" / "YOLO11" / "best.pt"
-    weight_path = Path(weight_path)
-    if not weight_path.exists():
-        raise FileNotFoundError(f"YOLO weight file not found: {weight_path}")
-    
-    print("🔥 Loading YOLO model...")
-    model = YOLO(str(weight_path))
+def _load_weights(weight_path: Path, backend: str = None, precision: str = None):
+    """Load + warm-up. Returns: (model, backend, precision) đã thực sự load (sau fallback)"""
+    backend, precision = backend or INFERENCE_BACKEND, precision or INFERENCE_PRECISION
+    print(f"🔥 Loading YOLO model (backend: {backend}, precision: {precision})...")
+    model, backend, precision = load_model(backend, precision, weight_path)
     
     # Warm-up model với dummy inference để tăng tốc cho lần đầu
     print("⚡ Warming up model...")
@@ -51,7 +69,183 @@ def _load_local_model():
     except Exception as e:
         print(f"⚠️  Model warm-up failed (non-critical): {e}")
     
-    return model
+    return model, backend, precision
+
+
+def _load_model_handle(handle):
+    """Loader của model registry: inference pool riêng cho version (nếu bật pool), không thì model trong process"""
+    if INFERENCE_POOL_WORKERS > 0 and not in_pool_worker():
+        # Resolve (export nếu cần) một lần ở đây, các worker load đúng backend / precision này
+        handle.backend, handle.precision, _ = resolve_backend(INFERENCE_BACKEND, INFERENCE_PRECISION, handle.weight_path)
+        handle.pool = InferencePool(INFERENCE_POOL_WORKERS, handle.weight_path, handle.backend, handle.precision)
+        # Một job cho mỗi worker để pool khởi động đủ process (initializer load + warm-up model)
+        dummy = np.zeros((IMAGE_INPUT_SIZE, IMAGE_INPUT_SIZE, 3), dtype=np.uint8)
+        for future in [handle.pool.submit_images([dummy], IMAGE_CONF_THRESHOLD) for _ in range(handle.pool.workers)]:
+            future.result()
+    else:
+        # Worker của pool: load đúng backend / precision process cha đã resolve cho pool
+        backend, precision = pool_worker_backend() or (INFERENCE_BACKEND, INFERENCE_PRECISION)
+        handle.model, handle.backend, handle.precision = _load_weights(handle.weight_path, backend, precision)
+
+
+def _close_model_handle(handle):
+    """Version đã bị thay và không còn job nào dùng: dừng pool (job đã gửi vẫn chạy xong), bỏ model"""
+    if handle.pool is not None:
+        handle.pool.shutdown(wait=False, cancel_futures=False)
+    print(f"♻️  Model version {handle.version} released")
+
+
+model_registry = ModelRegistry(_load_model_handle, _close_model_handle, check_interval=MODEL_RELOAD_CHECK_INTERVAL)
+_local_model_lock = threading.Lock()
+
+
+def _load_local_model():
+    """Model YOLO trong process hiện tại, thuộc version job đang pin (hoặc version active)"""
+    handle = model_registry.current()
+    if handle.model is None:
+        # Bật inference pool: process gửi job chỉ load model khi phải chạy local (chế độ 2 pass)
+        with _local_model_lock:
+            if handle.model is None:
+                handle.model, _, _ = _load_weights(handle.weight_path, handle.backend, handle.precision)
+    return handle.model
+
+
+def _current_pool():
+    """Inference pool của version đang dùng, None nếu pool bị tắt"""
+    return model_registry.current().pool
+
+
+def _replace_broken_pool(handle, pool):
+    """Worker của pool bị kill (BrokenProcessPool): tạo pool mới cho cùng version, job sau dùng pool mới"""
+    with _local_model_lock:
+        if handle.pool is pool:
+            pool.shutdown(wait=False)
+            handle.pool = InferencePool(INFERENCE_POOL_WORKERS, handle.weight_path, handle.backend, handle.precision)
+
+
+def pin_model():
+    """
+    with pin_model() as model: ... -> cả job chạy trên cùng một version model (model.version),
+    kể cả khi weights được hot reload giữa chừng
+    """
+    return model_registry.pin()
+
+
+def active_model_version() -> str:
+    """Version model mà inference trong thread này sẽ dùng (version job đang pin, hoặc version active)"""
+    return model_registry.current().version
+
+
+def reload_model(force: bool = False, background: bool = False):
+    """Load lại YOLO_WEIGHTS và chuyển request mới sang version mới (xem ai_engine/model_registry.py)"""
+    return model_registry.reload(force=force, background=background)
+
+
+# Trạng thái load model lần đầu cho readiness check: not_loaded -> loading -> ready | failed
+_model_state = {"state": "not_loaded", "error": None, "fork_threads": None}
+_model_state_lock = threading.Lock()
+
+
+def preload_model(fork_safe: bool = False, background: bool = False) -> bool:
+    """
+    Load + warm-up model ngay thay vì ở request đầu tiên. Trả về True nếu model đã sẵn sàng
+    
+    fork_safe=True: gọi trong master process trước khi fork (gunicorn preload_app). Warm-up chạy với
+    1 thread torch để không có thread pool nào bị fork, các worker gọi after_fork() để lấy lại số thread.
+    Weights nằm trong bộ nhớ của master nên các worker dùng chung (copy-on-write).
+    Chỉ backend torch được load trước fork: session onnxruntime / openvino giữ thread pool riêng,
+    không dùng được sau fork, nên với các backend này mỗi worker tự load sau fork.
+    
+    Khi bật inference pool, model nằm trong các worker process của pool: preload khởi động pool
+    và đợi các worker warm-up xong (không làm trước fork).
+    background=True: load trong thread nền, trả về ngay
+    """
+    with _model_state_lock:
+        if model_registry.loaded:
+            return True
+        if _model_state["state"] == "loading":
+            return False
+        if fork_safe and (INFERENCE_BACKEND != 'torch' or INFERENCE_POOL_WORKERS > 0):
+            print(f"ℹ️  Model preload deferred to workers (backend: {INFERENCE_BACKEND}, inference pool workers: {INFERENCE_POOL_WORKERS})")
+            return False
+        _model_state.update(state="loading", error=None)
+
+    if background:
+        threading.Thread(target=_preload, args=(fork_safe,), name="model-preload", daemon=True).start()
+        return False
+    return _preload(fork_safe)
+
+
+def _preload(fork_safe: bool) -> bool:
+    try:
+        if fork_safe:
+            import torch
+            _model_state["fork_threads"] = torch.get_num_threads()
+            torch.set_num_threads(1)
+        handle = model_registry.active()
+        if fork_safe:
+            # Chuyển object hiện có sang generation cố định: GC của worker không chạm vào (không ghi
+            # refcount / header) nên các trang bộ nhớ chứa weights không bị copy sau fork
+            gc.freeze()
+    except Exception as e:
+        with _model_state_lock:
+            _model_state.update(state="failed", error=str(e))
+        print(f"❌ Model preload failed: {e}")
+        return False
+    with _model_state_lock:
+        _model_state["state"] = "ready"
+    print(f"✅ Model ready ({handle.version})")
+    return True
+
+
+def after_fork(preload: bool = True):
+    """
+    Gọi trong worker process ngay sau fork (gunicorn post_fork)
+    Bỏ các thread / process pool kế thừa từ master (không chạy trong process con),
+    khôi phục số thread torch, và load model ở nền nếu master chưa preload (preload=True)
+    """
+    global _image_batcher, _image_batcher_lock, _local_model_lock
+    _image_batcher = None
+    _image_batcher_lock = threading.Lock()
+    _local_model_lock = threading.Lock()
+    model_registry.after_fork()
+    fork_threads = _model_state.get("fork_threads")
+    if fork_threads:
+        import torch
+        torch.set_num_threads(fork_threads)
+    with _model_state_lock:
+        if _model_state["state"] == "loading":
+            # Thread load của master không tồn tại trong process con
+            _model_state["state"] = "not_loaded"
+    if preload:
+        preload_model(background=True)
+
+
+def model_status() -> dict:
+    """Trạng thái model cho readiness endpoint: version active, version cũ còn job đang chạy, trạng thái reload"""
+    registry = model_registry.status()
+    with _model_state_lock:
+        state = dict(_model_state)
+    if registry["active"] is not None:
+        # Có thể đã được load lazily bởi một request thay vì preload
+        state["state"] = "ready"
+    status = {
+        "ready": state["state"] == "ready",
+        "state": state["state"],
+        "backend": INFERENCE_BACKEND,
+        "precision": INFERENCE_PRECISION,
+    }
+    if registry["active"] is not None:
+        # Backend / precision đã thực sự load (có thể đã fallback so với cấu hình)
+        status["backend"] = registry["active"]["backend"]
+        status["precision"] = registry["active"]["precision"]
+        status["model_version"] = registry["active"]["version"]
+        status["loaded_at"] = registry["active"]["loaded_at"]
+        status["retiring"] = registry["retiring"]
+        status["reload"] = registry["reload"]
+    if state["error"] and not status["ready"]:
+        status["error"] = state["error"]
+    return status
 
 
 def _run_yolo_on_image(image_path: Path, conf: float) -> Tuple[list, tuple]:
@@ -63,7 +257,8 @@ def _run_yolo_on_image(image_path: Path, conf: float) -> Tuple[list, tuple]:
     print(f"   Input size: {IMAGE_INPUT_SIZE}x{IMAGE_INPUT_SIZE}, Confidence: {conf}")
     
     # Đọc ảnh gốc
-    img = cv2.imread(str(image_path))
+    with time_stage("decode"):
+        img = cv2.imread(str(image_path))
     if img is None:
         raise ValueError(f"Cannot read image: {image_path}")
     
@@ -71,25 +266,32 @@ def _run_yolo_on_image(image_path: Path, conf: float) -> Tuple[list, tuple]:
     original_size = (original_w, original_h)
     
     # Resize về IMAGE_INPUT_SIZE để inference (độ chính xác cao)
-    img_resized = cv2.resize(img, (IMAGE_INPUT_SIZE, IMAGE_INPUT_SIZE))
+    with time_stage("resize"):
+        img_resized = cv2.resize(img, (IMAGE_INPUT_SIZE, IMAGE_INPUT_SIZE))
+    
+    # Ảnh độ phân giải cao: tiled inference ở độ phân giải gốc
+    if IMAGE_TILING_ENABLED and max(original_size) >= IMAGE_TILING_MIN_SIDE:
+        detections = _run_tiled_inference(img, img_resized, conf)
+        print(f"   ✅ Detected {len(detections)} signs")
+        return detections, original_size
     
     # Run YOLO inference với settings tối ưu cho ảnh
-    model = _load_local_model()
-    results = model.predict(
-        source=img_resized, 
-        conf=conf, 
-        verbose=False,
-        iou=0.5,  # IoU threshold cho NMS
-        max_det=100  # Tăng số detection tối đa
-    )
-    detections = _convert_results(results)
+    # Gom với các request đồng thời khác thành 1 batch nếu bật micro-batching
+    batcher = _get_image_batcher()
+    if batcher is not None:
+        detections = batcher((img_resized, conf, model_registry.current()))
+    else:
+        detections = _infer_images([img_resized], conf)[0]
     
     print(f"   ✅ Detected {len(detections)} signs")
     
     # Scale bounding boxes về kích thước ảnh gốc
-    scale_x = original_w / IMAGE_INPUT_SIZE
-    scale_y = original_h / IMAGE_INPUT_SIZE
+    _scale_detections(detections, original_w / IMAGE_INPUT_SIZE, original_h / IMAGE_INPUT_SIZE)
     
+    return detections, original_size
+
+
+def _scale_detections(detections: list, scale_x: float, scale_y: float) -> list:
     for det in detections:
         bbox = det.get("bbox", [])
         if len(bbox) == 4:
@@ -100,8 +302,109 @@ def _run_yolo_on_image(image_path: Path, conf: float) -> Tuple[list, tuple]:
                 x2 * scale_x,
                 y2 * scale_y
             ]
+    return detections
+
+
+def _run_tiled_inference(img, img_resized, conf: float) -> list:
+    """
+    Chạy model trên ảnh thu nhỏ toàn cảnh + các tile salient ở độ phân giải gốc trong một lần predict,
+    gộp kết quả bằng NMS theo class
+    """
+    original_h, original_w = img.shape[:2]
+    tiles, total_tiles = select_tiles(
+        img, IMAGE_TILE_SIZE, IMAGE_TILE_OVERLAP, IMAGE_TILE_SALIENCY_THRESHOLD, IMAGE_TILE_MAX_TILES
+    )
+    print(f"   🧩 Tiled inference: {len(tiles)}/{total_tiles} tiles ({IMAGE_TILE_SIZE}px, overlap {IMAGE_TILE_OVERLAP})")
     
-    return detections, original_size
+    crops = [img[y1:y2, x1:x2] for x1, y1, x2, y2 in tiles]
+    outputs = _infer_images([img_resized] + crops, conf)
+    
+    detections = _scale_detections(outputs[0], original_w / IMAGE_INPUT_SIZE, original_h / IMAGE_INPUT_SIZE)
+    for tile, tile_detections in zip(tiles, outputs[1:]):
+        detections.extend(offset_detections(tile_detections, tile))
+    return nms_detections(detections, iou_threshold=IMAGE_TILE_NMS_IOU)
+
+
+def predict_frame(frame, conf: float = None) -> list:
+    """
+    Detect trên một frame BGR trong bộ nhớ (live stream), bbox theo kích thước frame
+    Đi qua micro-batcher nên nhiều stream đồng thời được gom chung một lần forward
+    """
+    if conf is None:
+        conf = VIDEO_CONF_THRESHOLD
+    height, width = frame.shape[:2]
+    with time_stage("resize"):
+        frame_resized = cv2.resize(frame, (VIDEO_INPUT_SIZE, VIDEO_INPUT_SIZE))
+    batcher = _get_image_batcher()
+    if batcher is not None:
+        detections = batcher((frame_resized, conf, model_registry.current()))
+    else:
+        detections = _infer_images([frame_resized], conf)[0]
+    return _scale_detections(detections, width / VIDEO_INPUT_SIZE, height / VIDEO_INPUT_SIZE)
+
+
+def _predict_images_local(images: list, conf: float, model=None) -> list:
+    """Một lần forward cho nhiều ảnh đã resize về IMAGE_INPUT_SIZE, trả về detections theo từng ảnh"""
+    model = model or _load_local_model()
+    with time_stage("inference"):
+        results = model.predict(
+            source=images, 
+            conf=conf, 
+            verbose=False,
+            iou=0.5,  # IoU threshold cho NMS
+            max_det=100  # Tăng số detection tối đa
+        )
+    with time_stage("postprocess"):
+        return [_convert_results([res]) for res in results]
+
+
+def _infer_images(images: list, conf: float, handle=None) -> list:
+    """Dispatch sang inference pool của version model nếu được bật, không thì chạy local"""
+    handle = handle or model_registry.current()
+    pool = handle.pool
+    if pool is None:
+        return _predict_images_local(images, conf, handle.model)
+    try:
+        return pool.submit_images(images, conf).result()
+    except BrokenProcessPool:
+        _replace_broken_pool(handle, pool)
+        raise
+
+
+def _infer_image_batch(items: list) -> list:
+    """
+    Batch function cho micro-batcher: items là [(img_resized, conf, model_handle)],
+    gom theo conf và version model của caller (request đến trước hot reload vẫn chạy version cũ)
+    """
+    outputs = [None] * len(items)
+    groups = {}
+    for i, (_, conf, handle) in enumerate(items):
+        groups.setdefault((conf, handle), []).append(i)
+    for (conf, handle), indices in groups.items():
+        detections_batch = _infer_images([items[i][0] for i in indices], conf, handle)
+        for i, detections in zip(indices, detections_batch):
+            outputs[i] = detections
+    return outputs
+
+
+_image_batcher = None
+_image_batcher_lock = threading.Lock()
+
+
+def _get_image_batcher():
+    """Micro-batcher dùng chung trong process, None nếu tắt IMAGE_MICRO_BATCH_ENABLED"""
+    global _image_batcher
+    if not IMAGE_MICRO_BATCH_ENABLED:
+        return None
+    with _image_batcher_lock:
+        if _image_batcher is None:
+            _image_batcher = MicroBatcher(
+                _infer_image_batch,
+                max_batch_size=IMAGE_MICRO_BATCH_MAX_SIZE,
+                max_wait_ms=IMAGE_MICRO_BATCH_MAX_WAIT_MS,
+                name="image-micro-batcher",
+            )
+        return _image_batcher
 
 
 def _convert_results(results) -> list:
@@ -133,21 +436,17 @@ def _get_sign_code_label(det: dict) -> str:
 
 
 def _draw_and_save(image_path: Path, detections: list) -> Path:
-    img = Image.open(image_path).convert("RGBA")
-    draw = ImageDraw.Draw(img)
-    font = _get_font()
-    for det in detections:
-        bbox = det.get("bbox")
-        if not bbox or len(bbox) != 4:
-            continue
-        x1, y1, x2, y2 = bbox
-        draw.rectangle([x1, y1, x2, y2], outline=TEXT_COLOR, width=2)
-        # Sử dụng mã biển báo thay vì tên
-        label = _get_sign_code_label(det)
-        _draw_label_with_bg(draw, (x1, max(0, y1 - FONT_SIZE)), label, font)
+    # Đọc bằng OpenCV như lúc inference (cùng hướng xoay EXIF) để box khớp ảnh
+    with time_stage("decode"):
+        img = cv2.imread(str(image_path))
+    if img is None:
+        raise ValueError(f"Cannot read image: {image_path}")
+    with time_stage("draw"):
+        _draw_boxes_on_frame(img, detections)
     run_name = f"img_{uuid.uuid4().hex}"
     out_path = OUTPUT_DIR / f"{run_name}.jpg"
-    img.convert("RGB").save(out_path)
+    with time_stage("encode"):
+        cv2.imwrite(str(out_path), img, [cv2.IMWRITE_JPEG_QUALITY, OUTPUT_JPEG_QUALITY])
     return out_path
 
 
@@ -159,25 +458,37 @@ def predict_image(image_path: Path, conf: float = None):
     return detections
 
 
-def predict_image_with_save(image_path: Path, conf: float = None) -> Tuple[list, Path]:
-    """Predict và save ảnh với độ chính xác cao nhất"""
+def predict_image_with_save(image_path: Path, conf: float = None, candidate_conf: float = None) -> Tuple[list, Path]:
+    """
+    Predict và save ảnh với độ chính xác cao nhất
+    candidate_conf < conf: YOLO chạy với candidate_conf, detections trả về có cả candidate confidence < conf
+    (chỉ box >= conf được vẽ)
+    """
     if conf is None:
         conf = IMAGE_CONF_THRESHOLD
-    detections, _ = _run_yolo_on_image(image_path, conf=conf)
-    out_path = _draw_and_save(image_path, detections)
+    infer_conf = conf if candidate_conf is None else min(conf, candidate_conf)
+    detections, _ = _run_yolo_on_image(image_path, conf=infer_conf)
+    out_path = _draw_and_save(image_path, select_detections(detections, conf))
     return detections, out_path
 
 
 def _run_yolo_batch(model, frames_batch: list, conf: float, original_size: tuple) -> list:
     """Xử lý batch của frames cho video"""
-    results = model.predict(
-        source=frames_batch, 
-        conf=conf, 
-        verbose=False, 
-        stream=False,
-        iou=0.6  # IoU cao hơn cho video
-    )
+    with time_stage("inference"):
+        results = model.predict(
+            source=frames_batch, 
+            conf=conf, 
+            verbose=False, 
+            stream=False,
+            iou=0.6  # IoU cao hơn cho video
+        )
     
+    with time_stage("postprocess"):
+        return _convert_video_results(results, original_size)
+
+
+def _convert_video_results(results, original_size: tuple) -> list:
+    """Detections theo từng frame, bbox scale từ VIDEO_INPUT_SIZE về kích thước gốc"""
     original_w, original_h = original_size
     scale_x = original_w / VIDEO_INPUT_SIZE
     scale_y = original_h / VIDEO_INPUT_SIZE
@@ -201,8 +512,16 @@ def _run_yolo_batch(model, frames_batch: list, conf: float, original_size: tuple
     return all_detections
 
 
-def predict_video_with_save(video_path: Path, conf: float = None) -> Tuple[list, Path, float]:
-    """Xử lý video với cấu hình tối ưu riêng"""
+def predict_video_with_save(video_path: Path, conf: float = None, stats: dict = None,
+                            aggregator=None, candidate_conf: float = None) -> Tuple[list, Path, float]:
+    """
+    Xử lý video với cấu hình tối ưu riêng
+    Nếu truyền dict `stats`, thống kê xử lý (thời gian từng stage của pipeline) được ghi vào đó
+    Nếu truyền `aggregator` (ai_engine/segments.py), detections của từng frame detect được gửi vào đó ngay khi có
+    kết quả và aggregator.segments sẵn sàng khi hàm trả về; results trả về khi đó là [] (không giữ cả video)
+    Nếu truyền `candidate_conf` < conf, YOLO chạy với ngưỡng này và kết quả có thêm candidate (confidence < conf,
+    không có track_id, không được vẽ); lọc lại bằng select_detections(detections, conf)
+    """
     if conf is None:
         conf = VIDEO_CONF_THRESHOLD
     
@@ -220,169 +539,359 @@ def predict_video_with_save(video_path: Path, conf: float = None) -> Tuple[list,
     total_frames_orig = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
     duration = total_frames_orig / fps if fps > 0 else 0
 
-    temp_path = OUTPUT_DIR / f"temp_{uuid.uuid4().hex}.mp4"
     out_path = OUTPUT_DIR / f"vid_{uuid.uuid4().hex}.mp4"
+    on_result = None
+    if aggregator is not None:
+        aggregator.start(fps)
+        on_result = aggregator.add
+
+    # Video dài + có inference pool: chia segment theo keyframe, xử lý song song trên các worker
+    segments = _plan_video_segments(video_path, fps, total_frames_orig)
+    if segments:
+        cap.release()
+        print(f"📹 Video gốc: {fps:.1f}fps, {duration:.1f}s, {total_frames_orig} frames")
+        started = time.perf_counter()
+        segment_stats = stats if stats is not None else {}
+        results = _process_video_segments(
+            video_path, segments, conf, fps, out_path, segment_stats, on_result, candidate_conf
+        )
+        if aggregator is not None:
+            aggregator.finish()
+        _record_video_metrics(segment_stats.get("sampling", {}), time.perf_counter() - started)
+        return results, out_path, float(fps)
     
     # Sử dụng config từ performance_config
-    frame_stride = max(1, int(fps / VIDEO_TARGET_DETECTION_FPS))  # Tính frame_stride dựa trên FPS gốc
+    frame_stride = _frame_stride(fps)  # Tính frame_stride dựa trên FPS gốc
+    sampler = _create_frame_sampler(fps, frame_stride)
     
     print(f"📹 Video gốc: {fps:.1f}fps, {duration:.1f}s, {total_frames_orig} frames")
-    print(f"📹 Detection: stride={frame_stride}, chỉ detect mỗi {frame_stride} frame")
+    if VIDEO_ADAPTIVE_SAMPLING:
+        print(f"📹 Detection: adaptive, mỗi {sampler.min_gap}-{sampler.max_gap} frame tùy mức thay đổi của cảnh")
+    else:
+        print(f"📹 Detection: stride={frame_stride}, chỉ detect mỗi {frame_stride} frame")
     print(f"📹 Output: {fps:.1f}fps (giữ FPS gốc), ghi TẤT CẢ frames")
     
     # GHI VIDEO VỚI FPS GỐC để giữ đúng thời lượng
     # Chỉ detect trên một số frames nhưng GHI TẤT CẢ frames
-    fourcc = cv2.VideoWriter_fourcc(*"mp4v")
-    writer = cv2.VideoWriter(str(temp_path), fourcc, fps, (width, height))
+    writer = open_video_writer(out_path, fps, (width, height), duration)
     
     if not writer.isOpened():
         raise RuntimeError("Cannot initialize video writer. Please check OpenCV installation.")
 
-    results = []
-    frame_idx = 0
-    batch_size = VIDEO_BATCH_SIZE  # Sử dụng config riêng cho video
-    
     # Lưu kích thước gốc để scale bounding boxes
     original_size = (width, height)
+    started = time.perf_counter()
+    
+    try:
+        if VIDEO_SINGLE_PASS:
+            results, pipeline_report = _process_video_pipeline(
+                cap, writer, conf, original_size, sampler, fps, on_result=on_result, candidate_conf=candidate_conf
+            )
+            print(format_pipeline_report(pipeline_report))
+            if stats is not None:
+                stats["pipeline"] = pipeline_report
+        else:
+            results = _process_video_two_pass(
+                cap, writer, _load_local_model(), conf, original_size, sampler, fps, on_result=on_result,
+                candidate_conf=candidate_conf,
+            )
+    finally:
+        cap.release()
+        writer.release()
+    if aggregator is not None:
+        aggregator.finish()
     
-    # Batch processing
-    model = _load_local_model()
+    sampling_report = sampler.report()
+    print(format_sampling_report(sampling_report))
+    if stats is not None:
+        stats["sampling"] = sampling_report
+    
+    # ffmpeg pipe: đợi encoder ghi xong; OpenCV writer: transcode file tạm sang H.264
+    out_path = writer.finalize()
+    _record_video_metrics(sampling_report, time.perf_counter() - started)
+
+    # Trả về FPS GỐC để tính thời gian xuất hiện ĐÚNG
+    # output_fps chỉ dùng để ghi video, không dùng để tính thời gian!
+    return results, out_path, float(fps)
+
+
+def _record_video_metrics(sampling_report: dict, wall_seconds: float):
+    frames = sampling_report.get("frames", 0)
+    FRAMES_TOTAL.inc(frames, source="video", kind="decoded")
+    FRAMES_TOTAL.inc(sampling_report.get("sampled", 0), source="video", kind="inferred")
+    if wall_seconds > 0:
+        VIDEO_PROCESSING_FPS.set(frames / wall_seconds)
+
+
+def _frame_stride(fps: float) -> int:
+    return max(1, int(fps / VIDEO_TARGET_DETECTION_FPS))
+
+
+def _plan_video_segments(video_path: Path, fps: float, total_frames: int):
+    """
+    Danh sách segment (start, end) cho chế độ segment-parallel,
+    None nếu chế độ bị tắt, không có inference pool / ffmpeg, video quá ngắn để chia
+    hoặc seek không tới đúng frame đầu segment (khi đó dùng single-pass)
+    """
+    if not VIDEO_SEGMENT_PARALLEL or not VIDEO_SINGLE_PASS:
+        return None
+    pool = _current_pool()
+    if pool is None or pool.workers < 2 or not shutil.which('ffmpeg'):
+        return None
+    min_frames = int(VIDEO_SEGMENT_MIN_SECONDS * fps)
+    if total_frames < 2 * min_frames:
+        return None
+    segments = plan_segments(
+        probe_keyframes(video_path), total_frames, pool.workers * VIDEO_SEGMENTS_PER_WORKER, min_frames
+    )
+    if len(segments) < 2:
+        return None
+    if not check_segment_seeks(video_path, segments, fps):
+        print(f"⚠️  Seek không tới đúng frame đầu segment (timestamp lệch), xử lý single-pass")
+        return None
+    return segments
+
+
+def _process_video_segments(video_path: Path, segments: list, conf: float, fps: float, out_path: Path,
+                            stats: dict = None, on_result=None, candidate_conf: float = None) -> list:
+    """
+    Xử lý các segment song song trên inference pool (ai_engine/segment_parallel.py),
+    ghép video output và nối detections với frame_index toàn cục theo từng segment khi segment đó xong
+    on_result(frame_index, detections): nhận từng frame đã nối thay vì trả về list (khi đó trả về [])
+    """
+    handle = model_registry.current()
+    pool = handle.pool
+    print(f"🧩 Segment-parallel: {len(segments)} segments (bắt đầu tại keyframe) trên {pool.workers} workers")
+    start = time.perf_counter()
+    reports = []  # Chỉ giữ report của từng segment, detections được nối rồi bỏ ngay
+
+    outputs = iter_segments(pool, video_path, segments, conf, fps, out_path, candidate_conf)
+
+    def completed_segments():
+        for output in outputs:
+            reports.append({key: output[key] for key in ("start_frame", "pipeline", "sampling")})
+            yield output
+
+    stitched = iter_stitched_results(
+        completed_segments(), match_iou=TRACKER_MATCH_IOU, max_gap=int(fps * TRACKER_MAX_AGE_SECONDS)
+    )
+    results = []
+    try:
+        if on_result is None:
+            results = list(stitched)
+        else:
+            for entry in stitched:
+                on_result(entry["frame_index"], entry["detections"])
+    except BrokenProcessPool:
+        _replace_broken_pool(handle, pool)
+        raise
+    finally:
+        # on_result lỗi giữa chừng: hủy các segment chưa chạy và xóa file tạm ngay
+        outputs.close()
+    wall_seconds = time.perf_counter() - start
+
+    sampling_report = merge_sampling_reports([report["sampling"] for report in reports])
+    print(f"✅ {len(segments)} segments processed and concatenated in {wall_seconds:.2f}s")
+    print(format_sampling_report(sampling_report))
+    if stats is not None:
+        stats["sampling"] = sampling_report
+        stats["segments"] = {
+            "wall_seconds": round(wall_seconds, 4),
+            "segments": [
+                {"start_frame": report["start_frame"], "pipeline": report["pipeline"]} for report in reports
+            ],
+        }
+    return results
+
+
+def _create_frame_sampler(fps: float, frame_stride: int):
+    if not VIDEO_ADAPTIVE_SAMPLING:
+        return FixedStrideSampler(frame_stride)
+    return AdaptiveFrameSampler(
+        fps,
+        min_fps=VIDEO_MIN_DETECTION_FPS,
+        max_fps=VIDEO_MAX_DETECTION_FPS,
+        diff_threshold=VIDEO_SCENE_DIFF_THRESHOLD,
+        thumb_size=VIDEO_SCENE_THUMB_SIZE,
+        base_fps=VIDEO_TARGET_DETECTION_FPS,
+    )
+
+
+def _create_track_stage(fps: float, conf: float, on_result=None, candidate_conf: float = None) -> Tuple[object, float]:
+    """
+    TrackStage mới cho mỗi video (None nếu tắt VIDEO_TRACKING_ENABLED) và confidence để chạy YOLO
+    Khi có tracker, YOLO chạy với TRACKER_LOW_CONF_THRESHOLD, `conf` thành ngưỡng tạo track mới
+    candidate_conf: YOLO chạy với ngưỡng này nếu thấp hơn, box không được gán track vẫn có trong kết quả
+    """
+    infer_conf = conf if candidate_conf is None else min(conf, candidate_conf)
+    if not VIDEO_TRACKING_ENABLED:
+        return None, infer_conf
+    low_conf = min(conf, TRACKER_LOW_CONF_THRESHOLD)
+    track_stage = TrackStage(ByteTracker(
+        high_threshold=conf,
+        low_threshold=low_conf,
+        match_iou=TRACKER_MATCH_IOU,
+        max_age=int(fps * TRACKER_MAX_AGE_SECONDS),
+    ), on_result=on_result, keep_dropped=candidate_conf is not None)
+    return track_stage, min(infer_conf, low_conf)
+
+
+def _process_video_pipeline(cap, writer, conf: float, original_size: tuple, sampler, fps: float,
+                            max_frames: int = None, on_result=None, candidate_conf: float = None) -> Tuple[list, dict]:
+    """
+    Decode video đúng 1 lần qua pipeline decode -> infer -> draw -> encode
+    
+    Frame decode sau một frame đang chờ detect được giữ trong look-behind buffer của stage infer
+    (tối đa VIDEO_PIPELINE_BUFFER_MB, đầy thì decode chờ kết quả detect),
+    kết quả vẽ giống hệt chế độ 2 pass. Với VIDEO_PIPELINE_THREADED mỗi stage chạy một thread,
+    nối bằng queue VIDEO_PIPELINE_QUEUE_SIZE phần tử.
+    Nếu inference pool được bật, các batch được gửi sang pool (tối đa 1 batch / worker cùng lúc).
+    Với VIDEO_TRACKING_ENABLED có thêm stage track giữa infer và draw (box nội suy theo track).
+    max_frames: chỉ xử lý tối đa max_frames frames từ vị trí hiện tại của cap (một segment của video)
+    on_result(frame_index, detections): nhận kết quả từng frame detect (sau tracker) thay vì results
+    candidate_conf: xem predict_video_with_save, chỉ box >= conf (hoặc đã gán track) được vẽ
+    Returns: (results, pipeline_report), results là [] khi có on_result
+    """
+    print(f"🔍 Single pass: decode -> infer -> draw -> encode...")
+    draw_fn = _candidate_draw_fn(conf, candidate_conf)
+    track_stage, conf = _create_track_stage(fps, conf, on_result, candidate_conf)
+    detect_on_result = None if track_stage else on_result
+    handle = model_registry.current()
+    pool = handle.pool
+    if pool is not None:
+        detect_stage = StrideDetectStage(
+            submit_batch=lambda frames_batch: pool.submit_batch(frames_batch, conf, original_size),
+            max_in_flight=pool.workers,
+            sampler=sampler,
+            batch_size=VIDEO_BATCH_SIZE,
+            input_size=VIDEO_INPUT_SIZE,
+            on_result=detect_on_result,
+            max_buffer_bytes=VIDEO_PIPELINE_BUFFER_MB * 1024 * 1024,
+        )
+    else:
+        model = _load_local_model()
+        detect_stage = StrideDetectStage(
+            run_batch=lambda frames_batch: _run_yolo_batch(model, frames_batch, conf, original_size),
+            sampler=sampler,
+            batch_size=VIDEO_BATCH_SIZE,
+            input_size=VIDEO_INPUT_SIZE,
+            on_result=detect_on_result,
+            max_buffer_bytes=VIDEO_PIPELINE_BUFFER_MB * 1024 * 1024,
+        )
+    stages = [detect_stage] + ([track_stage] if track_stage else [])
+    pipeline = StagedPipeline(
+        read_frames(cap, max_frames),
+        stages + [AnnotateStage(draw_fn), EncodeStage(writer)],
+        queue_size=VIDEO_PIPELINE_QUEUE_SIZE,
+        threaded=VIDEO_PIPELINE_THREADED,
+    )
+    try:
+        report = pipeline.run()
+    except BrokenProcessPool:
+        _replace_broken_pool(handle, pool)
+        raise
+    return (track_stage or detect_stage).results, report
+
+
+def _process_video_two_pass(cap, writer, model, conf: float, original_size: tuple, sampler, fps: float,
+                            on_result=None, candidate_conf: float = None) -> list:
+    """
+    Chế độ cũ: pass 1 detect, pass 2 decode lại từ đầu để vẽ và ghi
+    on_result(frame_index, detections), candidate_conf giống _process_video_pipeline (results là [] khi có on_result)
+    """
+    draw_fn = _candidate_draw_fn(conf, candidate_conf)
+    track_stage, conf = _create_track_stage(fps, conf, on_result, candidate_conf)
+    results = []
+    # Có tracker thì kết quả (đã gán track_id) do track_stage trả ra ở pass 2
+    emit = on_result or (lambda idx, detections: results.append({"frame_index": idx, "detections": detections}))
+    frame_idx = 0
+    batch_size = VIDEO_BATCH_SIZE  # Sử dụng config riêng cho video
     frames_batch = []
     frames_data = []
 
     # Cache detections cho các frames đã detect
     frame_detections_map = {}  # {frame_idx: detections}
     
-    try:
-        # PASS 1: Detect trên các frames theo stride
-        print(f"🔍 Pass 1: Detection...")
-        while True:
-            ret, frame = cap.read()
-            if not ret:
-                # Xử lý batch cuối cùng nếu còn
-                if frames_batch:
-                    detections_batch = _run_yolo_batch(model, frames_batch, conf, original_size)
-                    for i, (_, idx) in enumerate(frames_data):
-                        frame_detections_map[idx] = detections_batch[i]
-                        results.append({"frame_index": idx, "detections": detections_batch[i]})
-                break
-
-            if frame_idx % frame_stride == 0:
-                # Resize frame cho inference với VIDEO_INPUT_SIZE
-                frame_resized = cv2.resize(frame, (VIDEO_INPUT_SIZE, VIDEO_INPUT_SIZE))
-                frames_batch.append(frame_resized)
-                frames_data.append((None, frame_idx))  # Không cần lưu frame gốc
-                
-                # Khi đủ batch_size thì xử lý
-                if len(frames_batch) >= batch_size:
-                    detections_batch = _run_yolo_batch(model, frames_batch, conf, original_size)
-                    for i, (_, idx) in enumerate(frames_data):
-                        frame_detections_map[idx] = detections_batch[i]
-                        results.append({"frame_index": idx, "detections": detections_batch[i]})
-                    frames_batch = []
-                    frames_data = []
-                
-            frame_idx += 1
-        
-        # PASS 2: Ghi TẤT CẢ frames với detections từ frame gần nhất
-        print(f"✍️  Pass 2: Writing all frames with detections...")
-        cap.set(cv2.CAP_PROP_POS_FRAMES, 0)  # Reset về đầu video
-        frame_idx = 0
-        last_detections = []  # Cache detection gần nhất
-        
-        while True:
-            ret, frame = cap.read()
-            if not ret:
-                break
+    # PASS 1: Detect trên các frames theo stride
+    print(f"🔍 Pass 1: Detection...")
+    while True:
+        ret, frame = cap.read()
+        if not ret:
+            # Xử lý batch cuối cùng nếu còn
+            if frames_batch:
+                detections_batch = _run_yolo_batch(model, frames_batch, conf, original_size)
+                for i, (_, idx) in enumerate(frames_data):
+                    frame_detections_map[idx] = detections_batch[i]
+                    if track_stage is None:
+                        emit(idx, detections_batch[i])
+            break
+
+        if sampler.should_sample(frame_idx, frame):
+            # Resize frame cho inference với VIDEO_INPUT_SIZE
+            frame_resized = cv2.resize(frame, (VIDEO_INPUT_SIZE, VIDEO_INPUT_SIZE))
+            frames_batch.append(frame_resized)
+            frames_data.append((None, frame_idx))  # Không cần lưu frame gốc
             
-            # Nếu frame này có detections thì dùng, không thì dùng detections gần nhất
-            if frame_idx in frame_detections_map:
-                last_detections = frame_detections_map[frame_idx]
+            # Khi đủ batch_size thì xử lý
+            if len(frames_batch) >= batch_size:
+                detections_batch = _run_yolo_batch(model, frames_batch, conf, original_size)
+                for i, (_, idx) in enumerate(frames_data):
+                    frame_detections_map[idx] = detections_batch[i]
+                    if track_stage is None:
+                        emit(idx, detections_batch[i])
+                frames_batch = []
+                frames_data = []
             
-            # Vẽ detections lên frame
-            if last_detections:
-                _draw_boxes_on_frame(frame, last_detections)
-            
-            # GHI TẤT CẢ frames
+        frame_idx += 1
+    
+    # PASS 2: Ghi TẤT CẢ frames với detections từ frame gần nhất
+    print(f"✍️  Pass 2: Writing all frames with detections...")
+    cap.set(cv2.CAP_PROP_POS_FRAMES, 0)  # Reset về đầu video
+    
+    if track_stage is not None:
+        # Gán track_id và nội suy box cho các frame giữa 2 lần detect
+        def _draw_and_write(frame_idx, frame, detections):
+            if detections:
+                draw_fn(frame, detections)
             writer.write(frame)
-            frame_idx += 1
-    finally:
-        cap.release()
-        writer.release()
+        
+        run_track_stage(
+            track_stage,
+            ((idx, frame, frame_detections_map.pop(idx, None)) for idx, frame in read_frames(cap)),
+            _draw_and_write,
+        )
+        return track_stage.results
     
-    # Convert video sang H.264 để tương thích với web browsers
-    try:
-        import subprocess
-        print(f"🔄 Converting video to H.264 for web compatibility...")
+    frame_idx = 0
+    last_detections = []  # Cache detection gần nhất
+    
+    while True:
+        ret, frame = cap.read()
+        if not ret:
+            break
         
-        # FFmpeg với các flags tối ưu cho web streaming
-        result = subprocess.run([
-            'ffmpeg', '-i', str(temp_path),
-            '-c:v', 'libx264',  # H.264 codec
-            '-preset', FFMPEG_PRESET,
-            '-crf', str(FFMPEG_CRF),
-            '-pix_fmt', 'yuv420p',  # Pixel format cho web compatibility
-            '-movflags', '+faststart',  # Enable progressive streaming
-            '-r', str(fps),  # Force output FPS = input FPS
-            '-vsync', 'cfr',  # Constant frame rate
-            '-g', str(int(fps * 2)),  # Keyframe interval (2 giây)
-            '-sc_threshold', '0',  # Disable scene change detection
-            '-force_key_frames', f'expr:gte(t,n_forced*2)',  # Force keyframe mỗi 2s
-            '-t', str(duration),  # CRITICAL: Set exact duration
-            '-y',
-            str(out_path)
-        ], capture_output=True, timeout=300, encoding='utf-8', errors='ignore')
+        # Nếu frame này có detections thì dùng, không thì dùng detections gần nhất
+        if frame_idx in frame_detections_map:
+            last_detections = frame_detections_map.pop(frame_idx)
         
-        if result.returncode == 0:
-            print(f"✅ Video converted to H.264 successfully")
-            temp_path.unlink(missing_ok=True)
-        else:
-            print(f"⚠️  FFmpeg conversion failed: {result.stderr}")
-            temp_path.rename(out_path)
-    except (FileNotFoundError, subprocess.SubprocessError) as e:
-        print(f"⚠️  FFmpeg not found or conversion failed: {e}")
-        temp_path.rename(out_path)
-
-    # Trả về FPS GỐC để tính thời gian xuất hiện ĐÚNG
-    # output_fps chỉ dùng để ghi video, không dùng để tính thời gian!
-    return results, out_path, float(fps)
+        # Vẽ detections lên frame
+        if last_detections:
+            draw_fn(frame, last_detections)
+        
+        # GHI TẤT CẢ frames
+        writer.write(frame)
+        frame_idx += 1
+    
+    return results
 
 
 def _draw_boxes_on_frame(frame, detections: list):
-    font = _get_font()
-    img = Image.fromarray(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)).convert("RGBA")
-    draw = ImageDraw.Draw(img)
-    for det in detections:
-        bbox = det.get("bbox")
-        if not bbox or len(bbox) != 4:
-            continue
-        x1, y1, x2, y2 = map(int, bbox)
-        draw.rectangle([x1, y1, x2, y2], outline=TEXT_COLOR, width=2)
-        # Sử dụng mã biển báo thay vì tên
-        label = _get_sign_code_label(det)
-        _draw_label_with_bg(draw, (x1, max(0, y1 - FONT_SIZE)), label, font)
-    frame[:] = cv2.cvtColor(np.array(img.convert("RGB")), cv2.COLOR_RGB2BGR)
-
-
-@lru_cache(maxsize=1)
-def _get_font(size: int = FONT_SIZE):
-    try:
-        local_font = BASE_DIR / "ai_engine" / "fonts" / "DejaVuSans.ttf"
-        if local_font.exists():
-            return ImageFont.truetype(str(local_font), size=size)
-        return ImageFont.truetype("DejaVuSans.ttf", size=size)
-    except Exception:
-        return ImageFont.load_default()
-
-
-def _draw_label_with_bg(draw: ImageDraw.ImageDraw, xy: tuple, text: str, font: ImageFont.ImageFont):
-    if not text:
-        return
-    x, y = xy
-    bbox = draw.textbbox((x, y), text, font=font)
-    if not bbox:
-        return
-    x0, y0, x1, y1 = bbox
-    padding = 4
-    draw.rectangle([x0 - padding, y0 - padding, x1 + padding, y1 + padding], fill=TEXT_BG_COLOR)
-    draw.text((x, y), text, fill=TEXT_COLOR, font=font)
\ No newline at end of file
+    """Vẽ box + mã biển báo trực tiếp lên frame BGR (sprite nhãn render sẵn, xem ai_engine/annotation.py)"""
+    draw_detections(frame, detections, _get_sign_code_label)
+
+
+def _candidate_draw_fn(conf: float, candidate_conf: float = None):
+    """Hàm vẽ cho video: có candidate_conf thì bỏ qua candidate (confidence < conf, không có track_id)"""
+    if candidate_conf is None:
+        return _draw_boxes_on_frame
+    return lambda frame, detections: _draw_boxes_on_frame(frame, select_detections(detections, conf))
@@ -0,0 +1,11 @@
+"""
+Benchmark suite cho ai_engine và endpoint upload-run
+
+    python -m benchmarks                                   # chạy tất cả, in bảng + ghi JSON
+    python -m benchmarks --filter video --repeats 3        # chỉ các benchmark có "video" trong tên
+    python -m benchmarks --update-baseline                 # lưu kết quả làm baseline
+    python -m benchmarks --baseline benchmarks/baseline.json --tolerance 0.2
+
+Chạy với settings visionGT_BE.settings_benchmark (SQLite), media được sinh tự động.
+Khi có baseline, benchmark nào có median chậm hơn baseline quá `tolerance` thì lệnh thoát với mã 1.
+"""
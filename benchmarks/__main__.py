@@ -0,0 +1,8 @@
+import os
+import sys
+
+from .runner import main
+
+if __name__ == '__main__':
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'visionGT_BE.settings_benchmark')
+    sys.exit(main())
@@ -0,0 +1,317 @@
+"""
+Các benchmark, đăng ký bằng @benchmark(name)
+
+Mỗi benchmark nhận Suite và ghi một hoặc nhiều kết quả tên "<name>.<biến thể>".
+"""
+import time
+
+import numpy as np
+
+from .media import make_image, make_scene, make_video
+
+BENCHMARKS = []  # [(name, fn)] theo thứ tự đăng ký
+
+BATCH_SIZES = (1, 2, 4, 8, 16)
+NMS_SIZES = (10, 50, 200)
+NMS_VIDEO_FRAMES = 300
+NMS_VIDEO_BOXES = (5, 20, 50)
+ANNOTATE_BOXES = (5, 20)
+REAGGREGATE_FRAMES = 3000  # Frame detect của video 10 phút (5 lần detect / giây)
+
+
+def benchmark(name: str):
+    def decorator(fn):
+        BENCHMARKS.append((name, fn))
+        return fn
+    return decorator
+
+
+def _synthetic_detections(count: int, seed: int = 0) -> list:
+    """Detections dạng output YOLO: các cụm box chồng lấn (như cùng biển báo bị detect nhiều lần)"""
+    rng = np.random.default_rng(seed)
+    clusters = max(1, count // 5)
+    centers = rng.uniform(50, 1200, size=(clusters, 2))
+    detections = []
+    for i in range(count):
+        cx, cy = centers[i % clusters] + rng.normal(0, 4, size=2)
+        size = rng.uniform(20, 60)
+        detections.append({
+            "class_id": int(rng.integers(0, 3)),
+            "class_name": "sign",
+            "confidence": float(rng.uniform(0.3, 0.95)),
+            "bbox": [cx - size, cy - size, cx + size, cy + size],
+        })
+    return detections
+
+
+@benchmark("ai_engine.predict_image")
+def bench_predict_image(suite):
+    from ai_engine.yolo_infer import predict_image
+
+    path = make_image(suite.work_dir / "bench_1280x720.jpg")
+    suite.measure("ai_engine.predict_image.1280x720", lambda: predict_image(path))
+
+
+@benchmark("ai_engine.run_yolo_batch")
+def bench_run_yolo_batch(suite):
+    import cv2
+    from ai_engine.performance_config import VIDEO_CONF_THRESHOLD, VIDEO_INPUT_SIZE
+    from ai_engine.yolo_infer import _load_local_model, _run_yolo_batch
+
+    model = _load_local_model()
+    frames = [
+        cv2.resize(make_scene(640, 360, seed=i), (VIDEO_INPUT_SIZE, VIDEO_INPUT_SIZE))
+        for i in range(max(BATCH_SIZES))
+    ]
+    for batch_size in BATCH_SIZES:
+        batch = frames[:batch_size]
+        suite.measure(
+            f"ai_engine.run_yolo_batch.bs{batch_size}",
+            lambda: _run_yolo_batch(model, batch, VIDEO_CONF_THRESHOLD, (640, 360)),
+            items=batch_size,
+        )
+
+
+@benchmark("ai_engine.predict_video")
+def bench_predict_video(suite):
+    """Thời gian tổng và thời gian bận của từng stage pipeline (decode / infer / track / draw / encode)"""
+    from ai_engine.yolo_infer import predict_video_with_save
+
+    path = make_video(suite.work_dir / "bench_10s_640x360.mp4", seconds=10.0)
+
+    def run():
+        stats = {}
+        start = time.perf_counter()
+        _, out_path, _ = predict_video_with_save(path, stats=stats)
+        elapsed = time.perf_counter() - start
+        out_path.unlink(missing_ok=True)
+        return elapsed, stats
+
+    for _ in range(suite.warmup):
+        run()
+    wall, stages, sampling = [], {}, {}
+    for _ in range(suite.repeats):
+        elapsed, stats = run()
+        wall.append(elapsed)
+        sampling = stats.get("sampling", {})
+        for stage, stage_stats in stats.get("pipeline", {}).get("stages", {}).items():
+            stages.setdefault(stage, []).append(stage_stats["busy_seconds"])
+
+    suite.record("ai_engine.predict_video.wall", wall, extra={"sampling": sampling})
+    for stage, samples in stages.items():
+        suite.record(f"ai_engine.predict_video.stage.{stage}", samples)
+
+
+@benchmark("ai_engine.annotate_frame")
+def bench_annotate_frame(suite):
+    """Vẽ box + nhãn lên một frame 1280x720 (ANNOTATE_BOXES box), frame được copy mỗi lần như trong pipeline"""
+    from ai_engine.yolo_infer import _draw_boxes_on_frame
+
+    frame = make_scene(1280, 720, seed=3)
+    for count in ANNOTATE_BOXES:
+        detections = _synthetic_detections(count)
+        suite.measure(
+            f"ai_engine.annotate_frame.1280x720.n{count}",
+            lambda: _draw_boxes_on_frame(frame.copy(), detections),
+            number=20,
+        )
+
+
+def _legacy_filter_overlapping(detections: list, iou_threshold: float = 0.5) -> list:
+    """Bản cũ của DetectionProcessor._filter_overlapping_detections (vòng lặp Python qua từng cặp box), để so sánh"""
+    def iou(box1, box2):
+        inter_w = min(box1[2], box2[2]) - max(box1[0], box2[0])
+        inter_h = min(box1[3], box2[3]) - max(box1[1], box2[1])
+        if inter_w < 0 or inter_h < 0:
+            return 0.0
+        inter = inter_w * inter_h
+        union = (box1[2] - box1[0]) * (box1[3] - box1[1]) + (box2[2] - box2[0]) * (box2[3] - box2[1]) - inter
+        return inter / union if union > 0 else 0.0
+
+    sorted_dets = sorted(detections, key=lambda x: x.get('confidence', 0), reverse=True)
+    filtered, skip = [], set()
+    for i, det1 in enumerate(sorted_dets):
+        if i in skip:
+            continue
+        filtered.append(det1)
+        if len(det1.get('bbox', [])) != 4:
+            continue
+        for j in range(i + 1, len(sorted_dets)):
+            bbox2 = sorted_dets[j].get('bbox', [])
+            if j not in skip and len(bbox2) == 4 and iou(det1['bbox'], bbox2) > iou_threshold:
+                skip.add(j)
+    return filtered
+
+
+@benchmark("recognition.filter_overlapping_detections")
+def bench_filter_overlapping(suite):
+    """Một frame nhiều box: NMS vectorized so với vòng lặp Python cũ"""
+    from recognition.processing import DetectionProcessor
+
+    processor = DetectionProcessor()
+    for count in NMS_SIZES:
+        detections = _synthetic_detections(count)
+        if processor._filter_overlapping_detections(detections) != _legacy_filter_overlapping(detections):
+            raise RuntimeError(f"Vectorized NMS differs from the legacy implementation (n={count})")
+        suite.measure(
+            f"recognition.filter_overlapping_detections.n{count}",
+            lambda: processor._filter_overlapping_detections(detections),
+            number=20,
+        )
+        suite.measure(
+            f"recognition.filter_overlapping_detections.legacy.n{count}",
+            lambda: _legacy_filter_overlapping(detections),
+            number=20,
+        )
+
+
+@benchmark("ai_engine.nms_video")
+def bench_nms_video(suite):
+    """Detections của cả video (NMS_VIDEO_FRAMES frame đã sample): một lần gọi batch / từng frame / vòng lặp cũ"""
+    from ai_engine.nms import nms_detections_batch
+
+    for count in NMS_VIDEO_BOXES:
+        frames = [_synthetic_detections(count, seed=i) for i in range(NMS_VIDEO_FRAMES)]
+        name = f"ai_engine.nms_video.f{NMS_VIDEO_FRAMES}.n{count}"
+        extra = {"frames": NMS_VIDEO_FRAMES, "boxes_per_frame": count}
+        suite.measure(f"{name}.batched", lambda: nms_detections_batch(frames, class_aware=False), extra=extra)
+        suite.measure(
+            f"{name}.per_frame", lambda: [nms_detections_batch([f], class_aware=False) for f in frames], extra=extra
+        )
+        suite.measure(f"{name}.legacy", lambda: [_legacy_filter_overlapping(f) for f in frames], extra=extra)
+
+
+def _synthetic_candidates_file(path, frames: int, conf: float, fps: float):
+    """
+    File detections_file giống video xử lý với tracker: 4 biển báo xuất hiện / biến mất, box trôi dần,
+    candidate confidence thấp không được gán track
+    """
+    from ai_engine.frame_store import FrameDetectionWriter
+    from ai_engine.performance_config import TRACKER_LOW_CONF_THRESHOLD, TRACKER_MATCH_IOU, TRACKER_MAX_AGE_SECONDS
+    from ai_engine.tracker import ByteTracker
+
+    rng = np.random.default_rng(0)
+    stride = max(1, int(fps / 5))
+    tracker = ByteTracker(high_threshold=conf, low_threshold=min(conf, TRACKER_LOW_CONF_THRESHOLD),
+                          match_iou=TRACKER_MATCH_IOU, max_age=int(fps * TRACKER_MAX_AGE_SECONDS))
+    writer = FrameDetectionWriter()
+    visible = np.ones(4, dtype=bool)
+    for i in range(frames):
+        visible ^= rng.random(4) < 0.02
+        detections = []
+        for class_id in np.flatnonzero(visible | (rng.random(4) < 0.2)):
+            x = 150.0 * class_id + (i % 200) + rng.normal(0, 2)
+            detections.append({
+                "class_id": int(class_id),
+                "class_name": f"sign_{class_id}",
+                "confidence": float(rng.uniform(0.5, 0.95) if visible[class_id] else rng.uniform(0.1, 0.5)),
+                "bbox": [x, 100.0, x + 60, 160.0],
+            })
+        tracked, dropped = tracker.track(i * stride, detections)
+        writer.add(i * stride, tracked + dropped)
+    return writer.save(path, {
+        "file_type": "video", "fps": fps, "total_frames": frames * stride,
+        "conf_threshold": conf, "candidate_conf": TRACKER_LOW_CONF_THRESHOLD, "tracking": True,
+    })
+
+
+@benchmark("recognition.reaggregate")
+def bench_reaggregate(suite):
+    """
+    Tạo lại DetectedSign từ candidate đã lưu (không chạy YOLO) cho video REAGGREGATE_FRAMES frame detect:
+    cùng conf (chỉ đổi gap, dùng track_id đã lưu) và conf mới (chạy lại tracker)
+    """
+    from django.core.files import File
+    from recognition.models import Detection
+    from recognition.processing import DetectionProcessor
+
+    _ensure_database()
+    processor = DetectionProcessor()
+    conf, fps = processor.CONF_THRESHOLD, 30.0
+    path = _synthetic_candidates_file(suite.work_dir / "reaggregate_detections.npz", REAGGREGATE_FRAMES, conf, fps)
+    detection = Detection(
+        file_type='video', status='done', fps=fps, conf_threshold=conf,
+        gap_tolerance=processor.GAP_TOLERANCE, min_duration=processor.MIN_APPEARANCE_DURATION,
+    )
+    with open(path, 'rb') as f:
+        detection.detections_file.save(path.name, File(f), save=False)
+    detection.save()
+    try:
+        name = f"recognition.reaggregate.f{REAGGREGATE_FRAMES}"
+        extra = {"frames": REAGGREGATE_FRAMES}
+        suite.measure(f"{name}.same_conf", lambda: processor.reaggregate(detection, conf, 1.0), extra=extra)
+        suite.measure(f"{name}.new_conf", lambda: processor.reaggregate(detection, conf + 0.1), extra=extra)
+    finally:
+        detection.detections_file.delete(save=False)
+        detection.delete()
+
+
+def _ensure_database():
+    from django.core.management import call_command
+    call_command('migrate', interactive=False, verbosity=0)
+
+
+def _benchmark_client():
+    from django.contrib.auth import get_user_model
+    from rest_framework.test import APIClient
+
+    _ensure_database()
+    user, _ = get_user_model().objects.get_or_create(
+        username="benchmark", defaults={"email": "benchmark@example.com"}
+    )
+    client = APIClient()
+    client.force_authenticate(user=user)
+    return client
+
+
+def _upload_round_trip(client, path, file_type: str) -> dict:
+    """POST upload-run -> worker xử lý job -> GET chi tiết, trả về thời gian từng bước"""
+    from recognition.jobs import process_next_detection
+
+    start = time.perf_counter()
+    with open(path, 'rb') as f:
+        response = client.post('/api/recognition/upload-run/', {'file': f, 'file_type': file_type}, format='multipart')
+    uploaded = time.perf_counter()
+    if response.status_code != 202:
+        raise RuntimeError(f"upload-run returned {response.status_code}: {response.content[:500]!r}")
+    detection_id = response.json()["detection_id"]
+
+    if not process_next_detection():
+        raise RuntimeError("Detection job was not claimed")
+    processed = time.perf_counter()
+
+    detail = client.get(f'/api/recognition/detection/{detection_id}/')
+    finished = time.perf_counter()
+    if detail.status_code != 200 or detail.json().get("status") != "done":
+        raise RuntimeError(f"Detection {detection_id} did not finish: {detail.content[:500]!r}")
+    return {
+        "round_trip": finished - start,
+        "upload": uploaded - start,
+        "process": processed - uploaded,
+        "fetch": finished - processed,
+    }
+
+
+def _bench_upload_run(suite, name: str, path, file_type: str):
+    client = _benchmark_client()
+    for _ in range(suite.warmup):
+        _upload_round_trip(client, path, file_type)
+    timings = {}
+    for _ in range(suite.repeats):
+        for step, elapsed in _upload_round_trip(client, path, file_type).items():
+            timings.setdefault(step, []).append(elapsed)
+    for step, samples in timings.items():
+        suite.record(f"{name}.{step}", samples)
+
+
+@benchmark("api.upload_run.image")
+def bench_upload_run_image(suite):
+    path = make_image(suite.work_dir / "upload_1280x720.jpg", seed=1)
+    _bench_upload_run(suite, "api.upload_run.image", path, "image")
+
+
+@benchmark("api.upload_run.video")
+def bench_upload_run_video(suite):
+    path = make_video(suite.work_dir / "upload_5s_640x360.mp4", seconds=5.0, seed=1)
+    _bench_upload_run(suite, "api.upload_run.video", path, "video")
+
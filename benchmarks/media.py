@@ -0,0 +1,64 @@
+"""
+Sinh media tổng hợp cho benchmark: nền đường + các hình giống biển báo (tròn đỏ, tam giác vàng, vuông xanh)
+
+Nội dung cố định theo seed nên các lần chạy (và baseline) đo trên cùng dữ liệu.
+"""
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+
+def _draw_signs(img: np.ndarray, rng: np.random.Generator, count: int, shift: tuple = (0, 0)):
+    height, width = img.shape[:2]
+    for _ in range(count):
+        size = int(rng.integers(max(8, width // 60), max(16, width // 12)))
+        cx = int(rng.integers(size, width - size)) + shift[0]
+        cy = int(rng.integers(size, height // 2 + size)) + shift[1]
+        kind = rng.integers(3)
+        if kind == 0:
+            cv2.circle(img, (cx, cy), size, (0, 0, 220), -1)
+            cv2.circle(img, (cx, cy), int(size * 0.7), (255, 255, 255), -1)
+        elif kind == 1:
+            points = np.array([[cx, cy - size], [cx - size, cy + size], [cx + size, cy + size]], np.int32)
+            cv2.fillPoly(img, [points], (0, 200, 255))
+            cv2.polylines(img, [points], True, (0, 0, 200), max(1, size // 6))
+        else:
+            cv2.rectangle(img, (cx - size, cy - size), (cx + size, cy + size), (200, 80, 0), -1)
+
+
+def make_scene(width: int, height: int, seed: int = 0, signs: int = 6) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    img = np.empty((height, width, 3), dtype=np.uint8)
+    img[: height // 2] = (200, 170, 120)  # trời
+    img[height // 2:] = (90, 90, 90)  # mặt đường
+    noise = rng.integers(0, 20, size=(height, width, 1), dtype=np.uint8)
+    img = cv2.add(img, np.repeat(noise, 3, axis=2))
+    _draw_signs(img, rng, signs)
+    return img
+
+
+def make_image(path: Path, width: int = 1280, height: int = 720, seed: int = 0) -> Path:
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    cv2.imwrite(str(path), make_scene(width, height, seed), [cv2.IMWRITE_JPEG_QUALITY, 90])
+    return path
+
+
+def make_video(path: Path, seconds: float = 10.0, fps: float = 30.0, width: int = 640, height: int = 360,
+               seed: int = 0) -> Path:
+    """Video mp4v: cảnh trôi dần sang trái (như xe đang chạy), các biển báo xuất hiện rồi biến mất"""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    background = make_scene(width * 2, height, seed, signs=0)
+    writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*"mp4v"), fps, (width, height))
+    try:
+        for idx in range(int(seconds * fps)):
+            offset = int(idx * 2) % width
+            frame = np.ascontiguousarray(background[:, offset:offset + width])
+            # Đổi bộ biển báo mỗi 2 giây
+            _draw_signs(frame, np.random.default_rng(seed + int(idx / (2 * fps))), 3, shift=(-(idx % int(2 * fps)), 0))
+            writer.write(frame)
+    finally:
+        writer.release()
+    return path
@@ -0,0 +1,206 @@
+"""
+Đo thời gian, ghi kết quả JSON và so sánh với baseline
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+BENCHMARK_ROOT = Path(__file__).resolve().parent
+DEFAULT_OUTPUT = BENCHMARK_ROOT / "results.json"
+DEFAULT_BASELINE = BENCHMARK_ROOT / "baseline.json"
+
+
+def summarize(samples: list, items: int = 1) -> dict:
+    """Thống kê thời gian (giây) của các lần đo, items = số phần tử xử lý trong mỗi lần (batch size...)"""
+    ordered = sorted(samples)
+    p95_index = max(0, min(len(ordered) - 1, int(round(0.95 * len(ordered))) - 1))
+    summary = {
+        "unit": "seconds",
+        "repeats": len(samples),
+        "median": statistics.median(ordered),
+        "mean": statistics.fmean(ordered),
+        "min": ordered[0],
+        "max": ordered[-1],
+        "p95": ordered[p95_index],
+    }
+    if items > 1:
+        summary["items"] = items
+        summary["per_item_median"] = summary["median"] / items
+    return summary
+
+
+class Suite:
+    """
+    Nơi các benchmark ghi kết quả
+    measure() chạy một callable nhiều lần; record() dùng khi benchmark tự đo (ví dụ thời gian từng stage)
+    """
+
+    def __init__(self, repeats: int, warmup: int, work_dir: Path):
+        self.repeats = repeats
+        self.warmup = warmup
+        self.work_dir = Path(work_dir)
+        self.work_dir.mkdir(parents=True, exist_ok=True)
+        self.results = {}
+
+    def measure(self, name: str, fn, repeats: int = None, warmup: int = None, number: int = 1,
+                items: int = 1, extra: dict = None) -> dict:
+        """
+        Gọi fn() warmup lần (không tính), sau đó đo repeats lần
+        number > 1: mỗi lần đo gọi fn() number lần và lấy thời gian trung bình (cho hàm rất nhanh)
+        """
+        repeats = repeats or self.repeats
+        for _ in range(self.warmup if warmup is None else warmup):
+            fn()
+        samples = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            for _ in range(number):
+                fn()
+            samples.append((time.perf_counter() - start) / number)
+        return self.record(name, samples, items=items, extra=extra)
+
+    def record(self, name: str, samples: list, items: int = 1, extra: dict = None) -> dict:
+        result = summarize(samples, items)
+        if extra:
+            result["extra"] = extra
+        self.results[name] = result
+        print(f"   {name:<50} median={result['median'] * 1000:10.2f} ms  p95={result['p95'] * 1000:10.2f} ms")
+        return result
+
+
+def _git_commit() -> str:
+    try:
+        result = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, cwd=BENCHMARK_ROOT.parent
+        )
+        return result.stdout.strip() if result.returncode == 0 else ''
+    except (FileNotFoundError, subprocess.SubprocessError):
+        return ''
+
+
+def environment_info() -> dict:
+    from ai_engine.performance_config import INFERENCE_BACKEND, INFERENCE_PRECISION, INFERENCE_POOL_WORKERS
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "git_commit": _git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "backend": INFERENCE_BACKEND,
+        "precision": INFERENCE_PRECISION,
+        "inference_pool_workers": INFERENCE_POOL_WORKERS,
+        "settings": os.environ.get('DJANGO_SETTINGS_MODULE'),
+    }
+
+
+def compare_with_baseline(results: dict, baseline: dict, tolerance: float) -> list:
+    """
+    So sánh median từng benchmark với baseline
+    Returns: [(name, baseline_median, median, ratio, status)], status: regression / improved / ok / new
+    """
+    rows = []
+    base_results = baseline.get("results", {})
+    for name, result in results.items():
+        base = base_results.get(name)
+        if base is None or not base.get("median"):
+            rows.append((name, None, result["median"], None, "new"))
+            continue
+        ratio = result["median"] / base["median"]
+        if ratio > 1 + tolerance:
+            status = "regression"
+        elif ratio < 1 - tolerance:
+            status = "improved"
+        else:
+            status = "ok"
+        rows.append((name, base["median"], result["median"], ratio, status))
+    return rows
+
+
+def format_comparison(rows: list, tolerance: float) -> str:
+    lines = [f"📊 So sánh với baseline (tolerance ±{tolerance * 100:.0f}%):"]
+    for name, base, current, ratio, status in rows:
+        base_text = f"{base * 1000:10.2f} ms" if base is not None else f"{'-':>13}"
+        ratio_text = f"{ratio:6.2f}x" if ratio is not None else f"{'-':>7}"
+        marker = {"regression": "❌", "improved": "🚀", "ok": "✅", "new": "🆕"}[status]
+        lines.append(f"   {marker} {name:<50} {base_text} -> {current * 1000:10.2f} ms  {ratio_text}  {status}")
+    return "\n".join(lines)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description="Benchmark ai_engine và upload-run")
+    parser.add_argument('--filter', action='append', default=[],
+                        help='Chỉ chạy benchmark có tên chứa chuỗi này (lặp lại được)')
+    parser.add_argument('--repeats', type=int, default=5, help='Số lần đo mỗi benchmark')
+    parser.add_argument('--warmup', type=int, default=1, help='Số lần chạy bỏ qua trước khi đo')
+    parser.add_argument('--output', type=Path, default=DEFAULT_OUTPUT, help='File JSON kết quả')
+    parser.add_argument('--baseline', type=Path, default=DEFAULT_BASELINE, help='File JSON baseline để so sánh')
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help='Cho phép chậm hơn baseline tối đa tỉ lệ này (0.2 = 20%%)')
+    parser.add_argument('--update-baseline', action='store_true', help='Ghi kết quả lần này làm baseline')
+    parser.add_argument('--list', action='store_true', help='Liệt kê các benchmark rồi thoát')
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+
+    import django
+    django.setup()
+
+    from django.conf import settings
+    from .cases import BENCHMARKS
+
+    selected = [(name, fn) for name, fn in BENCHMARKS if not args.filter or any(f in name for f in args.filter)]
+    if args.list:
+        for name, _ in selected:
+            print(name)
+        return 0
+    if not selected:
+        print(f"⚠️  Không có benchmark nào khớp filter {args.filter}")
+        return 2
+
+    suite = Suite(args.repeats, args.warmup, Path(settings.BENCHMARK_DIR) / "work")
+    print(f"⏱️  Running {len(selected)} benchmark(s), repeats={args.repeats}, warmup={args.warmup}")
+    for name, fn in selected:
+        print(f"▶️  {name}")
+        fn(suite)
+
+    report = {"environment": environment_info(), "results": suite.results}
+    args.output.parent.mkdir(parents=True, exist_ok=True)
+    args.output.write_text(json.dumps(report, indent=2, ensure_ascii=False), encoding='utf-8')
+    print(f"💾 Results written to {args.output}")
+
+    if args.update_baseline:
+        baseline = {"environment": report["environment"], "results": dict(suite.results)}
+        if args.baseline.exists() and args.filter:
+            # Chỉ cập nhật các benchmark vừa chạy, giữ nguyên phần còn lại
+            previous = json.loads(args.baseline.read_text(encoding='utf-8'))
+            baseline["results"] = {**previous.get("results", {}), **suite.results}
+        args.baseline.write_text(json.dumps(baseline, indent=2, ensure_ascii=False), encoding='utf-8')
+        print(f"💾 Baseline updated: {args.baseline}")
+        return 0
+
+    if not args.baseline.exists():
+        print(f"ℹ️  No baseline at {args.baseline}, skipping comparison (create one with --update-baseline)")
+        return 0
+
+    baseline = json.loads(args.baseline.read_text(encoding='utf-8'))
+    base_env = baseline.get("environment", {})
+    for key in ("cpu_count", "backend", "precision", "inference_pool_workers"):
+        if base_env.get(key) != report["environment"].get(key):
+            print(f"⚠️  Baseline {key}={base_env.get(key)!r} khác lần chạy này ({report['environment'].get(key)!r})")
+
+    rows = compare_with_baseline(suite.results, baseline, args.tolerance)
+    print(format_comparison(rows, args.tolerance))
+    regressions = [row[0] for row in rows if row[4] == "regression"]
+    if regressions:
+        print(f"❌ {len(regressions)} regression(s): {', '.join(regressions)}", file=sys.stderr)
+        return 1
+    return 0
@@ -0,0 +1,31 @@
+"""
+Cấu hình gunicorn: gunicorn visionGT_BE.wsgi -c gunicorn.conf.py
+
+Model YOLO được load + warm-up một lần trong master process trước khi fork (on_starting),
+các worker dùng chung weights theo copy-on-write thay vì mỗi worker load riêng ở request đầu tiên.
+Worker chỉ nhận traffic khi GET /health/ready trả về 200.
+"""
+from decouple import config
+
+bind = config('GUNICORN_BIND', default='0.0.0.0:8000')
+workers = config('GUNICORN_WORKERS', default=2, cast=int)
+threads = config('GUNICORN_THREADS', default=4, cast=int)
+# Web tier không chạy inference (ảnh, video, frame push đều do run_detection_workers xử lý).
+# threads > 1 (worker gthread): timeout chỉ là thời gian worker không báo về master trước khi bị restart,
+# không giới hạn độ dài request (SSE, upload chunk). Với GUNICORN_THREADS=1 (worker sync) timeout giới hạn
+# cả request, khi đó phải lớn hơn STREAM_EVENTS_MAX_DURATION
+timeout = config('GUNICORN_TIMEOUT', default=30, cast=int)  # giây
+preload_app = True
+
+MODEL_PRELOAD = config('MODEL_PRELOAD', default=True, cast=bool)
+
+
+def on_starting(server):
+    if MODEL_PRELOAD:
+        from ai_engine.yolo_infer import preload_model
+        preload_model(fork_safe=True)
+
+
+def post_fork(server, worker):
+    from ai_engine.yolo_infer import after_fork
+    after_fork(preload=MODEL_PRELOAD)
@@ -1,6 +1,24 @@
+import os
+import sys
+
 from django.apps import AppConfig
+from django.conf import settings
 
 
 class RecognitionConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'recognition'
+
+    def ready(self):
+        # Load + warm-up model khi khởi động server thay vì ở request đầu tiên.
+        # Gunicorn preload trong gunicorn.conf.py (trước khi fork), run_detection_workers trong command.
+        if settings.MODEL_PRELOAD and _is_runserver_process():
+            from ai_engine.yolo_infer import preload_model
+            preload_model(background=True)
+
+
+def _is_runserver_process() -> bool:
+    """Chỉ process phục vụ request của runserver (không phải process autoreloader, migrate, shell...)"""
+    if len(sys.argv) < 2 or sys.argv[1] != 'runserver':
+        return False
+    return os.environ.get('RUN_MAIN') == 'true' or '--noreload' in sys.argv
@@ -0,0 +1,131 @@
+"""
+Dedup file upload theo nội dung (SHA-256)
+
+Cùng một file đã xử lý xong với cùng model version và threshold (confidence, gap / thời lượng tối thiểu
+của video, có thể đã đổi bằng reaggregate) thì Detection mới dùng lại output_file và clone DetectedSign,
+không chạy lại model.
+File upload trùng cũng không được lưu thêm bản copy dưới uploads/.
+"""
+import logging
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from ai_engine.backends import resolved_model_version
+from .models import Detection, DetectedSign
+from .processing import DetectionProcessor
+
+logger = logging.getLogger(__name__)
+
+
+def find_stored_upload(sha256: str, file_type: str):
+    """Tên file (trong storage) của lần upload trước có cùng nội dung, hoặc None"""
+    previous = (
+        Detection.objects
+        .filter(file_sha256=sha256, file_type=file_type)
+        .exclude(file='')
+        .order_by('-created_at')
+        .first()
+    )
+    if previous and previous.file.storage.exists(previous.file.name):
+        return previous.file.name
+    return None
+
+
+def find_reusable_detection(sha256: str, file_type: str, model_version: str, conf_threshold: float,
+                            gap_tolerance: float = None, min_duration: float = None):
+    """
+    Detection 'done' gần nhất cùng nội dung file, model version và threshold, còn output file
+    gap_tolerance / min_duration chỉ được so khi đã lưu trên Detection (ảnh và detection cũ không có)
+    """
+    candidates = (
+        Detection.objects
+        .filter(
+            file_sha256=sha256,
+            file_type=file_type,
+            status='done',
+            model_version=model_version,
+            conf_threshold=conf_threshold,
+        )
+        .filter(Q(gap_tolerance__isnull=True) | Q(gap_tolerance=gap_tolerance))
+        .filter(Q(min_duration__isnull=True) | Q(min_duration=min_duration))
+        .exclude(output_file='')
+        .order_by('-finished_at')
+    )
+    for candidate in candidates[:5]:
+        if candidate.output_file.storage.exists(candidate.output_file.name):
+            return candidate
+    return None
+
+
+@transaction.atomic
+def clone_detection(source: Detection, user, file_name: str = None) -> Detection:
+    """Tạo Detection 'done' mới trỏ tới output_file của source và copy các DetectedSign"""
+    now = timezone.now()
+    detection = Detection.objects.create(
+        file=file_name or source.file.name,
+        file_sha256=source.file_sha256,
+        output_file=source.output_file.name,
+        detections_file=source.detections_file.name,
+        file_type=source.file_type,
+        status='done',
+        fps=source.fps,
+        duration=source.duration,
+        total_frames=source.total_frames,
+        model_version=source.model_version,
+        conf_threshold=source.conf_threshold,
+        gap_tolerance=source.gap_tolerance,
+        min_duration=source.min_duration,
+        started_at=now,
+        finished_at=now,
+        user=user,
+    )
+    DetectedSign.objects.bulk_create([
+        DetectedSign(
+            detection=detection,
+            traffic_sign_id=sign.traffic_sign_id,
+            class_id=sign.class_id,
+            class_name=sign.class_name,
+            confidence=sign.confidence,
+            bbox=sign.bbox,
+            start_time=sign.start_time,
+            end_time=sign.end_time,
+            frame_index=sign.frame_index,
+        )
+        for sign in source.detected_signs.all()
+    ])
+    logger.info(f"Detection {detection.id} reused results of detection {source.id} ({source.file_sha256[:12]})")
+    return detection
+
+
+def create_detection_for_upload(user, file_type: str, sha256: str, file):
+    """
+    Tạo Detection cho file vừa upload (file: UploadedFile hoặc tên file đã nằm trong storage)
+    Dùng lại kết quả cũ nếu có, không thì tạo job 'pending' cho worker
+    Returns: (detection, reused)
+    """
+    # File trùng đã xử lý với cùng model + threshold -> dùng lại kết quả, không chạy model
+    if settings.DETECTION_REUSE_RESULTS:
+        try:
+            # Version backend sẽ thực sự load (onnx export lỗi -> torch...), chưa biết thì không dùng lại
+            model_version = resolved_model_version()
+        except FileNotFoundError:
+            model_version = None
+        source = model_version and find_reusable_detection(
+            sha256, file_type, model_version, DetectionProcessor.CONF_THRESHOLD,
+            DetectionProcessor.GAP_TOLERANCE, DetectionProcessor.MIN_APPEARANCE_DURATION,
+        )
+        if source:
+            return clone_detection(source, user), True
+
+    # Nội dung đã có trong storage thì trỏ tới file cũ thay vì lưu thêm bản copy
+    detection = Detection.objects.create(
+        file=find_stored_upload(sha256, file_type) or file,
+        file_sha256=sha256,
+        file_type=file_type,
+        status='pending',
+        user=user,
+    )
+    return detection, False
@@ -0,0 +1,203 @@
+"""
+Hàng đợi xử lý Detection dựa trên database
+
+Không cần broker ngoài: mỗi Detection ở trạng thái 'pending' là một job.
+Worker "claim" job bằng một câu UPDATE có điều kiện (status='pending' -> 'processing'),
+nên nhiều worker (nhiều thread hoặc nhiều process/máy) có thể chạy song song an toàn.
+Trong lúc xử lý, worker cập nhật heartbeat_at của job; job của worker đã chết (không còn heartbeat)
+được đưa lại về 'pending' ở lần housekeeping tiếp theo.
+"""
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, connection
+from django.db.models import Q
+from django.utils import timezone
+
+from ai_engine.metrics import Counter, Gauge, Histogram
+from .models import Detection
+from .processing import DetectionProcessor
+from .streaming import expire_push_streams
+from .uploads import expire_upload_sessions
+
+logger = logging.getLogger(__name__)
+
+# Số job pending lấy ra mỗi lần thử claim
+CLAIM_CANDIDATES = 10
+# Số giây giữa 2 lần requeue job treo / dọn upload bỏ dở / stream push idle trong lúc pool chạy
+HOUSEKEEPING_INTERVAL = 30
+
+JOBS_IN_FLIGHT = Gauge('visiongt_detection_jobs_in_flight', 'Số Detection đang được xử lý trong process này')
+JOB_QUEUE_DEPTH = Gauge('visiongt_detection_queue_depth', 'Số Detection đang chờ (pending) trong database')
+JOB_QUEUE_DEPTH.set_function(lambda: Detection.objects.filter(status='pending').count())
+JOB_SECONDS = Histogram(
+    'visiongt_detection_job_duration_seconds', 'Thời gian xử lý một Detection', ('file_type', 'status'),
+)
+JOBS_TOTAL = Counter('visiongt_detection_jobs', 'Số Detection đã xử lý xong', ('file_type', 'status'))
+
+
+def claim_next_detection():
+    """
+    Claim job pending cũ nhất
+    Trả về Detection đã chuyển sang 'processing', hoặc None nếu hàng đợi trống
+    """
+    candidate_ids = list(
+        Detection.objects.filter(status='pending')
+        .order_by('created_at', 'id')
+        .values_list('id', flat=True)[:CLAIM_CANDIDATES]
+    )
+    for detection_id in candidate_ids:
+        # UPDATE có điều kiện là atomic: chỉ một worker nhận được rowcount = 1
+        now = timezone.now()
+        claimed = Detection.objects.filter(id=detection_id, status='pending').update(
+            status='processing',
+            started_at=now,
+            heartbeat_at=now,
+        )
+        if claimed:
+            return Detection.objects.get(id=detection_id)
+    return None
+
+
+def requeue_stale_detections(timeout_seconds=None):
+    """
+    Đưa các job 'processing' không còn heartbeat quá DETECTION_STALE_TIMEOUT giây (worker chết giữa chừng)
+    về lại 'pending'. Trả về số job đã requeue
+    """
+    if timeout_seconds is None:
+        timeout_seconds = settings.DETECTION_STALE_TIMEOUT
+    deadline = timezone.now() - timedelta(seconds=timeout_seconds)
+    stale = Detection.objects.filter(status='processing').filter(
+        # Job claim trước khi có heartbeat_at: tính từ started_at
+        Q(heartbeat_at__lt=deadline) | Q(heartbeat_at__isnull=True, started_at__lt=deadline)
+    )
+    # Stream URL không chạy lại từ đầu được (timestamp theo reader), không requeue.
+    # Stream push thì được: frame chờ nằm trong push_frame_dir, segment đang mở khôi phục từ DetectedSign
+    count = stale.exclude(file_type='stream', source_url__gt='').update(
+        status='pending',
+        started_at=None,
+        heartbeat_at=None,
+    )
+    if count:
+        logger.warning(f"Requeued {count} stale detection job(s)")
+    return count
+
+
+@contextmanager
+def job_heartbeat(detection_id, interval=None):
+    """
+    Cập nhật heartbeat_at của job mỗi DETECTION_HEARTBEAT_INTERVAL giây trong thread riêng,
+    kể cả khi job đang ở một bước chạy lâu (inference, encode video)
+    """
+    if interval is None:
+        interval = settings.DETECTION_HEARTBEAT_INTERVAL
+    stop = threading.Event()
+
+    def beat():
+        try:
+            while not stop.wait(interval):
+                try:
+                    Detection.objects.filter(id=detection_id, status='processing').update(heartbeat_at=timezone.now())
+                except Exception as e:
+                    logger.warning(f"Detection {detection_id}: heartbeat failed: {e}")
+        finally:
+            connection.close()
+
+    thread = threading.Thread(target=beat, name=f"detection-heartbeat-{detection_id}", daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        stop.set()
+        thread.join()
+
+
+def process_next_detection(processor=None):
+    """Claim và xử lý một job. Trả về True nếu có job được xử lý"""
+    detection = claim_next_detection()
+    if detection is None:
+        return False
+    processor = processor or DetectionProcessor()
+    logger.info(f"Processing detection {detection.id} ({detection.file_type})")
+    start = time.perf_counter()
+    with JOBS_IN_FLIGHT.track_inprogress(), job_heartbeat(detection.id):
+        processor.process(detection)
+    JOB_SECONDS.observe(time.perf_counter() - start, file_type=detection.file_type, status=detection.status)
+    JOBS_TOTAL.inc(file_type=detection.file_type, status=detection.status)
+    return True
+
+
+class DetectionWorkerPool:
+    """
+    Pool các worker thread lấy job từ hàng đợi Detection
+
+    Mỗi thread có DB connection riêng (Django quản lý theo thread).
+    Có thể chạy nhiều pool ở nhiều process/máy để scale độc lập với web tier.
+    """
+
+    def __init__(self, workers=None, poll_interval=None):
+        self.workers = workers or settings.DETECTION_WORKERS
+        self.poll_interval = poll_interval if poll_interval is not None else settings.DETECTION_POLL_INTERVAL
+        self._stop_event = threading.Event()
+        self._threads = []
+
+    def start(self):
+        self.housekeeping()
+        for i in range(self.workers):
+            thread = threading.Thread(
+                target=self._run,
+                name=f"detection-worker-{i}",
+                daemon=True,
+            )
+            thread.start()
+            self._threads.append(thread)
+        logger.info(f"Started {self.workers} detection worker(s)")
+
+    def stop(self, timeout=None):
+        self._stop_event.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def housekeeping(self):
+        """
+        Requeue job của worker đã chết, hủy upload bỏ dở và kết thúc stream push idle
+        (lúc start và mỗi HOUSEKEEPING_INTERVAL giây trong wait)
+        """
+        close_old_connections()
+        try:
+            requeue_stale_detections()
+            expire_upload_sessions()
+            expire_push_streams()
+        except Exception as e:
+            logger.error(f"Detection housekeeping error: {e}", exc_info=True)
+
+    def wait(self):
+        """Chặn cho đến khi pool dừng (Ctrl+C sẽ gọi stop)"""
+        last_housekeeping = time.monotonic()
+        try:
+            while any(thread.is_alive() for thread in self._threads):
+                time.sleep(0.5)
+                if time.monotonic() - last_housekeeping >= HOUSEKEEPING_INTERVAL:
+                    last_housekeeping = time.monotonic()
+                    self.housekeeping()
+        except KeyboardInterrupt:
+            logger.info("Stopping detection workers...")
+            self.stop()
+
+    def _run(self):
+        processor = DetectionProcessor()
+        while not self._stop_event.is_set():
+            close_old_connections()
+            try:
+                has_job = process_next_detection(processor)
+            except Exception as e:
+                logger.error(f"Detection worker error: {e}", exc_info=True)
+                has_job = False
+            if not has_job:
+                self._stop_event.wait(self.poll_interval)
+        close_old_connections()
@@ -0,0 +1,43 @@
+import signal
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from ai_engine.metrics import start_http_server
+from ai_engine.yolo_infer import preload_model, reload_model
+
+from recognition.jobs import DetectionWorkerPool, requeue_stale_detections
+
+
+class Command(BaseCommand):
+    help = "Chạy pool worker xử lý các Detection đang ở trạng thái 'pending'"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=None, help='Số worker thread (mặc định: DETECTION_WORKERS)')
+        parser.add_argument('--poll-interval', type=float, default=None, help='Số giây chờ khi hàng đợi trống')
+        parser.add_argument('--requeue-stale', action='store_true', help='Chỉ requeue các job bị treo rồi thoát')
+        parser.add_argument('--metrics-port', type=int, default=None,
+                            help='Port phục vụ Prometheus metrics của worker (mặc định: METRICS_WORKER_PORT, 0 = tắt)')
+
+    def handle(self, *args, **options):
+        if options['requeue_stale']:
+            count = requeue_stale_detections()
+            self.stdout.write(self.style.SUCCESS(f"Requeued {count} job(s)"))
+            return
+
+        pool = DetectionWorkerPool(
+            workers=options['workers'],
+            poll_interval=options['poll_interval'],
+        )
+        metrics_port = options['metrics_port'] if options['metrics_port'] is not None else settings.METRICS_WORKER_PORT
+        if metrics_port and settings.METRICS_ENABLED:
+            start_http_server(metrics_port)
+            self.stdout.write(f"📈 Metrics: http://0.0.0.0:{metrics_port}/metrics")
+        if settings.MODEL_PRELOAD and not preload_model():
+            self.stderr.write("⚠️  Model preload failed, workers sẽ load model ở job đầu tiên")
+        if hasattr(signal, 'SIGHUP'):
+            # kill -HUP <pid>: load lại YOLO_WEIGHTS ngay, không đợi MODEL_RELOAD_CHECK_INTERVAL
+            signal.signal(signal.SIGHUP, lambda signum, frame: reload_model(background=True))
+        pool.start()
+        self.stdout.write(self.style.SUCCESS(f"🚀 {pool.workers} detection worker(s) đang chạy, Ctrl+C để dừng"))
+        pool.wait()
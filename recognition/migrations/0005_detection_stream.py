@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recognition', '0004_detection_dedup'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='detection',
+            name='source_url',
+            field=models.CharField(blank=True, default='', max_length=500),
+        ),
+        migrations.AlterField(
+            model_name='detection',
+            name='file_type',
+            field=models.CharField(choices=[('image', 'Image'), ('video', 'Video'), ('stream', 'Live stream')], max_length=10),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recognition', '0006_upload_session'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='detection',
+            name='detections_file',
+            field=models.FileField(blank=True, null=True, upload_to='detections/'),
+        ),
+    ]
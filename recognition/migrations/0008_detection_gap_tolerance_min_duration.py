@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recognition', '0007_detection_detections_file'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='detection',
+            name='gap_tolerance',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='detection',
+            name='min_duration',
+            field=models.FloatField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recognition', '0008_detection_gap_tolerance_min_duration'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='detection',
+            name='last_frame_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
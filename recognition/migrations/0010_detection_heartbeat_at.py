@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recognition', '0009_detection_last_frame_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='detection',
+            name='heartbeat_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
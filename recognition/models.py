@@ -1,3 +1,5 @@
+import uuid
+
 from django.conf import settings
 from django.db import models
 from traffic_signs.models import TrafficSign
@@ -7,6 +9,7 @@ class Detection(models.Model):
     FILE_TYPES = (
         ("image", "Image"),
         ("video", "Video"),
+        ("stream", "Live stream"),
     )
     STATUSES = (
         ("pending", "Pending"),
@@ -16,20 +19,65 @@ class Detection(models.Model):
     )
 
     file = models.FileField(upload_to="uploads/")
+    file_sha256 = models.CharField(max_length=64, blank=True, default="")  # Hash nội dung file upload (dedup)
     output_file = models.FileField(upload_to="results/", null=True, blank=True)
+    # Detections gốc từng frame dạng cột .npz (ai_engine/frame_store.py), không có với stream
+    detections_file = models.FileField(upload_to="detections/", null=True, blank=True)
     file_type = models.CharField(max_length=10, choices=FILE_TYPES)
+    source_url = models.CharField(max_length=500, blank=True, default="")  # URL RTSP/MJPEG cho live stream
     status = models.CharField(max_length=15, choices=STATUSES, default="pending")
     fps = models.FloatField(null=True, blank=True)  # FPS cho video
     duration = models.FloatField(null=True, blank=True)  # Độ dài video (seconds)
     total_frames = models.IntegerField(null=True, blank=True)  # Tổng số frames
     error_message = models.TextField(null=True, blank=True)
+    model_version = models.CharField(max_length=64, blank=True, default="")  # Weights + backend đã chạy detection
+    conf_threshold = models.FloatField(null=True, blank=True)  # Confidence threshold đã dùng
+    gap_tolerance = models.FloatField(null=True, blank=True)  # Gap (giây) tối đa khi gộp timeline video
+    min_duration = models.FloatField(null=True, blank=True)  # Thời lượng (giây) tối thiểu của một lần xuất hiện
     created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)  # Thời điểm worker claim job
+    heartbeat_at = models.DateTimeField(null=True, blank=True)  # Worker xử lý job còn sống (cập nhật định kỳ)
+    finished_at = models.DateTimeField(null=True, blank=True)  # Thời điểm xử lý xong (done/failed)
+    last_frame_at = models.DateTimeField(null=True, blank=True)  # Frame push gần nhất client gửi lên (hết hạn khi idle)
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, null=True, blank=True)
 
+    class Meta:
+        indexes = [
+            # Worker poll hàng đợi theo status, job cũ nhất trước
+            models.Index(fields=['status', 'created_at']),
+            # Tìm kết quả cũ của cùng nội dung file
+            models.Index(fields=['file_sha256', 'status']),
+        ]
+
     def __str__(self):
         return f"Detection {self.id} ({self.file_type})"
 
 
+class UploadSession(models.Model):
+    """Upload nhiều chunk có thể resume (xem recognition/uploads.py)"""
+    STATUSES = (
+        ("uploading", "Uploading"),
+        ("completed", "Completed"),
+        ("aborted", "Aborted"),
+    )
+
+    token = models.UUIDField(default=uuid.uuid4, unique=True, editable=False)  # ID public trong URL
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    filename = models.CharField(max_length=255)  # Tên file gốc từ client
+    file_type = models.CharField(max_length=10, choices=Detection.FILE_TYPES)
+    file_name = models.CharField(max_length=255)  # Đường dẫn trong storage (uploads/...)
+    total_size = models.BigIntegerField()  # bytes
+    received = models.BigIntegerField(default=0)  # Offset đã ghi xong
+    sha256 = models.CharField(max_length=64, blank=True, default="")  # Checksum client khai báo
+    status = models.CharField(max_length=15, choices=STATUSES, default="uploading")
+    detection = models.ForeignKey(Detection, on_delete=models.SET_NULL, null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Upload {self.token} ({self.received}/{self.total_size})"
+
+
 class DetectedSign(models.Model):
     """Lưu thông tin chi tiết về từng biển báo được phát hiện"""
     detection = models.ForeignKey(Detection, on_delete=models.CASCADE, related_name="detected_signs")
@@ -0,0 +1,325 @@
+import logging
+import tempfile
+import time
+from pathlib import Path
+from django.core.files import File
+from django.db import transaction
+from django.utils import timezone
+
+from .models import DetectedSign
+from .streaming import run_stream
+from traffic_signs.index import traffic_sign_index
+from ai_engine.frame_store import FrameDetectionFile, FrameDetectionWriter
+from ai_engine.metrics import time_stage
+from ai_engine.nms import nms_detections_batch
+from ai_engine.performance_config import (
+    VIDEO_TRACKING_ENABLED, TRACKER_LOW_CONF_THRESHOLD, TRACKER_MATCH_IOU, TRACKER_MAX_AGE_SECONDS,
+)
+from ai_engine.segments import SegmentAggregator, select_detections
+from ai_engine.tracker import ByteTracker
+from ai_engine.yolo_infer import pin_model, predict_image_with_save, predict_video_with_save
+
+logger = logging.getLogger(__name__)
+
+
+class DetectionProcessor:
+    """
+    Chạy nhận diện cho một Detection đã được lưu file upload
+    Dùng bởi background worker (xem recognition/jobs.py), không chạy trong HTTP request
+    """
+    CONF_THRESHOLD = 0.5
+    # YOLO chạy với ngưỡng này: candidate confidence < CONF_THRESHOLD không được vẽ / gộp,
+    # chỉ được lưu vào detections_file để reaggregate với threshold khác mà không chạy lại model
+    CANDIDATE_CONF_THRESHOLD = 0.1
+    MIN_APPEARANCE_DURATION = 0.3  # Chỉ giữ biển báo xuất hiện ít nhất 0.3 giây
+    GAP_TOLERANCE = 0.5  # Cho phép gap 0.5 giây giữa các detections của cùng một biển báo
+    OVERLAP_IOU_THRESHOLD = 0.5  # Box overlap nhiều hơn ngưỡng này với box confidence cao hơn thì bị loại
+    OVERLAP_CLASS_AWARE = False  # False: box khác class vẫn loại nhau (cùng một biển báo bị gán 2 class)
+
+    def process(self, detection):
+        """
+        Xử lý detection, cập nhật status 'done' hoặc 'failed'
+        Trả về True nếu xử lý thành công
+        """
+        try:
+            # Cả job chạy trên một version model, kể cả khi weights được hot reload giữa chừng
+            with pin_model() as model:
+                # Lấy đường dẫn file đã upload (stream không có file)
+                file_path = Path(detection.file.path) if detection.file else None
+                
+                # Ghi lại model + threshold để dedup các lần upload trùng sau này
+                detection.model_version = model.version
+                detection.conf_threshold = self.CONF_THRESHOLD
+                signs = []
+                
+                if detection.file_type == 'stream':
+                    # Live stream (source_url hoặc frame push): chạy tới khi bị stop / hết stream, DetectedSign được ghi dần
+                    run_stream(detection, self)
+                    
+                elif detection.file_type == 'image':
+                    # Xử lý ảnh với confidence threshold 0.5 (kèm candidate confidence thấp hơn)
+                    detections, output_path = predict_image_with_save(
+                        file_path, conf=self.CONF_THRESHOLD, candidate_conf=self.CANDIDATE_CONF_THRESHOLD
+                    )
+                    recorder = FrameDetectionWriter()
+                    recorder.add(0, detections)
+                    
+                    # Bỏ candidate, lọc overlapping detections
+                    detections = self._filter_overlapping_detections(
+                        select_detections(detections, self.CONF_THRESHOLD)
+                    )
+                    
+                    # Lưu output file - CHỈ LƯU 1 LẦN
+                    with open(output_path, 'rb') as f:
+                        detection.output_file.save(output_path.name, File(f), save=True)
+                    
+                    # Xóa file tạm sau khi Django đã lưu
+                    try:
+                        output_path.unlink(missing_ok=True)
+                    except Exception as e:
+                        logger.warning(f"Cannot delete temp file {output_path}: {e}")
+                    
+                    # Detections gốc (trước khi lọc overlap) lưu cạnh output_file
+                    self._save_detections_file(detection, recorder, output_path)
+                    
+                    # DetectedSign cho ảnh (ghi cùng lúc với status ở dưới)
+                    signs = self._build_detected_signs_for_image(detection, detections)
+                    
+                else:  # video
+                    # Xử lý video với confidence threshold 0.5, detections được lọc overlap và gộp thành
+                    # segment ngay khi từng frame có kết quả (không giữ detections của cả video)
+                    stats = {}
+                    recorder = FrameDetectionWriter()
+                    aggregator = self._create_segment_aggregator(recorder)
+                    _, output_path, fps = predict_video_with_save(
+                        file_path, conf=self.CONF_THRESHOLD, stats=stats, aggregator=aggregator,
+                        candidate_conf=self.CANDIDATE_CONF_THRESHOLD,
+                    )
+                    sampling = stats.get('sampling', {})
+                    logger.info(
+                        f"Detection {detection.id}: inference on {sampling.get('sampled')}/{sampling.get('frames')} frames, "
+                        f"skipped {sampling.get('skipped')} ({sampling.get('mode')} sampling), "
+                        f"{len(aggregator.segments)} segments (max {aggregator.max_open} open)"
+                    )
+                    
+                    # Lưu output file - CHỈ LƯU 1 LẦN
+                    with open(output_path, 'rb') as f:
+                        detection.output_file.save(output_path.name, File(f), save=True)
+                    
+                    # Xóa file tạm sau khi Django đã lưu
+                    try:
+                        output_path.unlink(missing_ok=True)
+                    except Exception as e:
+                        logger.warning(f"Cannot delete temp file {output_path}: {e}")
+                    
+                    # Lưu thông tin video
+                    detection.fps = fps
+                    detection.total_frames = sampling.get('frames', aggregator.frames)
+                    detection.duration = detection.total_frames / fps if fps > 0 else 0
+                    detection.gap_tolerance = self.GAP_TOLERANCE
+                    detection.min_duration = self.MIN_APPEARANCE_DURATION
+                    
+                    # Detections gốc từng frame detect (trước khi lọc overlap / gộp) lưu cạnh output_file
+                    self._save_detections_file(detection, recorder, output_path)
+                    
+                    # DetectedSign cho video với timeline (ghi cùng lúc với status ở dưới)
+                    signs = self._build_detected_signs_for_video(detection, aggregator.segments, fps)
+                
+                detection.status = 'done'
+                detection.finished_at = timezone.now()
+                # Mọi DetectedSign (một lệnh bulk insert) và status 'done' trong một transaction
+                with time_stage("db_write"), transaction.atomic():
+                    if detection.file_type != 'stream':
+                        # Job được requeue (worker bị coi là chết) có thể đã ghi kết quả: không nhân đôi
+                        detection.detected_signs.all().delete()
+                    DetectedSign.objects.bulk_create(signs)
+                    detection.save(update_fields=[
+                        'status', 'fps', 'total_frames', 'duration', 'finished_at', 'model_version', 'conf_threshold',
+                        'gap_tolerance', 'min_duration', 'detections_file',
+                    ])
+                return True
+            
+        except Exception as e:
+            logger.error(f"Error processing detection {detection.id}: {str(e)}", exc_info=True)
+            detection.status = 'failed'
+            detection.error_message = str(e)
+            detection.finished_at = timezone.now()
+            detection.save()
+            return False
+    
+    def _filter_overlapping_detections(self, detections, iou_threshold=None):
+        """
+        Lọc các detections bị overlap (Non-Maximum Suppression)
+        Chỉ giữ detection có confidence cao nhất trong nhóm overlap
+        """
+        return self._filter_overlapping_frames([detections], iou_threshold)[0]
+    
+    def _filter_overlapping_frames(self, frames, iou_threshold=None):
+        """NMS cho detections của nhiều frame (cả video) trong một lần gọi vectorized"""
+        if iou_threshold is None:
+            iou_threshold = self.OVERLAP_IOU_THRESHOLD
+        return nms_detections_batch(frames, iou_threshold=iou_threshold, class_aware=self.OVERLAP_CLASS_AWARE)
+    
+    def _build_detected_signs_for_image(self, detection, detections):
+        """DetectedSign (chưa lưu) cho ảnh"""
+        signs = []
+        for det in detections:
+            class_id = det.get('class_id')
+            class_name = det.get('class_name', '')
+            
+            # Tìm TrafficSign tương ứng
+            traffic_sign = self._find_traffic_sign(class_id, class_name)
+            
+            signs.append(DetectedSign(
+                detection=detection,
+                traffic_sign=traffic_sign,
+                class_id=class_id,
+                class_name=class_name,
+                confidence=det.get('confidence', 0),
+                bbox=det.get('bbox', []),
+                frame_index=0  # Ảnh chỉ có 1 frame
+            ))
+        return signs
+    
+    def _create_segment_aggregator(self, recorder=None, conf_threshold=None, gap_tolerance=None, min_duration=None):
+        """
+        Gộp detections thành segment ngay trong lúc xử lý video (NMS theo chunk frame, gap, thời lượng tối thiểu)
+        recorder: nhận detections gốc của từng frame, kể cả candidate (FrameDetectionWriter)
+        Threshold không truyền thì dùng giá trị mặc định của class
+        """
+        return SegmentAggregator(
+            gap_tolerance=self.GAP_TOLERANCE if gap_tolerance is None else gap_tolerance,
+            min_duration=self.MIN_APPEARANCE_DURATION if min_duration is None else min_duration,
+            frame_filter=self._filter_overlapping_frames,
+            recorder=recorder,
+            min_confidence=self.CONF_THRESHOLD if conf_threshold is None else conf_threshold,
+        )
+    
+    def _save_detections_file(self, detection, recorder, output_path):
+        """Ghi detections gốc từng frame (.npz dạng cột, xem ai_engine/frame_store.py) vào detection.detections_file"""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = recorder.save(Path(tmp_dir) / f"{Path(output_path).stem}_detections.npz", {
+                "file_type": detection.file_type,
+                "fps": detection.fps,
+                "total_frames": detection.total_frames,
+                "model_version": detection.model_version,
+                "conf_threshold": detection.conf_threshold,
+                "candidate_conf": self.CANDIDATE_CONF_THRESHOLD,
+                "tracking": detection.file_type == 'video' and VIDEO_TRACKING_ENABLED,
+            })
+            with open(path, 'rb') as f:
+                detection.detections_file.save(path.name, File(f), save=False)
+    
+    def reaggregate(self, detection, conf_threshold=None, gap_tolerance=None, min_duration=None):
+        """
+        Tạo lại DetectedSign của detection từ candidate trong detections_file với threshold mới, không chạy lại YOLO
+        Threshold không truyền thì giữ giá trị detection đang dùng. output_file (đã vẽ) không thay đổi
+        Video có tracker: chạy lại tracker trên candidate (conf_threshold là ngưỡng tạo track mới),
+        trừ khi conf_threshold giống lúc xử lý (dùng track_id đã lưu, chỉ đổi gap / thời lượng)
+        Raise ValueError nếu conf_threshold thấp hơn ngưỡng candidate đã lưu
+        Trả về danh sách DetectedSign mới
+        """
+        started = time.perf_counter()
+        conf_threshold = self._threshold(conf_threshold, detection.conf_threshold, self.CONF_THRESHOLD)
+        gap_tolerance = self._threshold(gap_tolerance, detection.gap_tolerance, self.GAP_TOLERANCE)
+        min_duration = self._threshold(min_duration, detection.min_duration, self.MIN_APPEARANCE_DURATION)
+        
+        store = FrameDetectionFile(detection.detections_file.path)
+        # File lưu trước khi có candidate: chỉ có detection >= conf_threshold lúc xử lý
+        candidate_conf = store.meta.get("candidate_conf", detection.conf_threshold)
+        if candidate_conf is not None and conf_threshold < candidate_conf:
+            raise ValueError(f"conf_threshold must be >= {candidate_conf} (lowest stored candidate confidence)")
+        
+        if detection.file_type == 'image':
+            frames = list(store.iter_frames())
+            detections = select_detections(frames[0]["detections"], conf_threshold) if frames else []
+            signs = self._build_detected_signs_for_image(detection, self._filter_overlapping_detections(detections))
+        else:
+            fps = detection.fps or store.meta.get("fps") or 0.0
+            aggregator = self._create_segment_aggregator(
+                conf_threshold=conf_threshold, gap_tolerance=gap_tolerance, min_duration=min_duration
+            )
+            aggregator.start(fps)
+            # Aggregator giữ detection có track_id và bỏ candidate < conf_threshold (min_confidence)
+            tracker = self._create_replay_tracker(store, conf_threshold, fps)
+            for frame in store.iter_frames():
+                detections = frame["detections"]
+                if tracker is not None:
+                    # Gán lại track_id, candidate không được gán track bị bỏ
+                    detections = tracker.update(frame["frame_index"], detections)
+                aggregator.add(frame["frame_index"], detections)
+            signs = self._build_detected_signs_for_video(detection, aggregator.finish(), fps)
+        
+        detection.conf_threshold = conf_threshold
+        if detection.file_type == 'video':
+            detection.gap_tolerance = gap_tolerance
+            detection.min_duration = min_duration
+        with time_stage("db_write"), transaction.atomic():
+            detection.detected_signs.all().delete()
+            DetectedSign.objects.bulk_create(signs)
+            detection.save(update_fields=['conf_threshold', 'gap_tolerance', 'min_duration'])
+        logger.info(
+            f"Detection {detection.id}: reaggregated {store.frame_count} frames into {len(signs)} signs "
+            f"(conf={conf_threshold}, gap={gap_tolerance}, min_duration={min_duration}) "
+            f"in {(time.perf_counter() - started) * 1000:.1f}ms"
+        )
+        return signs
+    
+    @staticmethod
+    def _threshold(value, current, default):
+        if value is not None:
+            return value
+        return current if current is not None else default
+    
+    def _create_replay_tracker(self, store, conf_threshold, fps):
+        """
+        ByteTracker giống lúc xử lý video (yolo_infer._create_track_stage) để gán lại track_id,
+        None nếu video chạy không có tracker hoặc track_id đã lưu dùng được (cùng conf_threshold)
+        """
+        tracking = store.meta.get("tracking")
+        if tracking is None:
+            # File lưu trước khi có meta "tracking": có track_id nghĩa là video chạy với tracker
+            tracking = bool((store["track_id"] >= 0).any())
+        if not tracking or store.meta.get("conf_threshold") == conf_threshold:
+            return None
+        return ByteTracker(
+            high_threshold=conf_threshold,
+            low_threshold=min(conf_threshold, TRACKER_LOW_CONF_THRESHOLD),
+            match_iou=TRACKER_MATCH_IOU,
+            max_age=int(fps * TRACKER_MAX_AGE_SECONDS),
+        )
+    
+    def _build_detected_signs_for_video(self, detection, segments, fps):
+        """
+        DetectedSign (chưa lưu) cho video với timeline, mỗi segment là một DetectedSign
+        Segment: các detection của cùng một biển báo, cho phép gap nhỏ, hoặc một track nếu tracker bật
+        """
+        return [self._build_detected_sign_for_video(detection, segment, fps) for segment in segments]
+    
+    def _build_detected_sign_for_video(self, detection, segment, fps):
+        """Một DetectedSign (chưa lưu) cho video"""
+        # Thời gian theo FPS gốc, confidence trung bình, bbox cuối cùng của segment
+        start_time = segment.start_frame / fps if fps > 0 else 0
+        end_time = segment.end_frame / fps if fps > 0 else 0
+        
+        # Tìm TrafficSign tương ứng
+        traffic_sign = self._find_traffic_sign(segment.class_id, segment.class_name)
+        
+        return DetectedSign(
+            detection=detection,
+            traffic_sign=traffic_sign,
+            class_id=segment.class_id,
+            class_name=segment.class_name,
+            confidence=segment.confidence,
+            bbox=segment.bbox,
+            start_time=start_time,
+            end_time=end_time,
+            frame_index=segment.start_frame
+        )
+    
+    def _find_traffic_sign(self, class_id, class_name):
+        """
+        Tìm TrafficSign dựa trên class_id hoặc class_name từ YOLO
+        Tra trong index của process (traffic_signs/index.py), không query DB mỗi biển báo
+        """
+        return traffic_sign_index.resolve(class_id, class_name)
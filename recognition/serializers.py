@@ -103,18 +103,21 @@ class DetectionDetailSerializer(serializers.ModelSerializer):
     detected_signs = serializers.SerializerMethodField()
     signs_summary = serializers.SerializerMethodField()
     output_file = serializers.SerializerMethodField()
+    detections_file = serializers.SerializerMethodField()
     file = serializers.SerializerMethodField()
     
     class Meta:
         model = Detection
         fields = [
-            'id', 'file', 'output_file', 'file_type', 
+            'id', 'file', 'output_file', 'detections_file', 'file_type', 
             'status', 'fps', 'duration', 'total_frames', 
-            'error_message', 'created_at', 'detected_signs', 'signs_summary'
+            'error_message', 'model_version', 'conf_threshold', 'gap_tolerance', 'min_duration',
+            'created_at', 'detected_signs', 'signs_summary'
         ]
         read_only_fields = [
             'id', 'output_file', 'status', 'fps', 'duration', 
-            'total_frames', 'error_message', 'created_at'
+            'total_frames', 'error_message', 'model_version', 'conf_threshold', 'gap_tolerance', 'min_duration',
+            'created_at'
         ]
     
     def get_detected_signs(self, obj):
@@ -159,6 +162,14 @@ class DetectionDetailSerializer(serializers.ModelSerializer):
                 return request.build_absolute_uri(f'/api/recognition/media/{file_path}')
         return None
     
+    def get_detections_file(self, obj):
+        """URL file .npz detections gốc từng frame (đọc theo khoảng frame qua /detection/<id>/frames/)"""
+        if obj.detections_file:
+            request = self.context.get('request')
+            if request:
+                return request.build_absolute_uri(f'/api/recognition/media/{obj.detections_file.name}')
+        return None
+    
     def get_signs_summary(self, obj):
         """Tóm tắt số lượng từng loại biển báo với timeline chi tiết"""
         signs = obj.detected_signs.all()
@@ -0,0 +1,407 @@
+"""
+Live stream ingestion: nhận diện biển báo trên nguồn frame liên tục (dashcam)
+
+Hai chế độ, đều là Detection có file_type='stream' do worker (run_detection_workers) claim và chạy,
+mỗi stream chiếm một worker thread (trạng thái sampling / segment đang mở chỉ nằm trong worker đó):
+- source_url (RTSP / HTTP MJPEG): worker đọc stream cho tới khi bị stop, stream kết thúc
+  hoặc quá STREAM_MAX_DURATION.
+- Push: client POST từng frame JPEG lên API, web process chỉ ghi frame vào thư mục của stream
+  (push_frame_dir, dưới MEDIA_ROOT nên web và worker phải dùng chung storage), worker đọc và detect theo thứ tự.
+  Stream push không nhận frame nào quá STREAM_PUSH_IDLE_TIMEOUT giây được kết thúc (expire_push_streams).
+
+source_url chỉ được trỏ tới host trong STREAM_ALLOWED_HOSTS hoặc host chỉ resolve ra địa chỉ public
+(validate_source_url): worker không bị dùng để kết nối vào dịch vụ nội bộ / cloud metadata (SSRF).
+
+Chỉ frame cách frame detect trước >= 1/STREAM_DETECTION_FPS giây mới chạy YOLO.
+DetectedSign được ghi dần: tạo khi biển báo xuất hiện đủ MIN_APPEARANCE_DURATION, end_time
+được cập nhật mỗi lần còn thấy, nên client đọc được sự kiện ngay (SSE) thay vì đợi hết stream.
+"""
+import ipaddress
+import logging
+import os
+import shutil
+import socket
+import threading
+import time
+import uuid
+from datetime import timedelta
+from urllib.parse import urlparse
+
+import cv2
+import numpy as np
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.models import Q
+from django.http.request import validate_host
+from django.utils import timezone
+
+from ai_engine.metrics import FRAMES_TOTAL, time_stage
+from ai_engine.stream_source import LatestFrameReader
+from ai_engine.yolo_infer import active_model_version, predict_frame
+from .models import Detection, DetectedSign
+
+logger = logging.getLogger(__name__)
+
+ALLOWED_SCHEMES = ('rtsp', 'rtsps', 'http', 'https')
+# Chữ ký đầu file của frame push được nhận (JPEG, PNG), decode để ở worker
+IMAGE_SIGNATURES = (b'\xff\xd8\xff', b'\x89PNG\r\n\x1a\n')
+PUSH_FRAME_SUFFIX = '.frame'
+PUSH_POLL_INTERVAL = 0.05  # giây, worker kiểm tra frame push mới
+
+
+class StreamSourceError(ValueError):
+    """source_url không được phép đọc, message trả về cho client"""
+
+
+def validate_source_url(source_url: str):
+    """
+    Raise StreamSourceError nếu worker không được kết nối tới source_url:
+    giao thức ngoài ALLOWED_SCHEMES, hoặc host không nằm trong STREAM_ALLOWED_HOSTS (cùng cú pháp ALLOWED_HOSTS
+    của Django) mà resolve ra địa chỉ không public (loopback, private, link-local như 169.254.169.254, ...)
+    """
+    parsed = urlparse(source_url)
+    if parsed.scheme.lower() not in ALLOWED_SCHEMES:
+        raise StreamSourceError(f"source_url phải là một trong các giao thức: {', '.join(ALLOWED_SCHEMES)}")
+    try:
+        host = (parsed.hostname or '').rstrip('.')
+        parsed.port  # Port không hợp lệ -> ValueError
+    except ValueError:
+        host = ''
+    if not host:
+        raise StreamSourceError("source_url không có host hợp lệ")
+    if validate_host(host, settings.STREAM_ALLOWED_HOSTS):
+        return
+    try:
+        addresses = {info[4][0] for info in socket.getaddrinfo(host, None)}
+    except (socket.gaierror, UnicodeError):
+        raise StreamSourceError(f"Không resolve được host {host}")
+    for address in addresses:
+        ip = ipaddress.ip_address(address.split('%')[0])
+        if ip.version == 6 and ip.ipv4_mapped:
+            ip = ip.ipv4_mapped
+        if not ip.is_global or ip.is_multicast:
+            raise StreamSourceError(f"Host {host} không được phép (địa chỉ nội bộ)")
+
+
+class _OpenSegment:
+    __slots__ = ('class_id', 'class_name', 'start_time', 'end_time', 'start_frame',
+                 'confidence_sum', 'count', 'bbox', 'sign')
+
+    def __init__(self, det, timestamp, frame_index):
+        self.class_id = det.get('class_id')
+        self.class_name = det.get('class_name', '')
+        self.start_time = timestamp
+        self.end_time = timestamp
+        self.start_frame = frame_index
+        self.confidence_sum = 0.0
+        self.count = 0
+        self.bbox = det.get('bbox', [])
+        self.sign = None  # DetectedSign khi đã được ghi xuống DB
+        self.add(det, timestamp)
+
+    def add(self, det, timestamp):
+        self.end_time = timestamp
+        self.confidence_sum += det.get('confidence', 0)
+        self.count += 1
+        self.bbox = det.get('bbox', [])
+
+    @property
+    def confidence(self):
+        return self.confidence_sum / self.count if self.count else 0
+
+
+class StreamSession:
+    """
+    Trạng thái nhận diện của một stream: sampling theo thời gian và các segment đang mở
+
+    process_frame(frame, timestamp) -> (detections | None, events)
+    detections là None khi frame bị bỏ qua (chưa tới lượt sample)
+    """
+
+    def __init__(self, detection, processor):
+        self.detection = detection
+        self.processor = processor
+        self.min_interval = 1.0 / max(settings.STREAM_DETECTION_FPS, 0.001)
+        self.gap_tolerance = settings.STREAM_GAP_TOLERANCE
+        self.frames = detection.total_frames or 0
+        self.sampled = 0
+        self.last_timestamp = detection.duration or 0.0
+        self.model_version = detection.model_version
+        self._last_sampled_at = None
+        self._open = {}  # (class_id, class_name) -> _OpenSegment
+        self._lock = threading.Lock()
+        self._restore_open_segments()
+
+    def _restore_open_segments(self):
+        """Nối tiếp các DetectedSign vừa ghi (session được tạo lại ở process khác / sau restart)"""
+        recent = DetectedSign.objects.filter(
+            detection=self.detection,
+            end_time__gte=self.last_timestamp - self.gap_tolerance,
+        )
+        for sign in recent:
+            segment = _OpenSegment(
+                {'class_id': sign.class_id, 'class_name': sign.class_name,
+                 'confidence': sign.confidence, 'bbox': sign.bbox},
+                sign.start_time, sign.frame_index,
+            )
+            segment.end_time = sign.end_time
+            segment.sign = sign
+            self._open[(sign.class_id, sign.class_name)] = segment
+
+    def process_frame(self, frame, timestamp: float = None):
+        return self._process(lambda: frame, timestamp)
+
+    def process_encoded_frame(self, data: bytes, timestamp: float = None):
+        """Như process_frame với ảnh JPEG / PNG chưa decode: frame không tới lượt sample không bị decode"""
+        return self._process(lambda: cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR), timestamp)
+
+    def _process(self, load_frame, timestamp):
+        with self._lock:
+            if timestamp is None:
+                timestamp = (timezone.now() - self.detection.started_at).total_seconds()
+            frame_index = self.frames
+            self.frames += 1
+            self.last_timestamp = max(self.last_timestamp, timestamp)
+            FRAMES_TOTAL.inc(source="stream", kind="decoded")
+
+            if self._last_sampled_at is not None and timestamp - self._last_sampled_at < self.min_interval:
+                return None, []
+            frame = load_frame()
+            if frame is None:
+                logger.warning(f"Stream {self.detection.id}: frame {frame_index} is not a valid image, skipped")
+                return None, []
+            self._last_sampled_at = timestamp
+            self.sampled += 1
+            FRAMES_TOTAL.inc(source="stream", kind="inferred")
+
+            detections = predict_frame(frame, conf=self.processor.CONF_THRESHOLD)
+            self.model_version = active_model_version()
+            detections = self.processor._filter_overlapping_detections(detections)
+            with time_stage("db_write"):
+                events = self._update_segments(detections, timestamp, frame_index)
+            return detections, events
+
+    def _update_segments(self, detections, timestamp, frame_index) -> list:
+        events = []
+        for det in detections:
+            key = (det.get('class_id'), det.get('class_name', ''))
+            segment = self._open.get(key)
+            if segment is None or timestamp - segment.end_time > self.gap_tolerance:
+                self._open[key] = _OpenSegment(det, timestamp, frame_index)
+                continue
+            segment.add(det, timestamp)
+            if segment.sign is None:
+                if segment.end_time - segment.start_time >= self.processor.MIN_APPEARANCE_DURATION:
+                    segment.sign = self._create_sign(segment)
+                    events.append(sign_event(segment.sign))
+            else:
+                self._update_sign(segment)
+
+        # Đóng các segment không còn thấy quá gap tolerance
+        for key, segment in list(self._open.items()):
+            if timestamp - segment.end_time > self.gap_tolerance:
+                del self._open[key]
+        return events
+
+    def _create_sign(self, segment) -> DetectedSign:
+        return DetectedSign.objects.create(
+            detection=self.detection,
+            traffic_sign=self.processor._find_traffic_sign(segment.class_id, segment.class_name),
+            class_id=segment.class_id,
+            class_name=segment.class_name,
+            confidence=segment.confidence,
+            bbox=segment.bbox,
+            start_time=segment.start_time,
+            end_time=segment.end_time,
+            frame_index=segment.start_frame,
+        )
+
+    def _update_sign(self, segment):
+        sign = segment.sign
+        sign.end_time = segment.end_time
+        sign.confidence = segment.confidence
+        sign.bbox = segment.bbox
+        sign.save(update_fields=['end_time', 'confidence', 'bbox'])
+
+    def save_progress(self):
+        """Lưu số frame đã nhận, thời lượng stream hiện tại và version model"""
+        self.detection.total_frames = self.frames
+        self.detection.duration = self.last_timestamp
+        self.detection.model_version = self.model_version
+        Detection.objects.filter(id=self.detection.id).update(
+            total_frames=self.frames, duration=self.last_timestamp, model_version=self.model_version,
+        )
+
+
+def sign_event(sign: DetectedSign) -> dict:
+    """Payload sự kiện 'sign' gửi cho client (SSE / response của push frame)"""
+    return {
+        'id': sign.id,
+        'class_id': sign.class_id,
+        'class_name': sign.class_name,
+        'sign_code': sign.traffic_sign.sign_Code if sign.traffic_sign_id else None,
+        'confidence': round(sign.confidence, 3),
+        'bbox': sign.bbox,
+        'start_time': sign.start_time,
+        'end_time': sign.end_time,
+    }
+
+
+def push_frame_dir(detection_id) -> str:
+    """Thư mục chứa frame push đã nhận, chưa được worker detect"""
+    return os.path.join(settings.MEDIA_ROOT, 'stream_frames', str(detection_id))
+
+
+def is_image_data(data: bytes) -> bool:
+    return data.startswith(IMAGE_SIGNATURES)
+
+
+def enqueue_push_frame(detection, data: bytes, timestamp: float) -> bool:
+    """
+    Ghi frame (JPEG / PNG) cho worker của stream, không decode / detect trong request
+    Trả về False nếu đã có STREAM_PUSH_QUEUE_SIZE frame chờ (worker không theo kịp)
+    """
+    frame_dir = push_frame_dir(detection.id)
+    os.makedirs(frame_dir, exist_ok=True)
+    if len(os.listdir(frame_dir)) >= settings.STREAM_PUSH_QUEUE_SIZE:
+        return False
+    # Tên theo thời điểm nhận: worker detect theo thứ tự, kể cả khi frame đến từ nhiều web process
+    name = f"{time.time_ns():020d}-{uuid.uuid4().hex[:8]}-{timestamp!r}{PUSH_FRAME_SUFFIX}"
+    tmp_path = os.path.join(frame_dir, name + '.tmp')
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, os.path.join(frame_dir, name))
+    Detection.objects.filter(id=detection.id).update(last_frame_at=timezone.now())
+    return True
+
+
+def discard_push_frames(detection_id):
+    shutil.rmtree(push_frame_dir(detection_id), ignore_errors=True)
+
+
+def _pending_push_frames(frame_dir) -> list:
+    try:
+        return sorted(name for name in os.listdir(frame_dir) if name.endswith(PUSH_FRAME_SUFFIX))
+    except FileNotFoundError:
+        return []
+
+
+def expire_push_streams(idle_seconds=None) -> int:
+    """
+    Kết thúc (status 'done') các stream push không nhận frame nào quá STREAM_PUSH_IDLE_TIMEOUT giây
+    (client mất kết nối, không gọi stop). Trả về số stream đã kết thúc
+    """
+    if idle_seconds is None:
+        idle_seconds = settings.STREAM_PUSH_IDLE_TIMEOUT
+    deadline = timezone.now() - timedelta(seconds=idle_seconds)
+    idle = Detection.objects.filter(file_type='stream', source_url='', status__in=['pending', 'processing']).filter(
+        Q(last_frame_at__lt=deadline)
+        | (Q(last_frame_at__isnull=True) & (Q(started_at__lt=deadline) | Q(started_at__isnull=True, created_at__lt=deadline)))
+    )
+    idle_ids = list(idle.values_list('id', flat=True))
+    # Worker của stream dừng trong khoảng 1 giây, frame gửi sau đó nhận 409
+    count = Detection.objects.filter(id__in=idle_ids, status__in=['pending', 'processing']).update(
+        status='done', finished_at=timezone.now()
+    )
+    for detection_id in idle_ids:
+        discard_push_frames(detection_id)
+    if count:
+        logger.info(f"Expired {count} idle push stream(s)")
+    return count
+
+
+def run_stream(detection, processor):
+    """Chạy stream trong worker thread: đọc source_url hoặc detect frame push"""
+    if detection.source_url:
+        return run_url_stream(detection, processor)
+    return run_push_stream(detection, processor)
+
+
+def _stream_stopped(detection) -> bool:
+    close_old_connections()
+    return not Detection.objects.filter(id=detection.id, status='processing').exists()
+
+
+def run_push_stream(detection, processor):
+    """
+    Detect các frame client đã push (theo thứ tự nhận) cho tới khi stream bị stop hoặc hết hạn vì idle
+    Frame không tới lượt sample chỉ được đếm, không decode
+    """
+    session = StreamSession(detection, processor)
+    frame_dir = push_frame_dir(detection.id)
+    last_check = time.monotonic()
+    logger.info(f"Stream {detection.id}: waiting for pushed frames")
+    try:
+        while True:
+            now = time.monotonic()
+            if now - last_check >= 1.0:
+                last_check = now
+                session.save_progress()
+                if _stream_stopped(detection):
+                    logger.info(f"Stream {detection.id}: stopped")
+                    break
+
+            names = _pending_push_frames(frame_dir)
+            if not names:
+                time.sleep(PUSH_POLL_INTERVAL)
+                continue
+            for name in names:
+                path = os.path.join(frame_dir, name)
+                try:
+                    with open(path, 'rb') as f:
+                        data = f.read()
+                    os.remove(path)
+                except FileNotFoundError:
+                    continue
+                timestamp = float(name[:-len(PUSH_FRAME_SUFFIX)].split('-', 2)[2])
+                session.process_encoded_frame(data, timestamp)
+    finally:
+        session.save_progress()
+        discard_push_frames(detection.id)
+    logger.info(f"Stream {detection.id}: {session.frames} frames pushed, {session.sampled} detected")
+    return session
+
+
+def run_url_stream(detection, processor):
+    """
+    Đọc stream từ detection.source_url cho tới khi bị stop (status khác 'processing'),
+    stream kết thúc hoặc quá STREAM_MAX_DURATION giây. Chạy trong worker thread.
+    """
+    # Kiểm tra lại lúc worker kết nối: DNS của host có thể đã đổi sau khi stream được tạo
+    validate_source_url(detection.source_url)
+    session = StreamSession(detection, processor)
+    reader = LatestFrameReader(detection.source_url)
+    started = time.monotonic()
+    last_check = started
+    logger.info(f"Stream {detection.id}: reading {detection.source_url}")
+    try:
+        while True:
+            now = time.monotonic()
+            if now - started > settings.STREAM_MAX_DURATION:
+                logger.info(f"Stream {detection.id}: reached STREAM_MAX_DURATION")
+                break
+            if now - last_check >= 1.0:
+                last_check = now
+                session.save_progress()
+                if _stream_stopped(detection):
+                    logger.info(f"Stream {detection.id}: stopped by client")
+                    break
+
+            item = reader.read_latest(timeout=1.0)
+            if item is None:
+                if reader.ended:
+                    break
+                continue
+            _, frame, timestamp = item
+            session.process_frame(frame, timestamp)
+    finally:
+        reader.stop()
+        session.frames = reader.frames_read
+        session.save_progress()
+    if reader.error and session.frames == 0:
+        raise RuntimeError(reader.error)
+    logger.info(
+        f"Stream {detection.id}: {reader.frames_read} frames read, {session.sampled} detected, "
+        f"{reader.frames_dropped} dropped while inference was busy"
+    )
+    return session
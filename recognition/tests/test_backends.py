@@ -0,0 +1,72 @@
+import tempfile
+from pathlib import Path
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from ai_engine import backends
+from ai_engine.backends import current_model_version, resolve_backend, resolved_model_version
+from ai_engine.model_registry import ModelRegistry
+
+
+class ResolveBackendTests(SimpleTestCase):
+    """Version phải theo backend / precision thực sự load, không phải cấu hình"""
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self._tmp.cleanup)
+        self.weights = Path(self._tmp.name) / 'best.pt'
+        self.weights.write_bytes(b'weights')
+        for name, value in (('YOLO_WEIGHTS', str(self.weights)), ('YOLO_EXPORT_DIR', self._tmp.name)):
+            patcher = mock.patch.dict('os.environ', {name: value})
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.hash = backends.weights_hash(self.weights)[:16]
+
+    def test_missing_backend_package_falls_back_to_torch(self):
+        with mock.patch.object(backends, 'backend_available', return_value=False):
+            self.assertEqual(resolve_backend('onnx', 'int8', self.weights), ('torch', 'fp32', None))
+            with mock.patch.object(backends, 'INFERENCE_BACKEND', 'onnx'):
+                self.assertEqual(resolved_model_version(), f"{self.hash}-torch-fp32")
+
+    def test_failed_export_falls_back_to_torch(self):
+        with mock.patch.object(backends, 'backend_available', return_value=True), \
+                mock.patch.object(backends, 'export_model', side_effect=RuntimeError('export failed')):
+            self.assertEqual(resolve_backend('onnx', 'fp32', self.weights), ('torch', 'fp32', None))
+
+    def test_missing_int8_model_falls_back_to_fp32(self):
+        artifact = backends.exported_artifact_path(self.weights, 'onnx')
+        with mock.patch.object(backends, 'backend_available', return_value=True), \
+                mock.patch.object(backends, 'export_model', return_value=artifact):
+            self.assertEqual(resolve_backend('onnx', 'int8', self.weights), ('onnx', 'fp32', artifact))
+        self.assertEqual(resolve_backend('torch', 'int8', self.weights), ('torch', 'fp32', None))
+
+    def test_unknown_until_exported(self):
+        artifact = backends.exported_artifact_path(self.weights, 'onnx')
+        with mock.patch.object(backends, 'backend_available', return_value=True), \
+                mock.patch.object(backends, 'INFERENCE_BACKEND', 'onnx'), \
+                mock.patch.object(backends, 'export_model') as export_model:
+            # Chưa export: không biết export có lỗi (-> torch) hay không, không export trong request
+            self.assertIsNone(resolved_model_version())
+            artifact.write_bytes(b'onnx')
+            backends.metadata_path(artifact).write_text('{}')
+            self.assertEqual(resolved_model_version(), f"{self.hash}-onnx-fp32")
+        export_model.assert_not_called()
+
+    def test_load_model_returns_loaded_backend(self):
+        with mock.patch.object(backends, 'backend_available', return_value=False), \
+                mock.patch('ultralytics.YOLO') as yolo:
+            model, backend, precision = backends.load_model('openvino', 'fp32', self.weights)
+        self.assertIs(model, yolo.return_value)
+        self.assertEqual((backend, precision), ('torch', 'fp32'))
+
+    def test_registry_version_uses_loaded_backend(self):
+        def load(handle):
+            # Cấu hình onnx nhưng loader đã fallback về torch
+            handle.model, handle.backend, handle.precision = 'model', 'torch', 'fp32'
+
+        with mock.patch.object(backends, 'INFERENCE_BACKEND', 'onnx'):
+            handle = ModelRegistry(load).active()
+        self.assertEqual(handle.version, f"{self.hash}-torch-fp32")
+        self.assertEqual(handle.version, current_model_version('torch', 'fp32', self.weights))
+        self.assertEqual(handle.describe()['backend'], 'torch')
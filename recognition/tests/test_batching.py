@@ -0,0 +1,100 @@
+import threading
+import time
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from ai_engine import yolo_infer
+from ai_engine.batching import MicroBatcher
+
+
+class MicroBatcherTests(SimpleTestCase):
+
+    def make_batcher(self, batch_fn=None, **kwargs):
+        self.batches = []
+
+        def record(items):
+            self.batches.append(list(items))
+            return batch_fn(items) if batch_fn else [item * 10 for item in items]
+
+        batcher = MicroBatcher(record, **kwargs)
+        self.addCleanup(batcher.stop)
+        return batcher
+
+    def test_concurrent_items_are_batched_and_results_scattered(self):
+        batcher = self.make_batcher(max_batch_size=4, max_wait_ms=200)
+        futures = [batcher.submit(i) for i in range(4)]
+
+        self.assertEqual([future.result(timeout=2) for future in futures], [0, 10, 20, 30])
+        self.assertEqual(self.batches, [[0, 1, 2, 3]])
+        self.assertEqual(batcher.average_batch_size, 4.0)
+
+    def test_batches_never_exceed_max_size(self):
+        batcher = self.make_batcher(max_batch_size=4, max_wait_ms=200)
+        futures = [batcher.submit(i) for i in range(10)]
+
+        self.assertEqual([future.result(timeout=2) for future in futures], [i * 10 for i in range(10)])
+        self.assertEqual([len(batch) for batch in self.batches], [4, 4, 2])
+        self.assertEqual(sum(self.batches, []), list(range(10)))
+
+    def test_partial_batch_is_flushed_after_max_wait(self):
+        batcher = self.make_batcher(max_batch_size=8, max_wait_ms=50)
+        started = time.perf_counter()
+        self.assertEqual(batcher(7), 70)
+        elapsed = time.perf_counter() - started
+
+        self.assertEqual(self.batches, [[7]])
+        self.assertGreaterEqual(elapsed, 0.04)
+        self.assertLess(elapsed, 1.0)
+
+    def test_model_error_reaches_every_caller_in_batch(self):
+        error = RuntimeError('CUDA out of memory')
+
+        def fail_on_first_batch(items):
+            if len(self.batches) == 1:
+                raise error
+            return [item * 10 for item in items]
+
+        batcher = self.make_batcher(fail_on_first_batch, max_batch_size=3, max_wait_ms=200)
+        futures = [batcher.submit(i) for i in range(3)]
+        for future in futures:
+            self.assertIs(future.exception(timeout=2), error)
+        # Batcher vẫn chạy sau khi batch trước lỗi
+        self.assertEqual(batcher(5), 50)
+
+    def test_callers_on_many_threads(self):
+        batcher = self.make_batcher(max_batch_size=8, max_wait_ms=20)
+        results = {}
+
+        def call(i):
+            results[i] = batcher(i)
+
+        threads = [threading.Thread(target=call, args=(i,)) for i in range(32)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(timeout=5)
+
+        self.assertEqual(results, {i: i * 10 for i in range(32)})
+        self.assertTrue(all(len(batch) <= 8 for batch in self.batches))
+        self.assertEqual(sorted(sum(self.batches, [])), list(range(32)))
+
+
+class ImageBatchFunctionTests(SimpleTestCase):
+
+    def test_items_are_grouped_by_conf_and_model_version(self):
+        old, new = object(), object()
+        calls = []
+
+        def infer(images, conf, handle):
+            calls.append((images, conf, handle))
+            return [f"{image}@{conf}" for image in images]
+
+        items = [('a', 0.5, old), ('b', 0.25, old), ('c', 0.5, new), ('d', 0.5, old)]
+        with mock.patch.object(yolo_infer, '_infer_images', side_effect=infer):
+            outputs = yolo_infer._infer_image_batch(items)
+
+        self.assertEqual(outputs, ['a@0.5', 'b@0.25', 'c@0.5', 'd@0.5'])
+        self.assertEqual(sorted((images, conf) for images, conf, _ in calls),
+                         [(['a', 'd'], 0.5), (['b'], 0.25), (['c'], 0.5)])
+        self.assertEqual(len(calls), 3)
@@ -0,0 +1,135 @@
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from recognition.dedup import clone_detection, create_detection_for_upload, find_reusable_detection
+from recognition.models import Detection, DetectedSign
+from recognition.processing import DetectionProcessor
+
+SHA = 'a' * 64
+KEY = {'model_version': 'hash-torch-fp32', 'conf_threshold': 0.5, 'gap_tolerance': 0.5, 'min_duration': 0.3}
+
+
+class DedupTests(TestCase):
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        media = override_settings(MEDIA_ROOT=self.media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        os.makedirs(os.path.join(self.media_root, 'results'))
+        User = get_user_model()
+        self.owner = User.objects.create_user(username='owner', email='owner@example.com', password='x')
+        self.other = User.objects.create_user(username='other', email='other@example.com', password='x')
+
+    def make_done(self, output='results/vid.mp4', finished_ago=0, **overrides):
+        fields = {
+            'file': 'uploads/clip.mp4', 'file_sha256': SHA, 'file_type': 'video', 'status': 'done',
+            'output_file': output, 'detections_file': 'detections/vid.npz', 'fps': 25.0, 'duration': 4.0,
+            'total_frames': 100, 'finished_at': timezone.now() - timedelta(seconds=finished_ago), 'user': self.owner,
+            **KEY,
+        }
+        fields.update(overrides)
+        if output:
+            open(os.path.join(self.media_root, output), 'wb').close()
+        return Detection.objects.create(**fields)
+
+    def find(self, **overrides):
+        sha256, file_type = overrides.pop('sha256', SHA), overrides.pop('file_type', 'video')
+        return find_reusable_detection(sha256, file_type, **{**KEY, **overrides})
+
+    def test_same_key_is_reused(self):
+        source = self.make_done()
+        self.assertEqual(self.find(), source)
+
+    def test_key_mismatch_is_not_reused(self):
+        self.make_done()
+        for overrides in (
+            {'model_version': 'hash-onnx-fp32'},
+            {'model_version': 'other-torch-fp32'},
+            {'conf_threshold': 0.4},
+            {'gap_tolerance': 1.0},
+            {'min_duration': 0.5},
+            {'sha256': 'b' * 64},
+            {'file_type': 'image'},
+        ):
+            with self.subTest(**overrides):
+                self.assertIsNone(self.find(**overrides))
+
+    def test_only_finished_results_with_output_are_reused(self):
+        for status in ('pending', 'processing', 'failed'):
+            self.make_done(status=status)
+        self.make_done(output='')
+        missing = self.make_done(output='results/missing.mp4')
+        os.remove(os.path.join(self.media_root, 'results/missing.mp4'))
+        self.assertIsNone(self.find())
+
+        # Bản mới nhất mất file output: dùng bản cũ hơn còn file
+        older = self.make_done(output='results/older.mp4', finished_ago=60)
+        self.assertTrue(missing.finished_at > older.finished_at)
+        self.assertEqual(self.find(), older)
+
+    def test_newest_matching_result_is_used(self):
+        self.make_done(output='results/old.mp4', finished_ago=60)
+        newest = self.make_done(output='results/new.mp4')
+        self.assertEqual(self.find(), newest)
+
+    def test_detection_without_stored_gap_matches_any_gap(self):
+        # Ảnh và detection cũ không lưu gap_tolerance / min_duration
+        source = self.make_done(gap_tolerance=None, min_duration=None)
+        self.assertEqual(self.find(gap_tolerance=2.0, min_duration=1.0), source)
+
+    def test_clone_copies_result_and_signs(self):
+        source = self.make_done()
+        for i in range(3):
+            DetectedSign.objects.create(
+                detection=source, class_id=i, class_name=f"P.10{i}", confidence=0.6 + i / 10,
+                bbox=[i, i, i + 10, i + 10], start_time=i, end_time=i + 0.5, frame_index=i * 25,
+            )
+
+        clone = clone_detection(source, self.other, file_name='uploads/clip_copy.mp4')
+
+        self.assertNotEqual(clone.id, source.id)
+        self.assertEqual(clone.user, self.other)
+        self.assertEqual(clone.status, 'done')
+        self.assertEqual(clone.file.name, 'uploads/clip_copy.mp4')
+        for field in ('file_sha256', 'file_type', 'fps', 'duration', 'total_frames', 'model_version',
+                      'conf_threshold', 'gap_tolerance', 'min_duration'):
+            self.assertEqual(getattr(clone, field), getattr(source, field), field)
+        self.assertEqual(clone.output_file.name, source.output_file.name)
+        self.assertEqual(clone.detections_file.name, source.detections_file.name)
+
+        def rows(detection):
+            return list(detection.detected_signs.order_by('frame_index').values_list(
+                'class_id', 'class_name', 'confidence', 'bbox', 'start_time', 'end_time', 'frame_index'
+            ))
+        self.assertEqual(rows(clone), rows(source))
+        self.assertTrue(set(clone.detected_signs.values_list('id', flat=True)).isdisjoint(
+            source.detected_signs.values_list('id', flat=True)
+        ))
+        # Reaggregate / xóa trên bản clone không động tới kết quả gốc
+        clone.detected_signs.all().delete()
+        self.assertEqual(source.detected_signs.count(), 3)
+
+    @mock.patch('recognition.dedup.resolved_model_version', return_value=KEY['model_version'])
+    def test_create_detection_for_upload(self, _):
+        source = self.make_done(
+            conf_threshold=DetectionProcessor.CONF_THRESHOLD, gap_tolerance=DetectionProcessor.GAP_TOLERANCE,
+            min_duration=DetectionProcessor.MIN_APPEARANCE_DURATION,
+        )
+        with override_settings(DETECTION_REUSE_RESULTS=True):
+            detection, reused = create_detection_for_upload(self.other, 'video', SHA, 'uploads/new.mp4')
+        self.assertTrue(reused)
+        self.assertEqual(detection.output_file.name, source.output_file.name)
+
+        with override_settings(DETECTION_REUSE_RESULTS=False):
+            detection, reused = create_detection_for_upload(self.other, 'video', SHA, 'uploads/new.mp4')
+        self.assertFalse(reused)
+        self.assertEqual(detection.status, 'pending')
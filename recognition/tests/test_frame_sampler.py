@@ -0,0 +1,89 @@
+import random
+
+import numpy as np
+from django.test import SimpleTestCase
+
+from ai_engine.frame_sampler import AdaptiveFrameSampler, FixedStrideSampler
+
+
+def scene(value):
+    """Frame BGR một màu: cùng value là cảnh đứng yên"""
+    return np.full((72, 128, 3), value, dtype=np.uint8)
+
+
+def sampled_indices(sampler, frames):
+    return [idx for idx, frame in enumerate(frames) if sampler.should_sample(idx, frame)]
+
+
+class AdaptiveFrameSamplerTests(SimpleTestCase):
+
+    def make_sampler(self, fps=30.0, **kwargs):
+        options = {'min_fps': 2.0, 'max_fps': 15.0, 'diff_threshold': 0.03, 'base_fps': 7.0}
+        options.update(kwargs)
+        return AdaptiveFrameSampler(fps, **options)
+
+    def test_gaps_from_fps(self):
+        sampler = self.make_sampler()
+        self.assertEqual((sampler.min_gap, sampler.max_gap), (2, 15))
+        # max_fps cao hơn fps của video: detect tối đa mọi frame
+        self.assertEqual(self.make_sampler(fps=10.0, max_fps=15.0).min_gap, 1)
+        # Không đọc được fps: coi như 24
+        self.assertEqual(self.make_sampler(fps=0, min_fps=2.0).max_gap, 12)
+
+    def test_static_scene_uses_widest_stride(self):
+        sampler = self.make_sampler()
+        indices = sampled_indices(sampler, [scene(100)] * 100)
+
+        self.assertEqual(indices, list(range(0, 100, 15)))
+        report = sampler.report()
+        self.assertEqual(report['sampled_on_change'], 0)
+        self.assertEqual(report['sampled_on_timeout'], len(indices) - 1)
+        # Stride cố định 30 / 7 = 4 frame sẽ detect 25 lần
+        self.assertEqual(report['saved_vs_fixed_stride'], 25 - len(indices))
+
+    def test_changing_scene_uses_narrowest_stride(self):
+        indices = sampled_indices(self.make_sampler(), [scene(i * 20 % 256) for i in range(40)])
+        self.assertEqual(indices, list(range(0, 40, 2)))
+
+    def test_scene_change_resets_stride(self):
+        # Đứng yên, cảnh đổi ở frame 37, rồi lại đứng yên
+        frames = [scene(50)] * 37 + [scene(200)] * 63
+        sampler = self.make_sampler()
+        indices = sampled_indices(sampler, frames)
+
+        self.assertEqual(indices[:3], [0, 15, 30])
+        self.assertIn(37, indices)
+        after = indices[indices.index(37):]
+        # Sau lần detect do cảnh đổi, bộ đếm max_gap tính lại từ frame đó
+        self.assertEqual(after, list(range(37, 100, 15)))
+        self.assertEqual(sampler.report()['sampled_on_change'], 1)
+
+    def test_change_before_min_gap_waits(self):
+        frames = [scene(50), scene(200), scene(200), scene(200)]
+        self.assertEqual(sampled_indices(self.make_sampler(), frames), [0, 2])
+
+    def test_gap_stays_within_bounds(self):
+        rng = random.Random(0)
+        value, frames = 100, []
+        for _ in range(2000):
+            if rng.random() < 0.1:
+                value = rng.randint(0, 255)
+            frames.append(scene(value))
+        sampler = self.make_sampler()
+        indices = sampled_indices(sampler, frames)
+
+        gaps = np.diff(indices)
+        self.assertEqual(indices[0], 0)
+        self.assertGreaterEqual(gaps.min(), sampler.min_gap)
+        self.assertLessEqual(gaps.max(), sampler.max_gap)
+        self.assertGreaterEqual(len(frames) - 1 - indices[-1], 0)
+        self.assertLess(len(frames) - 1 - indices[-1], sampler.max_gap)
+        self.assertEqual(sampler.report()['frames'], len(frames))
+
+
+class FixedStrideSamplerTests(SimpleTestCase):
+
+    def test_every_nth_frame(self):
+        sampler = FixedStrideSampler(4)
+        self.assertEqual(sampled_indices(sampler, [None] * 10), [0, 4, 8])
+        self.assertEqual(sampler.report()['skipped'], 7)
@@ -0,0 +1,193 @@
+import random
+import tempfile
+from pathlib import Path
+from unittest import mock
+
+import numpy as np
+from django.contrib.auth import get_user_model
+from django.core.files import File
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from ai_engine.frame_store import FrameDetectionFile, FrameDetectionWriter
+from recognition.models import Detection
+
+
+def random_frames(count, seed=0):
+    """Frame tăng dần (có bước nhảy), một số frame không có detection; giá trị biểu diễn chính xác bằng float32"""
+    rng = random.Random(seed)
+    frames, frame_index = [], 0
+    for _ in range(count):
+        frame_index += rng.choice([1, 2, 5])
+        detections = []
+        for _ in range(rng.choice([0, 0, 1, 2, 4])):
+            x, y = rng.randint(0, 1900) / 4, rng.randint(0, 1000) / 4
+            det = {
+                'class_id': rng.randint(0, 51),
+                'class_name': '',
+                'confidence': rng.randint(1, 100) / 128,
+                'bbox': [x, y, x + rng.randint(4, 200) / 2, y + rng.randint(4, 200) / 2],
+            }
+            det['class_name'] = f"sign_{det['class_id']}"
+            if rng.random() < 0.5:
+                det['track_id'] = rng.randint(1, 500)
+            detections.append(det)
+        frames.append({'frame_index': frame_index, 'detections': detections})
+    return frames
+
+
+class FrameStoreRoundTripTests(SimpleTestCase):
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.dir = Path(self._tmp.name)
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def write(self, frames, meta=None, name='detections.npz'):
+        writer = FrameDetectionWriter()
+        for frame in frames:
+            writer.add(frame['frame_index'], frame['detections'])
+        return FrameDetectionFile(writer.save(self.dir / name, meta))
+
+    def test_empty_video(self):
+        store = self.write([], meta={'fps': 30.0})
+
+        self.assertEqual(store.frame_count, 0)
+        self.assertEqual(store.meta['fps'], 30.0)
+        self.assertEqual(store.class_names, [])
+        self.assertEqual(list(store.iter_frames()), [])
+        self.assertEqual(store.frame_range(), (0, 0))
+        self.assertEqual(store.frame_range(10, 20), (0, 0))
+        columns = store.slice(0, 0)
+        self.assertEqual(len(columns['frame_index']), 0)
+        self.assertEqual(len(columns['class_id']), 0)
+        self.assertEqual(columns['row_offsets'].tolist(), [0])
+        with np.load(store.path) as data:
+            self.assertEqual(data['row_offsets'].tolist(), [0])
+
+    def test_frames_without_detections(self):
+        frames = [
+            {'frame_index': 0, 'detections': []},
+            {'frame_index': 3, 'detections': [
+                {'class_id': 2, 'class_name': 'P.102', 'confidence': 0.75, 'bbox': [1.0, 2.0, 3.0, 4.0]},
+            ]},
+            {'frame_index': 6, 'detections': []},
+            {'frame_index': 9, 'detections': []},
+        ]
+        store = self.write(frames)
+
+        self.assertEqual(list(store.iter_frames()), frames)
+        self.assertEqual(store['row_offsets'].tolist(), [0, 0, 1, 1, 1])
+        self.assertEqual(store.class_names, ['', '', 'P.102'])
+
+    def test_round_trip_across_chunk_spills(self):
+        frames = random_frames(300, seed=1)
+        rows = sum(len(frame['detections']) for frame in frames)
+        with mock.patch.object(FrameDetectionWriter, 'CHUNK_ROWS', 16):
+            store = self.write(frames, meta={'fps': 25.0, 'total_frames': 999})
+
+        self.assertGreater(rows, 16 * 4)
+        self.assertEqual(store.frame_count, len(frames))
+        self.assertEqual(len(store['class_id']), rows)
+        self.assertEqual(store.meta, {'format': 1, 'fps': 25.0, 'total_frames': 999})
+        self.assertEqual(list(store.iter_frames()), frames)
+        # Đọc theo chunk nhỏ và một khoảng bất kỳ cho kết quả giống đọc cả file
+        self.assertEqual(list(store.iter_frames(chunk_frames=7)), frames)
+        self.assertEqual(list(store.iter_frames(40, 130, chunk_frames=16)), frames[40:130])
+
+    def test_round_trip_with_default_chunk_size(self):
+        frames = random_frames(FrameDetectionWriter.CHUNK_ROWS + 50, seed=2)
+        store = self.write(frames)
+
+        self.assertEqual(store.frame_count, len(frames))
+        self.assertEqual(list(store.iter_frames()), frames)
+
+    def test_frame_range_bounds(self):
+        frames = [{'frame_index': index, 'detections': []} for index in (2, 4, 6, 8)]
+        store = self.write(frames)
+
+        self.assertEqual(store.frame_range(), (0, 4))
+        self.assertEqual(store.frame_range(0, 100), (0, 4))
+        self.assertEqual(store.frame_range(4, 8), (1, 3))  # end không bao gồm
+        self.assertEqual(store.frame_range(3, 7), (1, 3))
+        self.assertEqual(store.frame_range(start=5), (2, 4))
+        self.assertEqual(store.frame_range(end=5), (0, 2))
+        self.assertEqual(store.frame_range(6, 6), (2, 2))
+        self.assertEqual(store.frame_range(7, 3), (3, 3))
+        self.assertEqual(store.frame_range(9, 20), (4, 4))
+        self.assertEqual(store.frame_range(-5, 2), (0, 0))
+
+    def test_slice_rebases_row_offsets(self):
+        frames = random_frames(50, seed=3)
+        store = self.write(frames)
+        offsets = store['row_offsets']
+
+        for lo, hi in ((0, 50), (10, 20), (49, 50), (20, 20), (45, 60)):
+            with self.subTest(lo=lo, hi=hi):
+                columns = store.slice(lo, hi)
+                end = min(hi, 50)
+                first, last = int(offsets[lo]), int(offsets[end])
+                self.assertEqual(columns['frame_index'].tolist(), [f['frame_index'] for f in frames[lo:end]])
+                self.assertEqual(columns['row_offsets'].tolist(), (offsets[lo:end + 1] - first).tolist())
+                self.assertEqual(columns['class_id'].tolist(), store['class_id'][first:last].tolist())
+                self.assertEqual(columns['bbox'].shape, (last - first, 4))
+
+    def test_detection_without_class_id_or_bbox(self):
+        store = self.write([{'frame_index': 0, 'detections': [
+            {'class_id': None, 'confidence': 0.5, 'bbox': [0.0, 0.0, 1.0, 1.0]},
+            {'confidence': 0.5, 'bbox': [0.0, 0.0, 2.0, 2.0]},
+            {'class_id': 1, 'confidence': 0.5, 'bbox': [0.0, 0.0]},
+            {'class_id': 1, 'confidence': 0.5},
+        ]}])
+
+        self.assertEqual(store['class_id'].tolist(), [-1, -1])
+        detections = next(store.iter_frames())['detections']
+        self.assertEqual([det['class_id'] for det in detections], [-1, -1])
+        self.assertEqual([det['class_name'] for det in detections], ['', ''])
+
+    def test_frames_must_increase(self):
+        writer = FrameDetectionWriter()
+        writer.add(5, [])
+        with self.assertRaises(ValueError):
+            writer.add(5, [])
+        with self.assertRaises(ValueError):
+            writer.add(4, [])
+        writer.close()
+
+
+class DetectionFramesApiTests(TestCase):
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self._tmp.cleanup)
+        media = override_settings(MEDIA_ROOT=self._tmp.name)
+        media.enable()
+        self.addCleanup(media.disable)
+        self.user = get_user_model().objects.create_user(username='driver', email='driver@example.com', password='x')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+        writer = FrameDetectionWriter()
+        for frame in random_frames(40, seed=4):
+            writer.add(frame['frame_index'], frame['detections'])
+        path = writer.save(Path(self._tmp.name) / 'source.npz')
+        self.detection = Detection.objects.create(file_type='video', status='done', fps=10.0, user=self.user)
+        with open(path, 'rb') as f:
+            self.detection.detections_file.save('detections.npz', File(f))
+        self.url = reverse('detection-frames', args=[self.detection.id])
+
+    def test_time_bounds(self):
+        response = self.client.get(self.url, {'start_time': '1.05', 'end_time': '3'})
+        self.assertEqual(response.status_code, 200)
+        indices = [frame['frame_index'] for frame in response.data['frames']]
+        self.assertTrue(indices)
+        self.assertTrue(all(11 <= index < 30 for index in indices))
+
+    def test_non_finite_time_is_rejected(self):
+        for params in ({'start_time': 'inf'}, {'end_time': '-inf'}, {'start_time': 'nan'},
+                       {'end_time': '1e308'}, {'start_time': 'abc'}, {'limit': '0'}):
+            with self.subTest(params=params):
+                self.assertEqual(self.client.get(self.url, params).status_code, 400)
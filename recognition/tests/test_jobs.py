@@ -0,0 +1,172 @@
+import contextlib
+import shutil
+import tempfile
+import time
+from datetime import timedelta
+from pathlib import Path
+from unittest import mock
+
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+
+from recognition.jobs import DetectionWorkerPool, claim_next_detection, job_heartbeat, requeue_stale_detections
+from recognition.models import DetectedSign, Detection
+from recognition.processing import DetectionProcessor
+
+
+def make_detection(file_type='image', status='pending', started_at=None, source_url=''):
+    return Detection.objects.create(
+        file=f"uploads/test.{'mp4' if file_type == 'video' else 'jpg'}",
+        file_type=file_type,
+        status=status,
+        started_at=started_at,
+        source_url=source_url,
+    )
+
+
+class ClaimNextDetectionTests(TestCase):
+
+    def test_claims_oldest_pending_first(self):
+        first = make_detection()
+        second = make_detection()
+        make_detection(status='done')
+
+        claimed = claim_next_detection()
+        self.assertEqual(claimed.id, first.id)
+        self.assertEqual(claimed.status, 'processing')
+        self.assertIsNotNone(claimed.started_at)
+        self.assertEqual(claimed.heartbeat_at, claimed.started_at)
+        self.assertEqual(claim_next_detection().id, second.id)
+        self.assertIsNone(claim_next_detection())
+
+    def test_each_pending_row_is_claimed_once(self):
+        detections = [make_detection() for _ in range(5)]
+
+        claimed = [claim_next_detection() for _ in range(len(detections) + 2)]
+        claimed_ids = [detection.id for detection in claimed if detection is not None]
+        self.assertCountEqual(claimed_ids, [detection.id for detection in detections])
+        self.assertEqual(Detection.objects.filter(status='pending').count(), 0)
+
+    def test_row_claimed_by_another_worker_is_skipped(self):
+        first = make_detection()
+        second = make_detection()
+        real_now = timezone.now
+
+        def claim_first_concurrently():
+            # Worker khác claim `first` sau khi worker này đã đọc danh sách candidate, trước câu UPDATE
+            if Detection.objects.filter(id=first.id, status='pending').exists():
+                Detection.objects.filter(id=first.id).update(status='processing', started_at=real_now())
+            return real_now()
+
+        with mock.patch('recognition.jobs.timezone.now', side_effect=claim_first_concurrently):
+            claimed = claim_next_detection()
+
+        self.assertEqual(claimed.id, second.id)
+        self.assertEqual(Detection.objects.filter(status='processing').count(), 2)
+        self.assertIsNone(claim_next_detection())
+
+
+class RequeueStaleDetectionsTests(TestCase):
+
+    def test_requeues_stale_files_and_skips_url_streams(self):
+        stale = timezone.now() - timedelta(seconds=120)
+        stale_video = make_detection('video', 'processing', stale)
+        stale_image = make_detection('image', 'processing', stale)
+        stale_stream = make_detection('stream', 'processing', stale, source_url='rtsp://camera.example.com/live')
+        # Stream push chạy tiếp được trên worker khác: frame chờ và segment đang mở nằm ngoài worker
+        stale_push_stream = make_detection('stream', 'processing', stale)
+        fresh_video = make_detection('video', 'processing', timezone.now())
+        done_image = make_detection('image', 'done', stale)
+
+        self.assertEqual(requeue_stale_detections(timeout_seconds=60), 3)
+
+        for detection in (stale_video, stale_image, stale_push_stream):
+            detection.refresh_from_db()
+            self.assertEqual(detection.status, 'pending')
+            self.assertIsNone(detection.started_at)
+        for detection, status in ((stale_stream, 'processing'), (fresh_video, 'processing'), (done_image, 'done')):
+            detection.refresh_from_db()
+            self.assertEqual(detection.status, status)
+        self.assertIsNotNone(stale_stream.started_at)
+
+    def test_requeued_job_can_be_claimed_again(self):
+        detection = make_detection('video', 'processing', timezone.now() - timedelta(hours=2))
+
+        self.assertIsNone(claim_next_detection())
+        requeue_stale_detections(timeout_seconds=3600)
+        self.assertEqual(claim_next_detection().id, detection.id)
+
+    def test_long_job_with_recent_heartbeat_is_not_requeued(self):
+        long_ago = timezone.now() - timedelta(hours=2)
+        alive = make_detection('video', 'processing', long_ago)
+        dead = make_detection('video', 'processing', long_ago)
+        Detection.objects.filter(id=alive.id).update(heartbeat_at=timezone.now() - timedelta(seconds=10))
+        Detection.objects.filter(id=dead.id).update(heartbeat_at=timezone.now() - timedelta(seconds=120))
+
+        self.assertEqual(requeue_stale_detections(timeout_seconds=60), 1)
+        alive.refresh_from_db()
+        dead.refresh_from_db()
+        self.assertEqual((alive.status, dead.status), ('processing', 'pending'))
+        self.assertIsNone(dead.heartbeat_at)
+
+    def test_housekeeping_requeues_dead_jobs(self):
+        detection = make_detection('image', 'processing', timezone.now() - timedelta(hours=2))
+        with self.settings(DETECTION_STALE_TIMEOUT=60):
+            DetectionWorkerPool(workers=1).housekeeping()
+        detection.refresh_from_db()
+        self.assertEqual(detection.status, 'pending')
+
+
+class ReprocessDetectionTests(TestCase):
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        media = override_settings(MEDIA_ROOT=self.media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+
+    def fake_image(self, file_path, conf, candidate_conf):
+        output_path = Path(self.media_root) / 'img_test.jpg'
+        output_path.write_bytes(b'image')
+        return [], output_path
+
+    def test_reprocessed_job_replaces_previous_signs(self):
+        # Worker cũ bị coi là chết nhưng vẫn ghi xong kết quả trước khi job được xử lý lại
+        detection = make_detection('image', 'processing', timezone.now())
+        DetectedSign.objects.create(detection=detection, class_id=1, class_name='P.101', confidence=0.9, bbox=[0, 0, 1, 1])
+        processor = DetectionProcessor()
+        new_sign = DetectedSign(detection=detection, class_id=2, class_name='P.102', confidence=0.8, bbox=[0, 0, 2, 2])
+
+        @contextlib.contextmanager
+        def pin_model():
+            yield mock.Mock(version='test-version')
+
+        with mock.patch('recognition.processing.pin_model', pin_model), \
+                mock.patch('recognition.processing.predict_image_with_save', side_effect=self.fake_image), \
+                mock.patch.object(processor, '_save_detections_file'), \
+                mock.patch.object(processor, '_build_detected_signs_for_image', return_value=[new_sign]):
+            self.assertTrue(processor.process(detection))
+
+        self.assertEqual(list(detection.detected_signs.values_list('class_name', flat=True)), ['P.102'])
+
+
+class JobHeartbeatTests(TransactionTestCase):
+
+    def test_heartbeat_is_refreshed_while_job_runs(self):
+        detection = make_detection('video', 'processing', timezone.now() - timedelta(hours=1))
+        stale = timezone.now() - timedelta(hours=1)
+        Detection.objects.filter(id=detection.id).update(heartbeat_at=stale)
+
+        with job_heartbeat(detection.id, interval=0.05):
+            deadline = time.monotonic() + 5
+            while Detection.objects.get(id=detection.id).heartbeat_at == stale and time.monotonic() < deadline:
+                time.sleep(0.02)
+        detection.refresh_from_db()
+        self.assertGreater(detection.heartbeat_at, timezone.now() - timedelta(seconds=5))
+
+        # Hết job: không còn cập nhật
+        Detection.objects.filter(id=detection.id).update(heartbeat_at=stale)
+        time.sleep(0.15)
+        detection.refresh_from_db()
+        self.assertEqual(detection.heartbeat_at, stale)
@@ -0,0 +1,124 @@
+import os
+import tempfile
+import threading
+from pathlib import Path
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from ai_engine.backends import current_model_version
+from ai_engine.model_registry import ModelRegistry
+
+
+class ModelRegistryHotReloadTests(SimpleTestCase):
+    """YOLO_WEIGHTS là symlink, deploy version mới bằng cách trỏ symlink sang file khác rồi reload()"""
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.dir = Path(self._tmp.name)
+        self.weights = {}
+        for name in ('v1', 'v2'):
+            path = self.dir / f"{name}.pt"
+            path.write_bytes(f"weights {name}".encode())
+            self.weights[name] = path
+        self.link = self.dir / "current.pt"
+        self.point_to('v1')
+        patcher = mock.patch('ai_engine.model_registry.resolve_weight_path', return_value=self.link)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.closed = []
+        self.registry = ModelRegistry(self.load, self.closed.append)
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def point_to(self, name):
+        tmp_link = self.dir / "current.tmp"
+        os.symlink(self.weights[name], tmp_link)
+        os.replace(tmp_link, self.link)
+
+    @staticmethod
+    def load(handle):
+        # "Model" là nội dung file weights mà loader thực sự đọc
+        handle.model = Path(handle.weight_path).read_bytes().decode()
+
+    def test_pinned_job_keeps_previous_version_until_released(self):
+        with self.registry.pin() as handle:
+            self.assertEqual(handle.model, "weights v1")
+            self.point_to('v2')
+            new_handle = self.registry.reload()
+
+            self.assertIsNot(new_handle, handle)
+            self.assertEqual(self.registry.active().model, "weights v2")
+            self.assertEqual(self.registry.current(), handle)
+            self.assertEqual(handle.model, "weights v1")
+            self.assertEqual(self.closed, [])
+            self.assertEqual([h["version"] for h in self.registry.status()["retiring"]], [handle.version])
+        self.assertEqual(self.closed, [handle])
+        self.assertEqual(self.registry.status()["retiring"], [])
+
+    def test_unused_version_is_closed_on_swap(self):
+        first = self.registry.active()
+        self.point_to('v2')
+        self.registry.reload()
+        self.assertEqual(self.closed, [first])
+        self.assertIsNone(first.model)
+
+    def test_handle_loads_resolved_weights_not_symlink(self):
+        with self.registry.pin() as handle:
+            self.point_to('v2')
+            self.registry.reload()
+            self.assertEqual(handle.weight_path, self.weights['v1'])
+            # Load lại lười (model local / pool mới) từ handle vẫn là weights của version đã pin
+            self.load(handle)
+            self.assertEqual(handle.model, "weights v1")
+            self.assertEqual(handle.version, current_model_version(weight_path=self.weights['v1']))
+
+    def test_reload_between_active_and_pin(self):
+        active = self.registry.active
+        reloaded = []
+
+        def active_then_swap():
+            # Reload xong ngay sau khi pin() đọc version active, trước khi tăng in_flight
+            handle = active()
+            if not reloaded:
+                self.point_to('v2')
+                reloaded.append(self.registry.reload())
+            return handle
+
+        with mock.patch.object(self.registry, 'active', side_effect=active_then_swap):
+            with self.registry.pin() as handle:
+                self.assertNotIn(handle, self.closed)
+                self.assertIs(handle, reloaded[0])
+                self.assertEqual(handle.model, "weights v2")
+
+    def test_concurrent_pins_during_reloads(self):
+        failures = []
+        stop = threading.Event()
+
+        def job():
+            while not stop.is_set():
+                with self.registry.pin() as handle:
+                    model = handle.model
+                    if model is None or handle in self.closed:
+                        failures.append(handle.version)
+                    elif handle.version != current_model_version(weight_path=handle.weight_path):
+                        failures.append(handle.version)
+
+        self.registry.active()
+        threads = [threading.Thread(target=job) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        try:
+            for i in range(30):
+                self.point_to('v2' if i % 2 == 0 else 'v1')
+                self.registry.reload()
+        finally:
+            stop.set()
+            for thread in threads:
+                thread.join()
+
+        self.assertEqual(failures, [])
+        # Mọi version bị thay đều được giải phóng sau khi job cuối cùng xong
+        self.assertEqual(len(self.closed), 30)
+        self.assertEqual(self.registry.status()["retiring"], [])
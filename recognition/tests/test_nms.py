@@ -0,0 +1,107 @@
+import random
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from ai_engine import nms
+from ai_engine.nms import nms_detections, nms_detections_batch
+
+
+def pairwise_nms(detections, iou_threshold=0.5, class_aware=True):
+    """Vòng lặp từng cặp box như DetectionProcessor._filter_overlapping_detections cũ (thêm class_aware)"""
+    def iou(box1, box2):
+        inter_w = min(box1[2], box2[2]) - max(box1[0], box2[0])
+        inter_h = min(box1[3], box2[3]) - max(box1[1], box2[1])
+        if inter_w < 0 or inter_h < 0:
+            return 0.0
+        inter = inter_w * inter_h
+        union = (box1[2] - box1[0]) * (box1[3] - box1[1]) + (box2[2] - box2[0]) * (box2[3] - box2[1]) - inter
+        return inter / union if union > 0 else 0.0
+
+    sorted_dets = sorted(detections, key=lambda det: det.get('confidence', 0), reverse=True)
+    filtered, skip = [], set()
+    for i, det1 in enumerate(sorted_dets):
+        if i in skip:
+            continue
+        filtered.append(det1)
+        if len(det1.get('bbox', [])) != 4:
+            continue
+        for j in range(i + 1, len(sorted_dets)):
+            det2 = sorted_dets[j]
+            if j in skip or len(det2.get('bbox', [])) != 4:
+                continue
+            if class_aware and (det1.get('class_id') or 0) != (det2.get('class_id') or 0):
+                continue
+            if iou(det1['bbox'], det2['bbox']) > iou_threshold:
+                skip.add(j)
+    return filtered
+
+
+def random_frame(rng, count, integer=False):
+    """Các cụm box chồng lấn, có box trùng hẳn, confidence bằng nhau và detection không có bbox"""
+    centers = [(rng.uniform(0, 400), rng.uniform(0, 400)) for _ in range(max(1, count // 4))]
+    detections = []
+    for i in range(count):
+        cx, cy = centers[i % len(centers)]
+        w, h = rng.uniform(0, 60), rng.uniform(0, 60)
+        x1, y1 = cx + rng.gauss(0, 8), cy + rng.gauss(0, 8)
+        bbox = [x1, y1, x1 + w, y1 + h]
+        if integer:
+            bbox = [float(round(value)) for value in bbox]
+        if detections and rng.random() < 0.1:
+            bbox = list(detections[-1]['bbox'])
+        det = {
+            'class_id': rng.choice([0, 1, 2, None]),
+            'confidence': rng.choice([0.5, 0.7, round(rng.uniform(0.1, 1.0), 3)]),
+            'bbox': bbox,
+        }
+        if rng.random() < 0.05:
+            det['bbox'] = [] if rng.random() < 0.5 else bbox[:3]
+        detections.append(det)
+    return detections
+
+
+class BatchedNmsEquivalenceTests(SimpleTestCase):
+
+    def assert_same(self, frames, iou_threshold, class_aware):
+        expected = [pairwise_nms(detections, iou_threshold, class_aware) for detections in frames]
+        actual = nms_detections_batch(frames, iou_threshold=iou_threshold, class_aware=class_aware)
+        self.assertEqual(len(actual), len(frames))
+        for f, (kept, reference) in enumerate(zip(actual, expected)):
+            # So sánh identity để thứ tự và detection được giữ giống hệt, kể cả các detection trùng nhau
+            self.assertEqual([id(det) for det in kept], [id(det) for det in reference], f"frame {f}")
+
+    def test_random_frames_match_pairwise(self):
+        rng = random.Random(0)
+        for class_aware in (True, False):
+            for iou_threshold in (0.3, 0.5, 0.7):
+                with self.subTest(class_aware=class_aware, iou_threshold=iou_threshold):
+                    frames = [random_frame(rng, rng.randint(0, 40), integer=rng.random() < 0.3) for _ in range(60)]
+                    self.assert_same(frames, iou_threshold, class_aware)
+
+    def test_chunked_frames_match_pairwise(self):
+        rng = random.Random(1)
+        frames = [random_frame(rng, rng.randint(0, 25)) for _ in range(40)]
+        # Ép chia thành nhiều chunk với số box / frame khác nhau
+        with mock.patch.object(nms, 'BATCH_MAX_ELEMENTS', 500):
+            for class_aware in (True, False):
+                with self.subTest(class_aware=class_aware):
+                    self.assert_same(frames, 0.5, class_aware)
+
+    def test_iou_equal_to_threshold_is_kept(self):
+        # IoU đúng bằng 0.5: ngưỡng là "> iou_threshold" nên cả 2 box được giữ
+        frames = [[
+            {'class_id': 0, 'confidence': 0.9, 'bbox': [0.0, 0.0, 30.0, 10.0]},
+            {'class_id': 0, 'confidence': 0.8, 'bbox': [0.0, 0.0, 15.0, 10.0]},
+        ]]
+        self.assertEqual(len(nms_detections_batch(frames, iou_threshold=0.5)[0]), 2)
+        self.assert_same(frames, 0.5, True)
+
+    def test_nms_detections_matches_pairwise_on_valid_boxes(self):
+        rng = random.Random(2)
+        for class_aware in (True, False):
+            for _ in range(50):
+                detections = [det for det in random_frame(rng, rng.randint(1, 30)) if len(det['bbox']) == 4]
+                kept = nms_detections(detections, iou_threshold=0.5, class_aware=class_aware)
+                reference = pairwise_nms(detections, 0.5, class_aware)
+                self.assertEqual([id(det) for det in kept], [id(det) for det in reference])
@@ -0,0 +1,183 @@
+import contextlib
+import shutil
+import tempfile
+from pathlib import Path
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from ai_engine.frame_store import FrameDetectionFile
+from ai_engine.yolo_infer import _create_track_stage
+from recognition.models import Detection
+from recognition.processing import DetectionProcessor
+
+FPS = 10.0
+FRAMES = 60
+
+# (class_id, confidence, frames xuất hiện, x của box)
+SIGNS = [
+    (0, 0.8, range(0, 60), 0.0),        # Biển báo rõ, cả video
+    (1, 0.3, range(0, 60), 300.0),      # Chỉ là candidate ở ngưỡng mặc định 0.5
+    (2, 0.12, range(0, 30), 600.0),     # Candidate gần ngưỡng candidate 0.1
+    (3, 0.9, range(40, 46), 900.0),     # Rõ nhưng chỉ 0.5 giây
+    (4, 0.35, range(10, 40), 1200.0),   # Hai biển cùng class cạnh nhau: tracker tách thành 2 track
+    (4, 0.35, range(10, 40), 1500.0),
+]
+
+
+def frame_detections(frame_index):
+    return [
+        {'class_id': class_id, 'class_name': f"sign_{class_id}", 'confidence': conf,
+         'bbox': [x, 100.0, x + 60.0, 160.0]}
+        for class_id, conf, frames, x in SIGNS
+        if frame_index in frames
+    ]
+
+
+class ReaggregateTests(TestCase):
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        media = override_settings(MEDIA_ROOT=self.media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        self.user = get_user_model().objects.create_user(username='driver', email='driver@example.com', password='x')
+        self.processor = DetectionProcessor()
+
+    def fake_predict_video(self, file_path, conf, stats, aggregator, candidate_conf):
+        """Như predict_video_with_save: detect mọi frame, kết quả qua TrackStage (kèm candidate) vào aggregator"""
+        aggregator.start(FPS)
+        track_stage, infer_conf = _create_track_stage(FPS, conf, on_result=aggregator.add, candidate_conf=candidate_conf)
+        for frame_index in range(FRAMES):
+            detections = [d for d in frame_detections(frame_index) if d['confidence'] >= infer_conf]
+            if track_stage is None:
+                aggregator.add(frame_index, detections)
+            else:
+                list(track_stage.process((frame_index, None, detections)))
+        aggregator.finish()
+        stats['sampling'] = {'frames': FRAMES, 'sampled': FRAMES, 'skipped': 0, 'mode': 'fixed'}
+        out_path = Path(self.media_root) / 'vid_test.mp4'
+        out_path.write_bytes(b'video')
+        return [], out_path, FPS
+
+    def process_video(self):
+        detection = Detection.objects.create(
+            file='uploads/clip.mp4', file_type='video', status='processing', user=self.user
+        )
+
+        @contextlib.contextmanager
+        def pin_model():
+            yield mock.Mock(version='test-version')
+
+        with mock.patch('recognition.processing.pin_model', pin_model), \
+                mock.patch('recognition.processing.predict_video_with_save', side_effect=self.fake_predict_video):
+            self.assertTrue(self.processor.process(detection))
+        detection.refresh_from_db()
+        return detection
+
+    @staticmethod
+    def rows(detection):
+        return sorted(
+            (s.class_id, s.start_time, s.end_time, round(s.confidence, 6), s.frame_index, tuple(s.bbox))
+            for s in detection.detected_signs.all()
+        )
+
+    @staticmethod
+    def classes(detection):
+        return sorted(set(detection.detected_signs.values_list('class_id', flat=True)))
+
+    def test_candidates_are_stored_but_not_in_default_output(self):
+        detection = self.process_video()
+
+        self.assertEqual(self.classes(detection), [0, 3])
+        self.assertFalse(detection.detected_signs.filter(confidence__lt=DetectionProcessor.CONF_THRESHOLD).exists())
+        # detections_file có đủ candidate (tới 0.1) để reaggregate
+        store = FrameDetectionFile(detection.detections_file.path)
+        self.assertEqual(store.meta['candidate_conf'], DetectionProcessor.CANDIDATE_CONF_THRESHOLD)
+        self.assertEqual(sorted(set(store['class_id'].tolist())), [0, 1, 2, 3, 4])
+        self.assertAlmostEqual(float(store['confidence'].min()), 0.12, places=5)
+
+    def test_reaggregate_with_same_thresholds_rebuilds_same_rows(self):
+        detection = self.process_video()
+        original = self.rows(detection)
+        original_ids = set(detection.detected_signs.values_list('id', flat=True))
+
+        signs = self.processor.reaggregate(detection)
+
+        self.assertEqual(len(signs), len(original))
+        self.assertEqual(self.rows(detection), original)
+        self.assertFalse(detection.detected_signs.filter(id__in=original_ids).exists())
+
+    def test_reaggregate_with_new_thresholds_rebuilds_rows_from_candidates(self):
+        detection = self.process_video()
+        default_rows = self.rows(detection)
+
+        self.processor.reaggregate(detection, conf_threshold=0.3)
+        self.assertEqual(self.classes(detection), [0, 1, 3, 4])
+        # Tracker chạy lại với ngưỡng mới: 2 biển cùng class là 2 lần xuất hiện riêng
+        self.assertEqual(detection.detected_signs.filter(class_id=4).count(), 2)
+        detection.refresh_from_db()
+        self.assertEqual(detection.conf_threshold, 0.3)
+
+        self.processor.reaggregate(detection, conf_threshold=0.1)
+        self.assertEqual(self.classes(detection), [0, 1, 2, 3, 4])
+        sign = detection.detected_signs.get(class_id=2)
+        self.assertEqual((sign.start_time, sign.frame_index), (0.0, 0))
+        self.assertAlmostEqual(sign.end_time, 2.9)
+
+        # Trở lại ngưỡng mặc định: candidate không còn, kết quả giống lúc xử lý
+        self.processor.reaggregate(detection, conf_threshold=DetectionProcessor.CONF_THRESHOLD)
+        self.assertEqual(self.rows(detection), default_rows)
+
+        self.processor.reaggregate(detection, min_duration=1.0)
+        self.assertEqual(self.classes(detection), [0])
+        detection.refresh_from_db()
+        self.assertEqual((detection.conf_threshold, detection.min_duration), (0.5, 1.0))
+
+    def test_reaggregate_below_candidate_threshold_is_rejected(self):
+        detection = self.process_video()
+        rows = self.rows(detection)
+        with self.assertRaises(ValueError):
+            self.processor.reaggregate(detection, conf_threshold=0.05)
+        self.assertEqual(self.rows(detection), rows)
+
+    def test_reaggregate_api(self):
+        detection = self.process_video()
+        client = APIClient()
+        client.force_authenticate(self.user)
+        url = reverse('detection-reaggregate', args=[detection.id])
+
+        response = client.post(url, {'conf_threshold': 0.3}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['signs_count'], 5)
+        self.assertEqual(self.classes(detection), [0, 1, 3, 4])
+
+        self.assertEqual(client.post(url, {'conf_threshold': 0.05}, format='json').status_code, 400)
+        self.assertEqual(detection.detected_signs.count(), 5)
+
+    def test_image_candidates_are_not_in_default_output(self):
+        detection = Detection.objects.create(
+            file='uploads/photo.jpg', file_type='image', status='processing', user=self.user
+        )
+        output_path = Path(self.media_root) / 'img_test.jpg'
+        output_path.write_bytes(b'image')
+
+        @contextlib.contextmanager
+        def pin_model():
+            yield mock.Mock(version='test-version')
+
+        with mock.patch('recognition.processing.pin_model', pin_model), \
+                mock.patch('recognition.processing.predict_image_with_save',
+                           return_value=(frame_detections(0), output_path)):
+            self.assertTrue(self.processor.process(detection))
+        detection.refresh_from_db()
+        self.assertEqual(self.classes(detection), [0])
+
+        self.processor.reaggregate(detection, conf_threshold=0.1)
+        self.assertEqual(self.classes(detection), [0, 1, 2])
+        self.processor.reaggregate(detection, conf_threshold=0.5)
+        self.assertEqual(self.classes(detection), [0])
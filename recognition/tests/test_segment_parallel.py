@@ -0,0 +1,246 @@
+import tempfile
+from concurrent.futures import Future
+from pathlib import Path
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+import cv2
+import numpy as np
+
+from ai_engine import segment_parallel, yolo_infer
+from ai_engine.segment_parallel import check_segment_seeks, seek_to_frame, stitch_segment_results
+
+
+def segment_output(start_frame, frame_count, track_ids):
+    """Output giả của process_segment: frame detect mỗi 3 frame, mỗi frame có các track trong track_ids"""
+    results = [
+        {
+            'frame_index': local,
+            'detections': [
+                {'class_id': track_id % 3, 'confidence': 0.9, 'bbox': [track_id * 50, 0, track_id * 50 + 40, 40],
+                 'track_id': track_id}
+                for track_id in track_ids
+            ],
+        }
+        for local in range(0, frame_count, 3)
+    ]
+    sampling = {
+        'mode': 'fixed', 'frame_stride': 3, 'frames': frame_count,
+        'sampled': len(results), 'skipped': frame_count - len(results),
+    }
+    return {'start_frame': start_frame, 'results': results, 'pipeline': {'frames': frame_count}, 'sampling': sampling}
+
+
+class _RecordingFuture(Future):
+    """Future của pool chỉ xong khi caller chờ result(), ghi lại thời điểm đó vào events"""
+
+    def __init__(self, index, output, events):
+        super().__init__()
+        self._index, self._output, self._events = index, output, events
+
+    def result(self, timeout=None):
+        if not super().done():
+            self._events.append(('segment', self._index))
+            self.set_result(self._output)
+        return super().result(timeout)
+
+
+class _FakePool:
+    workers = 2
+
+    def __init__(self, outputs, events):
+        self.outputs, self.events, self.futures = outputs, events, []
+
+    def submit_segment(self, video_path, start_frame, end_frame, conf, fps, out_path, candidate_conf=None):
+        index = len(self.futures) % len(self.outputs)
+        future = _RecordingFuture(index, self.outputs[index], self.events)
+        self.futures.append(future)
+        return future
+
+
+class SegmentStreamingTests(SimpleTestCase):
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self._tmp.cleanup)
+        self.out_path = Path(self._tmp.name) / 'out.mp4'
+        self.segments = [(0, 30), (30, 60), (60, None)]
+        self.outputs = [
+            segment_output(0, 30, [1, 2]), segment_output(30, 30, [1, 2]), segment_output(60, 21, [1, 3]),
+        ]
+        self.expected = stitch_segment_results(
+            self.outputs, match_iou=yolo_infer.TRACKER_MATCH_IOU, max_gap=int(30 * yolo_infer.TRACKER_MAX_AGE_SECONDS)
+        )
+        self.events = []
+        self.pool = _FakePool(self.outputs, self.events)
+        handle = mock.Mock(pool=self.pool)
+        for patcher in (
+            mock.patch.object(yolo_infer.model_registry, 'current', return_value=handle),
+            mock.patch('ai_engine.segment_parallel.concat_segments', side_effect=self.concat),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def concat(self, segment_paths, out_path):
+        self.events.append(('concat', len(segment_paths)))
+
+    def process(self, on_result=None, stats=None):
+        return yolo_infer._process_video_segments(
+            Path('video.mp4'), self.segments, 0.5, 30.0, self.out_path, stats, on_result
+        )
+
+    def test_frames_are_stitched_as_each_segment_completes(self):
+        def on_result(frame_index, detections):
+            self.events.append(('frame', frame_index))
+        stats = {}
+        self.assertEqual(self.process(on_result, stats), [])
+
+        frames = [entry['frame_index'] for entry in self.expected]
+        segment_starts = [10, 20]  # số frame detect của segment 0 và 0+1
+        self.assertEqual(
+            self.events,
+            [('segment', 0)] + [('frame', f) for f in frames[:segment_starts[0]]]
+            + [('segment', 1)] + [('frame', f) for f in frames[segment_starts[0]:segment_starts[1]]]
+            + [('segment', 2)] + [('frame', f) for f in frames[segment_starts[1]:]]
+            + [('concat', 3)],
+        )
+        self.assertEqual(stats['sampling']['frames'], 81)
+        self.assertEqual([s['start_frame'] for s in stats['segments']['segments']], [0, 30, 60])
+
+    def test_results_match_stitching_all_segments(self):
+        received = []
+        self.process(lambda frame_index, detections: received.append(
+            {'frame_index': frame_index, 'detections': detections}
+        ))
+        self.assertEqual(received, self.expected)
+        self.assertEqual(self.process(), self.expected)
+        # Track nối qua ranh giới segment giữ id cũ, track mới ở segment cuối có id mới
+        self.assertEqual({d['track_id'] for d in received[-1]['detections']}, {1, 7})
+
+    def test_consumer_error_cancels_remaining_segments(self):
+        def on_result(frame_index, detections):
+            if frame_index >= 30:
+                raise RuntimeError('aggregator failed')
+
+        with self.assertRaises(RuntimeError):
+            self.process(on_result)
+        self.assertTrue(self.pool.futures[2].cancelled())
+        self.assertNotIn(('concat', 3), self.events)
+        self.assertEqual(list(Path(self._tmp.name).iterdir()), [])
+
+
+class _MisalignedCapture:
+    """cap.set(POS_FRAMES) chỉ đổi bộ đếm, decode vẫn bắt đầu từ keyframe trước đó (frame 0)"""
+
+    def __init__(self, fps):
+        self.fps = fps
+        self.pos = 0
+        self.decoded = -1
+
+    def isOpened(self):
+        return True
+
+    def set(self, prop, value):
+        self.pos = int(value)
+
+    def get(self, prop):
+        if prop == cv2.CAP_PROP_POS_FRAMES:
+            return float(self.pos)
+        if prop == cv2.CAP_PROP_POS_MSEC:
+            return self.decoded * 1000.0 / self.fps
+        return 64.0
+
+    def read(self):
+        self.decoded += 1
+        self.pos += 1
+        return True, np.full((48, 64, 3), self.decoded, dtype=np.uint8)
+
+    def release(self):
+        pass
+
+
+class SegmentSeekTests(SimpleTestCase):
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self._tmp.cleanup)
+        self.video_path = Path(self._tmp.name) / 'clip.mp4'
+        writer = cv2.VideoWriter(str(self.video_path), cv2.VideoWriter_fourcc(*'mp4v'), 10.0, (64, 48))
+        if not writer.isOpened():
+            self.skipTest('OpenCV không ghi được video mp4v')
+        for i in range(60):
+            writer.write(np.full((48, 64, 3), i * 4, dtype=np.uint8))
+        writer.release()
+        # Frame decode tuần tự làm chuẩn (mp4v nén có mất mát, không so trực tiếp với giá trị đã ghi)
+        cap = cv2.VideoCapture(str(self.video_path))
+        self.frames = []
+        ok, frame = cap.read()
+        while ok:
+            self.frames.append(frame)
+            ok, frame = cap.read()
+        cap.release()
+
+    def frame_number(self, frame):
+        """Index của frame decode tuần tự giống frame nhất"""
+        return int(np.argmin([np.abs(frame.astype(int) - ref).sum() for ref in self.frames]))
+
+    def test_seek_returns_first_frame_at_target(self):
+        cap = cv2.VideoCapture(str(self.video_path))
+        try:
+            for target in (12, 25, 37):
+                frame = seek_to_frame(cap, target, 10.0)
+                self.assertIsNotNone(frame)
+                self.assertEqual(self.frame_number(frame), target)
+        finally:
+            cap.release()
+        self.assertTrue(check_segment_seeks(self.video_path, [(0, 20), (20, 40), (40, None)], 10.0))
+
+    def test_timestamp_mismatch_is_detected(self):
+        # fps sai (timestamp x fps không ra frame yêu cầu)
+        self.assertFalse(check_segment_seeks(self.video_path, [(0, 20), (20, None)], 25.0))
+
+        cap = _MisalignedCapture(10.0)
+        self.assertIsNone(seek_to_frame(cap, 20, 10.0))
+        # Bộ đếm vẫn báo đúng vị trí: kiểm tra cũ bằng CAP_PROP_POS_FRAMES không phát hiện được
+        cap = _MisalignedCapture(10.0)
+        cap.set(cv2.CAP_PROP_POS_FRAMES, 20)
+        self.assertEqual(int(cap.get(cv2.CAP_PROP_POS_FRAMES)), 20)
+
+    def test_misaligned_seek_falls_back_to_single_pass(self):
+        pool = mock.Mock(workers=2)
+        with mock.patch.object(yolo_infer, '_current_pool', return_value=pool), \
+                mock.patch.object(yolo_infer, 'probe_keyframes', return_value=[0, 20, 40]), \
+                mock.patch.object(yolo_infer, 'VIDEO_SEGMENT_PARALLEL', True), \
+                mock.patch.object(yolo_infer, 'VIDEO_SINGLE_PASS', True), \
+                mock.patch.object(yolo_infer, 'VIDEO_SEGMENT_MIN_SECONDS', 1.0), \
+                mock.patch.object(yolo_infer.shutil, 'which', return_value='/usr/bin/ffmpeg'):
+            self.assertEqual(yolo_infer._plan_video_segments(self.video_path, 10.0, 60), [(0, 20), (20, 40), (40, None)])
+            with mock.patch.object(segment_parallel.cv2, 'VideoCapture', return_value=_MisalignedCapture(10.0)):
+                self.assertIsNone(yolo_infer._plan_video_segments(self.video_path, 10.0, 60))
+
+    def test_worker_feeds_checked_frame_into_pipeline(self):
+        read = []
+
+        def pipeline(source, *args, **kwargs):
+            for _ in range(3):
+                ok, frame = source.read()
+                read.append(self.frame_number(frame))
+            return [], {}
+
+        with mock.patch.object(yolo_infer, '_process_video_pipeline', side_effect=pipeline), \
+                mock.patch.object(segment_parallel, 'FFmpegPipeWriter') as writer:
+            writer.return_value.isOpened.return_value = True
+            output = segment_parallel.process_segment(
+                str(self.video_path), 20, 40, 0.5, 10.0, str(Path(self._tmp.name) / 'segment.mp4')
+            )
+        self.assertEqual(output['start_frame'], 20)
+        self.assertEqual(read, [20, 21, 22])
+
+        with mock.patch.object(segment_parallel.cv2, 'VideoCapture', return_value=_MisalignedCapture(10.0)), \
+                mock.patch.object(yolo_infer, '_process_video_pipeline') as pipeline_mock:
+            with self.assertRaises(RuntimeError):
+                segment_parallel.process_segment(
+                    str(self.video_path), 20, 40, 0.5, 10.0, str(Path(self._tmp.name) / 'segment.mp4')
+                )
+        pipeline_mock.assert_not_called()
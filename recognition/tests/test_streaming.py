@@ -0,0 +1,283 @@
+import os
+import shutil
+import socket
+import tempfile
+import time
+from datetime import timedelta
+from unittest import mock
+
+import cv2
+import numpy as np
+
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from recognition import streaming
+from recognition.jobs import DetectionWorkerPool
+from recognition.models import Detection, DetectedSign
+from recognition.processing import DetectionProcessor
+from recognition.streaming import (
+    StreamSourceError, expire_push_streams, push_frame_dir, run_push_stream, run_url_stream, validate_source_url,
+)
+
+
+def resolves_to(*addresses):
+    """Giả lập DNS: host resolve ra các địa chỉ này"""
+    def getaddrinfo(host, port, *args, **kwargs):
+        return [(socket.AF_INET6 if ':' in a else socket.AF_INET, socket.SOCK_STREAM, 6, '', (a, 0)) for a in addresses]
+    return mock.patch('recognition.streaming.socket.getaddrinfo', side_effect=getaddrinfo)
+
+
+@override_settings(STREAM_ALLOWED_HOSTS=[])
+class ValidateSourceUrlTests(SimpleTestCase):
+
+    def test_rejects_internal_addresses(self):
+        for url in (
+            'http://169.254.169.254/latest/meta-data/',
+            'http://127.0.0.1:8099/feed',
+            'rtsp://10.0.0.5/live',
+            'rtsp://192.168.1.10:554/stream',
+            'http://[::1]/feed',
+            'http://[::ffff:127.0.0.1]/feed',
+            'http://0.0.0.0/feed',
+            'http://100.64.0.1/feed',
+            'rtsp://224.0.0.1/stream',
+        ):
+            with self.subTest(url=url), self.assertRaises(StreamSourceError):
+                validate_source_url(url)
+
+    def test_rejects_hostname_resolving_to_private_address(self):
+        with resolves_to('93.184.216.34', '10.1.2.3'):
+            with self.assertRaises(StreamSourceError):
+                validate_source_url('http://camera.example.com/feed')
+        with resolves_to('fd00::1'):
+            with self.assertRaises(StreamSourceError):
+                validate_source_url('rtsp://camera.example.com/live')
+
+    def test_accepts_public_host(self):
+        with resolves_to('93.184.216.34', '2606:2800:220:1:248:1893:25c8:1946'):
+            validate_source_url('rtsp://camera.example.com:554/live')
+        validate_source_url('https://8.8.8.8/feed')
+
+    def test_rejects_bad_scheme_or_host(self):
+        for url in ('ftp://example.com/feed', 'file:///etc/passwd', 'http:///feed', 'http://example.com:99999/'):
+            with self.subTest(url=url), self.assertRaises(StreamSourceError):
+                validate_source_url(url)
+
+    def test_rejects_unresolvable_host(self):
+        with mock.patch('recognition.streaming.socket.getaddrinfo', side_effect=socket.gaierror):
+            with self.assertRaises(StreamSourceError):
+                validate_source_url('rtsp://missing.example.com/live')
+
+    @override_settings(STREAM_ALLOWED_HOSTS=['127.0.0.1', '.cameras.internal'])
+    def test_allowed_hosts_skip_address_check(self):
+        with mock.patch('recognition.streaming.socket.getaddrinfo') as getaddrinfo:
+            validate_source_url('http://127.0.0.1:8099/feed')
+            validate_source_url('rtsp://gate-1.cameras.internal/live')
+        getaddrinfo.assert_not_called()
+        with self.assertRaises(StreamSourceError):
+            validate_source_url('http://127.0.0.2/feed')
+
+
+@override_settings(STREAM_ALLOWED_HOSTS=[])
+class StreamSourceUrlApiTests(TestCase):
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username='driver', email='driver@example.com', password='x')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_create_rejects_internal_url(self):
+        response = self.client.post(
+            reverse('stream-create'), {'source_url': 'http://169.254.169.254/latest/meta-data/'}, format='json'
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Detection.objects.exists())
+
+    def test_create_accepts_public_url(self):
+        with resolves_to('93.184.216.34'):
+            response = self.client.post(
+                reverse('stream-create'), {'source_url': 'rtsp://camera.example.com/live'}, format='json'
+            )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Detection.objects.get().status, 'pending')
+
+    def test_worker_checks_url_again_before_connecting(self):
+        # Stream đã tạo khi host còn là địa chỉ public, DNS sau đó trỏ về mạng nội bộ
+        detection = Detection.objects.create(
+            file_type='stream', source_url='rtsp://camera.example.com/live', status='processing', user=self.user
+        )
+        with resolves_to('10.0.0.8'), mock.patch('recognition.streaming.LatestFrameReader') as reader:
+            with self.assertRaises(StreamSourceError):
+                run_url_stream(detection, DetectionProcessor())
+        reader.assert_not_called()
+
+
+def jpeg(value=0):
+    return cv2.imencode('.jpg', np.full((32, 32, 3), value, dtype=np.uint8))[1].tobytes()
+
+
+class PushStreamTests(TestCase):
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username='driver', email='driver@example.com', password='x')
+        self.media_root = tempfile.mkdtemp()
+        media = override_settings(MEDIA_ROOT=self.media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+
+    def make_stream(self, started_ago, last_frame_ago=None, source_url='', status='processing'):
+        now = timezone.now()
+        return Detection.objects.create(
+            file_type='stream', source_url=source_url, status=status, user=self.user,
+            started_at=now - timedelta(seconds=started_ago),
+            last_frame_at=now - timedelta(seconds=last_frame_ago) if last_frame_ago is not None else None,
+        )
+
+    def test_expires_idle_push_streams_only(self):
+        idle = self.make_stream(started_ago=600, last_frame_ago=300)
+        never_sent = self.make_stream(started_ago=600)
+        active = self.make_stream(started_ago=600, last_frame_ago=5)
+        just_opened = self.make_stream(started_ago=5)
+        url_stream = self.make_stream(started_ago=600, source_url='rtsp://camera.example.com/live')
+        stopped = self.make_stream(started_ago=600, last_frame_ago=300, status='done')
+
+        self.assertEqual(expire_push_streams(idle_seconds=120), 2)
+
+        for detection, expected in ((idle, 'done'), (never_sent, 'done'), (active, 'processing'),
+                                    (just_opened, 'processing'), (url_stream, 'processing'), (stopped, 'done')):
+            detection.refresh_from_db()
+            self.assertEqual(detection.status, expected, detection.id)
+        idle.refresh_from_db()
+        self.assertIsNotNone(idle.finished_at)
+
+    @override_settings(STREAM_PUSH_IDLE_TIMEOUT=60)
+    def test_worker_housekeeping_expires_push_streams(self):
+        idle = self.make_stream(started_ago=600, last_frame_ago=300)
+        DetectionWorkerPool(workers=1).housekeeping()
+        idle.refresh_from_db()
+        self.assertEqual(idle.status, 'done')
+
+    def push(self, detection, data=None, **fields):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        frame = SimpleUploadedFile('frame.jpg', jpeg() if data is None else data, content_type='image/jpeg')
+        return client.post(reverse('stream-frames', args=[detection.id]), {'frame': frame, **fields})
+
+    def test_pushed_frame_is_queued_for_worker(self):
+        detection = self.make_stream(started_ago=600, last_frame_ago=300)
+        response = self.push(detection, timestamp='1.5')
+
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.data['timestamp'], 1.5)
+        self.assertEqual(len(os.listdir(push_frame_dir(detection.id))), 1)
+        detection.refresh_from_db()
+        self.assertLess(timezone.now() - detection.last_frame_at, timedelta(seconds=5))
+        self.assertEqual(expire_push_streams(idle_seconds=120), 0)
+
+    def test_frames_are_accepted_before_worker_claims_stream(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        created = client.post(reverse('stream-create'), {}, format='json')
+        detection = Detection.objects.get(id=created.data['detection_id'])
+        self.assertEqual((created.data['mode'], detection.status), ('push', 'pending'))
+        self.assertEqual(self.push(detection).status_code, 202)
+
+    def test_invalid_frame_is_rejected(self):
+        detection = self.make_stream(started_ago=5)
+        self.assertEqual(self.push(detection, data=b'not an image').status_code, 400)
+        self.assertEqual(self.push(detection, timestamp='inf').status_code, 400)
+        self.assertFalse(os.path.exists(push_frame_dir(detection.id)))
+
+    @override_settings(STREAM_PUSH_QUEUE_SIZE=2)
+    def test_full_queue_returns_429(self):
+        detection = self.make_stream(started_ago=5)
+        self.assertEqual([self.push(detection).status_code for _ in range(3)], [202, 202, 429])
+
+    def test_frame_after_expiry_is_rejected(self):
+        detection = self.make_stream(started_ago=600, last_frame_ago=300)
+        self.push(detection)
+        Detection.objects.filter(id=detection.id).update(last_frame_at=timezone.now() - timedelta(seconds=300))
+        expire_push_streams(idle_seconds=120)
+        # Frame chưa detect của stream đã kết thúc được dọn
+        self.assertFalse(os.path.exists(push_frame_dir(detection.id)))
+        self.assertEqual(self.push(detection).status_code, 409)
+
+    @override_settings(STREAM_DETECTION_FPS=5.0)
+    def test_worker_detects_pushed_frames_in_order(self):
+        detection = self.make_stream(started_ago=5)
+        # Frame không tới lượt sample (cách frame trước < 0.2 giây) không bị decode
+        for timestamp, data in ((0.0, jpeg()), (0.05, b'\xff\xd8\xff broken'), (0.1, jpeg()), (0.3, jpeg())):
+            self.assertEqual(self.push(detection, data=data, timestamp=timestamp).status_code, 202)
+        sign = {'class_id': 3, 'class_name': 'P.102', 'confidence': 0.9, 'bbox': [0, 0, 10, 10]}
+        predicted = []
+
+        def predict_frame(frame, conf):
+            predicted.append(frame.shape)
+            if len(predicted) == 2:
+                # Client gọi stop sau frame cuối
+                Detection.objects.filter(id=detection.id).update(status='done')
+            return [dict(sign)]
+
+        with mock.patch('recognition.streaming.predict_frame', side_effect=predict_frame), \
+                mock.patch('recognition.streaming.active_model_version', return_value='test-version'), \
+                mock.patch('recognition.streaming.cv2.imdecode', wraps=cv2.imdecode) as imdecode:
+            session = run_push_stream(detection, DetectionProcessor())
+
+        self.assertEqual(imdecode.call_count, 2)
+        self.assertEqual(predicted, [(32, 32, 3)] * 2)
+        self.assertEqual((session.frames, session.sampled), (4, 2))
+        stored = detection.detected_signs.get()
+        self.assertEqual((stored.class_name, stored.start_time, stored.end_time), ('P.102', 0.0, 0.3))
+        self.assertFalse(os.path.exists(push_frame_dir(detection.id)))
+        detection.refresh_from_db()
+        self.assertEqual((detection.total_frames, detection.model_version), (4, 'test-version'))
+
+
+@override_settings(STREAM_EVENT_POLL_INTERVAL=0.01)
+class StreamEventsTests(TestCase):
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username='driver', email='driver@example.com', password='x')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.detection = Detection.objects.create(
+            file_type='stream', status='processing', started_at=timezone.now(), user=self.user
+        )
+        self.signs = [
+            DetectedSign.objects.create(
+                detection=self.detection, class_id=1, class_name='P.102', confidence=0.9, bbox=[0, 0, 1, 1],
+                start_time=i, end_time=i + 1, frame_index=i,
+            )
+            for i in range(3)
+        ]
+
+    def read_events(self, **headers):
+        started = time.monotonic()
+        response = self.client.get(reverse('stream-events', args=[self.detection.id]), **headers)
+        body = b''.join(response.streaming_content).decode()
+        return body, time.monotonic() - started
+
+    @override_settings(STREAM_EVENTS_MAX_DURATION=0)
+    def test_connection_closes_after_max_duration(self):
+        body, elapsed = self.read_events()
+        self.assertEqual(body.count('event: sign'), 3)
+        self.assertNotIn('event: end', body)
+        self.assertLess(elapsed, 5)
+
+    @override_settings(STREAM_EVENTS_MAX_DURATION=0)
+    def test_reconnect_resumes_after_last_event_id(self):
+        body, _ = self.read_events(HTTP_LAST_EVENT_ID=str(self.signs[1].id))
+        self.assertEqual(body.count('event: sign'), 1)
+        self.assertIn(f"id: {self.signs[2].id}", body)
+
+    def test_stream_end_closes_connection(self):
+        Detection.objects.filter(id=self.detection.id).update(status='done')
+        body, _ = self.read_events()
+        self.assertIn('event: end', body)
+        self.assertIn('"status": "done"', body)
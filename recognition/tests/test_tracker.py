@@ -0,0 +1,124 @@
+from django.test import SimpleTestCase
+
+from ai_engine.tracker import ByteTracker, TrackStage, interpolate_detections
+
+
+def det(x, conf=0.9, class_id=1, width=40.0):
+    return {'class_id': class_id, 'class_name': f"sign_{class_id}", 'confidence': conf,
+            'bbox': [x, 100.0, x + width, 140.0]}
+
+
+def track_ids(detections):
+    return [d['track_id'] for d in detections]
+
+
+class ByteTrackerTests(SimpleTestCase):
+
+    def make_tracker(self, **kwargs):
+        options = {'high_threshold': 0.5, 'low_threshold': 0.1, 'match_iou': 0.3, 'max_age': 10}
+        options.update(kwargs)
+        return ByteTracker(**options)
+
+    def test_track_id_survives_missed_frames(self):
+        tracker = self.make_tracker()
+        first = tracker.update(0, [det(100), det(400, class_id=2)])
+        self.assertEqual(track_ids(first), [1, 2])
+        # Frame detect không thấy biển báo (bị che), track vẫn được giữ trong max_age
+        self.assertEqual(tracker.update(3, []), [])
+        again = tracker.update(6, [det(405, class_id=2), det(104)])
+        self.assertEqual(sorted((d['class_id'], d['track_id']) for d in again), [(1, 1), (2, 2)])
+
+    def test_moving_box_is_matched_through_prediction(self):
+        tracker = self.make_tracker()
+        for frame_idx in range(6):
+            self.assertEqual(track_ids(tracker.update(frame_idx, [det(100 + frame_idx * 20)])), [1])
+        # Mất 2 frame detect: box mới không chồng lên box cuối (IoU 0), chỉ khớp được nhờ vận tốc của Kalman
+        self.assertEqual(track_ids(tracker.update(8, [det(100 + 8 * 20)])), [1])
+
+    def test_class_mismatch_starts_new_track(self):
+        tracker = self.make_tracker()
+        tracker.update(0, [det(100, class_id=1)])
+        self.assertEqual(track_ids(tracker.update(1, [det(100, class_id=2)])), [2])
+
+    def test_low_score_detection_extends_existing_track_only(self):
+        tracker = self.make_tracker()
+        tracker.update(0, [det(100)])
+
+        tracked, dropped = tracker.track(1, [det(102, conf=0.3), det(500, conf=0.3), det(300, conf=0.05)])
+        # Bước 2: detection thấp khớp track đã có, detection thấp không khớp không tạo track mới
+        self.assertEqual([(d['bbox'][0], d['track_id']) for d in tracked], [(102, 1)])
+        self.assertEqual(sorted(d['bbox'][0] for d in dropped), [300, 500])
+        self.assertTrue(all('track_id' not in d for d in dropped))
+        self.assertEqual(len(tracker.tracks), 1)
+
+        # Detection cao ở frame sau vẫn nối vào cùng track
+        self.assertEqual(track_ids(tracker.update(2, [det(104)])), [1])
+
+    def test_high_score_detection_is_matched_before_low_score(self):
+        tracker = self.make_tracker()
+        tracker.update(0, [det(100)])
+        tracked, dropped = tracker.track(1, [det(101, conf=0.3), det(103, conf=0.9)])
+        self.assertEqual([(d['confidence'], d['track_id']) for d in tracked], [(0.9, 1)])
+        self.assertEqual([d['confidence'] for d in dropped], [0.3])
+
+    def test_track_expires_after_max_age(self):
+        tracker = self.make_tracker(max_age=10)
+        tracker.update(0, [det(100)])
+        self.assertEqual(track_ids(tracker.update(10, [det(100)])), [1])
+        self.assertEqual(track_ids(tracker.update(21, [det(100)])), [2])
+        self.assertEqual([t.track_id for t in tracker.tracks], [2])
+
+    def test_expired_track_does_not_take_low_score_detection(self):
+        tracker = self.make_tracker(max_age=5)
+        tracker.update(0, [det(100)])
+        tracked, dropped = tracker.track(6, [det(100, conf=0.3)])
+        self.assertEqual(tracked, [])
+        self.assertEqual(len(dropped), 1)
+
+
+class TrackStageTests(SimpleTestCase):
+
+    def run_stage(self, items, **kwargs):
+        results = []
+        stage = TrackStage(
+            ByteTracker(high_threshold=0.5, low_threshold=0.1, max_age=30),
+            on_result=lambda frame_idx, detections: results.append((frame_idx, detections)), **kwargs
+        )
+        outputs = []
+        for item in items:
+            outputs.extend(stage.process(item))
+        outputs.extend(stage.finish())
+        return outputs, results
+
+    def test_skipped_frames_are_interpolated(self):
+        items = [(0, 'f0', [det(100)])] + [(i, f"f{i}", None) for i in range(1, 4)] + [(4, 'f4', [det(120)])]
+        outputs, _ = self.run_stage(items)
+
+        self.assertEqual([(idx, frame) for idx, frame, _ in outputs], [(i, f"f{i}") for i in range(5)])
+        xs = [dets[0]['bbox'][0] for _, _, dets in outputs]
+        self.assertEqual(xs, [100, 105, 110, 115, 120])
+        self.assertTrue(all(dets[0]['track_id'] == 1 for _, _, dets in outputs))
+
+    def test_frames_before_first_detection_and_after_last(self):
+        items = [(0, 'f0', None), (1, 'f1', [det(100)]), (2, 'f2', None), (3, 'f3', None)]
+        outputs, _ = self.run_stage(items)
+
+        self.assertEqual([idx for idx, _, _ in outputs], [0, 1, 2, 3])
+        self.assertEqual(outputs[0][2], [])
+        # Không có frame detect sau: giữ box cuối
+        self.assertEqual([dets[0]['bbox'][0] for _, _, dets in outputs[1:]], [100, 100, 100])
+
+    def test_track_ending_keeps_last_box_and_new_track_is_not_drawn_early(self):
+        prev = [{**det(100), 'track_id': 1}]
+        next_ = [{**det(300), 'track_id': 2}]
+        self.assertEqual(interpolate_detections(prev, 0, next_, 4, 2), prev)
+
+    def test_on_result_receives_candidates_only_with_keep_dropped(self):
+        items = [(0, 'f0', [det(100), det(500, conf=0.3)])]
+        outputs, results = self.run_stage(items, keep_dropped=True)
+        self.assertEqual([d.get('track_id') for d in results[0][1]], [1, None])
+        # Frame output chỉ vẽ detection đã gán track
+        self.assertEqual(track_ids(outputs[0][2]), [1])
+
+        _, results = self.run_stage(items)
+        self.assertEqual(track_ids(results[0][1]), [1])
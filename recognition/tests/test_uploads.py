@@ -0,0 +1,257 @@
+import hashlib
+import io
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from recognition import uploads
+from recognition.models import Detection, DetectedSign, UploadSession
+from recognition.uploads import UploadError, complete_upload, init_upload, write_chunk
+
+CONTENT = bytes(range(256)) * 40  # 10240 bytes
+SHA256 = hashlib.sha256(CONTENT).hexdigest()
+
+
+class _BrokenStream(io.BytesIO):
+    """Body của request bị ngắt kết nối sau khi đã đọc một phần"""
+
+    def __init__(self, data, fail_after):
+        super().__init__(data)
+        self.fail_after = fail_after
+
+    def read(self, size=-1):
+        if self.tell() >= self.fail_after:
+            raise OSError("connection reset")
+        return super().read(min(size, self.fail_after - self.tell()) if size >= 0 else self.fail_after - self.tell())
+
+
+@override_settings(UPLOAD_CHUNK_MAX_SIZE=4096, UPLOAD_MAX_SIZE=64 * 1024)
+class ChunkedUploadTests(TestCase):
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        media = override_settings(MEDIA_ROOT=self.media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        block = mock.patch.object(uploads, 'READ_BLOCK_SIZE', 1000)
+        block.start()
+        self.addCleanup(block.stop)
+        self.addCleanup(uploads._hashers.clear)
+
+        self.user = get_user_model().objects.create_user(username='driver', email='driver@example.com', password='x')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def start(self, content=CONTENT, sha256=''):
+        return init_upload(self.user, 'clip.mp4', 'video', len(content), sha256)
+
+    def put(self, session, offset, body):
+        return self.client.put(
+            reverse('upload-chunk', args=[session.token]), body,
+            content_type='application/offset+octet-stream', HTTP_UPLOAD_OFFSET=str(offset),
+        )
+
+    def complete(self, session, sha256=''):
+        return self.client.post(reverse('upload-complete', args=[session.token]), {'sha256': sha256}, format='json')
+
+    def upload_all(self, session, content=CONTENT, chunk=3000):
+        for offset in range(0, len(content), chunk):
+            response = self.put(session, offset, content[offset:offset + chunk])
+            self.assertEqual(response.status_code, 200, response.data)
+
+    def upload_all_from(self, session, offset, chunk=3000):
+        while offset < len(CONTENT):
+            offset = write_chunk(session, offset, io.BytesIO(CONTENT[offset:offset + chunk]))
+
+    def stored_bytes(self, session):
+        with open(os.path.join(self.media_root, session.file_name), 'rb') as f:
+            return f.read()
+
+    def part_files(self, session):
+        return [name for name in os.listdir(os.path.join(self.media_root, 'uploads')) if name.endswith('.part')]
+
+    def test_full_upload_creates_pending_detection(self):
+        session = self.start(sha256=SHA256)
+        self.upload_all(session)
+        response = self.complete(session)
+
+        self.assertEqual(response.status_code, 202)
+        detection = Detection.objects.get(id=response.data['detection_id'])
+        self.assertEqual(detection.status, 'pending')
+        self.assertEqual(detection.file_sha256, SHA256)
+        self.assertEqual(detection.file.name, session.file_name)
+        self.assertEqual(self.stored_bytes(session), CONTENT)
+        session.refresh_from_db()
+        self.assertEqual(session.status, 'completed')
+
+    def test_offset_mismatch_returns_409(self):
+        session = self.start()
+        self.put(session, 0, CONTENT[:3000])
+
+        for offset in (0, 2000, 4000):
+            with self.subTest(offset=offset):
+                response = self.put(session, offset, CONTENT[offset:offset + 1000])
+                self.assertEqual(response.status_code, 409)
+                self.assertEqual(response['Upload-Offset'], '3000')
+        session.refresh_from_db()
+        self.assertEqual(session.received, 3000)
+        self.assertEqual(self.stored_bytes(session), CONTENT[:3000])
+
+    def test_oversized_chunk_returns_413(self):
+        session = self.start()
+        response = self.put(session, 0, CONTENT[:5000])  # > UPLOAD_CHUNK_MAX_SIZE
+        self.assertEqual(response.status_code, 413)
+        self.assertEqual(response['Upload-Offset'], '0')
+
+        # Chunk cuối vượt quá total_size
+        self.upload_all(session, CONTENT[:9000])
+        response = self.put(session, 9000, CONTENT[9000:] + b'extra')
+        self.assertEqual(response.status_code, 413)
+
+    def test_oversized_body_without_content_length_is_rejected_while_reading(self):
+        session = self.start()
+        with self.assertRaises(UploadError) as error:
+            write_chunk(session, 0, io.BytesIO(CONTENT[:5000]), content_length=None)
+        self.assertEqual(error.exception.status, 413)
+        session.refresh_from_db()
+        self.assertEqual(session.received, 0)
+
+    def test_interrupted_chunk_keeps_received_bytes(self):
+        session = self.start(sha256=SHA256)
+        write_chunk(session, 0, io.BytesIO(CONTENT[:3000]))
+        # Client mất kết nối sau 2500 bytes (nhiều block): phần đã nhận được lưu, offset mới trả về để resume
+        self.assertEqual(write_chunk(session, 3000, _BrokenStream(CONTENT[3000:7000], fail_after=2500)), 5500)
+        session.refresh_from_db()
+        self.assertEqual(session.received, 5500)
+        self.assertEqual(self.stored_bytes(session), CONTENT[:5500])
+        self.assertEqual(self.part_files(session), [])
+
+        with self.assertRaises(UploadError) as error:
+            write_chunk(session, 3000, io.BytesIO(CONTENT[3000:4000]))
+        self.assertEqual(error.exception.status, 409)
+
+        self.upload_all_from(session, 5500)
+
+        detection, reused = complete_upload(session)
+        self.assertFalse(reused)
+        self.assertEqual(detection.file_sha256, SHA256)
+        self.assertEqual(self.stored_bytes(session), CONTENT)
+
+    def test_chunk_written_by_another_request_while_reading_is_rejected(self):
+        session = self.start()
+        write_chunk(session, 0, io.BytesIO(CONTENT[:3000]))
+        # Request cũ còn đang đọc body (không giữ khóa session) thì client đã gửi lại chunk đó qua request khác
+        stale = _BrokenStream(CONTENT[3000:6000], fail_after=3000)
+        retried = []
+        original_read = stale.read
+
+        def read_then_retry(size=-1):
+            if not retried:
+                retried.append(write_chunk(session, 3000, io.BytesIO(CONTENT[3000:5000])))
+            return original_read(size)
+
+        stale.read = read_then_retry
+        with self.assertRaises(UploadError) as error:
+            write_chunk(session, 3000, stale)
+        self.assertEqual(error.exception.status, 409)
+        self.assertEqual(retried, [5000])
+        # Request thua không ghi gì vào file
+        self.assertEqual(self.stored_bytes(session), CONTENT[:5000])
+        self.assertEqual(self.part_files(session), [])
+
+    def test_bad_checksum_aborts_session(self):
+        session = self.start(sha256=hashlib.sha256(b'other').hexdigest())
+        self.upload_all(session)
+        response = self.complete(session)
+
+        self.assertEqual(response.status_code, 422)
+        session.refresh_from_db()
+        self.assertEqual(session.status, 'aborted')
+        self.assertFalse(os.path.exists(os.path.join(self.media_root, session.file_name)))
+        self.assertFalse(Detection.objects.exists())
+        self.assertEqual(self.put(session, len(CONTENT), b'x').status_code, 409)
+        self.assertEqual(self.complete(session).status_code, 409)
+
+    def test_checksum_from_complete_body(self):
+        session = self.start()
+        self.upload_all(session)
+        self.assertEqual(self.complete(session, sha256='0' * 64).status_code, 422)
+
+        session = self.start()
+        self.upload_all(session)
+        self.assertEqual(self.complete(session, sha256=SHA256.upper()).status_code, 202)
+
+    def test_incomplete_upload_cannot_complete(self):
+        session = self.start()
+        self.put(session, 0, CONTENT[:3000])
+        self.assertEqual(self.complete(session).status_code, 409)
+
+    def test_hash_without_in_process_hasher_matches(self):
+        # Mỗi chunk tới một gunicorn worker khác: không có hasher tính dần, complete đọc lại cả file
+        incremental = self.start()
+        self.upload_all(incremental)
+        self.assertIn(incremental.id, uploads._hashers)
+        incremental_sha = uploads._file_sha256(UploadSession.objects.get(id=incremental.id))
+
+        fallback = self.start()
+        for offset in range(0, len(CONTENT), 3000):
+            uploads._hashers.clear()
+            write_chunk(fallback, offset, io.BytesIO(CONTENT[offset:offset + 3000]))
+        uploads._hashers.clear()
+        fallback.refresh_from_db()
+        self.assertEqual(uploads._file_sha256(fallback), incremental_sha)
+        self.assertEqual(incremental_sha, SHA256)
+
+        detection, _ = complete_upload(fallback, SHA256)
+        self.assertEqual(detection.file_sha256, SHA256)
+
+    def test_duplicate_content_deletes_assembled_file(self):
+        first = self.start()
+        self.upload_all(first)
+        first_detection = Detection.objects.get(id=self.complete(first).data['detection_id'])
+
+        second = self.start()
+        self.upload_all(second)
+        response = self.complete(second)
+
+        self.assertEqual(response.status_code, 202)
+        detection = Detection.objects.get(id=response.data['detection_id'])
+        self.assertEqual(detection.file.name, first_detection.file.name)
+        self.assertFalse(os.path.exists(os.path.join(self.media_root, second.file_name)))
+        self.assertEqual(self.stored_bytes(first), CONTENT)
+
+    @override_settings(DETECTION_REUSE_RESULTS=True)
+    @mock.patch('recognition.dedup.resolved_model_version', return_value='test-version')
+    def test_processed_duplicate_reuses_results(self, _):
+        first = self.start()
+        self.upload_all(first)
+        source = Detection.objects.get(id=self.complete(first).data['detection_id'])
+        source.status = 'done'
+        source.model_version = 'test-version'
+        source.conf_threshold = 0.5
+        source.output_file = 'results/clip.mp4'
+        source.finished_at = timezone.now()
+        source.save()
+        os.makedirs(os.path.join(self.media_root, 'results'))
+        open(os.path.join(self.media_root, 'results', 'clip.mp4'), 'wb').close()
+        DetectedSign.objects.create(detection=source, class_id=3, class_name='P.102', confidence=0.8, bbox=[1, 2, 3, 4])
+
+        second = self.start()
+        self.upload_all(second)
+        response = self.complete(second)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.data['reused'])
+        detection = Detection.objects.get(id=response.data['detection_id'])
+        self.assertEqual(detection.status, 'done')
+        self.assertEqual(detection.detected_signs.count(), 1)
+        self.assertFalse(os.path.exists(os.path.join(self.media_root, second.file_name)))
+        self.assertEqual(self.stored_bytes(first), CONTENT)
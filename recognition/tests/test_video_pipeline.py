@@ -0,0 +1,67 @@
+from concurrent.futures import Future
+
+import numpy as np
+from django.test import SimpleTestCase
+
+from ai_engine.video_pipeline import StrideDetectStage
+
+
+class _SlowFuture(Future):
+    """Future của pool chưa xong cho tới khi có người chờ result() (worker rất chậm)"""
+
+    def __init__(self, compute):
+        super().__init__()
+        self._compute = compute
+
+    def result(self, timeout=None):
+        if not super().done():
+            self.set_result(self._compute())
+        return super().result(timeout)
+
+
+def fake_detections(frames_batch):
+    return [[{'class_id': int(frame[0, 0, 0]), 'confidence': 0.9, 'bbox': [0, 0, 1, 1]}] for frame in frames_batch]
+
+
+def run_stage(stage, frame_count, frame_shape=(10, 10, 3)):
+    outputs, max_buffered = [], 0
+    for frame_idx in range(frame_count):
+        frame = np.full(frame_shape, frame_idx % 256, dtype=np.uint8)
+        outputs.extend(stage.process((frame_idx, frame)))
+        max_buffered = max(max_buffered, len(stage._pending))
+    outputs.extend(stage.finish())
+    return outputs, max_buffered
+
+
+class StrideDetectStageBufferTests(SimpleTestCase):
+
+    def make_stage(self, **kwargs):
+        return StrideDetectStage(
+            submit_batch=lambda frames_batch: _SlowFuture(lambda: fake_detections(frames_batch)),
+            max_in_flight=4, frame_stride=5, batch_size=4, input_size=4, **kwargs
+        )
+
+    def test_unbounded_buffer_holds_every_in_flight_frame(self):
+        _, max_buffered = run_stage(self.make_stage(), 200)
+        # 4 batch x 4 frame detect x stride 5 frames chờ kết quả
+        self.assertGreaterEqual(max_buffered, 4 * 4 * 5)
+
+    def test_buffer_is_capped_by_bytes(self):
+        frame_bytes = 10 * 10 * 3
+        bounded = self.make_stage(max_buffer_bytes=12 * frame_bytes)
+        outputs, max_buffered = run_stage(bounded, 200)
+        expected, _ = run_stage(self.make_stage(), 200)
+
+        self.assertLessEqual(max_buffered, 12)
+        # Cùng frame, cùng thứ tự, cùng detections như khi không giới hạn
+        self.assertEqual([idx for idx, _, _ in outputs], list(range(200)))
+        self.assertEqual(
+            [(idx, detections) for idx, _, detections in outputs],
+            [(idx, detections) for idx, _, detections in expected],
+        )
+        self.assertEqual(bounded._pending_bytes, 0)
+
+    def test_limit_smaller_than_one_frame_still_progresses(self):
+        outputs, max_buffered = run_stage(self.make_stage(max_buffer_bytes=1), 50)
+        self.assertEqual([idx for idx, _, _ in outputs], list(range(50)))
+        self.assertLessEqual(max_buffered, 1)
@@ -0,0 +1,45 @@
+"""
+Upload handlers tính SHA-256 của file ngay trong lúc stream vào (không đọc lại file sau khi lưu)
+
+Thay thế 2 handler mặc định của Django, file trả về có thêm thuộc tính `sha256`.
+"""
+import hashlib
+
+from django.core.files.uploadhandler import MemoryFileUploadHandler, TemporaryFileUploadHandler
+
+
+class Sha256UploadMixin:
+    def new_file(self, *args, **kwargs):
+        # Khởi tạo trước super(): MemoryFileUploadHandler raise StopFutureHandlers khi được chọn
+        self._sha256 = hashlib.sha256()
+        super().new_file(*args, **kwargs)
+
+    def receive_data_chunk(self, raw_data, start):
+        self._sha256.update(raw_data)
+        return super().receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size):
+        file = super().file_complete(file_size)
+        if file is not None:
+            file.sha256 = self._sha256.hexdigest()
+        return file
+
+
+class HashingMemoryFileUploadHandler(Sha256UploadMixin, MemoryFileUploadHandler):
+    pass
+
+
+class HashingTemporaryFileUploadHandler(Sha256UploadMixin, TemporaryFileUploadHandler):
+    pass
+
+
+def file_sha256(uploaded_file) -> str:
+    """SHA-256 của file upload: lấy giá trị đã tính lúc stream, nếu không có thì đọc lại theo chunk"""
+    digest = getattr(uploaded_file, 'sha256', None)
+    if digest:
+        return digest
+    sha = hashlib.sha256()
+    for chunk in uploaded_file.chunks():
+        sha.update(chunk)
+    uploaded_file.seek(0)
+    return sha.hexdigest()
@@ -0,0 +1,234 @@
+"""
+Upload nhiều chunk, resume được (giao thức giống tus)
+
+1. init: tạo UploadSession + file rỗng dưới MEDIA_ROOT/uploads
+2. PUT chunk kèm offset: body được ghi dần ra file tạm (không buffer trong RAM, không giữ khóa session
+   khi đọc qua mạng) rồi chép vào file cuối cùng tại offset đó. Offset phải bằng số byte server đã nhận
+   -> client mất kết nối chỉ cần hỏi lại offset (phần đã nhận trước khi ngắt vẫn được giữ) và gửi tiếp
+3. complete: kiểm tra kích thước + SHA-256, tạo Detection (đưa vào hàng đợi của worker)
+"""
+import glob
+import hashlib
+import logging
+import os
+import shutil
+import threading
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from django.utils.text import get_valid_filename
+
+from .dedup import create_detection_for_upload
+from .models import Detection, UploadSession
+
+logger = logging.getLogger(__name__)
+
+READ_BLOCK_SIZE = 1024 * 1024
+
+
+class UploadError(Exception):
+    """Lỗi giao thức upload, status là HTTP status code trả về cho client"""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+
+def _storage():
+    return Detection._meta.get_field('file').storage
+
+
+def _full_path(session) -> str:
+    return _storage().path(session.file_name)
+
+
+# SHA-256 tính dần theo các chunk liên tiếp trong process này, tránh đọc lại file lúc complete
+_hashers = {}
+_hashers_lock = threading.Lock()
+
+
+def _take_hasher(session_id, offset):
+    """Hasher đã tính tới đúng offset (hoặc hasher mới nếu offset = 0), None nếu không có"""
+    with _hashers_lock:
+        state = _hashers.pop(session_id, None)
+    if offset == 0:
+        return hashlib.sha256()
+    if state is None or state[0] != offset:
+        return None
+    return state[1]
+
+
+def _store_hasher(session_id, size, hasher):
+    if hasher is not None:
+        with _hashers_lock:
+            _hashers[session_id] = (size, hasher)
+
+
+def _file_sha256(session) -> str:
+    with _hashers_lock:
+        state = _hashers.pop(session.id, None)
+    if state is not None and state[0] == session.total_size:
+        return state[1].hexdigest()
+    sha = hashlib.sha256()
+    with open(_full_path(session), 'rb') as f:
+        for block in iter(lambda: f.read(READ_BLOCK_SIZE), b''):
+            sha.update(block)
+    return sha.hexdigest()
+
+
+def init_upload(user, filename: str, file_type: str, total_size: int, sha256: str = '') -> UploadSession:
+    if total_size <= 0:
+        raise UploadError("size phải lớn hơn 0")
+    if total_size > settings.UPLOAD_MAX_SIZE:
+        raise UploadError(f"File quá lớn, tối đa {settings.UPLOAD_MAX_SIZE} bytes", status=413)
+
+    token = uuid.uuid4()
+    file_name = f"uploads/{token.hex}_{get_valid_filename(os.path.basename(filename))}"
+    full_path = _storage().path(file_name)
+    os.makedirs(os.path.dirname(full_path), exist_ok=True)
+    open(full_path, 'wb').close()
+
+    return UploadSession.objects.create(
+        token=token,
+        user=user,
+        filename=filename,
+        file_type=file_type,
+        file_name=file_name,
+        total_size=total_size,
+        sha256=(sha256 or '').lower(),
+    )
+
+
+def _check_offset(session: UploadSession, offset: int):
+    if session.status != 'uploading':
+        raise UploadError("Upload đã kết thúc", status=409)
+    if offset != session.received:
+        raise UploadError(f"Offset không khớp, server đã nhận {session.received} bytes", status=409)
+
+
+def write_chunk(session: UploadSession, offset: int, stream, content_length: int = None) -> int:
+    """
+    Ghi body của request (đọc dần từ stream) vào file tại offset, trả về offset mới
+    Offset phải bằng session.received (409 nếu lệch, client hỏi lại offset rồi gửi tiếp)
+    Client mất kết nối giữa chừng: phần đã nhận vẫn được lưu, client gửi tiếp từ offset mới
+    """
+    session = UploadSession.objects.get(pk=session.pk)
+    _check_offset(session, offset)
+
+    limit = min(settings.UPLOAD_CHUNK_MAX_SIZE, session.total_size - offset)
+    if content_length is not None and content_length > limit:
+        raise UploadError(f"Chunk quá lớn, tối đa {limit} bytes", status=413)
+
+    # Đọc body qua mạng (có thể rất lâu) vào file tạm, không giữ khóa session
+    part_path = f"{_full_path(session)}.{uuid.uuid4().hex}.part"
+    written = 0
+    hasher = _take_hasher(session.id, offset)
+    try:
+        with open(part_path, 'wb') as part:
+            while True:
+                try:
+                    block = stream.read(min(READ_BLOCK_SIZE, limit + 1 - written))
+                except OSError as e:  # Gồm UnreadablePostError: client ngắt kết nối
+                    logger.info(f"Upload {session.id}: connection lost after {written} bytes at offset {offset}: {e}")
+                    break
+                if not block:
+                    break
+                written += len(block)
+                if written > limit:
+                    raise UploadError(f"Chunk quá lớn, tối đa {limit} bytes", status=413)
+                part.write(block)
+                if hasher is not None:
+                    hasher.update(block)
+        return _commit_chunk(session, offset, part_path, written, hasher)
+    finally:
+        try:
+            os.remove(part_path)
+        except FileNotFoundError:
+            pass
+
+
+def _commit_chunk(session: UploadSession, offset: int, part_path: str, written: int, hasher) -> int:
+    """Chép phần đã nhận vào file upload tại offset và lưu offset mới"""
+    with transaction.atomic():
+        # Khóa session: trong lúc đọc body, request khác có thể đã ghi chunk này hoặc upload đã bị hủy
+        session = UploadSession.objects.select_for_update().get(pk=session.pk)
+        _check_offset(session, offset)
+        with open(_full_path(session), 'r+b') as f, open(part_path, 'rb') as part:
+            f.seek(offset)
+            shutil.copyfileobj(part, f, READ_BLOCK_SIZE)
+            # Bỏ phần thừa của lần ghi dở trước đó
+            f.truncate(offset + written)
+
+        _store_hasher(session.id, offset + written, hasher)
+        session.received = offset + written
+        session.save(update_fields=['received', 'updated_at'])
+        return session.received
+
+
+def complete_upload(session: UploadSession, sha256: str = ''):
+    """
+    Kiểm tra kích thước + checksum rồi tạo Detection cho file đã ghép
+    Returns: (detection, reused)
+    """
+    with transaction.atomic():
+        # Khóa session: gọi complete 2 lần đồng thời chỉ tạo một Detection
+        session = UploadSession.objects.select_for_update().get(pk=session.pk)
+        result = _complete_locked(session, sha256)
+    if result is None:
+        raise UploadError("Checksum SHA-256 không khớp, vui lòng upload lại", status=422)
+    return result
+
+
+def _complete_locked(session: UploadSession, sha256: str):
+    """Returns: (detection, reused), hoặc None nếu checksum sai (upload bị hủy)"""
+    if session.status == 'completed' and session.detection_id:
+        return session.detection, False
+    if session.status != 'uploading':
+        raise UploadError("Upload đã bị hủy", status=409)
+    if session.received != session.total_size:
+        raise UploadError(f"Upload chưa đủ: {session.received}/{session.total_size} bytes", status=409)
+
+    expected = (sha256 or session.sha256 or '').lower()
+    actual = _file_sha256(session)
+    if expected and expected != actual:
+        abort_upload(session)
+        return None
+
+    detection, reused = create_detection_for_upload(session.user, session.file_type, actual, session.file_name)
+    if detection.file.name != session.file_name:
+        # Nội dung đã có sẵn trong storage -> bỏ bản vừa ghép
+        _storage().delete(session.file_name)
+
+    session.status = 'completed'
+    session.detection = detection
+    session.save(update_fields=['status', 'detection', 'updated_at'])
+    return detection, reused
+
+
+def abort_upload(session: UploadSession):
+    with _hashers_lock:
+        _hashers.pop(session.id, None)
+    if session.status == 'uploading':
+        _storage().delete(session.file_name)
+        # File tạm của request bị kill giữa chừng
+        for part_path in glob.glob(glob.escape(_full_path(session)) + '.*.part'):
+            os.remove(part_path)
+    session.status = 'aborted'
+    session.save(update_fields=['status', 'updated_at'])
+
+
+def expire_upload_sessions(max_age_seconds=None) -> int:
+    """Hủy các upload bỏ dở quá UPLOAD_SESSION_EXPIRY giây, xóa file tạm. Trả về số session đã hủy"""
+    if max_age_seconds is None:
+        max_age_seconds = settings.UPLOAD_SESSION_EXPIRY
+    deadline = timezone.now() - timedelta(seconds=max_age_seconds)
+    stale = list(UploadSession.objects.filter(status='uploading', updated_at__lt=deadline))
+    for session in stale:
+        abort_upload(session)
+    if stale:
+        logger.info(f"Expired {len(stale)} abandoned upload session(s)")
+    return len(stale)
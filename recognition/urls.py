@@ -3,16 +3,38 @@ from django.urls import path, re_path
 from .views import (
     DetectionUploadRunView,
     DetectionDetailView,
+    DetectionFramesView,
+    DetectionReaggregateView,
     RecognitionHistoryListView,
     ServeMediaFileView,
+    StreamCreateView,
+    StreamFrameView,
+    StreamEventsView,
+    StreamStopView,
+    ChunkedUploadInitView,
+    ChunkedUploadView,
+    ChunkedUploadCompleteView,
 )
 
 
 urlpatterns = [
     path("upload-run/", DetectionUploadRunView.as_view(), name="upload-run"),
     path("detection/<int:pk>/", DetectionDetailView.as_view(), name="detection-detail"),
+    path("detection/<int:pk>/frames/", DetectionFramesView.as_view(), name="detection-frames"),
+    path("detection/<int:pk>/reaggregate/", DetectionReaggregateView.as_view(), name="detection-reaggregate"),
     path("history/", RecognitionHistoryListView.as_view(), name="history-list"),
     
+    # Upload nhiều chunk, resume được
+    path("uploads/", ChunkedUploadInitView.as_view(), name="upload-init"),
+    path("uploads/<uuid:token>/", ChunkedUploadView.as_view(), name="upload-chunk"),
+    path("uploads/<uuid:token>/complete/", ChunkedUploadCompleteView.as_view(), name="upload-complete"),
+    
+    # Live stream (RTSP / MJPEG URL hoặc client đẩy frame)
+    path("stream/", StreamCreateView.as_view(), name="stream-create"),
+    path("stream/<int:pk>/frames/", StreamFrameView.as_view(), name="stream-frames"),
+    path("stream/<int:pk>/events/", StreamEventsView.as_view(), name="stream-events"),
+    path("stream/<int:pk>/stop/", StreamStopView.as_view(), name="stream-stop"),
+    
     # Serve media files với proper headers cho video streaming
     re_path(r'^media/(?P<file_path>.+)$', ServeMediaFileView.as_view(), name='serve-media'),
 ]
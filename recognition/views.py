@@ -1,25 +1,41 @@
+import io
 import os
+import json
 import logging
+import math
 import mimetypes
+import time
 from pathlib import Path
+
 from django.conf import settings
-from django.core.files import File
-from django.http import FileResponse, Http404
+from django.http import FileResponse, Http404, HttpResponse, StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from django.utils import timezone
 from rest_framework import generics, status
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from rest_framework.parsers import MultiPartParser, FormParser
+from rest_framework.parsers import JSONParser, MultiPartParser, FormParser
 from rest_framework.permissions import AllowAny
+from rest_framework.renderers import BaseRenderer, JSONRenderer
 
-from .models import Detection, DetectedSign, RecognitionHistory
+from ai_engine import metrics
+from ai_engine.frame_store import FrameDetectionFile
+from ai_engine.yolo_infer import model_status, preload_model
+from .dedup import create_detection_for_upload
+from .jobs import JOB_QUEUE_DEPTH  # noqa: F401  (đăng ký gauge độ dài hàng đợi cho /metrics)
+from .models import Detection, DetectedSign, RecognitionHistory, UploadSession
+from .processing import DetectionProcessor
+from .streaming import (
+    StreamSourceError, discard_push_frames, enqueue_push_frame, is_image_data, sign_event, validate_source_url,
+)
+from .uploads import UploadError, abort_upload, complete_upload, init_upload, write_chunk
+from .upload_handlers import file_sha256
 from .serializers import (
     DetectionSerializer,
     DetectionSummarySerializer,
     DetectionDetailSerializer,
     RecognitionHistorySerializer
 )
-from traffic_signs.models import TrafficSign
-from ai_engine.yolo_infer import predict_image_with_save, predict_video_with_save
 from rest_framework.permissions import IsAuthenticated
 
 logger = logging.getLogger(__name__)
@@ -35,29 +51,31 @@ class DetectionUploadRunView(generics.CreateAPIView):
         - file: file upload (image hoặc video)
         - file_type: "image" hoặc "video"
     
-    Response (Summary):
+    Việc nhận diện chạy ở background worker (manage.py run_detection_workers),
+    endpoint trả về 202 ngay sau khi lưu file.
+    
+    Response (202 Accepted):
         {
             "success": true,
-            "message": "Nhận diện thành công",
+            "message": "Đã nhận file, đang chờ xử lý",
             "detection_id": 123,
             "file_type": "video",
             "data": {
                 "id": 123,
-                "output_file": "http://...",
+                "output_file": null,
                 "file_type": "video",
-                "status": "done",
-                "fps": 30.0,
-                "duration": 10.5,
+                "status": "pending",
+                "fps": null,
+                "duration": null,
                 "created_at": "...",
-                "signs_summary": {
-                    "Cấm rẽ trái": {
-                        "count": 3,
-                        "total_duration": 5.2,
-                        "avg_confidence": 0.89
-                    }
-                }
+                "signs_summary": {}
             }
         }
+    
+    Poll GET /api/recognition/detection/<id>/ cho đến khi status là "done" hoặc "failed".
+    
+    Nếu cùng nội dung file đã được xử lý với cùng model version và threshold,
+    endpoint trả về 200 với "reused": true và status "done" ngay (không chạy lại model).
     """
     serializer_class = DetectionSerializer
     parser_classes = [MultiPartParser, FormParser]
@@ -86,312 +104,51 @@ class DetectionUploadRunView(generics.CreateAPIView):
             )
         
         # Kiểm tra định dạng file
-        allowed_image_extensions = ['.jpg', '.jpeg', '.png', '.bmp']
-        allowed_video_extensions = ['.mp4', '.avi', '.mov', '.mkv']
-        file_ext = os.path.splitext(file.name)[1].lower()
-        
-        if file_type == 'image' and file_ext not in allowed_image_extensions:
-            return Response(
-                {"success": False, "message": f"Định dạng ảnh không hợp lệ. Chỉ chấp nhận: {', '.join(allowed_image_extensions)}"},
-                status=status.HTTP_400_BAD_REQUEST
-            )
-        
-        if file_type == 'video' and file_ext not in allowed_video_extensions:
-            return Response(
-                {"success": False, "message": f"Định dạng video không hợp lệ. Chỉ chấp nhận: {', '.join(allowed_video_extensions)}"},
-                status=status.HTTP_400_BAD_REQUEST
-            )
-        
-        # Tạo Detection object
-        detection = Detection.objects.create(
-            file=file,
-            file_type=file_type,
-            status='processing',
-            user=request.user  # Lưu user đã đăng nhập
-        )
-        
-        try:
-            # Lấy đường dẫn file đã upload
-            file_path = Path(detection.file.path)
-            
-            if file_type == 'image':
-                # Xử lý ảnh với confidence threshold 0.5
-                detections, output_path = predict_image_with_save(file_path, conf=0.5)
-                
-                # Lọc overlapping detections
-                detections = self._filter_overlapping_detections(detections)
-                
-                # Lưu output file - CHỈ LƯU 1 LẦN
-                with open(output_path, 'rb') as f:
-                    detection.output_file.save(output_path.name, File(f), save=True)
-                
-                # Xóa file tạm sau khi Django đã lưu
-                try:
-                    output_path.unlink(missing_ok=True)
-                except Exception as e:
-                    logger.warning(f"Cannot delete temp file {output_path}: {e}")
-                
-                # Tạo DetectedSign cho ảnh
-                self._create_detected_signs_for_image(detection, detections)
-                
-            else:  # video
-                # Xử lý video với confidence threshold 0.5
-                frame_detections, output_path, fps = predict_video_with_save(file_path, conf=0.5)
-                
-                # Lọc overlapping detections cho từng frame
-                for frame_data in frame_detections:
-                    frame_data['detections'] = self._filter_overlapping_detections(frame_data['detections'])
-                
-                # Lưu output file - CHỈ LƯU 1 LẦN
-                with open(output_path, 'rb') as f:
-                    detection.output_file.save(output_path.name, File(f), save=True)
-                
-                # Xóa file tạm sau khi Django đã lưu
-                try:
-                    output_path.unlink(missing_ok=True)
-                except Exception as e:
-                    logger.warning(f"Cannot delete temp file {output_path}: {e}")
-                
-                # Lưu thông tin video
-                detection.fps = fps
-                detection.total_frames = len(frame_detections)
-                detection.duration = detection.total_frames / fps if fps > 0 else 0
-                
-                # Tạo DetectedSign cho video với timeline
-                self._create_detected_signs_for_video(detection, frame_detections, fps)
-            
-            # Cập nhật status - không cần save() lần nữa vì đã save khi lưu output_file
-            detection.status = 'done'
-            detection.save(update_fields=['status'])
-            
-            # Trả về response với thông tin tóm tắt
-            serializer = DetectionSummarySerializer(detection, context={'request': request})
-            return Response({
-                "success": True,
-                "message": "Nhận diện thành công",
-                "detection_id": detection.id,
-                "file_type": file_type,
-                "data": serializer.data
-            }, status=status.HTTP_201_CREATED)
-            
-        except Exception as e:
-            logger.error(f"Error processing detection {detection.id}: {str(e)}", exc_info=True)
-            detection.status = 'failed'
-            detection.error_message = str(e)
-            detection.save()
-            
-            return Response({
-                "success": False,
-                "message": f"Lỗi khi xử lý: {str(e)}",
-                "detection_id": detection.id
-            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-    
-    def _calculate_iou(self, box1, box2):
-        """Tính Intersection over Union (IoU) giữa 2 bounding boxes"""
-        x1_min, y1_min, x1_max, y1_max = box1
-        x2_min, y2_min, x2_max, y2_max = box2
-        
-        # Tính diện tích giao nhau
-        inter_x_min = max(x1_min, x2_min)
-        inter_y_min = max(y1_min, y2_min)
-        inter_x_max = min(x1_max, x2_max)
-        inter_y_max = min(y1_max, y2_max)
-        
-        if inter_x_max < inter_x_min or inter_y_max < inter_y_min:
-            return 0.0
-        
-        inter_area = (inter_x_max - inter_x_min) * (inter_y_max - inter_y_min)
-        
-        # Tính diện tích hợp nhất
-        box1_area = (x1_max - x1_min) * (y1_max - y1_min)
-        box2_area = (x2_max - x2_min) * (y2_max - y2_min)
-        union_area = box1_area + box2_area - inter_area
+        error = validate_file_extension(file_type, file.name)
+        if error:
+            return error
         
-        return inter_area / union_area if union_area > 0 else 0.0
-    
-    def _filter_overlapping_detections(self, detections, iou_threshold=0.5):
-        """
-        Lọc các detections bị overlap (Non-Maximum Suppression)
-        Chỉ giữ detection có confidence cao nhất trong nhóm overlap
-        """
-        if not detections:
-            return detections
+        # SHA-256 đã được tính trong lúc stream upload (recognition/upload_handlers.py)
+        # Tạo Detection ở trạng thái pending - worker sẽ claim và xử lý (hoặc dùng lại kết quả file trùng)
+        detection, reused = create_detection_for_upload(request.user, file_type, file_sha256(file), file)
         
-        # Sắp xếp theo confidence giảm dần
-        sorted_dets = sorted(detections, key=lambda x: x.get('confidence', 0), reverse=True)
-        
-        filtered = []
-        skip_indices = set()
-        
-        for i, det1 in enumerate(sorted_dets):
-            if i in skip_indices:
-                continue
-            
-            filtered.append(det1)
-            bbox1 = det1.get('bbox', [])
-            
-            if len(bbox1) != 4:
-                continue
-            
-            # So sánh với các detections còn lại
-            for j in range(i + 1, len(sorted_dets)):
-                if j in skip_indices:
-                    continue
-                
-                det2 = sorted_dets[j]
-                bbox2 = det2.get('bbox', [])
-                
-                if len(bbox2) != 4:
-                    continue
-                
-                # Tính IoU
-                iou = self._calculate_iou(bbox1, bbox2)
-                
-                # Nếu overlap quá nhiều, bỏ detection có confidence thấp hơn
-                if iou > iou_threshold:
-                    skip_indices.add(j)
-        
-        return filtered
-    
-    def _create_detected_signs_for_image(self, detection, detections):
-        """Tạo DetectedSign cho ảnh"""
-        for det in detections:
-            class_id = det.get('class_id')
-            class_name = det.get('class_name', '')
-            
-            # Tìm TrafficSign tương ứng
-            traffic_sign = self._find_traffic_sign(class_id, class_name)
-            
-            DetectedSign.objects.create(
-                detection=detection,
-                traffic_sign=traffic_sign,
-                class_id=class_id,
-                class_name=class_name,
-                confidence=det.get('confidence', 0),
-                bbox=det.get('bbox', []),
-                frame_index=0  # Ảnh chỉ có 1 frame
-            )
+        # Trả về ngay, client poll GET /api/recognition/detection/<id>/ để lấy kết quả
+        return detection_created_response(request, detection, reused)
+
+
+ALLOWED_IMAGE_EXTENSIONS = ['.jpg', '.jpeg', '.png', '.bmp']
+ALLOWED_VIDEO_EXTENSIONS = ['.mp4', '.avi', '.mov', '.mkv']
+
+
+def validate_file_extension(file_type, filename):
+    """Trả về Response 400 nếu đuôi file không hợp lệ với file_type, None nếu hợp lệ"""
+    file_ext = os.path.splitext(filename)[1].lower()
     
-    def _create_detected_signs_for_video(self, detection, frame_detections, fps):
-        """
-        Tạo DetectedSign cho video với timeline
-        Gộp các detection của cùng một biển báo, cho phép gap nhỏ giữa các detections
-        """
-        GAP_TOLERANCE_FRAMES = int(fps * 0.5)  # Cho phép gap 0.5 giây giữa các detections
-        MIN_APPEARANCE_DURATION = 0.3  # Chỉ giữ biển báo xuất hiện ít nhất 0.3 giây
-        
-        # Tập hợp tất cả detections theo biển báo
-        # Key: (class_id, class_name), Value: list of {frame, confidence, bbox}
-        all_detections_by_sign = {}
-        
-        for frame_data in frame_detections:
-            frame_idx = frame_data['frame_index']
-            detections = frame_data['detections']
-            
-            for det in detections:
-                class_id = det.get('class_id')
-                class_name = det.get('class_name', '')
-                key = (class_id, class_name)
-                
-                if key not in all_detections_by_sign:
-                    all_detections_by_sign[key] = []
-                
-                all_detections_by_sign[key].append({
-                    'frame': frame_idx,
-                    'confidence': det.get('confidence', 0),
-                    'bbox': det.get('bbox', [])
-                })
-        
-        # Xử lý từng biển báo
-        for (class_id, class_name), detections_list in all_detections_by_sign.items():
-            # Sắp xếp theo frame
-            detections_list.sort(key=lambda x: x['frame'])
-            
-            # Gộp các detections gần nhau thành các segments
-            segments = []
-            current_segment = None
-            
-            for det in detections_list:
-                frame = det['frame']
-                
-                if current_segment is None:
-                    # Bắt đầu segment mới
-                    current_segment = {
-                        'start_frame': frame,
-                        'end_frame': frame,
-                        'confidences': [det['confidence']],
-                        'bboxes': [det['bbox']],
-                        'class_id': class_id,
-                        'class_name': class_name
-                    }
-                elif frame - current_segment['end_frame'] <= GAP_TOLERANCE_FRAMES:
-                    # Tiếp tục segment hiện tại (cho phép gap nhỏ)
-                    current_segment['end_frame'] = frame
-                    current_segment['confidences'].append(det['confidence'])
-                    current_segment['bboxes'].append(det['bbox'])
-                else:
-                    # Kết thúc segment hiện tại và bắt đầu segment mới
-                    segments.append(current_segment)
-                    current_segment = {
-                        'start_frame': frame,
-                        'end_frame': frame,
-                        'confidences': [det['confidence']],
-                        'bboxes': [det['bbox']],
-                        'class_id': class_id,
-                        'class_name': class_name
-                    }
-            
-            # Thêm segment cuối cùng
-            if current_segment is not None:
-                segments.append(current_segment)
-            
-            # Lọc và lưu các segments có thời lượng đủ dài
-            for segment in segments:
-                duration = (segment['end_frame'] - segment['start_frame']) / fps
-                if duration >= MIN_APPEARANCE_DURATION:
-                    self._save_detected_sign_for_video(detection, segment, fps)
-    
-    def _save_detected_sign_for_video(self, detection, sign_data, fps):
-        """Lưu một DetectedSign cho video"""
-        class_id = sign_data['class_id']
-        class_name = sign_data['class_name']
-        
-        # Tính thời gian và confidence trung bình
-        start_time = sign_data['start_frame'] / fps if fps > 0 else 0
-        end_time = sign_data['end_frame'] / fps if fps > 0 else 0
-        avg_confidence = sum(sign_data['confidences']) / len(sign_data['confidences']) if sign_data['confidences'] else 0
-        
-        # Lấy bbox cuối cùng (hoặc có thể tính trung bình)
-        last_bbox = sign_data['bboxes'][-1] if sign_data['bboxes'] else []
-        
-        # Tìm TrafficSign tương ứng
-        traffic_sign = self._find_traffic_sign(class_id, class_name)
-        
-        DetectedSign.objects.create(
-            detection=detection,
-            traffic_sign=traffic_sign,
-            class_id=class_id,
-            class_name=class_name,
-            confidence=avg_confidence,
-            bbox=last_bbox,
-            start_time=start_time,
-            end_time=end_time,
-            frame_index=sign_data['start_frame']
+    if file_type == 'image' and file_ext not in ALLOWED_IMAGE_EXTENSIONS:
+        return Response(
+            {"success": False, "message": f"Định dạng ảnh không hợp lệ. Chỉ chấp nhận: {', '.join(ALLOWED_IMAGE_EXTENSIONS)}"},
+            status=status.HTTP_400_BAD_REQUEST
         )
     
-    def _find_traffic_sign(self, class_id, class_name):
-        """Tìm TrafficSign dựa trên class_id hoặc class_name từ YOLO"""
-        traffic_sign = None
-        
-        # Thử tìm theo model_class_id trước
-        if class_id is not None:
-            traffic_sign = TrafficSign.objects.filter(model_class_id=str(class_id)).first()
-        
-        # Nếu không tìm thấy, thử tìm theo tên
-        if not traffic_sign and class_name:
-            traffic_sign = TrafficSign.objects.filter(name__icontains=class_name).first()
-        
-        return traffic_sign
+    if file_type == 'video' and file_ext not in ALLOWED_VIDEO_EXTENSIONS:
+        return Response(
+            {"success": False, "message": f"Định dạng video không hợp lệ. Chỉ chấp nhận: {', '.join(ALLOWED_VIDEO_EXTENSIONS)}"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    return None
+
+
+def detection_created_response(request, detection, reused):
+    """202 khi job được đưa vào hàng đợi, 200 khi dùng lại kết quả của file trùng"""
+    serializer = DetectionSummarySerializer(detection, context={'request': request})
+    return Response({
+        "success": True,
+        "message": "File đã được xử lý trước đó, dùng lại kết quả" if reused else "Đã nhận file, đang chờ xử lý",
+        "detection_id": detection.id,
+        "file_type": detection.file_type,
+        "reused": reused,
+        "data": serializer.data
+    }, status=status.HTTP_200_OK if reused else status.HTTP_202_ACCEPTED)
 
 
 class DetectionDetailView(generics.RetrieveAPIView):
@@ -409,6 +166,142 @@ class DetectionDetailView(generics.RetrieveAPIView):
         return Detection.objects.filter(user=self.request.user)
 
 
+class DetectionFramesView(APIView):
+    """
+    Detections gốc từng frame detect của một detection, đọc một khoảng frame từ detections_file (memory map)
+    
+    GET /api/recognition/detection/<id>/frames/?start=<frame>&end=<frame>&limit=<n>
+    - start / end: khoảng frame_index [start, end) của video, mặc định cả video
+    - start_time / end_time: như start / end nhưng tính bằng giây (theo fps của video)
+    - limit: số frame detect tối đa trả về (mặc định và tối đa MAX_FRAMES), còn frame thì next_start khác null
+    """
+    permission_classes = [IsAuthenticated]
+    MAX_FRAMES = 1000
+    
+    def get(self, request, pk):
+        detection = get_object_or_404(Detection, pk=pk, user=request.user)
+        if not detection.detections_file:
+            return Response(
+                {"success": False, "message": "Detection không có dữ liệu từng frame"},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        try:
+            start, end = self._frame_bounds(request.query_params, detection.fps)
+            limit = min(int(request.query_params.get('limit', self.MAX_FRAMES)), self.MAX_FRAMES)
+            if limit <= 0:
+                raise ValueError
+        except (TypeError, ValueError):
+            return Response(
+                {"success": False, "message": "start / end / start_time / end_time / limit không hợp lệ"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        store = FrameDetectionFile(detection.detections_file.path)
+        lo, hi = store.frame_range(start, end)
+        stop = min(hi, lo + limit)
+        fps = detection.fps
+        frames = []
+        for frame in store.iter_frames(lo, stop):
+            frame_index = frame["frame_index"]
+            frames.append({
+                "frame_index": frame_index,
+                "time": round(frame_index / fps, 3) if fps else None,
+                "detections": [
+                    {
+                        **det,
+                        "confidence": round(det["confidence"], 4),
+                        "bbox": [round(value, 2) for value in det["bbox"]],
+                    }
+                    for det in frame["detections"]
+                ],
+            })
+        return Response({
+            "success": True,
+            "detection_id": detection.id,
+            "fps": fps,
+            "total_frames": detection.total_frames,
+            "detected_frames": store.frame_count,
+            "frames": frames,
+            "next_start": int(store["frame_index"][stop]) if stop < hi else None,
+        })
+    
+    @staticmethod
+    def _frame_bounds(params, fps):
+        """(start, end) theo frame_index từ query params, None = không giới hạn"""
+        bounds = []
+        for frame_key, time_key in (('start', 'start_time'), ('end', 'end_time')):
+            if params.get(frame_key) not in (None, ''):
+                bounds.append(int(params[frame_key]))
+            elif params.get(time_key) not in (None, ''):
+                position = float(params[time_key]) * fps if fps else math.nan
+                # inf / nan (hoặc số quá lớn, nhân fps thành inf) là input không hợp lệ, không để ceil() raise 500
+                if not math.isfinite(position):
+                    raise ValueError
+                bounds.append(int(math.ceil(position)))
+            else:
+                bounds.append(None)
+        return tuple(bounds)
+
+
+class DetectionReaggregateView(APIView):
+    """
+    Tạo lại DetectedSign của một detection đã xong với threshold mới, từ candidate đã lưu trong detections_file
+    (không chạy lại YOLO, không vẽ lại output_file)
+    
+    POST /api/recognition/detection/<id>/reaggregate/
+    Body (JSON hoặc form), bỏ trống thì giữ giá trị detection đang dùng:
+        - conf_threshold: confidence tối thiểu, không thấp hơn ngưỡng candidate đã lưu (0.1)
+        - gap_tolerance: gap (giây) tối đa giữa 2 lần thấy cùng một biển báo (video)
+        - min_duration: thời lượng (giây) tối thiểu của một lần xuất hiện (video)
+    
+    Response (200): {"success": true, "detection_id", "signs_count", "data": <chi tiết detection>}
+    """
+    parser_classes = [JSONParser, MultiPartParser, FormParser]
+    permission_classes = [IsAuthenticated]
+    
+    def post(self, request, pk):
+        detection = get_object_or_404(Detection, pk=pk, user=request.user)
+        if not detection.detections_file:
+            return Response(
+                {"success": False, "message": "Detection không có dữ liệu từng frame"},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        if detection.status != 'done':
+            return Response(
+                {"success": False, "message": f"Detection chưa xử lý xong (status: {detection.status})"},
+                status=status.HTTP_409_CONFLICT
+            )
+        try:
+            thresholds = {
+                key: self._parse_threshold(request.data.get(key), maximum)
+                for key, maximum in (('conf_threshold', 1.0), ('gap_tolerance', None), ('min_duration', None))
+            }
+            signs = DetectionProcessor().reaggregate(detection, **thresholds)
+        except ValueError as e:
+            return Response(
+                {"success": False, "message": f"conf_threshold / gap_tolerance / min_duration không hợp lệ: {e}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        serializer = DetectionDetailSerializer(detection, context={'request': request})
+        return Response({
+            "success": True,
+            "detection_id": detection.id,
+            "signs_count": len(signs),
+            "data": serializer.data,
+        })
+    
+    @staticmethod
+    def _parse_threshold(value, maximum=None):
+        """Số thực >= 0 (và <= maximum), None nếu bỏ trống"""
+        if value in (None, ''):
+            return None
+        value = float(value)
+        if not math.isfinite(value) or value < 0 or (maximum is not None and value > maximum):
+            raise ValueError(f"{value} out of range")
+        return value
+
+
 class RecognitionHistoryListView(generics.ListAPIView):
     """
     API endpoint để xem danh sách lịch sử nhận diện (Detection)
@@ -426,6 +319,52 @@ class RecognitionHistoryListView(generics.ListAPIView):
         return Detection.objects.filter(user=self.request.user).order_by('-created_at')
 
 
+class MetricsView(APIView):
+    """
+    Metrics của process theo Prometheus text format (histogram thời gian từng stage, job, frame)
+    GET /metrics
+    
+    Không yêu cầu đăng nhập để Prometheus scrape được, nên giới hạn truy cập ở reverse proxy
+    """
+    permission_classes = [AllowAny]
+    authentication_classes = []
+    
+    def get(self, request):
+        if not settings.METRICS_ENABLED:
+            raise Http404
+        return HttpResponse(metrics.render(), content_type=metrics.CONTENT_TYPE)
+
+
+class LivenessView(APIView):
+    """
+    Process còn sống (không kiểm tra model)
+    GET /health/live
+    """
+    permission_classes = [AllowAny]
+    authentication_classes = []
+    
+    def get(self, request):
+        return Response({"status": "ok"})
+
+
+class ReadinessView(APIView):
+    """
+    Sẵn sàng nhận request: chỉ trả về 200 khi model đã load + warm-up xong, nếu chưa trả về 503
+    (và bắt đầu load ở nền) để load balancer chưa chuyển traffic vào process này
+    GET /health/ready
+    """
+    permission_classes = [AllowAny]
+    authentication_classes = []
+    
+    def get(self, request):
+        status_data = model_status()
+        if not status_data["ready"]:
+            if status_data["state"] != "loading":
+                preload_model(background=True)
+            return Response(status_data, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        return Response(status_data)
+
+
 class ServeMediaFileView(APIView):
     """
     API endpoint để serve media files (video/image) với proper headers cho streaming
@@ -497,4 +436,325 @@ class ServeMediaFileView(APIView):
             
         except Exception as e:
             logger.error(f"Error serving file {file_path}: {str(e)}")
-            raise Http404("Error serving file")
\ No newline at end of file
+            raise Http404("Error serving file")
+
+
+class EventStreamRenderer(BaseRenderer):
+    """Cho phép client gửi Accept: text/event-stream (EventSource), lỗi vẫn trả JSON"""
+    media_type = 'text/event-stream'
+    format = 'sse'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return json.dumps(data, ensure_ascii=False).encode('utf-8')
+
+
+class StreamCreateView(APIView):
+    """
+    API endpoint để mở một live stream nhận diện biển báo
+    Yêu cầu đăng nhập
+    
+    POST /api/recognition/stream/
+    Body (JSON hoặc form):
+        - source_url (optional): URL RTSP / HTTP MJPEG, background worker sẽ đọc stream
+          Bỏ trống để client tự đẩy frame qua POST /api/recognition/stream/<id>/frames/
+    
+    Response (201 Created):
+        {
+            "success": true,
+            "detection_id": 123,
+            "mode": "url" | "push",
+            "frames_url": "...",   (chỉ có với mode "push")
+            "events_url": "...",
+            "stop_url": "..."
+        }
+    """
+    parser_classes = [JSONParser, MultiPartParser, FormParser]
+    permission_classes = [IsAuthenticated]
+    
+    def post(self, request):
+        source_url = (request.data.get('source_url') or '').strip()
+        if source_url:
+            try:
+                validate_source_url(source_url)
+            except StreamSourceError as e:
+                return Response({"success": False, "message": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        # Worker claim job rồi đọc source_url, hoặc detect các frame client push lên
+        detection = Detection.objects.create(
+            file_type='stream', source_url=source_url, status='pending', user=request.user
+        )
+        
+        base = f'/api/recognition/stream/{detection.id}'
+        payload = {
+            "success": True,
+            "detection_id": detection.id,
+            "mode": "url" if source_url else "push",
+            "events_url": request.build_absolute_uri(f'{base}/events/'),
+            "stop_url": request.build_absolute_uri(f'{base}/stop/'),
+        }
+        if not source_url:
+            payload["frames_url"] = request.build_absolute_uri(f'{base}/frames/')
+        return Response(payload, status=status.HTTP_201_CREATED)
+
+
+class StreamFrameView(APIView):
+    """
+    Đẩy một frame vào live stream (push mode)
+    
+    POST /api/recognition/stream/<id>/frames/
+    Form-data:
+        - frame: ảnh JPEG/PNG của frame
+        - timestamp (optional): thời điểm của frame tính bằng giây từ lúc mở stream
+    
+    Frame chỉ được ghi vào hàng đợi của stream, worker giữ stream detect theo thứ tự nhận
+    (không chạy YOLO trong request). Biển báo được xác nhận gửi qua events_url (SSE)
+    
+    Response (202 Accepted):
+        {"success": true, "queued": true, "timestamp": 1.25}
+    429 nếu đã có STREAM_PUSH_QUEUE_SIZE frame chờ worker
+    """
+    parser_classes = [MultiPartParser, FormParser]
+    permission_classes = [IsAuthenticated]
+    
+    def post(self, request, pk):
+        detection = get_object_or_404(Detection, pk=pk, user=request.user, file_type='stream')
+        if detection.source_url or detection.status not in ('pending', 'processing'):
+            return Response(
+                {"success": False, "message": "Stream không ở chế độ push hoặc đã kết thúc"},
+                status=status.HTTP_409_CONFLICT
+            )
+        
+        upload = request.FILES.get('frame')
+        data = upload.read() if upload is not None else b''
+        if not is_image_data(data):
+            return Response(
+                {"success": False, "message": "Vui lòng gửi frame là ảnh hợp lệ"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        try:
+            if request.data.get('timestamp') not in (None, ''):
+                timestamp = float(request.data['timestamp'])
+                if not math.isfinite(timestamp):
+                    raise ValueError
+            else:
+                timestamp = (timezone.now() - detection.created_at).total_seconds()
+        except (TypeError, ValueError):
+            return Response(
+                {"success": False, "message": "timestamp phải là số giây"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        if not enqueue_push_frame(detection, data, timestamp):
+            return Response(
+                {"success": False, "message": "Stream đang xử lý chậm hơn tốc độ gửi frame, vui lòng giảm tốc độ"},
+                status=status.HTTP_429_TOO_MANY_REQUESTS
+            )
+        return Response({"success": True, "queued": True, "timestamp": timestamp}, status=status.HTTP_202_ACCEPTED)
+
+
+class StreamEventsView(APIView):
+    """
+    Server-Sent Events cho live stream
+    
+    GET /api/recognition/stream/<id>/events/?after=<sign_id>
+    
+    Mỗi DetectedSign mới được ghi (biển báo xuất hiện) gửi một event "sign",
+    khi stream kết thúc gửi event "end" với status cuối cùng rồi đóng kết nối.
+    Kết nối bị đóng sau STREAM_EVENTS_MAX_DURATION giây (không gửi "end"): EventSource tự kết nối lại
+    với header Last-Event-ID và nhận tiếp từ sign sau đó.
+    """
+    permission_classes = [IsAuthenticated]
+    renderer_classes = [JSONRenderer, EventStreamRenderer]
+    HEARTBEAT_SECONDS = 15
+    
+    def get(self, request, pk):
+        detection = get_object_or_404(Detection, pk=pk, user=request.user, file_type='stream')
+        try:
+            cursor = int(request.query_params.get('after') or request.headers.get('Last-Event-ID') or 0)
+        except ValueError:
+            cursor = 0
+        
+        response = StreamingHttpResponse(
+            self._events(detection.id, cursor), content_type='text/event-stream'
+        )
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'  # Tắt buffer của nginx
+        return response
+    
+    def _events(self, detection_id, cursor):
+        last_sent = time.monotonic()
+        # Giới hạn thời gian giữ worker thread của web server cho một client
+        deadline = last_sent + settings.STREAM_EVENTS_MAX_DURATION
+        while True:
+            signs = (
+                DetectedSign.objects.filter(detection_id=detection_id, id__gt=cursor)
+                .select_related('traffic_sign').order_by('id')
+            )
+            for sign in signs:
+                cursor = sign.id
+                last_sent = time.monotonic()
+                yield f"id: {sign.id}\nevent: sign\ndata: {json.dumps(sign_event(sign), ensure_ascii=False)}\n\n"
+            
+            current_status = Detection.objects.filter(id=detection_id).values_list('status', flat=True).first()
+            if current_status not in ('pending', 'processing'):
+                yield f"event: end\ndata: {json.dumps({'status': current_status})}\n\n"
+                return
+            
+            if time.monotonic() >= deadline:
+                return
+            if time.monotonic() - last_sent >= self.HEARTBEAT_SECONDS:
+                last_sent = time.monotonic()
+                yield ": heartbeat\n\n"
+            time.sleep(settings.STREAM_EVENT_POLL_INTERVAL)
+
+
+class StreamStopView(APIView):
+    """
+    Dừng live stream
+    
+    POST /api/recognition/stream/<id>/stop/
+    Worker đang chạy stream (đọc source_url hoặc detect frame push) sẽ dừng trong khoảng 1 giây.
+    """
+    permission_classes = [IsAuthenticated]
+    
+    def post(self, request, pk):
+        detection = get_object_or_404(Detection, pk=pk, user=request.user, file_type='stream')
+        Detection.objects.filter(id=detection.id, status__in=['pending', 'processing']).update(
+            status='done', finished_at=timezone.now()
+        )
+        # Frame push chưa detect (worker đang chạy stream cũng tự dọn khi dừng)
+        discard_push_frames(detection.id)
+        detection.refresh_from_db()
+        serializer = DetectionSummarySerializer(detection, context={'request': request})
+        return Response({"success": True, "data": serializer.data})
+
+
+class ChunkedUploadInitView(APIView):
+    """
+    Bắt đầu upload nhiều chunk, resume được (cho video lớn)
+    
+    POST /api/recognition/uploads/
+    Body (JSON):
+        - filename: tên file gốc (dùng để kiểm tra định dạng)
+        - file_type: "image" hoặc "video"
+        - size: tổng số bytes
+        - sha256 (optional): checksum để kiểm tra khi complete
+    
+    Response (201 Created):
+        {"success": true, "upload_id": "<uuid>", "offset": 0, "upload_url": "...", "complete_url": "..."}
+    """
+    parser_classes = [JSONParser, FormParser]
+    permission_classes = [IsAuthenticated]
+    
+    def post(self, request):
+        filename = request.data.get('filename', '')
+        file_type = request.data.get('file_type', '').lower()
+        if not filename:
+            return Response({"success": False, "message": "Vui lòng gửi filename"}, status=status.HTTP_400_BAD_REQUEST)
+        if file_type not in ['image', 'video']:
+            return Response(
+                {"success": False, "message": f"file_type phải là 'image' hoặc 'video'. Nhận được: '{file_type}'"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        error = validate_file_extension(file_type, filename)
+        if error:
+            return error
+        try:
+            size = int(request.data.get('size'))
+        except (TypeError, ValueError):
+            return Response({"success": False, "message": "size phải là số bytes"}, status=status.HTTP_400_BAD_REQUEST)
+        
+        try:
+            session = init_upload(request.user, filename, file_type, size, request.data.get('sha256', ''))
+        except UploadError as e:
+            return Response({"success": False, "message": e.message}, status=e.status)
+        
+        base = f'/api/recognition/uploads/{session.token}'
+        return Response({
+            "success": True,
+            "upload_id": str(session.token),
+            "offset": 0,
+            "size": session.total_size,
+            "chunk_max_size": settings.UPLOAD_CHUNK_MAX_SIZE,
+            "upload_url": request.build_absolute_uri(f'{base}/'),
+            "complete_url": request.build_absolute_uri(f'{base}/complete/'),
+        }, status=status.HTTP_201_CREATED)
+
+
+def _upload_offset_response(session, status_code=status.HTTP_200_OK, **extra):
+    response = Response({
+        "success": status_code < 400,
+        "upload_id": str(session.token),
+        "offset": session.received,
+        "size": session.total_size,
+        "status": session.status,
+        **extra,
+    }, status=status_code)
+    response['Upload-Offset'] = str(session.received)
+    response['Upload-Length'] = str(session.total_size)
+    return response
+
+
+class ChunkedUploadView(APIView):
+    """
+    GET    /api/recognition/uploads/<upload_id>/  -> offset hiện tại (resume sau khi mất kết nối)
+    PUT    /api/recognition/uploads/<upload_id>/  -> gửi chunk, body là bytes thô
+           Header Upload-Offset: offset của chunk, phải bằng offset server đã nhận
+    DELETE /api/recognition/uploads/<upload_id>/  -> hủy upload
+    """
+    permission_classes = [IsAuthenticated]
+    
+    def get_session(self, request, token):
+        return get_object_or_404(UploadSession, token=token, user=request.user)
+    
+    def get(self, request, token):
+        return _upload_offset_response(self.get_session(request, token))
+    
+    def put(self, request, token):
+        session = self.get_session(request, token)
+        try:
+            offset = int(request.META.get('HTTP_UPLOAD_OFFSET', ''))
+        except ValueError:
+            return _upload_offset_response(session, status.HTTP_400_BAD_REQUEST, message="Thiếu header Upload-Offset")
+        try:
+            content_length = int(request.META.get('CONTENT_LENGTH') or 0) or None
+        except ValueError:
+            content_length = None
+        
+        # Đọc body dần từ stream, không parse / buffer cả request
+        stream = request.stream or io.BytesIO()
+        try:
+            write_chunk(session, offset, stream, content_length)
+        except UploadError as e:
+            session.refresh_from_db()
+            return _upload_offset_response(session, e.status, message=e.message)
+        session.refresh_from_db()
+        return _upload_offset_response(session)
+    
+    def delete(self, request, token):
+        session = self.get_session(request, token)
+        if session.status == 'uploading':
+            abort_upload(session)
+        return _upload_offset_response(session)
+
+
+class ChunkedUploadCompleteView(APIView):
+    """
+    POST /api/recognition/uploads/<upload_id>/complete/
+    Body (optional): {"sha256": "..."}
+    
+    Kiểm tra kích thước và checksum, sau đó tạo Detection giống upload-run (202, hoặc 200 nếu dùng lại kết quả)
+    """
+    parser_classes = [JSONParser, FormParser]
+    permission_classes = [IsAuthenticated]
+    
+    def post(self, request, token):
+        session = get_object_or_404(UploadSession, token=token, user=request.user)
+        try:
+            detection, reused = complete_upload(session, request.data.get('sha256', ''))
+        except UploadError as e:
+            session.refresh_from_db()
+            return _upload_offset_response(session, e.status, message=e.message)
+        return detection_created_response(request, detection, reused)
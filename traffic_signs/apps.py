@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class TrafficSignsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'traffic_signs'
+
+    def ready(self):
+        # Xóa index TrafficSign trong process khi biển báo thay đổi (traffic_signs/index.py)
+        from . import signals  # noqa: F401
@@ -0,0 +1,65 @@
+"""
+Index TrafficSign trong process: class_id / class_name của YOLO -> TrafficSign, không query DB cho từng biển báo
+
+Build một lần (một query toàn bảng) ở lần tra cứu đầu tiên, bị xóa khi TrafficSign được save / delete
+(signals.py). Thay đổi không phát signal (queryset.update(), bulk_create, sửa ở process khác) được
+nhận sau tối đa TRAFFIC_SIGN_INDEX_MAX_AGE giây.
+
+Kết quả giống query cũ: model_class_id khớp trước, sau đó name chứa class_name (không phân biệt hoa thường),
+nhiều bản ghi khớp thì lấy bản ghi có sign_Code nhỏ nhất như .first().
+"""
+import threading
+import time
+
+from django.conf import settings
+
+from .models import TrafficSign
+
+
+class TrafficSignIndex:
+
+    def __init__(self, max_age: float = 0.0):
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._signs = None
+        self._by_class_id = {}
+        self._by_name = {}
+        self._built_at = 0.0
+
+    def resolve(self, class_id, class_name):
+        """TrafficSign ứng với class_id hoặc class_name từ YOLO, None nếu không có"""
+        signs, by_class_id, by_name = self._snapshot()
+        traffic_sign = None
+        if class_id is not None:
+            traffic_sign = by_class_id.get(str(class_id))
+        if traffic_sign is None and class_name:
+            key = class_name.lower()
+            if key not in by_name:
+                by_name[key] = next((sign for sign in signs if key in sign.name.lower()), None)
+            traffic_sign = by_name[key]
+        return traffic_sign
+
+    def invalidate(self):
+        with self._lock:
+            self._signs = None
+
+    def _snapshot(self):
+        with self._lock:
+            if self._signs is None or (self.max_age > 0 and time.monotonic() - self._built_at > self.max_age):
+                self._build()
+            return self._signs, self._by_class_id, self._by_name
+
+    def _build(self):
+        signs = list(TrafficSign.objects.order_by('pk'))
+        by_class_id = {}
+        for sign in signs:
+            if sign.model_class_id is not None:
+                by_class_id.setdefault(sign.model_class_id, sign)
+        # Thay cả dict (không clear) để thread đang dùng snapshot cũ không bị ảnh hưởng
+        self._signs = signs
+        self._by_class_id = by_class_id
+        self._by_name = {}
+        self._built_at = time.monotonic()
+
+
+traffic_sign_index = TrafficSignIndex(max_age=settings.TRAFFIC_SIGN_INDEX_MAX_AGE)
@@ -0,0 +1,12 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .index import traffic_sign_index
+from .models import TrafficSign
+
+
+@receiver(post_save, sender=TrafficSign)
+@receiver(post_delete, sender=TrafficSign)
+def invalidate_traffic_sign_index(sender, **kwargs):
+    """Biển báo thêm / sửa / xóa -> build lại index ở lần tra cứu tiếp theo"""
+    traffic_sign_index.invalidate()
@@ -11,7 +11,7 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
 from pathlib import Path
-from decouple import config
+from decouple import Csv, config
 from datetime import timedelta
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -162,6 +162,43 @@ STATIC_URL = 'static/'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Tính SHA-256 của file upload trong lúc stream để dedup (xem recognition/dedup.py)
+FILE_UPLOAD_HANDLERS = [
+    'recognition.upload_handlers.HashingMemoryFileUploadHandler',
+    'recognition.upload_handlers.HashingTemporaryFileUploadHandler',
+]
+
+# Background worker xử lý Detection (python manage.py run_detection_workers)
+DETECTION_WORKERS = config('DETECTION_WORKERS', default=2, cast=int)
+DETECTION_POLL_INTERVAL = config('DETECTION_POLL_INTERVAL', default=1.0, cast=float)  # giây
+DETECTION_HEARTBEAT_INTERVAL = config('DETECTION_HEARTBEAT_INTERVAL', default=30, cast=int)  # giây, worker cập nhật heartbeat_at của job đang xử lý
+DETECTION_STALE_TIMEOUT = config('DETECTION_STALE_TIMEOUT', default=300, cast=int)  # giây, job 'processing' không có heartbeat quá lâu sẽ được requeue
+DETECTION_REUSE_RESULTS = config('DETECTION_REUSE_RESULTS', default=True, cast=bool)  # File trùng hash -> dùng lại kết quả cũ
+TRAFFIC_SIGN_INDEX_MAX_AGE = config('TRAFFIC_SIGN_INDEX_MAX_AGE', default=300.0, cast=float)  # giây, build lại index class_id -> TrafficSign (traffic_signs/index.py)
+
+# Upload nhiều chunk, resume được (recognition/uploads.py)
+UPLOAD_MAX_SIZE = config('UPLOAD_MAX_SIZE', default=2 * 1024 ** 3, cast=int)  # bytes, kích thước file tối đa
+UPLOAD_CHUNK_MAX_SIZE = config('UPLOAD_CHUNK_MAX_SIZE', default=16 * 1024 ** 2, cast=int)  # bytes mỗi PUT
+UPLOAD_SESSION_EXPIRY = config('UPLOAD_SESSION_EXPIRY', default=24 * 3600, cast=int)  # giây, upload bỏ dở bị xóa
+
+# Live stream (recognition/streaming.py)
+STREAM_DETECTION_FPS = config('STREAM_DETECTION_FPS', default=5.0, cast=float)  # Số frame chạy YOLO mỗi giây
+STREAM_GAP_TOLERANCE = config('STREAM_GAP_TOLERANCE', default=1.0, cast=float)  # giây, mất dấu lâu hơn thì tách segment mới
+STREAM_MAX_DURATION = config('STREAM_MAX_DURATION', default=4 * 3600, cast=int)  # giây, tối đa cho một stream URL
+STREAM_EVENT_POLL_INTERVAL = config('STREAM_EVENT_POLL_INTERVAL', default=0.2, cast=float)  # giây, SSE poll DetectedSign mới
+STREAM_EVENTS_MAX_DURATION = config('STREAM_EVENTS_MAX_DURATION', default=300, cast=int)  # giây, một kết nối SSE tối đa (client tự kết nối lại)
+STREAM_PUSH_IDLE_TIMEOUT = config('STREAM_PUSH_IDLE_TIMEOUT', default=120, cast=int)  # giây, stream push không nhận frame quá lâu sẽ kết thúc
+STREAM_PUSH_QUEUE_SIZE = config('STREAM_PUSH_QUEUE_SIZE', default=50, cast=int)  # Số frame push chờ worker tối đa, vượt quá trả 429
+# Host camera nội bộ được phép làm source_url (cú pháp như ALLOWED_HOSTS), host khác phải resolve ra địa chỉ public
+STREAM_ALLOWED_HOSTS = config('STREAM_ALLOWED_HOSTS', default='', cast=Csv())
+
+# Prometheus metrics: GET /metrics trên web process, worker process phục vụ ở METRICS_WORKER_PORT (0 = tắt)
+METRICS_ENABLED = config('METRICS_ENABLED', default=True, cast=bool)
+METRICS_WORKER_PORT = config('METRICS_WORKER_PORT', default=0, cast=int)
+
+# Load + warm-up YOLO model khi khởi động (runserver, run_detection_workers, gunicorn.conf.py)
+MODEL_PRELOAD = config('MODEL_PRELOAD', default=True, cast=bool)
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
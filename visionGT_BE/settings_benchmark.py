@@ -0,0 +1,36 @@
+"""
+Settings cho benchmark suite (python -m benchmarks)
+
+Dùng SQLite và thư mục media riêng, không cần SQL Server. Thư mục dữ liệu đổi bằng BENCHMARK_DIR.
+"""
+import os
+import tempfile
+from pathlib import Path
+
+# settings.py đọc các biến này bằng config() không có default
+os.environ.setdefault('SECRET_KEY', 'benchmark-only-secret-key')
+for _key in ('DB_NAME', 'DB_USER', 'DB_PASSWORD', 'DB_HOST'):
+    os.environ.setdefault(_key, '')
+
+from .settings import *  # noqa: E402,F401,F403
+
+BENCHMARK_DIR = Path(os.environ.get('BENCHMARK_DIR', Path(tempfile.gettempdir()) / 'visiongt_benchmark'))
+BENCHMARK_DIR.mkdir(parents=True, exist_ok=True)
+
+DEBUG = False
+ALLOWED_HOSTS = ['testserver', 'localhost', '127.0.0.1']
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BENCHMARK_DIR / 'db.sqlite3',
+    }
+}
+
+MEDIA_ROOT = BENCHMARK_DIR / 'media'
+
+# Mỗi lần upload phải chạy model thật, không dùng lại kết quả của file trùng
+DETECTION_REUSE_RESULTS = False
+
+# Tạo user benchmark nhanh, không cần hash mạnh
+PASSWORD_HASHERS = ['django.contrib.auth.hashers.MD5PasswordHasher']
@@ -19,6 +19,8 @@ from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
 
+from recognition.views import LivenessView, MetricsView, ReadinessView
+
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/', include('users.urls')),
@@ -27,6 +29,9 @@ urlpatterns = [
     path('api/auth/registration/', include('dj_rest_auth.registration.urls')),
     path('api/recognition/', include('recognition.urls')),
     path('api/traffic-signs/', include('traffic_signs.urls')),
+    path('metrics', MetricsView.as_view(), name='metrics'),
+    path('health/live', LivenessView.as_view(), name='health-live'),
+    path('health/ready', ReadinessView.as_view(), name='health-ready'),
 ]
 
 if settings.DEBUG: